@@ -3,6 +3,24 @@ import re
 import os
 import sys
 
+import atomic_files
+import build_cache
+import js_literals
+
+# Where the section modifier object starts in theme-engine-clean.js (js_literals.find_literal finds where it ends)
+SECTION_MODIFIERS_HEAD = r'this\.sectionModifiers\s*=\s*\{'
+# The alias table is declared on window, where magazine-router.js and theme-engine.js look it up
+MODIFIER_ALIASES_HEAD = r'(?:this|window)\.modifierAliases\s*=\s*\{'
+MODIFIER_INDENT = "            "
+# Suggested modifiers are content-addressed: "theme_<hash of the normalized parameters>", shared by every article
+# whose suggestions resolve to the same theme. Each article's own key (article_<id>_custom, which its
+# theme_modifier_key frontmatter names) is an entry in window.modifierAliases pointing at the shared modifier.
+MODIFIER_KEY_PREFIX = "theme_"
+MODIFIER_HASH_LENGTH = 12
+LEGACY_MODIFIER_KEY = re.compile(r'^article_\w+_custom$')
+MODIFIER_KEY = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|([A-Za-z_$][\w$]*))\s*:')
+
+
 def format_js_object(py_dict):
     """
     Converts a Python dictionary (especially with nested dicts like colorShift)
@@ -98,120 +116,221 @@ def restructure_suggestions_for_js(suggested_params):
     return f"{{ {', '.join(output_parts)} }}"
 
 
-def apply_suggestions(theme_engine_file_path, theme_suggestions_file_path):
-    errors = []
-    changes_summary = ""
+def normalize_params(suggested_params):
+    """
+    Flat params with sorted keys and canonical numbers (21.0 -> 21, floats rounded to 4 places), so equal themes
+    hash equally. Accepts flat ("colorShift.h") or nested ({"colorShift": {"h": ...}}) params.
+    """
+    flat = {}
+    for key, value in suggested_params.items():
+        if isinstance(value, dict):
+            flat.update((f"{key}.{sub_key}", sub_value) for sub_key, sub_value in value.items())
+        else:
+            flat[key] = value
+    normalized = {}
+    for key in sorted(flat):
+        value = flat[key]
+        if isinstance(value, float):
+            value = round(value, 4)
+            if value.is_integer():
+                value = int(value)
+        normalized[key] = value
+    return normalized
+
+
+def modifier_key_for(normalized_params):
+    return MODIFIER_KEY_PREFIX + build_cache.combine_keys(normalized_params)[:MODIFIER_HASH_LENGTH]
 
+
+def article_modifier_key(article_id):
+    # Replace non-alphanum chars if article_id can have them
+    return re.sub(r'[^a-zA-Z0-9_]', '_', f"article_{article_id}_custom")
+
+
+def load_suggestions(theme_suggestions_file_path):
+    """(article_id, normalized params) from a theme_suggestions.json; raises ValueError if it is unusable."""
     try:
         with open(theme_suggestions_file_path, 'r', encoding='utf-8') as f:
             suggestions_data = json.load(f)
     except Exception as e:
-        errors.append(f"Error loading theme suggestions: {e}")
-        return "failure", None, "", errors
-
+        raise ValueError(f"Error loading theme suggestions: {e}") from e
     target_article_id = suggestions_data.get("applies_to_article_id")
     suggested_params = suggestions_data.get("suggested_sectionModifier_params")
-
     if not target_article_id or not suggested_params:
-        errors.append("Theme suggestions file is missing 'applies_to_article_id' or 'suggested_sectionModifier_params'.")
-        return "failure", None, "", errors
-
-    # For this subtask, create a unique key for the new modifier
-    # In a real system, target_section_key might come from suggestions_data or be more sophisticated.
-    target_section_key = f"article_{target_article_id}_custom"
-                                                        # Replace non-alphanum chars if article_id can have them
-    target_section_key = re.sub(r'[^a-zA-Z0-9_]', '_', target_section_key)
+        raise ValueError("Theme suggestions file is missing 'applies_to_article_id' or 'suggested_sectionModifier_params'.")
+    return target_article_id, normalize_params(suggested_params)
 
 
-    # Convert Python dict to a JS object literal string
-    # The suggested_params from JSON are flat, e.g. "colorShift.h". Need to make nested for JS.
-    js_object_string = restructure_suggestions_for_js(suggested_params)
-    if not js_object_string or js_object_string == "{ }": # If restructure failed or params were empty
-        errors.append(f"Failed to format JS object string from suggestions: {suggested_params}")
-        return "failure", theme_engine_file_path, "Formatted JS object string is empty.", errors
+def literal_entries(content, literal):
+    """[(key, (start, end), value text)] for the top-level entries of an object literal; key is None if unreadable."""
+    entries = []
+    for entry_start, entry_end in js_literals.literal_items(content, *literal):
+        key_match = MODIFIER_KEY.match(content, entry_start, entry_end)
+        key = next((group for group in key_match.groups() if group is not None), None) if key_match else None
+        value = content[key_match.end():entry_end].strip() if key_match else ""
+        entries.append((key, (entry_start, entry_end), value))
+    return entries
 
 
+def apply_suggestions_batch(theme_engine_file_path, suggestions):
+    """
+    Applies many (article_id, normalized params) in one read and one write of the theme engine file. Each distinct
+    parameter set becomes (or reuses) one theme_<hash> modifier and each article's key becomes an alias of it.
+    Per-article modifiers written by older versions (article_<id>_custom entries holding JSON) are folded into the
+    shared modifiers the same way, and theme_<hash> modifiers no alias points at any more are removed.
+    Returns a report dict; report["status"] is "failure" (file untouched) if the file could not be read or parsed.
+    """
+    report = {"status": "failure", "modified_file": theme_engine_file_path, "applied": {}, "added_modifiers": [],
+              "removed_modifiers": [], "aliases_set": 0, "bytes_before": 0, "bytes_after": 0, "bytes_shed": 0, "errors": []}
     try:
         with open(theme_engine_file_path, 'r', encoding='utf-8') as f:
             theme_engine_content = f.read()
     except Exception as e:
-        errors.append(f"Error reading theme engine file: {e}")
-        return "failure", None, "", errors
+        report["errors"].append(f"Error reading theme engine file: {e}")
+        return report
 
-    # Locate the `this.sectionModifiers = {` block.
-    # This regex aims to find the start and the end of the object.
-    section_modifiers_match = re.search(r'(this\.sectionModifiers\s*=\s*\{)([\s\S]*?)(\n\s*\};)', theme_engine_content)
-
-    if not section_modifiers_match:
-        errors.append("Could not find 'this.sectionModifiers' object in theme-engine-clean.js.")
-        return "failure", theme_engine_file_path, "sectionModifiers object not found.", errors
-
-    prefix = section_modifiers_match.group(1) # "this.sectionModifiers = {"
-    middle_content = section_modifiers_match.group(2).strip() # Content between {}
-    suffix = section_modifiers_match.group(3) # "\n    };"
-
-    new_entry = f'\n            "{target_section_key}": {js_object_string}'
-
-    # Add a comma if middle_content is not empty and doesn't end with a comma
-    if middle_content and not middle_content.endswith(','):
-        new_middle_content = middle_content + ',' + new_entry
-    else: # Empty or already ends with comma
-        new_middle_content = middle_content + new_entry
-
-    # Ensure the last real item has a comma if we add more, but the very last one before '}' should not.
-    # Simpler: just add the new entry, then ensure the *overall* structure is okay.
-    # The new_entry itself should NOT end with a comma if it's the truly last one.
-    # However, we are inserting it into a list, so it should have a comma if more follow.
-    # For robustly adding as the last item (before the closing brace):
-
-    # Let's find the last occurrence of `},` or `{` if the object is empty/single-line
-    # and insert before the final `}` of the `sectionModifiers` block.
-
-    # Revised insertion: find the end of the existing content within braces
-    # and insert the new item there, ensuring proper comma handling.
-
-    # Safest way to add a new key:
-    # Find the last property. If it has a trailing comma, good. If not, add one.
-    # Then add the new property, without a trailing comma itself.
-
-    # Simpler: Add the new entry. It will be the last one before the suffix `\n    };`
-    # So, the new_entry should NOT have a trailing comma.
-    # The `new_middle_content` calculation above handles adding a comma to the previous last item.
-
-    # If the `middle_content` was empty, `new_middle_content` will just be `new_entry`
-    # If `middle_content` was `\n            "some_key": {}`, it becomes `\n            "some_key": {}, \n            "new_key": {}`
-
-    # The suffix starts with \n, so new_middle_content doesn't need a trailing \n if it's not empty.
-    # If middle_content was empty, new_middle_content is `\n            "new_key": {}`
-    # If middle_content was not empty, it's `EXISTING_CONTENT, \n            "new_key": {}`
-
-    # Ensure there's a newline before the new entry if middle_content was not empty
-    if middle_content:
-        final_middle_content = new_middle_content # Already has comma and newline from new_entry structure
-    else: # sectionModifiers was empty
-        final_middle_content = new_entry.lstrip() # Remove leading newline if it's the first entry
+    try:
+        modifiers_literal = js_literals.find_literal(theme_engine_content, SECTION_MODIFIERS_HEAD)
+        aliases_literal = js_literals.find_literal(theme_engine_content, MODIFIER_ALIASES_HEAD)
+        modifier_entries = literal_entries(theme_engine_content, modifiers_literal) if modifiers_literal else []
+        alias_entries = literal_entries(theme_engine_content, aliases_literal) if aliases_literal else []
+    except js_literals.JsSyntaxError as e:
+        report["errors"].append(f"Could not parse the theme engine file: {e}")
+        return report
+    if not modifiers_literal:
+        report["errors"].append("Could not find 'this.sectionModifiers' object in theme-engine-clean.js.")
+        return report
+
+    modifier_positions = {key: i for i, (key, _, _) in enumerate(modifier_entries) if key}
+    aliases = {key: json.loads(value) for key, _, value in alias_entries if key and value.startswith('"')}
+    new_modifiers = {} # key -> normalized params, in first-seen order
+    removed_positions = set()
+
+    def ensure_modifier(normalized_params):
+        modifier_key = modifier_key_for(normalized_params)
+        if modifier_key not in modifier_positions and modifier_key not in new_modifiers:
+            new_modifiers[modifier_key] = normalized_params
+        return modifier_key
+
+    for i, (key, _, value) in enumerate(modifier_entries):
+        if key and LEGACY_MODIFIER_KEY.match(key):
+            try:
+                legacy_params = json.loads(value)
+            except ValueError:
+                continue # Hand-written entry; leave it alone
+            aliases.setdefault(key, ensure_modifier(normalize_params(legacy_params)))
+            removed_positions.add(i)
+
+    for article_id, normalized_params in suggestions:
+        article_key = article_modifier_key(article_id)
+        modifier_key = ensure_modifier(normalized_params)
+        aliases[article_key] = modifier_key
+        report["applied"][article_id] = {"alias": article_key, "modifier": modifier_key}
+        if article_key in modifier_positions:
+            removed_positions.add(modifier_positions[article_key]) # The alias replaces the old per-article entry
+
+    # Garbage-collect content-addressed modifiers nothing refers to
+    referenced = set(aliases.values())
+    for key, position in modifier_positions.items():
+        if key.startswith(MODIFIER_KEY_PREFIX) and key not in referenced:
+            removed_positions.add(position)
+            report["removed_modifiers"].append(key)
+    report["removed_modifiers"].extend(modifier_entries[i][0] for i in sorted(removed_positions)
+                                       if not modifier_entries[i][0].startswith(MODIFIER_KEY_PREFIX))
+    report["added_modifiers"] = [key for key in new_modifiers if key in referenced]
+
+    separator = ",\n" + MODIFIER_INDENT
+    added_texts = [f'"{key}": {restructure_suggestions_for_js(new_modifiers[key])}' for key in report["added_modifiers"]]
+    splices = js_literals.item_splices([span for _, span, _ in modifier_entries], remove=removed_positions,
+                                       append=added_texts, separator=separator)
+    if splices is None and not modifier_entries: # sectionModifiers was empty
+        splices = [(modifiers_literal[0] + 1, modifiers_literal[1], "\n" + MODIFIER_INDENT + separator.join(added_texts) + "\n        ")]
+    elif splices is None: # Every existing entry went away
+        splices = [(modifier_entries[0][1][0], modifier_entries[-1][1][1], separator.join(added_texts))]
+
+    alias_texts = {key: f'"{key}": {json.dumps(target)}' for key, target in aliases.items()}
+    if aliases_literal:
+        alias_positions = {key: i for i, (key, _, _) in enumerate(alias_entries) if key}
+        changed_aliases = {alias_positions[key]: text for key, text in alias_texts.items()
+                           if key in alias_positions and alias_entries[alias_positions[key]][2] != json.dumps(aliases[key])}
+        new_aliases = [text for key, text in alias_texts.items() if key not in alias_positions]
+        report["aliases_set"] = len(changed_aliases) + len(new_aliases)
+        alias_splices = js_literals.item_splices([span for _, span, _ in alias_entries], replace=changed_aliases,
+                                                 append=new_aliases, separator=separator)
+        if alias_splices is None:
+            alias_splices = [(aliases_literal[0] + 1, aliases_literal[1], "\n" + MODIFIER_INDENT + separator.join(new_aliases) + "\n        ")]
+        splices.extend(alias_splices)
+    elif aliases:
+        # First run: declare the alias table right after the sectionModifiers statement
+        report["aliases_set"] = len(aliases)
+        insert_at = modifiers_literal[1] + 1
+        if theme_engine_content.startswith(';', insert_at):
+            insert_at += 1
+        splices.append((insert_at, insert_at, "\n        window.modifierAliases = {\n" + MODIFIER_INDENT
+                        + separator.join(alias_texts.values()) + "\n        };"))
+
+    updated_theme_engine_content = js_literals.splice(theme_engine_content, splices)
+    report["bytes_before"] = len(theme_engine_content.encode('utf-8'))
+    report["bytes_after"] = len(updated_theme_engine_content.encode('utf-8'))
+    report["bytes_shed"] = report["bytes_before"] - report["bytes_after"]
+    if updated_theme_engine_content != theme_engine_content:
+        try:
+            with atomic_files.atomic_open(theme_engine_file_path) as f:
+                f.write(updated_theme_engine_content)
+        except Exception as e:
+            report["errors"].append(f"Error writing updated theme engine file: {e}")
+            return report
+    report["status"] = "success"
+    return report
 
-    updated_theme_engine_content = prefix + final_middle_content + suffix
 
+def apply_suggestions(theme_engine_file_path, theme_suggestions_file_path):
     try:
-        with open(theme_engine_file_path, 'w', encoding='utf-8') as f:
-            f.write(updated_theme_engine_content)
-        changes_summary = f"Added new section modifier: {target_section_key}"
-        status = "success"
-    except Exception as e:
-        errors.append(f"Error writing updated theme engine file: {e}")
-        status = "failure"
+        target_article_id, normalized_params = load_suggestions(theme_suggestions_file_path)
+    except ValueError as e:
+        return "failure", None, "", [str(e)]
 
-    return status, theme_engine_file_path, changes_summary, errors
+    report = apply_suggestions_batch(theme_engine_file_path, [(target_article_id, normalized_params)])
+    if report["status"] != "success":
+        return "failure", theme_engine_file_path, "", report["errors"]
+    modifier_key = report["applied"][target_article_id]["modifier"]
+    verb = "Added new section modifier" if modifier_key in report["added_modifiers"] else "Reused section modifier"
+    return "success", theme_engine_file_path, f"{verb}: {modifier_key}", report["errors"]
 
 
 if __name__ == "__main__":
+    # `python apply_theme_suggestions.py --batch <theme_engine_file_path> <theme_suggestions_file_path> [...]` applies
+    # many suggestion files in one write; `--gc <theme_engine_file_path>` only folds and collects unused modifiers.
+    if len(sys.argv) >= 3 and sys.argv[1] in ("--batch", "--gc") and (sys.argv[1] == "--batch") == (len(sys.argv) >= 4):
+        batch_suggestions = []
+        load_errors = []
+        for suggestions_path in sys.argv[3:]:
+            try:
+                batch_suggestions.append(load_suggestions(suggestions_path))
+            except ValueError as e:
+                load_errors.append(f"{suggestions_path}: {e}")
+        batch_report = apply_suggestions_batch(sys.argv[2], batch_suggestions)
+        batch_report["errors"] = load_errors + batch_report["errors"]
+        if batch_report["status"] == "success" and sys.argv[1] == "--gc":
+            batch_report["editorial_ai_message"] = (
+                f"Collected theme modifiers: {len(batch_report['added_modifiers'])} shared modifier(s) added, {len(batch_report['removed_modifiers'])} removed, "
+                f"{batch_report['bytes_shed']} bytes shed from {os.path.basename(sys.argv[2])}.")
+        elif batch_report["status"] == "success":
+            batch_report["editorial_ai_message"] = (
+                f"Applied theme suggestions for {len(batch_report['applied'])} article(s) using {len(set(a['modifier'] for a in batch_report['applied'].values()))} "
+                f"shared modifier(s); {len(batch_report['added_modifiers'])} added, {len(batch_report['removed_modifiers'])} removed, "
+                f"{batch_report['bytes_shed']} bytes shed from {os.path.basename(sys.argv[2])}.")
+        else:
+            batch_report["editorial_ai_message"] = f"Failed to apply theme suggestions to {os.path.basename(sys.argv[2])}. Errors: {'; '.join(batch_report['errors'])}"
+        print(json.dumps(batch_report))
+        sys.exit(0)
+
     if len(sys.argv) != 3:
         print(json.dumps({
             "status": "failure",
             "modified_file": None,
             "changes_summary": "",
-            "editorial_ai_message": "Error: Incorrect arguments. Usage: python apply_theme_suggestions.py <theme_engine_file_path> <theme_suggestions_file_path>",
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python apply_theme_suggestions.py <theme_engine_file_path> <theme_suggestions_file_path> | --batch <theme_engine_file_path> <theme_suggestions_file_path> [...] | --gc <theme_engine_file_path>",
             "errors": ["Incorrect number of arguments provided."]
         }))
         sys.exit(1)
@@ -232,7 +351,7 @@ if __name__ == "__main__":
 
     ai_msg = ""
     if status_res == "success":
-        ai_msg = f"Applied theme suggestions for article '{article_id_for_msg}' (as modifier '{summary_res.split(': ')[-1]}') to theme-engine-clean.js."
+        ai_msg = f"Applied theme suggestions for article '{article_id_for_msg}' (as modifier '{summary_res.split(': ')[-1]}', aliased by '{article_modifier_key(article_id_for_msg)}') to theme-engine-clean.js."
     else:
         ai_msg = f"Failed to apply theme suggestions for article '{article_id_for_msg}' to theme-engine-clean.js."
         if err_list:
@@ -0,0 +1,558 @@
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+import atomic_files
+import build_cache
+import js_literals
+
+# Router data as static JSON shards instead of one inline `allArticles` array in magazine-router.js, so the
+# router fetches one small page on first load no matter how large the archive grows. Layout under assets/index/:
+#   meta.json                        totals plus the number of type/category/tag shards
+#   meta/<kind>.json                 every shard of one kind (types, categories, tags) with its display name and count
+#   catalog/<xx>.json                what the pipeline needs to place each article (date, type, category, tags, hashes),
+#                                    bucketed by the first hex characters of sha1(id): an update reads only its buckets
+#   catalog/shards/...               per listing: its name, article count and chunks (pages.json, <kind>/<slug>.json)
+#   articles/<id>.json[.gz]          the full record of one article (its "bundle"), compact JSON plus a gzip copy,
+#                                    fetched only when the article is opened
+#   pages/page-1.json                the newest PAGE_SIZE article cards, newest first, with the total and the chunk
+#                                    numbers, newest first
+#   pages/chunk-<n>.json             the whole listing in chunks of about PAGE_SIZE (newest first within a chunk).
+#                                    A chunk is anchored at the (date, id) of its first article and keeps its number
+#                                    for life, so any article, back-dated or new, only rewrites the chunk its date falls
+#                                    in. A chunk splits once it holds 2 * PAGE_SIZE, the newest one at PAGE_SIZE so new
+#                                    articles fill chunks in order. Shards that fit in page-1.json have no chunks
+#   types|categories|tags/<slug>/... the same page-1/chunk files per content type, category and tag
+# Listings only ever hold cards (card_record): the handful of fields a list needs, with a pointer to the bundle.
+# Updates are incremental: only shards containing a changed article are looked at, and within them only the
+# files whose cards actually changed are rewritten.
+PAGE_SIZE = 12
+INDEX_FORMAT_VERSION = 4
+SHARD_KINDS = ("types", "categories", "tags")
+# Hex characters of sha1(article id) naming its catalog bucket: 256 buckets
+CATALOG_BUCKET_CHARS = 2
+# Hex characters of sha1(name) appended to a tag or category slug that is not the name itself
+LISTING_SLUG_HASH_CHARS = 8
+CARD_EXCERPT_CHARS = 280
+# Checked in order for a card's thumbnail
+THUMBNAIL_FIELDS = ("thumbnail_image_path", "header_image_path", "episode_artwork_path")
+# Where the inline article array starts in magazine-router.js (js_literals.find_literal finds where it ends)
+ROUTER_ARTICLES_HEAD = r'(?:var\s+|this\.)allArticles\s*=\s*\['
+# Serializes updates of one index across threads and processes
+LOCK_FILENAME = ".index.lock"
+
+
+def index_dir_for_router(router_file_path):
+    """The index lives in assets/index/ next to the js/ folder holding the router."""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(router_file_path))), "assets", "index")
+
+
+def index_exists(index_dir):
+    return os.path.exists(os.path.join(index_dir, "meta.json"))
+
+
+def slugify(value):
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-') or "untitled"
+
+
+def listing_slug(name):
+    """Slug of a tag or category listing: the plain slug if name already is one, else suffixed with a hash of name."""
+    slug = slugify(name)
+    if slug == name:
+        return slug
+    # "C++", "C#" and "c" would otherwise all share tags/c/
+    return f"{slug}-{hashlib.sha1(str(name).encode('utf-8')).hexdigest()[:LISTING_SLUG_HASH_CHARS]}"
+
+
+def article_filename(article_id):
+    """Mirrors articleFilename() in magazine-router.js."""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(article_id)) + ".json"
+
+
+def normalize_tags(tags):
+    # Tags are usually a list, but hand-written frontmatter sometimes leaves the string "[a, b, c]"
+    if isinstance(tags, str):
+        tags = tags.strip().strip('[]').split(',')
+    if not isinstance(tags, list):
+        return []
+    return [str(tag).strip().strip('"\'') for tag in tags if str(tag).strip().strip('"\'')]
+
+
+def primary_category(record):
+    category = record.get("category")
+    if isinstance(category, list):
+        category = category[0] if category else None
+    return str(category) if category else None
+
+
+def card_thumbnail(record):
+    """The smallest responsive variant (generate_image_derivatives.py) of the first image field set, else the image itself."""
+    for field_name in THUMBNAIL_FIELDS:
+        path = record.get(field_name)
+        if not isinstance(path, str) or not path:
+            continue
+        for entry in record.get("image_derivatives") or []:
+            if isinstance(entry, dict) and entry.get("metadata_field") == field_name:
+                # Fallback-format variants display everywhere; modern formats would need a <picture> per card
+                variants = [v for v in entry.get("variants", []) if v.get("type") == entry.get("fallback_type") and v.get("path")]
+                if variants:
+                    return min(variants, key=lambda v: v.get("width") or 0)["path"]
+        return path
+    return None
+
+
+def card_record(record):
+    """What a listing shows for an article; the full record stays in its bundle (articles/<id>.json)."""
+    excerpt = " ".join(str(record.get("excerpt") or record.get("description") or "").split())
+    if len(excerpt) > CARD_EXCERPT_CHARS:
+        excerpt = excerpt[:CARD_EXCERPT_CHARS].rsplit(" ", 1)[0] + "..."
+    card = {
+        "id": record.get("id"),
+        "title": record.get("title"),
+        "excerpt": excerpt,
+        "thumbnail": card_thumbnail(record),
+        "category": primary_category(record),
+        "date": record.get("date"),
+        "contentType": record.get("contentType") or "article",
+        "tags": normalize_tags(record.get("tags")),
+        "theme_modifier_key": record.get("theme_modifier_key")
+    }
+    card = {key: value for key, value in card.items() if value not in (None, "", [])}
+    card["bundle"] = "articles/" + article_filename(record.get("id"))
+    return card
+
+
+def is_card(article):
+    return isinstance(article, dict) and "bundle" in article
+
+
+def catalog_entry(record):
+    return {
+        "date": str(record.get("date") or ""),
+        "contentType": record.get("contentType") or "article",
+        "category": primary_category(record),
+        "tags": normalize_tags(record.get("tags")),
+        "hash": build_cache.combine_keys(record),
+        "card": build_cache.combine_keys(card_record(record))
+    }
+
+
+def shard_keys(entry):
+    """Shards an article belongs to, as (kind, slug, display name); ("pages", "", "") is the full listing."""
+    keys = [("pages", "", ""), ("types", slugify(entry["contentType"]), entry["contentType"])]
+    if entry["category"]:
+        keys.append(("categories", listing_slug(entry["category"]), entry["category"]))
+    keys.extend(("tags", listing_slug(tag), tag) for tag in entry["tags"])
+    return keys
+
+
+def sort_key(article_id, date):
+    """Where an article sits in a listing, oldest first; chunks are anchored at one of these."""
+    return [str(date or ""), str(article_id)]
+
+
+def card_sort_key(card):
+    return sort_key(card["id"], card.get("date"))
+
+
+def catalog_bucket_path(index_dir, article_id):
+    bucket = hashlib.sha1(str(article_id).encode('utf-8')).hexdigest()[:CATALOG_BUCKET_CHARS]
+    return os.path.join(index_dir, "catalog", bucket + ".json")
+
+
+def shard_state_path(index_dir, key):
+    kind, slug = key
+    if kind == "pages":
+        return os.path.join(index_dir, "catalog", "shards", "pages.json")
+    return os.path.join(index_dir, "catalog", "shards", kind, slug + ".json")
+
+
+def _load_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def shard_dir(index_dir, key):
+    kind, slug = key
+    return os.path.join(index_dir, "pages") if kind == "pages" else os.path.join(index_dir, kind, slug)
+
+
+def bundle_path(index_dir, article_id):
+    return os.path.join(index_dir, "articles", article_filename(article_id))
+
+
+def write_bundle(index_dir, record):
+    """
+    Writes the full record as compact JSON plus a gzip copy next to it (for gzip_static-style servers and for the
+    router, which inflates it with DecompressionStream). Returns the paths written.
+    """
+    path = bundle_path(index_dir, record["id"])
+    data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_files.atomic_open(path, 'wb') as f:
+        f.write(data)
+    with atomic_files.atomic_open(path + ".gz", 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0)) # mtime=0 keeps unchanged bundles byte-identical
+    return [path, path + ".gz"]
+
+
+def load_bundle(index_dir, article_id):
+    with open(bundle_path(index_dir, article_id), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def delete_bundle(index_dir, article_id):
+    """Removes both bundle files; returns the paths that existed."""
+    deleted = []
+    for path in (bundle_path(index_dir, article_id), bundle_path(index_dir, article_id) + ".gz"):
+        if os.path.exists(path):
+            os.remove(path)
+            deleted.append(path)
+    return deleted
+
+
+def expand_articles(articles, index_dir):
+    """Full records for a mix of cards (loaded from their bundles) and records still stored inline."""
+    return [load_bundle(index_dir, article["id"]) if is_card(article) else article for article in articles if isinstance(article, dict)]
+
+
+def load_meta(index_dir):
+    """meta.json, or None if there is no index yet."""
+    return _load_json(os.path.join(index_dir, "meta.json"), None)
+
+
+def load_catalog(index_dir):
+    """Every article's catalog entry ({id: entry}), read from all buckets."""
+    articles = {}
+    catalog_dir = os.path.join(index_dir, "catalog")
+    if os.path.isdir(catalog_dir):
+        for name in sorted(os.listdir(catalog_dir)):
+            if name.endswith(".json"):
+                articles.update(_load_json(os.path.join(catalog_dir, name), {}))
+    return articles
+
+
+def stored_records(index_dir):
+    """Every full record under articles/, e.g. to re-publish an index written in an older format."""
+    articles_dir = os.path.join(index_dir, "articles")
+    if not os.path.isdir(articles_dir):
+        return []
+    records = []
+    for name in sorted(os.listdir(articles_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(articles_dir, name), 'r', encoding='utf-8') as f:
+                records.append(json.load(f))
+    return records
+
+
+def _split_chunk(cards, page_size, newest):
+    """Cards (oldest first) of an overfull chunk in pieces of page_size; an older chunk's last piece keeps the remainder."""
+    pieces = [cards[start:start + page_size] for start in range(0, len(cards), page_size)]
+    if not newest and len(pieces) > 1 and len(pieces[-1]) < page_size:
+        pieces[-2].extend(pieces.pop())
+    return pieces
+
+
+def _clear_listings(index_dir):
+    """Drops everything but the bundles, before an index is rebuilt from them."""
+    for name in ("meta.json", "catalog.json"):
+        if os.path.exists(os.path.join(index_dir, name)):
+            os.remove(os.path.join(index_dir, name))
+    for name in ("meta", "catalog", "pages") + SHARD_KINDS:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def _update_shard(index_dir, key, change, page_size, cards, write_json, delete_file):
+    """
+    Applies one listing's removals and additions ({id: sort key}; a changed card is removed and added again) to the
+    chunks they fall in, splits overfull chunks, and rewrites page-1.json if its content changed. cards has the card
+    of every added article. Returns the listing's new state.
+    """
+    directory = shard_dir(index_dir, key)
+    state_path = shard_state_path(index_dir, key)
+    state = _load_json(state_path, None) or {"name": change["name"], "count": 0, "chunks": [], "next_chunk": 1}
+    head_path = os.path.join(directory, "page-1.json")
+    old_head = _load_json(head_path, None)
+    chunks = state["chunks"]
+    loaded = {} # Chunk position -> cards, oldest first
+
+    def chunk_cards(position):
+        if position not in loaded:
+            chunk = _load_json(os.path.join(directory, f"chunk-{chunks[position]['n']}.json"), {"articles": []})
+            loaded[position] = list(reversed(chunk["articles"]))
+        return loaded[position]
+
+    if not chunks:
+        # page-1.json holds the whole listing
+        members = [card for card in reversed(old_head["articles"] if old_head else []) if card["id"] not in change["remove"]]
+        members.extend(cards[article_id] for article_id in change["add"])
+        members.sort(key=card_sort_key)
+        new_chunks = []
+        if len(members) > page_size:
+            for piece in _split_chunk(members, page_size, True):
+                new_chunks.append({"n": state["next_chunk"], "start": card_sort_key(piece[0]), "count": len(piece)})
+                state["next_chunk"] += 1
+                loaded[len(new_chunks) - 1] = piece
+                write_json(os.path.join(directory, f"chunk-{new_chunks[-1]['n']}.json"),
+                           {"chunk": new_chunks[-1]["n"], "articles": list(reversed(piece))})
+    else:
+        starts = [chunk["start"] for chunk in chunks]
+
+        def position_of(article_key):
+            return max(0, bisect.bisect_right(starts, article_key) - 1) # Older than every anchor: the oldest chunk
+
+        touched = set()
+        for article_id, article_key in change["remove"].items():
+            position = position_of(article_key)
+            loaded[position] = [card for card in chunk_cards(position) if card["id"] != article_id]
+            touched.add(position)
+        for article_id, article_key in change["add"].items():
+            position = position_of(article_key)
+            loaded[position] = sorted(chunk_cards(position) + [cards[article_id]], key=card_sort_key)
+            touched.add(position)
+
+        new_chunks = []
+        new_loaded = {}
+        for position, chunk in enumerate(chunks):
+            if position not in touched:
+                if position in loaded:
+                    new_loaded[len(new_chunks)] = loaded[position]
+                new_chunks.append(chunk)
+                continue
+            members = loaded[position]
+            if not members:
+                delete_file(os.path.join(directory, f"chunk-{chunk['n']}.json"))
+                continue
+            newest = position == len(chunks) - 1
+            pieces = [members] if len(members) <= (page_size if newest else 2 * page_size) else _split_chunk(members, page_size, newest)
+            for number, piece in enumerate(pieces):
+                if number == 0:
+                    piece_chunk = {"n": chunk["n"], "start": chunk["start"], "count": len(piece)}
+                else:
+                    piece_chunk = {"n": state["next_chunk"], "start": card_sort_key(piece[0]), "count": len(piece)}
+                    state["next_chunk"] += 1
+                new_loaded[len(new_chunks)] = piece
+                new_chunks.append(piece_chunk)
+                write_json(os.path.join(directory, f"chunk-{piece_chunk['n']}.json"), {"chunk": piece_chunk["n"], "articles": list(reversed(piece))})
+        chunks, loaded = new_chunks, new_loaded
+        members = None
+        if sum(chunk["count"] for chunk in chunks) <= page_size:
+            # Shrunk to one page: page-1.json holds it all again
+            members = [card for position in range(len(chunks)) for card in chunk_cards(position)]
+            for chunk in chunks:
+                delete_file(os.path.join(directory, f"chunk-{chunk['n']}.json"))
+            new_chunks = []
+
+    chunks = new_chunks
+    state["chunks"] = chunks
+    state["count"] = sum(chunk["count"] for chunk in chunks) if chunks else len(members)
+    if change["add"] or not state.get("name"):
+        state["name"] = change["name"]
+
+    if state["count"] == 0:
+        delete_file(head_path)
+        delete_file(state_path)
+        if key[0] != "pages" and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+        return state
+
+    if chunks:
+        head = []
+        for position in range(len(chunks) - 1, -1, -1):
+            head = chunk_cards(position) + head
+            if len(head) >= page_size:
+                break
+    else:
+        head = members
+    new_head = {
+        "page": 1,
+        "total": state["count"],
+        "page_size": page_size,
+        "chunks": [chunk["n"] for chunk in reversed(chunks)],
+        "articles": list(reversed(head[-page_size:]))
+    }
+    if new_head != old_head:
+        write_json(head_path, new_head)
+    write_json(state_path, state, listed=False)
+    return state
+
+
+def update_index(records, index_dir, removed_ids=(), page_size=None):
+    """
+    Adds or replaces the given article records (and drops removed_ids), rewriting only what changed: a record's
+    bundle when the record changed, the listing chunks holding it only when its card changed. Returns a report:
+    added/updated/removed ids and the index files written and deleted (the catalog is build-side state, not listed).
+    """
+    report = {"added": [], "updated": [], "removed": [], "unchanged": [], "files_written": [], "files_deleted": []}
+    with atomic_files.file_lock(os.path.join(index_dir, LOCK_FILENAME)):
+        meta = load_meta(index_dir)
+        page_size = page_size or (meta or {}).get("page_size") or PAGE_SIZE
+        if meta is not None and (meta.get("version") != INDEX_FORMAT_VERSION or meta.get("page_size") != page_size):
+            # Written by an older format, or re-chunked to a new page size: publish every stored bundle again
+            republished = {record["id"]: record for record in stored_records(index_dir) if record.get("id")}
+            republished.update((record["id"], record) for record in records if record.get("id"))
+            records = list(republished.values())
+            _clear_listings(index_dir)
+            meta = None
+
+        buckets = {}
+        dirty_buckets = set()
+        changes = {} # id -> (old catalog entry or None, new entry or None)
+        cards = {}
+
+        def write_json(path, data, listed=True):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_files.write_json(path, data, separators=(',', ':'))
+            if listed:
+                report["files_written"].append(os.path.relpath(path, index_dir))
+
+        def delete_file(path):
+            if os.path.exists(path):
+                os.remove(path)
+                if not os.path.relpath(path, index_dir).startswith("catalog" + os.sep):
+                    report["files_deleted"].append(os.path.relpath(path, index_dir))
+
+        def catalog_bucket(article_id):
+            path = catalog_bucket_path(index_dir, article_id)
+            if path not in buckets:
+                buckets[path] = _load_json(path, {})
+            return path, buckets[path]
+
+        for record in records:
+            article_id = record.get("id")
+            if not article_id:
+                continue
+            entry = catalog_entry(record)
+            path, bucket = catalog_bucket(article_id)
+            old_entry = bucket.get(article_id)
+            if old_entry and old_entry.get("hash") == entry["hash"] and os.path.exists(bundle_path(index_dir, article_id) + ".gz"):
+                report["unchanged"].append(article_id)
+                continue
+            report["updated" if old_entry else "added"].append(article_id)
+            bucket[article_id] = entry
+            dirty_buckets.add(path)
+            changes[article_id] = (changes.get(article_id, (old_entry,))[0], entry)
+            cards[article_id] = card_record(record)
+            report["files_written"].extend(os.path.relpath(path, index_dir) for path in write_bundle(index_dir, record))
+
+        for article_id in removed_ids:
+            path, bucket = catalog_bucket(article_id)
+            if article_id in bucket:
+                changes[article_id] = (changes.get(article_id, (bucket[article_id],))[0], None)
+                del bucket[article_id]
+                dirty_buckets.add(path)
+                report["removed"].append(article_id)
+                report["files_deleted"].extend(os.path.relpath(path, index_dir) for path in delete_bundle(index_dir, article_id))
+
+        if not changes and meta is not None:
+            return report
+
+        shard_changes = {} # (kind, slug) -> {"name": display name, "remove": {id: sort key}, "add": {id: sort key}}
+        for article_id, (old_entry, new_entry) in changes.items():
+            if old_entry and new_entry and old_entry.get("card") == new_entry["card"]:
+                continue # Only the bundle changed; no listing shows the difference
+            for entry, action in ((old_entry, "remove"), (new_entry, "add")):
+                if entry:
+                    for kind, slug, name in shard_keys(entry):
+                        change = shard_changes.setdefault((kind, slug), {"name": name, "remove": {}, "add": {}})
+                        change[action][article_id] = sort_key(article_id, entry["date"])
+                        if action == "add":
+                            change["name"] = name
+
+        states = {key: _update_shard(index_dir, key, change, page_size, cards, write_json, delete_file)
+                  for key, change in sorted(shard_changes.items())}
+
+        for path in sorted(dirty_buckets):
+            if buckets[path]:
+                write_json(path, buckets[path], listed=False)
+            else:
+                delete_file(path)
+
+        old_meta = meta
+        if meta:
+            meta = dict(meta, shard_counts=dict(meta["shard_counts"]))
+        else:
+            meta = {"version": INDEX_FORMAT_VERSION, "page_size": page_size, "total": 0, "shard_counts": {kind: 0 for kind in SHARD_KINDS}}
+        if ("pages", "") in states:
+            meta["total"] = states[("pages", "")]["count"]
+        for kind in SHARD_KINDS:
+            kind_states = {slug: state for (shard_kind, slug), state in states.items() if shard_kind == kind}
+            kind_path = os.path.join(index_dir, "meta", kind + ".json")
+            if not kind_states and os.path.exists(kind_path):
+                continue
+            kind_meta = _load_json(kind_path, {})
+            updated = dict(kind_meta)
+            for slug, state in kind_states.items():
+                if state["count"]:
+                    updated[slug] = {"name": state["name"], "count": state["count"]}
+                else:
+                    updated.pop(slug, None)
+            if updated != kind_meta or not os.path.exists(kind_path):
+                write_json(kind_path, dict(sorted(updated.items())))
+            meta["shard_counts"][kind] = len(updated)
+        if meta != old_meta:
+            write_json(os.path.join(index_dir, "meta.json"), meta)
+    return report
+
+
+def parse_router_articles(router_content):
+    """
+    ((open, close), articles) for the inline allArticles array in magazine-router.js, where open and close are the
+    offsets of its brackets; (None, []) if it is missing. Raises js_literals.JsSyntaxError if the array is malformed.
+    """
+    literal = js_literals.find_literal(router_content, ROUTER_ARTICLES_HEAD)
+    if literal is None:
+        return None, []
+    array_content_str = router_content[literal[0] + 1:literal[1]].strip()
+    return literal, json.loads(f"[{array_content_str}]") if array_content_str else []
+
+
+def migrate_router(router_file_path, page_size=None):
+    """Moves the inline allArticles array into the index and leaves `var allArticles = [];`, switching the router to the index."""
+    with open(router_file_path, 'r', encoding='utf-8') as f:
+        router_content = f.read()
+    literal, articles = parse_router_articles(router_content)
+    if literal is None:
+        raise ValueError(f"Could not find 'allArticles' array in {router_file_path}.")
+    index_dir = index_dir_for_router(router_file_path)
+    report = update_index(expand_articles(articles, index_dir), index_dir, page_size=page_size)
+    atomic_files.write_text(router_file_path, js_literals.splice(router_content, [(literal[0] + 1, literal[1], "")]))
+    return report
+
+
+if __name__ == "__main__":
+    # `python article_index.py migrate [router_file_path] [--page-size N]` moves the inline articles into assets/index/;
+    # `python article_index.py remove <article_id> [router_file_path]` drops an article; `stats` prints meta.json totals.
+    args = sys.argv[1:]
+    page_size_arg = None
+    if "--page-size" in args:
+        flag_index = args.index("--page-size")
+        try:
+            page_size_arg = max(1, int(args[flag_index + 1]))
+            del args[flag_index:flag_index + 2]
+        except (IndexError, ValueError):
+            args = []
+    default_router = "/app/js/magazine-router.js"
+
+    if args[:1] == ["migrate"] and len(args) <= 2:
+        router_path = args[1] if len(args) == 2 else default_router
+        print(json.dumps(dict(router_file=router_path, **migrate_router(router_path, page_size=page_size_arg))))
+    elif args[:1] == ["remove"] and len(args) in (2, 3):
+        router_path = args[2] if len(args) == 3 else default_router
+        print(json.dumps(update_index([], index_dir_for_router(router_path), removed_ids=[args[1]])))
+    elif args[:1] == ["stats"] and len(args) <= 2:
+        meta_path = os.path.join(index_dir_for_router(args[1] if len(args) == 2 else default_router), "meta.json")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        print(json.dumps({"total": meta["total"], "page_size": meta["page_size"], **meta["shard_counts"]}))
+    else:
+        print(json.dumps({"errors": ["Usage: python article_index.py migrate [router_file_path] [--page-size N] | remove <article_id> [router_file_path] | stats [router_file_path]"]}))
+        sys.exit(1)
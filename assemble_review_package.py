@@ -4,6 +4,9 @@ import sys
 import shutil
 from datetime import datetime
 
+import atomic_files
+import asset_store
+
 # Define known asset field prefixes/suffixes for categorization
 # This helps in identifying and categorizing assets from metadata
 # This list can be expanded as more asset types/fields are introduced.
@@ -25,7 +28,8 @@ def get_asset_type(field_name):
                 return asset_type
     return "unknown" # Default if not matched
 
-def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_name_arg): # Renamed to avoid conflict
+def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_name_arg, metadata=None): # Renamed to avoid conflict
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading the staged file
     # 1. Paths & Setup
     staging_batch_path = f"/app/content_pipeline/staging/{staging_batch_dir_name}"
     processed_content_dir = os.path.join(staging_batch_path, "01_processed_content")
@@ -56,18 +60,20 @@ def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_n
     metadata_file_path = os.path.join(staging_batch_path, f"{base_filename}_metadata.json")
     theme_suggestions_file_path = os.path.join(staging_batch_path, "theme_suggestions.json")
 
-    metadata = None
-    try:
-        with open(metadata_file_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+    if metadata is not None:
         files_created_or_verified.append(f"{base_filename}_metadata.json (verified)")
-    except FileNotFoundError:
-        errors.append(f"Metadata file not found: {metadata_file_path}")
-        # Cannot proceed without metadata for summary/manifest
-        return staging_batch_path, files_created_or_verified, f"Failed: Metadata not found for '{base_filename}'.", errors
-    except Exception as e:
-        errors.append(f"Error loading metadata from {metadata_file_path}: {e}")
-        return staging_batch_path, files_created_or_verified, f"Failed: Error loading metadata for '{base_filename}'.", errors
+    else:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            files_created_or_verified.append(f"{base_filename}_metadata.json (verified)")
+        except FileNotFoundError:
+            errors.append(f"Metadata file not found: {metadata_file_path}")
+            # Cannot proceed without metadata for summary/manifest
+            return staging_batch_path, files_created_or_verified, f"Failed: Metadata not found for '{base_filename}'.", errors
+        except Exception as e:
+            errors.append(f"Error loading metadata from {metadata_file_path}: {e}")
+            return staging_batch_path, files_created_or_verified, f"Failed: Error loading metadata for '{base_filename}'.", errors
 
     theme_suggestions = None
     if os.path.exists(theme_suggestions_file_path):
@@ -131,23 +137,42 @@ def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_n
             status_field = key + "_status" # e.g., supplementary_text_path_status
             txt_status = metadata.get(status_field, "unknown_status") # Default if status field itself is missing
 
+            sidecar = metadata.get(key + "_sidecar")
             staged_info = txt_status # Default staged_info to the status if not processed
-            if txt_status == "processed":
+            if txt_status == "processed" and isinstance(sidecar, dict):
+                staged_info = sidecar.get("path") # Large file: stored as a compressed sidecar, not embedded
+            elif txt_status == "processed":
                 staged_info = f"Embedded in metadata as '{content_field}'"
             elif txt_status == "error_reading":
                 staged_info = f"Error reading (see {status_field})"
 
-            asset_manifest.append({
+            manifest_item = {
                 "metadata_field": key,
                 "original_relative_path": value, # Original relative path from the field like supplementary_text_path
                 "staged_path_or_status": staged_info,
                 "status": txt_status, # This is the crucial status field
                 "asset_type": asset_type
-            })
+            }
+            if txt_status == "processed" and isinstance(sidecar, dict):
+                manifest_item["sidecar"] = sidecar
+                manifest_item["preview"] = metadata.get(key + "_preview")
+            asset_manifest.append(manifest_item)
+
+    # Attach responsive variants (from generate_image_derivatives.py) to the images they were derived from,
+    # and header probe results (from probe_media.py: dimensions, duration, page count, detected format)
+    derivatives_by_source = {entry.get("source"): entry for entry in metadata.get("image_derivatives", []) if isinstance(entry, dict)}
+    asset_probes = metadata.get("asset_probes") if isinstance(metadata.get("asset_probes"), dict) else {}
+    for item in asset_manifest:
+        derivative_entry = derivatives_by_source.get(item["staged_path_or_status"])
+        if derivative_entry:
+            item["variants"] = derivative_entry.get("variants", [])
+            item["srcset"] = derivative_entry.get("srcset", {})
+        if item["staged_path_or_status"] in asset_probes:
+            item["probe"] = asset_probes[item["staged_path_or_status"]]
 
     asset_manifest_path = os.path.join(staging_batch_path, "04_asset_manifest.json")
     try:
-        with open(asset_manifest_path, 'w', encoding='utf-8') as f:
+        with atomic_files.atomic_open(asset_manifest_path) as f:
             json.dump(asset_manifest, f, indent=4)
         files_created_or_verified.append("04_asset_manifest.json (created)")
     except Exception as e:
@@ -208,7 +233,7 @@ def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_n
         summary_content.append("- No general errors during package assembly.")
 
     try:
-        with open(summary_md_path, 'w', encoding='utf-8') as f:
+        with atomic_files.atomic_open(summary_md_path) as f:
             f.write("\n".join(summary_content))
         files_created_or_verified.append("00_PROCESSING_SUMMARY.md (created)")
     except Exception as e:
@@ -222,7 +247,7 @@ def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_n
 
     if os.path.exists(source_md_path):
         try:
-            shutil.copy2(source_md_path, destination_md_path)
+            asset_store.place(source_md_path, destination_md_path)
             files_created_or_verified.append(f"05_source_files_copy/{source_md_filename} (copied)")
         except Exception as e:
             errors.append(f"Non-critical: Error copying source MD file '{source_md_path}': {e}")
@@ -235,12 +260,24 @@ def assemble_package(staging_batch_dir_name, base_filename, incoming_batch_dir_n
 
     return staging_batch_path, files_created_or_verified, final_editorial_message, errors
 
+def stage_result(s_batch_dir, b_filename, i_batch_dir, metadata=None):
+    """Runs assemble_package and returns the same result dict the CLI prints."""
+    package_path, files_list, message, err_list = assemble_package(s_batch_dir, b_filename, i_batch_dir, metadata=metadata)
+    return {
+        "staging_package_path": package_path,
+        "files_created_or_verified": files_list,
+        "editorial_ai_message": message,
+        "errors": err_list
+    }
+
 if __name__ == "__main__":
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    sys.argv = [a for a in sys.argv if a != "--cache"]
     if len(sys.argv) != 4: # script_name, staging_batch_dir_name, base_filename, incoming_batch_dir_name
         print(json.dumps({
             "staging_package_path": None,
             "files_created_or_verified": [],
-            "editorial_ai_message": "Error: Incorrect arguments. Usage: python assemble_review_package.py <staging_batch_dir_name> <base_filename> <incoming_batch_dir_name>",
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python assemble_review_package.py <staging_batch_dir_name> <base_filename> <incoming_batch_dir_name> [--cache]",
             "errors": ["Incorrect number of arguments provided."]
         }))
         sys.exit(1)
@@ -249,11 +286,17 @@ if __name__ == "__main__":
     b_filename = sys.argv[2]
     i_batch_dir = sys.argv[3] # Corrected argument name
 
-    package_path, files_list, message, err_list = assemble_package(s_batch_dir, b_filename, i_batch_dir)
-
-    print(json.dumps({
-        "staging_package_path": package_path,
-        "files_created_or_verified": files_list,
-        "editorial_ai_message": message,
-        "errors": err_list
-    }))
+    if use_cache_arg:
+        import build_cache
+        staging_batch_path = f"/app/content_pipeline/staging/{s_batch_dir}"
+        # The rendered HTML is moved into the package, so it is hashed wherever it is now
+        html_hashes = [build_cache.hash_file(os.path.join(staging_batch_path, f"{b_filename}.html")),
+                       build_cache.hash_file(os.path.join(staging_batch_path, "01_processed_content", f"{b_filename}.html"))]
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "assemble_review_package", os.path.join(staging_batch_path, f"{b_filename}_metadata.json"),
+            [i_batch_dir, next((h for h in html_hashes if h), None),
+             build_cache.hash_file(os.path.join("/app/content_pipeline/incoming", i_batch_dir, f"{b_filename}.md"))],
+            lambda: stage_result(s_batch_dir, b_filename, i_batch_dir))
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(stage_result(s_batch_dir, b_filename, i_batch_dir)))
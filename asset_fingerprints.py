@@ -0,0 +1,196 @@
+import json
+import os
+import re
+import sys
+import time
+
+import atomic_files
+
+# Fingerprinted publishing (finalize_data_and_assets.py / pipeline.py --fingerprint):
+# live assets are written as name.<hash>.ext, so a changed file always gets a new URL and hosting can serve every
+# fingerprinted file with an immutable, year-long Cache-Control. The global asset-manifest.json in the live assets
+# root maps each logical router path (/assets/images/<article>/header.png) to its current fingerprinted path.
+# Finalize runs in separate processes share it, so every update is a read-merge-write under a file lock. A fingerprinted
+# path the manifest stops pointing at is kept under "superseded" with the time it was replaced, and its file is deleted
+# once STALE_FINGERPRINT_GRACE_SECONDS have passed (long enough for cached pages and routers that still use it).
+FINGERPRINT_LENGTH = 12
+ASSET_MANIFEST_FILENAME = "asset-manifest.json"
+FIREBASE_JSON_PATH = "/app/firebase.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MANIFEST_CACHE_CONTROL = "no-cache" # The manifest changes whenever an asset does, so it is always revalidated
+# Compound extensions kept together, so transcript.txt.gz becomes transcript.<hash>.txt.gz
+COMPOUND_EXTENSIONS = (".txt.gz",)
+STALE_FINGERPRINT_GRACE_SECONDS = 7 * 24 * 3600
+FINGERPRINTED_FILENAME = re.compile(rf'\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}(\.[A-Za-z0-9]+)+$')
+
+
+def split_extension(filename):
+    for extension in COMPOUND_EXTENSIONS:
+        if filename.lower().endswith(extension):
+            return filename[:-len(extension)], filename[-len(extension):]
+    return os.path.splitext(filename)
+
+
+def fingerprinted_name(filename, digest):
+    """header.png + its sha256 -> header.<first FINGERPRINT_LENGTH hex digits>.png"""
+    stem, extension = split_extension(filename)
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{extension}"
+
+
+def manifest_path(live_assets_root_dir_on_disk):
+    return os.path.join(live_assets_root_dir_on_disk, ASSET_MANIFEST_FILENAME)
+
+
+def _manifest_lock_path(path):
+    # A dotfile, so hosting never deploys it (firebase.json ignores **/.*)
+    return os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".lock")
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get("assets"), dict):
+            if not isinstance(manifest.get("superseded"), dict):
+                manifest["superseded"] = {}
+            return manifest
+    except (OSError, ValueError):
+        pass # Missing or unreadable manifest starts empty
+    return {"version": 1, "assets": {}, "superseded": {}}
+
+
+def _router_path_on_disk(router_path, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router):
+    prefix = live_assets_path_prefix_for_router.rstrip('/')
+    relative = router_path[len(prefix):] if router_path.startswith(prefix + '/') else router_path
+    return os.path.join(live_assets_root_dir_on_disk, relative.lstrip('/'))
+
+
+def _remove_expired(manifest, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, now, grace_seconds):
+    """Deletes the files of superseded fingerprinted paths older than the grace period; returns the paths removed."""
+    referenced = set(manifest["assets"].values())
+    removed = []
+    for router_path, superseded_at in sorted(manifest["superseded"].items()):
+        if router_path in referenced:
+            del manifest["superseded"][router_path] # Published again
+        elif now - superseded_at >= grace_seconds:
+            try:
+                os.remove(_router_path_on_disk(router_path, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router))
+            except FileNotFoundError:
+                pass
+            del manifest["superseded"][router_path]
+            removed.append(router_path)
+    return removed
+
+
+def _write_manifest(path, manifest):
+    manifest["assets"] = dict(sorted(manifest["assets"].items()))
+    manifest["superseded"] = dict(sorted(manifest["superseded"].items()))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_files.write_json(path, manifest, indent=2)
+
+
+def update_manifest(live_assets_root_dir_on_disk, entries, live_assets_path_prefix_for_router="/assets", now=None,
+                    grace_seconds=STALE_FINGERPRINT_GRACE_SECONDS):
+    """
+    Merges {logical_router_path: fingerprinted_router_path} into the global manifest and returns its path.
+    The merge re-reads the manifest under a file lock, so concurrent finalize runs (threads or processes) never drop
+    each other's entries. Replaced fingerprinted paths become superseded, and expired superseded files are deleted.
+    """
+    path = manifest_path(live_assets_root_dir_on_disk)
+    now = time.time() if now is None else now
+    with atomic_files.file_lock(_manifest_lock_path(path)):
+        manifest = load_manifest(path)
+        changed = False
+        for logical, fingerprinted in entries.items():
+            previous = manifest["assets"].get(logical)
+            if previous != fingerprinted:
+                if previous:
+                    manifest["superseded"][previous] = now
+                manifest["assets"][logical] = fingerprinted
+                changed = True
+        removed = _remove_expired(manifest, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, now, grace_seconds)
+        if changed or removed:
+            _write_manifest(path, manifest)
+    return path
+
+
+def collect_garbage(live_assets_root_dir_on_disk, live_assets_path_prefix_for_router="/assets", now=None,
+                    grace_seconds=STALE_FINGERPRINT_GRACE_SECONDS):
+    """
+    Full sweep of the live assets root: fingerprinted files the manifest does not reference are marked superseded the
+    first time they are seen, and deleted once that is older than the grace period.
+    """
+    path = manifest_path(live_assets_root_dir_on_disk)
+    now = time.time() if now is None else now
+    prefix = '/' + live_assets_path_prefix_for_router.strip('/')
+    with atomic_files.file_lock(_manifest_lock_path(path)):
+        manifest = load_manifest(path)
+        referenced = set(manifest["assets"].values())
+        marked = 0
+        for dir_path, _, filenames in os.walk(live_assets_root_dir_on_disk):
+            for filename in filenames:
+                if not FINGERPRINTED_FILENAME.search(filename):
+                    continue
+                relative = os.path.relpath(os.path.join(dir_path, filename), live_assets_root_dir_on_disk).replace(os.sep, '/')
+                router_path = f"{prefix}/{relative}"
+                if router_path not in referenced and router_path not in manifest["superseded"]:
+                    manifest["superseded"][router_path] = now
+                    marked += 1
+        removed = _remove_expired(manifest, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, now, grace_seconds)
+        if marked or removed:
+            _write_manifest(path, manifest)
+    return {"removed": removed, "awaiting_removal": len(manifest["superseded"])}
+
+
+def firebase_cache_headers(live_assets_path_prefix_for_router="/assets"):
+    """Firebase Hosting "headers" rules matching fingerprinted assets (immutable) and the manifest (always revalidated)."""
+    prefix = live_assets_path_prefix_for_router.strip('/')
+    return [
+        {
+            "regex": f"^/{re.escape(prefix)}/.+\\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}\\.[A-Za-z0-9]+(\\.gz)?$",
+            "headers": [{"key": "Cache-Control", "value": IMMUTABLE_CACHE_CONTROL}]
+        },
+        {
+            "source": f"/{prefix}/{ASSET_MANIFEST_FILENAME}",
+            "headers": [{"key": "Cache-Control", "value": MANIFEST_CACHE_CONTROL}]
+        }
+    ]
+
+
+def apply_firebase_headers(firebase_json_path=FIREBASE_JSON_PATH, live_assets_path_prefix_for_router="/assets"):
+    """Adds (or refreshes) the cache rules in firebase.json's hosting.headers, keeping any other rules. Returns True if it changed."""
+    with open(firebase_json_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    hosting = config.setdefault("hosting", {})
+    rules = firebase_cache_headers(live_assets_path_prefix_for_router)
+    rule_keys = {(rule.get("regex"), rule.get("source")) for rule in rules}
+    headers = [rule for rule in hosting.get("headers", []) if (rule.get("regex"), rule.get("source")) not in rule_keys] + rules
+    if headers == hosting.get("headers"):
+        return False
+    hosting["headers"] = headers
+    with atomic_files.atomic_open(firebase_json_path) as f:
+        json.dump(config, f, indent=2)
+    return True
+
+
+if __name__ == "__main__":
+    # `python asset_fingerprints.py manifest [live_assets_root]` prints the asset manifest;
+    # `python asset_fingerprints.py gc [live_assets_root]` deletes fingerprinted files unreferenced for the grace period;
+    # `python asset_fingerprints.py firebase-headers [--write] [firebase_json_path]` prints (or writes) the cache rules.
+    args = sys.argv[1:]
+    if args[:1] == ["manifest"] and len(args) <= 2:
+        live_root = args[1] if len(args) == 2 else "/app/assets"
+        print(json.dumps(load_manifest(manifest_path(live_root)), indent=2))
+    elif args[:1] == ["gc"] and len(args) <= 2:
+        print(json.dumps(collect_garbage(args[1] if len(args) == 2 else "/app/assets")))
+    elif args[:1] == ["firebase-headers"] and len(args) <= 3:
+        write = "--write" in args
+        paths = [a for a in args[1:] if a != "--write"]
+        if write:
+            firebase_json = paths[0] if paths else FIREBASE_JSON_PATH
+            print(json.dumps({"firebase_json": firebase_json, "updated": apply_firebase_headers(firebase_json)}))
+        else:
+            print(json.dumps({"headers": firebase_cache_headers()}, indent=2))
+    else:
+        print(json.dumps({"errors": ["Usage: python asset_fingerprints.py manifest [live_assets_root] | gc [live_assets_root] | firebase-headers [--write] [firebase_json_path]"]}))
+        sys.exit(1)
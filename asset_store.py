@@ -0,0 +1,421 @@
+import errno
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import atomic_files
+import build_cache
+
+# Content-addressed blob store shared by every stage that copies asset bytes around
+# (incoming/ -> processed_assets/ -> assets/, plus the source Markdown copy in review packages).
+# Each distinct file content is stored once as <root>/sha256/<2 hex>/<digest>; stage outputs are hardlinks to the blob,
+# or reflinks / plain copies where hardlinks are not possible. Output paths and metadata are exactly what copy2 produced.
+# Blobs are never linked to incoming/ files (editors rewrite those in place). Linked outputs stay writable like copy2
+# output, so an in-place edit through one link changes the blob and every other link to it. Each blob therefore has a
+# <digest>.stamp with the size and mtime it was stored with; a blob whose stamp no longer matches is re-hashed before
+# it is reused, and if its bytes changed its name is dropped and the original bytes are ingested again.
+ASSET_STORE_ROOT = "/app/content_pipeline/asset_store"
+STAMP_SUFFIX = ".stamp"
+
+# FICLONE ioctl (btrfs, XFS, bcachefs...): a copy-on-write clone, as cheap as a hardlink but an independent file
+FICLONE = 0x40049409
+REFLINK_AVAILABLE = False
+if sys.platform.startswith('linux'):
+    try:
+        import fcntl
+        REFLINK_AVAILABLE = True
+    except ImportError:
+        REFLINK_AVAILABLE = False
+
+# Transfers run on a bounded pool: enough to overlap hashing and I/O of several large media files without thrashing the disk
+TRANSFER_THREADS = 4
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+COMPARE_CHUNK_SIZE = 1024 * 1024
+# Transfer methods meaning the destination was already current and nothing was written
+SKIPPED_METHODS = ("existing", "unchanged")
+# errnos meaning "this kernel-side copy call can't handle these files", after which the next strategy is tried
+COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+
+# Digests already computed in this process, keyed by inode identity; stage outputs share the blob's inode,
+# so re-linking an already-stored file (e.g. processed_assets/ -> assets/ in finalize) does not re-read it
+_digest_memo = {}
+# Per-key locks so concurrent transfers of the same file hash it and copy it into the store only once
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def _lock_for(key):
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def blob_path(digest, store_root=None):
+    # store_root=None means ASSET_STORE_ROOT, looked up at call time
+    return os.path.join(store_root or ASSET_STORE_ROOT, "sha256", digest[:2], digest)
+
+
+def _stamp_path(blob):
+    return blob + STAMP_SUFFIX
+
+
+def _write_stamp(blob):
+    stat_result = os.stat(blob)
+    atomic_files.write_json(_stamp_path(blob), [stat_result.st_size, stat_result.st_mtime_ns])
+
+
+def _blob_intact(blob, digest):
+    """Whether blob still holds the bytes it is named after; only re-hashed if it changed since it was stamped."""
+    stat_result = os.stat(blob)
+    try:
+        with open(_stamp_path(blob), 'r', encoding='utf-8') as f:
+            if json.load(f) == [stat_result.st_size, stat_result.st_mtime_ns]:
+                return True
+    except (OSError, ValueError):
+        pass
+    if build_cache.hash_file(blob) != digest:
+        return False
+    _write_stamp(blob) # Touched or unstamped, but the bytes are right
+    return True
+
+
+def _identity(path):
+    stat_result = os.stat(path)
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def file_digest(path):
+    """sha256 of a file, memoized by inode identity (cheap for anything already placed through the store)."""
+    identity = _identity(path)
+    with _lock_for(("hash", identity)):
+        digest = _digest_memo.get(identity)
+        if digest is None:
+            digest = build_cache.hash_file(path)
+            _digest_memo[identity] = digest
+    return digest
+
+
+def _reflink(source_path, destination_path):
+    if not REFLINK_AVAILABLE:
+        return False
+    try:
+        with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source_path, destination_path)
+        return True
+    except OSError:
+        return False # Not supported by this filesystem (or across filesystems)
+
+
+def _copy_file_data(src_fd, dst_fd, size):
+    """
+    Copies size bytes between two open files without bouncing them through Python buffers where possible:
+    copy_file_range (which the filesystem may turn into a server-side copy or reflink), then sendfile,
+    then a plain read/write loop. Each strategy continues from where the previous one stopped. Returns the strategy that finished.
+    """
+    offset = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, min(size - offset, COPY_CHUNK_SIZE), offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+            if offset >= size:
+                return "copy_file_range"
+        except OSError as e:
+            if e.errno not in COPY_FALLBACK_ERRNOS:
+                raise
+
+    if hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, min(size - offset, COPY_CHUNK_SIZE))
+                if sent == 0:
+                    break
+                offset += sent
+            if offset >= size:
+                return "sendfile"
+        except OSError as e:
+            if e.errno not in COPY_FALLBACK_ERRNOS:
+                raise
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        chunk = os.read(src_fd, 1024 * 1024)
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+    return "read_write"
+
+
+def _copy_file(source_path, destination_path):
+    """copy2 equivalent built on _copy_file_data; returns the copy strategy used."""
+    with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+        strategy = _copy_file_data(src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size)
+    shutil.copystat(source_path, destination_path)
+    return strategy
+
+
+def _fsync_file(path):
+    """Flushes a freshly written file to disk before it is renamed into place, so a crash never leaves a torn blob."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _same_contents(path_a, path_b):
+    """Chunked byte comparison of two files of equal size; stops at the first chunk that differs."""
+    with open(path_a, 'rb') as file_a, open(path_b, 'rb') as file_b:
+        while True:
+            chunk_a = file_a.read(COMPARE_CHUNK_SIZE)
+            if chunk_a != file_b.read(COMPARE_CHUNK_SIZE):
+                return False
+            if not chunk_a:
+                return True
+
+
+def _temp_path_beside(path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    os.close(fd)
+    os.remove(tmp_path) # os.link and the FICLONE open need the name free
+    return tmp_path
+
+
+def ingest(source_path, store_root=None):
+    """
+    Adds source_path's bytes to the store (if not already there, or if the stored blob was edited in place).
+    Returns (digest, blob_path, method) where method is "existing", "reflink" or the copy strategy used.
+    """
+    digest = file_digest(source_path)
+    blob = blob_path(digest, store_root)
+    with _lock_for(("blob", blob)):
+        if os.path.exists(blob):
+            if _blob_intact(blob, digest):
+                mode = stat.S_IMODE(os.stat(blob).st_mode)
+                if not mode & stat.S_IWUSR: # Stored read-only by an older version of the store
+                    os.chmod(blob, mode | stat.S_IWUSR)
+                return digest, blob, "existing"
+            # Edited through one of its links: those outputs keep the edit, the name goes to a fresh copy
+            os.remove(blob)
+
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        tmp_path = _temp_path_beside(blob)
+        try:
+            method = "reflink" if _reflink(source_path, tmp_path) else _copy_file(source_path, tmp_path)
+            _fsync_file(tmp_path)
+            os.replace(tmp_path, blob) # Atomic; another process ingesting the same bytes just replaces an identical blob
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        _write_stamp(blob)
+    _digest_memo[_identity(blob)] = digest
+    return digest, blob, method
+
+
+def transfer(source_path, destination_path, store_root=None):
+    """
+    Places source_path at destination_path through the store and reports how, with per-file throughput:
+    {"method", "store_method", "bytes", "bytes_copied", "seconds", "mb_per_second"}.
+    method is "existing" (already linked to the blob, or the very same file), "unchanged" (an independent copy whose
+    size, mtime and bytes already match), "hardlink", "reflink" or the copy strategy used. bytes_copied counts bytes
+    actually written. Raises like copy2 does if the source is missing or the destination cannot be written.
+    Destinations that are already current are detected before the source is hashed: a shared inode (processed_assets/
+    and assets/ both linking the same blob) costs two stats, and an equal-size, equal-mtime copy one chunked comparison
+    that stops at the first difference. Re-publishing an unchanged, hardlinked 200 MB podcast reads nothing.
+    """
+    started = time.perf_counter()
+    if os.path.isdir(destination_path):
+        destination_path = os.path.join(destination_path, os.path.basename(source_path))
+    source_stat = os.stat(source_path)
+
+    method = None
+    store_method = "skipped"
+    bytes_copied = 0
+    try:
+        destination_stat = os.stat(destination_path)
+    except FileNotFoundError:
+        destination_stat = None
+    if destination_stat is not None:
+        if os.path.samestat(source_stat, destination_stat):
+            method = "existing"
+        elif (destination_stat.st_size == source_stat.st_size and destination_stat.st_mtime_ns == source_stat.st_mtime_ns
+              and _same_contents(source_path, destination_path)):
+            method = "unchanged"
+
+    if method is None:
+        digest, blob, store_method = ingest(source_path, store_root)
+        bytes_copied = source_stat.st_size if store_method not in ("existing", "reflink") else 0
+        if destination_stat is not None and os.path.samefile(blob, destination_path):
+            method = "existing"
+
+    if method is None:
+        os.makedirs(os.path.dirname(destination_path) or ".", exist_ok=True)
+        tmp_path = _temp_path_beside(destination_path)
+        try:
+            try:
+                os.link(blob, tmp_path)
+                method = "hardlink"
+            except OSError: # Different filesystem, or links not permitted
+                if _reflink(blob, tmp_path):
+                    method = "reflink"
+                else:
+                    method = _copy_file(blob, tmp_path)
+                    _fsync_file(tmp_path)
+                    bytes_copied += source_stat.st_size
+            os.replace(tmp_path, destination_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    seconds = time.perf_counter() - started
+    return {
+        "method": method,
+        "store_method": store_method,
+        "bytes": source_stat.st_size,
+        "bytes_copied": bytes_copied,
+        "seconds": round(seconds, 6),
+        "mb_per_second": round(source_stat.st_size / seconds / 1e6, 2) if seconds > 0 else None
+    }
+
+
+def transfer_action(report):
+    """What a transfer did to its destination: "skipped" (already current), "linked" (no bytes written) or "copied"."""
+    if report["method"] in SKIPPED_METHODS:
+        return "skipped"
+    return "copied" if report["bytes_copied"] else "linked"
+
+
+def summarize_transfers(reports):
+    """Totals over transfer reports: files skipped/linked/copied, bytes copied and bytes saved versus copying everything."""
+    summary = {"files": 0, "skipped": 0, "linked": 0, "copied": 0, "bytes": 0, "bytes_copied": 0, "bytes_saved": 0}
+    for report in reports:
+        summary["files"] += 1
+        summary[transfer_action(report)] += 1
+        summary["bytes"] += report["bytes"]
+        summary["bytes_copied"] += report["bytes_copied"]
+    summary["bytes_saved"] = max(0, summary["bytes"] - summary["bytes_copied"])
+    return summary
+
+
+def place(source_path, destination_path, store_root=None):
+    """Drop-in replacement for shutil.copy2(source_path, destination_path) routed through the store; returns the placement method."""
+    return transfer(source_path, destination_path, store_root)["method"]
+
+
+def place_many(pairs, threads=TRANSFER_THREADS, store_root=None):
+    """
+    Runs transfer() for many (source, destination) pairs on a bounded thread pool.
+    Returns {(source, destination): report}, where a failed transfer's report is the exception it raised.
+    Pairs sharing a destination run in the given order inside one task, so the last one wins exactly as with serial copies.
+    """
+    sources_by_destination = {}
+    for source_path, destination_path in pairs:
+        sources_by_destination.setdefault(destination_path, []).append(source_path)
+
+    results = {}
+
+    def run(destination_path):
+        for source_path in sources_by_destination[destination_path]:
+            try:
+                results[(source_path, destination_path)] = transfer(source_path, destination_path, store_root)
+            except Exception as e: # pylint: disable=broad-except
+                results[(source_path, destination_path)] = e
+
+    if len(sources_by_destination) <= 1 or threads <= 1:
+        for destination_path in sources_by_destination:
+            run(destination_path)
+    else:
+        with ThreadPoolExecutor(max_workers=min(threads, len(sources_by_destination))) as executor:
+            list(executor.map(run, sources_by_destination))
+    return results
+
+
+def incoming_transfer_pairs(metadata, field_names, incoming_batch_base_path, destination_dir):
+    """
+    (source, destination) pairs for every existing incoming file referenced by the given metadata fields,
+    resolved exactly like the image/audio/document stages resolve them, so they can be transferred up front with place_many.
+    """
+    pairs = []
+    for field_name in field_names:
+        field_value = metadata.get(field_name)
+        relative_paths = [field_value] if isinstance(field_value, str) else field_value if isinstance(field_value, list) else []
+        for relative_path in relative_paths:
+            if not isinstance(relative_path, str) or not relative_path.strip() or relative_path.startswith('/content_pipeline/processed_assets/'):
+                continue
+            clean_relative_path = relative_path.lstrip('/')
+            source_path = os.path.normpath(os.path.join(incoming_batch_base_path, clean_relative_path))
+            if os.path.isfile(source_path):
+                pairs.append((source_path, os.path.join(destination_dir, os.path.basename(clean_relative_path))))
+    return pairs
+
+
+def _iter_blobs(store_root):
+    shard_root = os.path.join(store_root or ASSET_STORE_ROOT, "sha256")
+    if not os.path.isdir(shard_root):
+        return
+    for shard in sorted(os.listdir(shard_root)):
+        shard_dir = os.path.join(shard_root, shard)
+        for name in sorted(os.listdir(shard_dir)):
+            if not name.startswith(".tmp-") and not name.endswith(STAMP_SUFFIX):
+                yield name, os.path.join(shard_dir, name)
+
+
+def store_stats(store_root=None):
+    """Blob count and size, and how many bytes the extra hardlinks would have cost as separate copies."""
+    blobs = 0
+    blob_bytes = 0
+    links = 0
+    bytes_saved = 0
+    for _, path in _iter_blobs(store_root):
+        stat_result = os.stat(path)
+        blobs += 1
+        blob_bytes += stat_result.st_size
+        links += stat_result.st_nlink - 1
+        bytes_saved += max(0, stat_result.st_nlink - 2) * stat_result.st_size # The first link replaces the blob's own copy
+    return {"blobs": blobs, "blob_bytes": blob_bytes, "linked_outputs": links, "bytes_saved_by_links": bytes_saved}
+
+
+def collect_garbage(store_root=None):
+    """Removes blobs no stage output links to any more (link count 1). Blobs only reached via reflink/copy fallbacks are removed too; they are re-ingested on next use."""
+    removed = []
+    freed = 0
+    for digest, path in _iter_blobs(store_root):
+        stat_result = os.stat(path)
+        if stat_result.st_nlink == 1:
+            os.remove(path)
+            if os.path.exists(_stamp_path(path)):
+                os.remove(_stamp_path(path))
+            removed.append(digest)
+            freed += stat_result.st_size
+    return {"removed_blobs": len(removed), "bytes_freed": freed}
+
+
+def verify_store(store_root=None):
+    """
+    Re-hashes every blob; a mismatch means something wrote into a linked output in place (every output linked to that
+    blob now has the edited bytes). The next ingest of the original bytes replaces such a blob automatically.
+    """
+    corrupted = [path for digest, path in _iter_blobs(store_root) if build_cache.hash_file(path) != digest]
+    return {"corrupted_blobs": corrupted}
+
+
+if __name__ == "__main__":
+    # Maintenance CLI: `python asset_store.py <stats|gc|verify>`
+    commands = {"stats": store_stats, "gc": collect_garbage, "verify": verify_store}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print(json.dumps({"errors": ["Usage: python asset_store.py <stats|gc|verify>"]}))
+        sys.exit(1)
+
+    print(json.dumps(dict(store_root=ASSET_STORE_ROOT, **commands[sys.argv[1]]())))
@@ -0,0 +1,107 @@
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+# Advisory locks for files several processes read-merge-write (the asset manifest, the keyword index, ...)
+FCNTL_AVAILABLE = False
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    import msvcrt # Windows
+
+# Crash-safe replacement of pipeline outputs (metadata JSON, HTML, manifests, magazine-router.js, ...).
+# Content goes to a temp file in the same directory, is flushed and fsync'ed, then renamed over the target, so
+# readers and a crashed run only ever see the old file or the complete new one, never a half-written one.
+# Temp names start with ".tmp-", which the watcher and the asset store already ignore.
+
+# The process umask, so replaced files get the same permissions plain open(..., 'w') would have given them
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def fsync_directory(directory):
+    """Makes a rename in directory durable. Not possible on every platform (e.g. Windows), where it is skipped."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode='w', encoding='utf-8', newline=None):
+    """
+    Drop-in for open(path, 'w'/'wb') when writing a whole file: yields a temp file object and, only if the block
+    finishes without raising, fsyncs it and atomically renames it to path. On error the target is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-" + os.path.basename(path) + ".")
+    try:
+        if 'b' in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, encoding=encoding, newline=newline)
+        with f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            permissions = os.stat(path).st_mode & 0o7777 # Keep the replaced file's permissions
+        except FileNotFoundError:
+            permissions = 0o666 & ~_UMASK # mkstemp creates 0600
+        os.chmod(tmp_path, permissions)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(directory)
+
+
+def write_text(path, text, encoding='utf-8'):
+    with atomic_open(path, 'w', encoding=encoding) as f:
+        f.write(text)
+
+
+def write_json(path, obj, **dump_kwargs):
+    # json.dumps serializes in one shot with the C encoder; json.dump(obj, f) streams through the pure-Python one
+    text = json.dumps(obj, **dump_kwargs)
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """
+    Holds an exclusive lock on lock_path (created if missing) for the duration of the block, across processes and
+    threads alike: every call opens the file anew, and flock locks belong to the open file, not the process.
+    Wrap the whole read-merge-write of a shared file in it, then replace the file with atomic_open as usual.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, 'a+b') as lock_file:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1) # Itself retries for about 10 seconds
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
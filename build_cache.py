@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import sys
+
+import atomic_files
+import stage_graph
+
+# Persistent content-hash build cache shared by the pipeline stages.
+# Each entry is keyed by "<batch>/<base_filename>:<stage>" and remembers the input key the stage last ran with,
+# the files it produced, the JSON result it returned and either the metadata dict it left behind (process_markdown)
+# or the metadata delta it applied (the graph-scheduled stages in pipeline.py).
+# A stage whose input key is unchanged (and whose outputs still exist) can be skipped and its result reused.
+# Standalone stage CLIs run with --cache keep their own "cli:" entries (see run_stage_cached): their keys cover the
+# staged metadata file itself instead of the pipeline's chain of upstream stage keys.
+BUILD_CACHE_PATH = "/app/content_pipeline/build_cache.json"
+BUILD_CACHE_FORMAT_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def empty_cache():
+    return {"format_version": BUILD_CACHE_FORMAT_VERSION, "file_hashes": {}, "entries": {}}
+
+
+def load_cache(cache_path=BUILD_CACHE_PATH):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get("format_version") == BUILD_CACHE_FORMAT_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass # Missing or unreadable cache just means a cold build
+    return empty_cache()
+
+
+def save_cache(cache, cache_path=BUILD_CACHE_PATH):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    atomic_files.write_json(cache_path, cache)
+
+
+def hash_file(path, cache=None):
+    """
+    Returns the sha256 hex digest of a file, or None if it does not exist.
+    With a cache, digests are remembered by (size, mtime) so unchanged large media is not re-read on every run.
+    """
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+
+    stamp = [stat_result.st_size, stat_result.st_mtime_ns]
+    if cache is not None:
+        known = cache["file_hashes"].get(path)
+        if known and known["stamp"] == stamp:
+            return known["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    file_hash = digest.hexdigest()
+
+    if cache is not None:
+        cache["file_hashes"][path] = {"stamp": stamp, "sha256": file_hash}
+    return file_hash
+
+
+def code_version(module):
+    """Per-stage code version: the hash of the stage module's source file, so any edit to a stage invalidates it."""
+    return hash_file(os.path.abspath(module.__file__))
+
+
+def combine_keys(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def entry_name(batch_dir_name, base_filename, stage_name):
+    return f"{batch_dir_name}/{base_filename}:{stage_name}"
+
+
+def cli_entry_name(metadata_file_path, stage_name):
+    return f"cli:{os.path.abspath(metadata_file_path)}:{stage_name}"
+
+
+def lookup(cache, name, input_key):
+    """
+    Returns the cached entry if it was built from input_key (or left its inputs in the state input_key describes,
+    see output_key in store) and all of its outputs still exist, else None.
+    """
+    entry = cache["entries"].get(name)
+    if not entry or input_key not in (entry.get("input_key"), entry.get("output_key")):
+        return None
+    if not all(os.path.exists(path) for path in entry.get("outputs", [])):
+        return None
+    return entry
+
+
+def store(cache, name, input_key, outputs, result, metadata_after=None, metadata_delta=None, output_key=None):
+    # output_key: the key of the stage's inputs as the stage itself left them (a stage that rewrites the metadata
+    # file it read), so running it again right after itself is a hit too
+    cache["entries"][name] = {
+        "input_key": input_key,
+        "output_key": output_key,
+        "outputs": sorted(set(outputs)),
+        "result": result,
+        "metadata_after": metadata_after,
+        "metadata_delta": metadata_delta
+    }
+
+
+def stage_outputs(result, base_app_path="/app"):
+    """Files a stage result says it wrote, so a cache hit can check they still exist."""
+    outputs = []
+    for key in ("updated_metadata_file_path", "output_suggestions_file_path", "final_metadata_file"):
+        if result.get(key):
+            outputs.append(result[key])
+    for log_key in ("processed_images_log", "derivatives_log", "processed_audio_log", "processed_files_log", "moved_assets_log"):
+        for log_entry in result.get(log_key, []):
+            if log_entry.get("staged_at"):
+                outputs.append(base_app_path + log_entry["staged_at"])
+            if log_entry.get("live_disk_path"):
+                outputs.append(log_entry["live_disk_path"])
+    # assemble_review_package lists what it wrote as "<path relative to the package> (<action>)"
+    if result.get("staging_package_path"):
+        for listed in result.get("files_created_or_verified", []):
+            relative_path, _, action = listed.rpartition(" (")
+            if action.rstrip(")") in ("moved", "created", "copied"):
+                outputs.append(os.path.join(result["staging_package_path"], relative_path))
+    return outputs
+
+
+def asset_input_hashes(incoming_batch_path, metadata, field_names, cache=None, base_app_path="/app"):
+    """
+    Hashes of the asset files referenced by the given metadata fields, in field order. Paths still relative to the
+    incoming batch are resolved there; staged (/content_pipeline/...) and live (/assets/...) ones under base_app_path.
+    """
+    hashes = []
+    for field_name in field_names:
+        value = metadata.get(field_name)
+        for asset_path in (value if isinstance(value, list) else [value]):
+            if isinstance(asset_path, str) and asset_path.strip():
+                if asset_path.startswith("/content_pipeline/") or asset_path.startswith("/assets/"):
+                    source_path = base_app_path + asset_path
+                else:
+                    source_path = os.path.normpath(os.path.join(incoming_batch_path, asset_path.lstrip('/')))
+                hashes.append([field_name, asset_path, hash_file(source_path, cache)])
+    return hashes
+
+
+def json_fields(fields_json_str):
+    """Field names from a stage CLI's asset-fields JSON argument; [] if it does not parse (the stage reports that)."""
+    try:
+        fields = json.loads(fields_json_str)
+    except ValueError:
+        return []
+    return [field for field in fields if isinstance(field, str)] if isinstance(fields, list) else []
+
+
+def _read_metadata(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        return metadata if isinstance(metadata, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _result_failed(result):
+    return any(result.get(key) for key in ("errors", "error_log", "asset_errors"))
+
+
+def run_stage_cached(stage_module, stage_name, metadata_file_path, inputs, run_stage, cache_path=BUILD_CACHE_PATH):
+    """
+    --cache for a stage's own CLI. run_stage() runs the stage and returns its JSON result; it is skipped, and the
+    cached result returned, when the stage already ran with the same code, the same inputs (hashes of the other files
+    it reads and its arguments) and the same staged metadata file. The metadata file matches both as it was before
+    the stage ran and as the stage left it; if it is back at the earlier state (e.g. re-staged by process_markdown),
+    the metadata changes the stage made are re-applied instead of re-running it. inputs may also be a function of the
+    staged metadata dict (e.g. to hash the asset files it references). Results reporting errors are not cached.
+    Returns (result, hit).
+    """
+    cache = load_cache(cache_path)
+    name = cli_entry_name(metadata_file_path, stage_name)
+    before = _read_metadata(metadata_file_path)
+    if callable(inputs):
+        inputs = inputs(before)
+    key_parts = [stage_name, code_version(stage_module), inputs]
+    input_key = combine_keys(*key_parts, hash_file(metadata_file_path, cache))
+    entry = lookup(cache, name, input_key)
+    if entry:
+        delta = entry.get("metadata_delta")
+        if entry["input_key"] == input_key and delta and (delta["set"] or delta["removed"]):
+            metadata, _ = stage_graph.apply_deltas(before, [(stage_name, delta)])
+            with atomic_files.atomic_open(metadata_file_path) as f:
+                json.dump(metadata, f, indent=4)
+        return entry["result"], True
+
+    result = run_stage()
+    if not _result_failed(result):
+        delta = stage_graph.compute_delta(before, _read_metadata(metadata_file_path))
+        output_key = combine_keys(*key_parts, hash_file(metadata_file_path, cache))
+        store(cache, name, input_key, [os.path.abspath(path) for path in stage_outputs(result)], result, metadata_delta=delta, output_key=output_key)
+        save_cache(cache, cache_path)
+    return result, False
+
+
+if __name__ == "__main__":
+    # Small maintenance CLI: `python build_cache.py stats` or `python build_cache.py clear`
+    if len(sys.argv) != 2 or sys.argv[1] not in ("stats", "clear"):
+        print(json.dumps({"errors": ["Usage: python build_cache.py <stats|clear>"]}))
+        sys.exit(1)
+
+    if sys.argv[1] == "clear":
+        if os.path.exists(BUILD_CACHE_PATH):
+            os.remove(BUILD_CACHE_PATH)
+        print(json.dumps({"cache_path": BUILD_CACHE_PATH, "status": "cleared"}))
+    else:
+        build_cache = load_cache()
+        print(json.dumps({
+            "cache_path": BUILD_CACHE_PATH,
+            "entries": len(build_cache["entries"]),
+            "hashed_files": len(build_cache["file_hashes"])
+        }))
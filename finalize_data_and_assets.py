@@ -1,7 +1,18 @@
 import json
 import os
 import sys
-import shutil
+
+import atomic_files
+import asset_fingerprints
+import asset_store
+import generate_image_derivatives
+
+# Publish assets as name.<hash>.ext (see asset_fingerprints.py) so hosting can cache them as immutable.
+# Off by default; enabled per run with --fingerprint (here or on pipeline.py).
+FINGERPRINT_ASSETS = False
+
+# Staged asset paths in the metadata are relative to /app, the repo root in the sandbox
+BASE_APP_PATH = "/app"
 
 # Mapping of metadata fields to asset type folders and if they are lists
 # This helps in iterating and processing different asset types.
@@ -22,24 +33,130 @@ ASSET_FIELD_MAPPING = {
     "missing_pdf_path": {"type": "documents", "is_list": False} # Example of another PDF field
 }
 # Note: TXT files with _content fields are not 'moved' assets, so not included here.
-
-def finalize_data(staging_batch_dir_name, base_filename, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router):
+# Large TXT files stored as <field>_sidecar are moved by finalize_text_sidecars below.
+
+def live_filename(disk_source_path, fingerprint):
+    """Filename an asset is published under: its staged name, or name.<hash>.ext when fingerprinting."""
+    filename = os.path.basename(disk_source_path)
+    if not fingerprint:
+        return filename
+    return asset_fingerprints.fingerprinted_name(filename, asset_store.file_digest(disk_source_path))
+
+
+def finalize_image_derivatives(metadata, base_filename, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, moved_assets_log, asset_errors, fingerprint=False):
+    """
+    Moves the responsive variants listed in metadata["image_derivatives"] next to their live originals and
+    rewrites their paths and srcsets. Variants that fail to move are dropped so no srcset points at a missing file.
+    """
+    processed_images_prefix = f"/content_pipeline/processed_assets/images/{base_filename}/"
+    live_images_dir = os.path.join(live_assets_root_dir_on_disk, "images", base_filename)
+    live_images_prefix = f"{live_assets_path_prefix_for_router}/images/{base_filename}/"
+    live_originals = {entry["source_staged_path"]: entry["live_router_path"] for entry in moved_assets_log}
+
+    def disk_paths(staged_path):
+        disk_source_path = BASE_APP_PATH + staged_path
+        return disk_source_path, os.path.join(live_images_dir, live_filename(disk_source_path, fingerprint))
+
+    entries = [entry for entry in metadata["image_derivatives"] if isinstance(entry, dict)]
+    transfers = asset_store.place_many([disk_paths(variant["path"]) for entry in entries for variant in entry.get("variants", [])
+                                        if variant.get("path", "").startswith(processed_images_prefix)])
+
+    for entry in entries:
+        entry["source"] = live_originals.get(entry.get("source"), entry.get("source"))
+        live_variants = []
+        for variant in entry.get("variants", []):
+            if variant.get("path", "").startswith(processed_images_prefix):
+                disk_source_path, disk_destination_path = disk_paths(variant["path"])
+                transfer = transfers.get((disk_source_path, disk_destination_path))
+                if isinstance(transfer, Exception):
+                    asset_errors.append({
+                        "field": "image_derivatives",
+                        "path": variant["path"],
+                        "error": f"Failed to copy variant to live location: {transfer}. Source: {disk_source_path}"
+                    })
+                    continue
+                router_path = live_images_prefix + os.path.basename(disk_destination_path)
+                moved_assets_log.append({
+                    "source_staged_path": variant["path"],
+                    "live_disk_path": disk_destination_path,
+                    "live_router_path": router_path,
+                    "status": "moved_to_live",
+                    "transfer": transfer
+                })
+                if fingerprint:
+                    moved_assets_log[-1]["logical_router_path"] = live_images_prefix + os.path.basename(variant["path"])
+                variant = dict(variant, path=router_path)
+            live_variants.append(variant)
+        entry["variants"] = live_variants
+        entry["srcset"] = generate_image_derivatives.build_srcsets(entry)
+
+
+def finalize_text_sidecars(metadata, base_filename, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, moved_assets_log, asset_errors, fingerprint=False):
+    """
+    Moves the compressed TXT sidecars (<field>_sidecar, see process_document_assets.py) to the live documents
+    folder and rewrites their paths. A sidecar that fails to move keeps its staged path and is reported.
+    """
+    processed_documents_prefix = f"/content_pipeline/processed_assets/documents/{base_filename}/"
+    live_documents_dir = os.path.join(live_assets_root_dir_on_disk, "documents", base_filename)
+
+    sidecar_fields = [field_name for field_name, value in metadata.items()
+                      if field_name.endswith("_sidecar") and isinstance(value, dict) and str(value.get("path", "")).startswith(processed_documents_prefix)]
+    pairs = {}
+    for field_name in sidecar_fields:
+        disk_source_path = BASE_APP_PATH + metadata[field_name]["path"]
+        try:
+            pairs[field_name] = (disk_source_path, os.path.join(live_documents_dir, live_filename(disk_source_path, fingerprint)))
+        except OSError: # Missing sidecar; the transfer below reports it
+            pairs[field_name] = (disk_source_path, os.path.join(live_documents_dir, os.path.basename(disk_source_path)))
+    transfers = asset_store.place_many(list(pairs.values()))
+
+    for field_name in sidecar_fields:
+        staged_path = metadata[field_name]["path"]
+        disk_source_path, disk_destination_path = pairs[field_name]
+        transfer = transfers.get((disk_source_path, disk_destination_path))
+        if isinstance(transfer, Exception):
+            asset_errors.append({
+                "field": field_name,
+                "path": staged_path,
+                "error": f"Failed to copy TXT sidecar to live location: {transfer}. Source: {disk_source_path}"
+            })
+            continue
+        router_path = f"{live_assets_path_prefix_for_router}/documents/{base_filename}/{os.path.basename(disk_destination_path)}"
+        moved_assets_log.append({
+            "source_staged_path": staged_path,
+            "live_disk_path": disk_destination_path,
+            "live_router_path": router_path,
+            "status": "moved_to_live",
+            "transfer": transfer
+        })
+        if fingerprint:
+            moved_assets_log[-1]["logical_router_path"] = f"{live_assets_path_prefix_for_router}/documents/{base_filename}/{os.path.basename(staged_path)}"
+        metadata[field_name] = dict(metadata[field_name], path=router_path)
+
+
+def finalize_data(staging_batch_dir_name, base_filename, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, metadata=None, fingerprint=None):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading the staged file.
+    # It is finalized in place, so callers should pass a copy if they still need the staged version.
+    # fingerprint: publish assets as name.<hash>.ext and record them in the asset manifest (defaults to FINGERPRINT_ASSETS)
+    if fingerprint is None:
+        fingerprint = FINGERPRINT_ASSETS
     # 1. Paths & Setup
-    staging_batch_path = f"/app/content_pipeline/staging/{staging_batch_dir_name}"
+    staging_batch_path = f"{BASE_APP_PATH}/content_pipeline/staging/{staging_batch_dir_name}"
     metadata_file_path = os.path.join(staging_batch_path, f"{base_filename}_metadata.json")
     final_metadata_output_path = os.path.join(staging_batch_path, f"{base_filename}_final_for_router.json")
-    processed_assets_root = "/app/content_pipeline/processed_assets" # Source for assets
+    processed_assets_root = BASE_APP_PATH + "/content_pipeline/processed_assets" # Source for assets
 
     moved_assets_log = []
     asset_errors = []
     editorial_ai_message = ""
 
     # 2. Load Staged Metadata
-    try:
-        with open(metadata_file_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        return None, [], [f"Error loading metadata: {e}"], f"Failed to load metadata for {base_filename}."
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as e:
+            return None, [], [f"Error loading metadata: {e}"], f"Failed to load metadata for {base_filename}."
 
     # 3. Merge AI Suggestions
     ai_suggestions = metadata.get("ai_suggestions")
@@ -77,6 +194,25 @@ def finalize_data(staging_batch_dir_name, base_filename, live_assets_root_dir_on
         # For now, keeping it for audit as per subtask notes.
 
     # 4. Update Asset Paths & Move Assets
+    # Every processed asset is transferred to its live location up front on the shared bounded pool;
+    # the loop below records the outcomes in field order
+    live_transfer_pairs = []
+    live_filenames = {} # disk_source_path -> published filename, shared by both passes
+    for field_name, field_info in ASSET_FIELD_MAPPING.items():
+        current_paths_val = metadata.get(field_name)
+        if field_info["is_list"]:
+            staged_paths = current_paths_val if isinstance(current_paths_val, list) else []
+        else:
+            staged_paths = [current_paths_val] if isinstance(current_paths_val, str) else []
+        expected_prefix = f"/content_pipeline/processed_assets/{field_info['type']}/{base_filename}/"
+        for staged_path in staged_paths:
+            if isinstance(staged_path, str) and staged_path.startswith(expected_prefix):
+                disk_source_path = staged_path if staged_path.startswith(BASE_APP_PATH) else BASE_APP_PATH + staged_path
+                if os.path.isfile(disk_source_path):
+                    live_filenames[disk_source_path] = live_filename(disk_source_path, fingerprint)
+                    live_transfer_pairs.append((disk_source_path, os.path.join(live_assets_root_dir_on_disk, field_info["type"], base_filename, live_filenames[disk_source_path])))
+    transfers = asset_store.place_many(live_transfer_pairs)
+
     for field_name, field_info in ASSET_FIELD_MAPPING.items():
         if field_name in metadata:
             asset_type_folder = field_info["type"]
@@ -104,30 +240,36 @@ def finalize_data(staging_batch_dir_name, base_filename, live_assets_root_dir_on
                 if staged_path.startswith(expected_prefix):
                     original_filename = os.path.basename(staged_path)
 
-                    # Construct paths for shutil.copy2 and for the new metadata
+                    # Construct paths for the asset store placement and for the new metadata
                     live_subdir_on_disk = os.path.join(live_assets_root_dir_on_disk, asset_type_folder, base_filename)
                     os.makedirs(live_subdir_on_disk, exist_ok=True)
 
                     # disk_source_path assumes paths in metadata are absolute from /app
                     # This was how previous scripts (image/audio/doc asset processing) stored them.
                     disk_source_path = staged_path
-                    if not disk_source_path.startswith("/app"): # Ensure it's absolute for shutil
-                        disk_source_path = "/app" + disk_source_path
+                    if not disk_source_path.startswith(BASE_APP_PATH): # Ensure it's absolute for the asset store
+                        disk_source_path = BASE_APP_PATH + disk_source_path
 
-                    disk_destination_path = os.path.join(live_subdir_on_disk, original_filename)
-                    router_path = f"{live_assets_path_prefix_for_router}/{asset_type_folder}/{base_filename}/{original_filename}"
+                    published_filename = live_filenames.get(disk_source_path, original_filename)
+                    disk_destination_path = os.path.join(live_subdir_on_disk, published_filename)
+                    router_path = f"{live_assets_path_prefix_for_router}/{asset_type_folder}/{base_filename}/{published_filename}"
 
                     try:
                         if not os.path.exists(disk_source_path):
                              raise FileNotFoundError(f"Source asset for copy not found: {disk_source_path}")
-                        shutil.copy2(disk_source_path, disk_destination_path)
+                        transfer = transfers.get((disk_source_path, disk_destination_path)) or asset_store.transfer(disk_source_path, disk_destination_path)
+                        if isinstance(transfer, Exception):
+                            raise transfer
                         new_live_paths.append(router_path)
                         moved_assets_log.append({
                             "source_staged_path": staged_path,
                             "live_disk_path": disk_destination_path,
                             "live_router_path": router_path,
-                            "status": "moved_to_live"
+                            "status": "moved_to_live",
+                            "transfer": transfer
                         })
+                        if fingerprint:
+                            moved_assets_log[-1]["logical_router_path"] = f"{live_assets_path_prefix_for_router}/{asset_type_folder}/{base_filename}/{original_filename}"
                     except Exception as e:
                         new_live_paths.append(staged_path) # Keep original staged path on error
                         asset_errors.append({
@@ -159,41 +301,90 @@ def finalize_data(staging_batch_dir_name, base_filename, live_assets_root_dir_on
             # else: if current_paths_val was None or empty string, and is_list is False, it remains as is.
 
 
+    # Responsive variants follow their originals to the live location
+    if isinstance(metadata.get("image_derivatives"), list):
+        finalize_image_derivatives(metadata, base_filename, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, moved_assets_log, asset_errors, fingerprint)
+
+    # Compressed TXT sidecars go live next to the PDFs
+    finalize_text_sidecars(metadata, base_filename, live_assets_root_dir_on_disk, live_assets_path_prefix_for_router, moved_assets_log, asset_errors, fingerprint)
+
+    # Probe results (width/height, duration, ...) are keyed by asset path, so re-key them by the live paths
+    if isinstance(metadata.get("asset_probes"), dict):
+        live_paths = {entry["source_staged_path"]: entry["live_router_path"] for entry in moved_assets_log}
+        metadata["asset_probes"] = {live_paths.get(path, path): probe for path, probe in metadata["asset_probes"].items()}
+
+    # Publishing is incremental: transfers skip destinations that are already current (same inode, or same
+    # size/mtime/bytes), so each moved asset records whether it was skipped, linked or actually copied
+    for entry in moved_assets_log:
+        entry["publish_action"] = asset_store.transfer_action(entry["transfer"])
+
+    # Logical -> fingerprinted paths go into the global asset manifest
+    if fingerprint:
+        fingerprinted_paths = {entry["logical_router_path"]: entry["live_router_path"] for entry in moved_assets_log if "logical_router_path" in entry}
+        if fingerprinted_paths:
+            try:
+                asset_fingerprints.update_manifest(live_assets_root_dir_on_disk, fingerprinted_paths, live_assets_path_prefix_for_router)
+            except Exception as e: # pylint: disable=broad-except
+                asset_errors.append({"field": "asset_manifest", "path": asset_fingerprints.manifest_path(live_assets_root_dir_on_disk), "error": f"Failed to update asset manifest: {e}"})
+
     # 5. Save Finalized Metadata
     try:
-        with open(final_metadata_output_path, 'w', encoding='utf-8') as f:
+        with atomic_files.atomic_open(final_metadata_output_path) as f:
             json.dump(metadata, f, indent=4)
     except Exception as e:
         errors.append(f"Error writing finalized metadata: {e}")
         return final_metadata_output_path, moved_assets_log, asset_errors, f"Failed to write finalized metadata for {base_filename}."
 
     message = f"Finalized data and assets for '{base_filename}'. Output: {os.path.basename(final_metadata_output_path)}."
+    if moved_assets_log:
+        publish_summary = asset_store.summarize_transfers(entry["transfer"] for entry in moved_assets_log)
+        message += (f" Published {publish_summary['files']} asset(s): {publish_summary['skipped']} unchanged, {publish_summary['linked']} linked,"
+                    f" {publish_summary['copied']} copied ({publish_summary['bytes_saved']} bytes not re-copied).")
     if asset_errors:
         message += f" Encountered {len(asset_errors)} asset moving errors."
 
     return final_metadata_output_path, moved_assets_log, asset_errors, message
 
 
+def stage_result(s_batch_dir, b_filename, live_root_disk, live_prefix_router, metadata=None, fingerprint=None):
+    """Runs finalize_data and returns the same result dict the CLI prints."""
+    final_meta_path, moved_log, err_list, msg = finalize_data(s_batch_dir, b_filename, live_root_disk, live_prefix_router, metadata=metadata, fingerprint=fingerprint)
+    return {
+        "final_metadata_file": final_meta_path,
+        "moved_assets_log": moved_log,
+        "moved_assets_summary": asset_store.summarize_transfers(entry["transfer"] for entry in moved_log),
+        "asset_errors": err_list,
+        "editorial_ai_message": msg
+    }
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 5:
+    fingerprint_arg = "--fingerprint" in sys.argv
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    args = [a for a in sys.argv[1:] if a not in ("--fingerprint", "--cache")]
+    if len(args) != 4:
         print(json.dumps({
             "final_metadata_file": None,
             "moved_assets_log": [],
             "asset_errors": ["Incorrect number of arguments provided."],
-            "editorial_ai_message": "Error: Incorrect arguments. Usage: python finalize_data_and_assets.py <staging_batch_dir_name> <base_filename> <live_assets_root_dir_on_disk> <live_assets_path_prefix_for_router>"
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python finalize_data_and_assets.py <staging_batch_dir_name> <base_filename> <live_assets_root_dir_on_disk> <live_assets_path_prefix_for_router> [--fingerprint] [--cache]"
         }))
         sys.exit(1)
 
-    s_batch_dir = sys.argv[1]
-    b_filename = sys.argv[2]
-    live_root_disk = sys.argv[3]
-    live_prefix_router = sys.argv[4]
-
-    final_meta_path, moved_log, err_list, msg = finalize_data(s_batch_dir, b_filename, live_root_disk, live_prefix_router)
-
-    print(json.dumps({
-        "final_metadata_file": final_meta_path,
-        "moved_assets_log": moved_log,
-        "asset_errors": err_list,
-        "editorial_ai_message": msg
-    }))
+    s_batch_dir = args[0]
+    b_filename = args[1]
+    live_root_disk = args[2]
+    live_prefix_router = args[3]
+
+    if use_cache_arg:
+        import build_cache
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "finalize_data_and_assets", f"{BASE_APP_PATH}/content_pipeline/staging/{s_batch_dir}/{b_filename}_metadata.json",
+            lambda metadata: [live_root_disk, live_prefix_router, fingerprint_arg,
+                              build_cache.asset_input_hashes(f"{BASE_APP_PATH}/content_pipeline/incoming/{s_batch_dir}", metadata, list(ASSET_FIELD_MAPPING), base_app_path=BASE_APP_PATH),
+                              [build_cache.hash_file(BASE_APP_PATH + str(value.get("path", ""))) for field_name, value in sorted(metadata.items())
+                               if field_name.endswith("_sidecar") and isinstance(value, dict)]],
+            lambda: stage_result(s_batch_dir, b_filename, live_root_disk, live_prefix_router, fingerprint=fingerprint_arg))
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(stage_result(s_batch_dir, b_filename, live_root_disk, live_prefix_router, fingerprint=fingerprint_arg)))
@@ -0,0 +1,282 @@
+import json
+import os
+import sys
+
+import atomic_files
+import asset_store
+import build_cache
+
+# Pillow is optional: without it the stage reports that originals are served as-is
+PIL_AVAILABLE = False
+try:
+    import PIL
+    from PIL import Image, features as PIL_features
+    PIL_AVAILABLE = True
+except ImportError:
+    pass
+
+# Target widths for responsive variants; widths at or above the original are never upscaled
+DERIVATIVE_WIDTHS = [480, 960, 1600]
+
+# Encode parameters per output format. They are part of the derivative cache key, so changing them re-encodes.
+# avif/webp are produced when this Pillow build supports them; jpeg/png is the universal fallback (png keeps alpha).
+DERIVATIVE_FORMATS = {
+    "avif": {"pil_format": "AVIF", "extension": "avif", "mime": "image/avif", "params": {"quality": 55}},
+    "webp": {"pil_format": "WEBP", "extension": "webp", "mime": "image/webp", "params": {"quality": 80, "method": 4}},
+    "jpeg": {"pil_format": "JPEG", "extension": "jpg", "mime": "image/jpeg", "params": {"quality": 82, "optimize": True, "progressive": True}},
+    "png": {"pil_format": "PNG", "extension": "png", "mime": "image/png", "params": {"optimize": True}},
+}
+MODERN_FORMATS = ["avif", "webp"]
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+
+# Persistent derivative cache: one small JSON entry per (source hash, width, format, encode params, Pillow version)
+# pointing at the encoded bytes in the asset store, so re-runs and re-used images never re-encode.
+DERIVATIVE_CACHE_ROOT = "/app/content_pipeline/derivative_cache"
+# Staged metadata and image paths are resolved under /app, the repo root in the sandbox
+BASE_APP_PATH = "/app"
+
+
+def available_modern_formats():
+    if not PIL_AVAILABLE:
+        return []
+    return [name for name in MODERN_FORMATS if PIL_features.check(name)]
+
+
+def encoder_signature():
+    """Everything besides the source bytes that decides the derivative output; used as an extra build cache input."""
+    return {
+        "pillow": PIL.__version__ if PIL_AVAILABLE else None,
+        "formats": available_modern_formats(),
+        "widths": DERIVATIVE_WIDTHS,
+        "params": {name: spec["params"] for name, spec in DERIVATIVE_FORMATS.items()}
+    }
+
+
+def build_srcset(variants, mime_type, source_path=None, source_width=None):
+    """'path 480w, path 960w' for the variants of one type, optionally ending with the original at its full width."""
+    candidates = [(v["width"], v["path"]) for v in variants if v["type"] == mime_type]
+    if source_path and source_width and all(width != source_width for width, _ in candidates):
+        candidates.append((source_width, source_path))
+    return ", ".join(f"{path} {width}w" for width, path in sorted(candidates))
+
+
+def build_srcsets(entry):
+    """srcset strings per MIME type for an image_derivatives entry; the fallback type includes the original."""
+    srcsets = {}
+    for variant_type in dict.fromkeys(v["type"] for v in entry["variants"]):
+        include_original = variant_type == entry["fallback_type"]
+        srcsets[variant_type] = build_srcset(entry["variants"], variant_type,
+                                             entry["source"] if include_original else None, entry["width"] if include_original else None)
+    return srcsets
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _cache_entry_path(key):
+    return os.path.join(DERIVATIVE_CACHE_ROOT, key[:2], key + ".json")
+
+
+def _derive(image, source_digest, width, format_name):
+    """
+    Returns (blob_path, height, bytes, cached) for one derivative, encoding it only on a cache miss.
+    Encoded bytes live in the asset store; the cache entry just remembers their digest.
+    """
+    spec = DERIVATIVE_FORMATS[format_name]
+    key = build_cache.combine_keys(source_digest, width, format_name, spec["params"], PIL.__version__)
+    entry_path = _cache_entry_path(key)
+    try:
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        blob = asset_store.blob_path(entry["sha256"])
+        if os.path.exists(blob):
+            return blob, entry["height"], entry["bytes"], True
+    except (OSError, ValueError, KeyError):
+        pass # Miss
+
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image.copy()
+    if format_name == "jpeg" and resized.mode != "RGB":
+        resized = resized.convert("RGB")
+    elif resized.mode not in ("RGB", "RGBA", "L", "LA"):
+        resized = resized.convert("RGBA" if _has_alpha(resized) else "RGB")
+
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    tmp_path = entry_path + f".{os.getpid()}.{spec['extension']}"
+    try:
+        resized.save(tmp_path, spec["pil_format"], **spec["params"])
+        digest, blob, _ = asset_store.ingest(tmp_path)
+        byte_size = os.path.getsize(blob)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    atomic_files.write_json(entry_path, {"sha256": digest, "width": width, "height": height, "bytes": byte_size, "format": format_name})
+    return blob, height, byte_size, False
+
+
+def generate_derivatives(staging_batch_dir_name, base_filename, asset_fields_json_str, metadata=None, save_metadata=True):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading the staged file
+    # save_metadata=False leaves writing <base>_metadata.json to the caller (pipeline.py merges concurrent stage updates)
+    # Runs after process_image_assets.py: only images already staged under processed_assets/images/<base>/ get variants.
+    metadata_file_path = f"{BASE_APP_PATH}/content_pipeline/staging/{staging_batch_dir_name}/{base_filename}_metadata.json"
+    processed_images_prefix = f"/content_pipeline/processed_assets/images/{base_filename}/"
+    processed_assets_article_images_path = BASE_APP_PATH + processed_images_prefix.rstrip('/')
+
+    derivatives_log = []
+    error_log = []
+    updated_metadata_file_path = None
+
+    try:
+        asset_fields = json.loads(asset_fields_json_str)
+    except json.JSONDecodeError as e:
+        return {
+            "derivatives_log": derivatives_log,
+            "error_log": [f"Error parsing asset_fields_json: {e}"],
+            "editorial_ai_message": "Error: Could not parse asset fields JSON.",
+            "updated_metadata_file_path": None
+        }
+
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            return {
+                "derivatives_log": derivatives_log,
+                "error_log": [f"Error loading metadata from {metadata_file_path}: {e}"],
+                "editorial_ai_message": f"Error generating image derivatives for '{base_filename}': Could not load metadata.",
+                "updated_metadata_file_path": None
+            }
+
+    article_title = metadata.get('title', base_filename)
+    if not PIL_AVAILABLE:
+        return {
+            "derivatives_log": derivatives_log,
+            "error_log": error_log,
+            "editorial_ai_message": f"Pillow is not installed; original images for '{article_title}' are served as-is.",
+            "updated_metadata_file_path": None,
+            "metadata_after_processing": metadata,
+            "pil_available": False
+        }
+
+    modern_formats = available_modern_formats()
+    derivative_entries = []
+    encoded = 0
+    cache_hits = 0
+
+    for field_name in asset_fields:
+        field_value = metadata.get(field_name)
+        staged_paths = [field_value] if isinstance(field_value, str) else field_value if isinstance(field_value, list) else []
+        for staged_path in staged_paths:
+            if not isinstance(staged_path, str) or not staged_path.startswith(processed_images_prefix):
+                continue # Not staged (yet), or already live
+            stem, extension = os.path.splitext(os.path.basename(staged_path))
+            if extension.lower() not in RASTER_EXTENSIONS:
+                derivatives_log.append({"source": staged_path, "status": "skipped", "reason": "not a raster image"})
+                continue
+
+            source_disk_path = BASE_APP_PATH + staged_path
+            try:
+                source_digest = build_cache.hash_file(source_disk_path)
+                with Image.open(source_disk_path) as opened:
+                    if getattr(opened, "is_animated", False):
+                        derivatives_log.append({"source": staged_path, "status": "skipped", "reason": "animated image"})
+                        continue
+                    opened.load()
+                    image = opened
+            except Exception as e: # pylint: disable=broad-except
+                # Unreadable or empty image: the original is still served, it just gets no variants
+                derivatives_log.append({"source": staged_path, "status": "skipped", "reason": f"could not decode: {e}"})
+                continue
+
+            fallback_format = "png" if _has_alpha(image) else "jpeg"
+            widths = [w for w in DERIVATIVE_WIDTHS if w < image.width]
+            plan = [(fmt, w) for fmt in modern_formats for w in widths + [image.width]] + [(fallback_format, w) for w in widths]
+
+            variants = []
+            for format_name, width in plan:
+                spec = DERIVATIVE_FORMATS[format_name]
+                variant_filename = f"{stem}-{width}w.{spec['extension']}"
+                variant_path = processed_images_prefix + variant_filename
+                try:
+                    blob, height, byte_size, cached = _derive(image, source_digest, width, format_name)
+                    asset_store.place(blob, os.path.join(processed_assets_article_images_path, variant_filename))
+                except Exception as e: # pylint: disable=broad-except
+                    error_log.append(f"Error generating {format_name} {width}w variant of '{staged_path}': {e}")
+                    continue
+                if cached:
+                    cache_hits += 1
+                else:
+                    encoded += 1
+                variants.append({"path": variant_path, "width": width, "height": height, "format": format_name, "type": spec["mime"], "bytes": byte_size})
+                derivatives_log.append({"source": staged_path, "staged_at": variant_path, "status": "cached" if cached else "encoded"})
+
+            entry = {
+                "metadata_field": field_name,
+                "source": staged_path,
+                "width": image.width,
+                "height": image.height,
+                "fallback_type": DERIVATIVE_FORMATS[fallback_format]["mime"],
+                "variants": variants
+            }
+            entry["srcset"] = build_srcsets(entry)
+            derivative_entries.append(entry)
+
+    metadata_updated = metadata.get("image_derivatives", []) != derivative_entries
+    if derivative_entries:
+        metadata["image_derivatives"] = derivative_entries
+    else:
+        metadata.pop("image_derivatives", None)
+
+    if metadata_updated and not save_metadata:
+        updated_metadata_file_path = metadata_file_path # Persisted by the caller
+    elif metadata_updated:
+        try:
+            with atomic_files.atomic_open(metadata_file_path) as f:
+                json.dump(metadata, f, indent=4)
+            updated_metadata_file_path = metadata_file_path
+        except Exception as e: # pylint: disable=broad-except
+            error_log.append(f"Error writing updated metadata to {metadata_file_path}: {e}")
+
+    variant_count = sum(len(entry["variants"]) for entry in derivative_entries)
+    if derivative_entries:
+        ai_message = f"Generated {variant_count} responsive variant(s) for {len(derivative_entries)} image(s) in '{article_title}' ({encoded} encoded, {cache_hits} from cache)."
+    else:
+        ai_message = f"No raster images needed responsive variants for article '{article_title}'."
+    if error_log:
+        ai_message += " Some variants failed; check logs."
+
+    return {
+        "derivatives_log": derivatives_log,
+        "error_log": error_log,
+        "editorial_ai_message": ai_message,
+        "updated_metadata_file_path": updated_metadata_file_path,
+        "metadata_after_processing": metadata,
+        "pil_available": True,
+        "formats": modern_formats
+    }
+
+
+if __name__ == "__main__":
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    sys.argv = [a for a in sys.argv if a != "--cache"]
+    if len(sys.argv) != 4:
+        print(json.dumps({
+            "derivatives_log": [],
+            "error_log": ["Usage: python generate_image_derivatives.py <staging_batch_dir_name> <base_filename> <asset_fields_json_string> [--cache]"],
+            "editorial_ai_message": "Error: Incorrect arguments for generate_image_derivatives.py.",
+            "updated_metadata_file_path": None
+        }))
+        sys.exit(1)
+
+    if use_cache_arg:
+        # Derivatives are made from the staged originals process_image_assets left in the metadata
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "generate_image_derivatives", f"/app/content_pipeline/staging/{sys.argv[1]}/{sys.argv[2]}_metadata.json",
+            lambda metadata: [sys.argv[3], encoder_signature(), build_cache.asset_input_hashes(f"/app/content_pipeline/incoming/{sys.argv[1]}", metadata, build_cache.json_fields(sys.argv[3]))],
+            lambda: generate_derivatives(sys.argv[1], sys.argv[2], sys.argv[3]))
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(generate_derivatives(sys.argv[1], sys.argv[2], sys.argv[3])))
@@ -0,0 +1,218 @@
+import colorsys
+import json
+import os
+import sys
+from collections import Counter
+
+import atomic_files
+import build_cache
+
+# Pillow is optional: without it no palette is extracted and suggestions come from visual_mood alone
+PIL_AVAILABLE = False
+try:
+    import PIL
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    pass
+
+# NumPy is optional: with it the histogram seeds are refined by k-means; without it the bins are counted in Python
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
+# Dominant colours of an image, computed on a small thumbnail. The source is decoded straight at reduced size where the
+# format allows (JPEG DCT scaling), then every opaque pixel is binned into a 4-bit-per-channel histogram; the most
+# populated bins seed up to PALETTE_SIZE colours, which k-means then settles onto the actual colour clusters.
+PALETTE_SIZE = 5
+THUMBNAIL_SIZE = 64
+HISTOGRAM_BITS = 4
+KMEANS_ITERATIONS = 8
+MIN_ALPHA = 128 # Mostly transparent pixels do not count
+PALETTE_FORMAT_VERSION = 1
+
+# colorShift.s/l are offsets around the theme's own values (the section modifiers use roughly -20..+20), so an image's
+# saturation/lightness of 0..100 maps linearly onto -COLOR_SHIFT_RANGE..+COLOR_SHIFT_RANGE around 50
+COLOR_SHIFT_RANGE = 20
+MIN_CHROMATIC_SATURATION = 15 # Below this a colour is treated as grey and does not pick the hue
+
+# Persistent palette cache: one small JSON entry per (image sha256, palette signature), so each image is decoded once
+PALETTE_CACHE_ROOT = "/app/content_pipeline/palette_cache"
+
+
+def palette_signature():
+    """Everything besides the image bytes that decides the palette; part of the cache key and the build cache input."""
+    return {
+        "format_version": PALETTE_FORMAT_VERSION,
+        "pillow": PIL.__version__ if PIL_AVAILABLE else None,
+        "method": "kmeans" if NUMPY_AVAILABLE else "histogram",
+        "size": PALETTE_SIZE,
+        "thumbnail": THUMBNAIL_SIZE,
+        "histogram_bits": HISTOGRAM_BITS,
+        "iterations": KMEANS_ITERATIONS if NUMPY_AVAILABLE else 0
+    }
+
+
+def rgb_to_hsl(rgb):
+    """[h 0-359, s 0-100, l 0-100] for an (r, g, b) of 0-255 values."""
+    h, l, s = colorsys.rgb_to_hls(*(channel / 255 for channel in rgb))
+    return [round(h * 360) % 360, round(s * 100), round(l * 100)]
+
+
+def hex_to_rgb(hex_color):
+    """(r, g, b) for '#rgb' or '#rrggbb'; raises ValueError for anything else."""
+    digits = hex_color.lstrip('#')
+    if len(digits) == 3:
+        digits = "".join(c * 2 for c in digits)
+    if len(digits) != 6:
+        raise ValueError(f"Not a hex colour: {hex_color}")
+    return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def color_shift_for_hsl(hsl):
+    """colorShift.h/s/l params for a colour: its hue, and its saturation/lightness as offsets around the middle."""
+    h, s, l = hsl
+    return {
+        "colorShift.h": h,
+        "colorShift.s": round((s - 50) * COLOR_SHIFT_RANGE / 50),
+        "colorShift.l": round((l - 50) * COLOR_SHIFT_RANGE / 50)
+    }
+
+
+def palette_color_shift(palette):
+    """
+    colorShift params for a palette ([{"hex", "hsl", "share"}], largest share first), or {} for an empty one.
+    The hue and saturation come from the most prominent chromatic colour and the lightness from the share-weighted
+    average of all of them; a greyscale image only shifts lightness and drains saturation.
+    """
+    if not palette:
+        return {}
+    mean_lightness = sum(color["hsl"][2] * color["share"] for color in palette) / sum(color["share"] for color in palette)
+    chromatic = [color for color in palette if color["hsl"][1] >= MIN_CHROMATIC_SATURATION]
+    if not chromatic:
+        return {"colorShift.s": -COLOR_SHIFT_RANGE, "colorShift.l": color_shift_for_hsl([0, 50, mean_lightness])["colorShift.l"]}
+    shift = color_shift_for_hsl(max(chromatic, key=lambda color: color["share"])["hsl"])
+    shift["colorShift.l"] = color_shift_for_hsl([0, 50, mean_lightness])["colorShift.l"]
+    return shift
+
+
+def _thumbnail_rgba(image_path):
+    with Image.open(image_path) as opened:
+        opened.draft("RGB", (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2)) # Decode JPEGs at a reduced scale
+        opened.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        return opened.convert("RGBA")
+
+
+def _palette_entries(colors, counts):
+    total = sum(counts)
+    entries = []
+    for rgb, count in sorted(zip(colors, counts), key=lambda pair: -pair[1]):
+        if count:
+            rgb = tuple(min(255, max(0, round(channel))) for channel in rgb)
+            entries.append({"hex": "#%02x%02x%02x" % rgb, "hsl": rgb_to_hsl(rgb), "share": round(count / total, 4)})
+    return entries
+
+
+def _histogram_palette(thumbnail):
+    """Most populated histogram bins, each as the mean colour of its pixels; plain Python over the thumbnail."""
+    shift = 8 - HISTOGRAM_BITS
+    bins = Counter()
+    sums = {}
+    raw = thumbnail.tobytes() # RGBA, one byte per channel
+    for r, g, b, a in zip(raw[0::4], raw[1::4], raw[2::4], raw[3::4]):
+        if a < MIN_ALPHA:
+            continue
+        code = (r >> shift, g >> shift, b >> shift)
+        bins[code] += 1
+        total = sums.setdefault(code, [0, 0, 0])
+        total[0] += r
+        total[1] += g
+        total[2] += b
+    top = bins.most_common(PALETTE_SIZE)
+    return _palette_entries([[channel / count for channel in sums[code]] for code, count in top], [count for _, count in top])
+
+
+def _kmeans_palette(thumbnail):
+    """Histogram seeds refined by k-means over the thumbnail's pixels, all as array operations."""
+    pixels = np.asarray(thumbnail, dtype=np.float64).reshape(-1, 4)
+    pixels = pixels[pixels[:, 3] >= MIN_ALPHA, :3]
+    if not len(pixels):
+        return []
+    shift = 8 - HISTOGRAM_BITS
+    quantized = pixels.astype(np.int64) >> shift
+    codes = (quantized[:, 0] << (2 * HISTOGRAM_BITS)) | (quantized[:, 1] << HISTOGRAM_BITS) | quantized[:, 2]
+    bin_counts = np.bincount(codes, minlength=1 << (3 * HISTOGRAM_BITS))
+    seeds = np.argsort(-bin_counts, kind="stable")[:PALETTE_SIZE]
+    seeds = seeds[bin_counts[seeds] > 0]
+    # Seed each centre at the mean colour of its bin
+    centers = np.stack([np.bincount(codes, weights=pixels[:, c], minlength=len(bin_counts))[seeds] for c in range(3)], axis=1) / bin_counts[seeds, None]
+
+    labels = None
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=len(centers))
+        populated = counts > 0
+        for c in range(3):
+            sums = np.bincount(labels, weights=pixels[:, c], minlength=len(centers))
+            centers[populated, c] = sums[populated] / counts[populated]
+    counts = np.bincount(labels, minlength=len(centers))
+    return _palette_entries(centers.tolist(), counts.tolist())
+
+
+def _cache_entry_path(key):
+    return os.path.join(PALETTE_CACHE_ROOT, key[:2], key + ".json")
+
+
+def extract_palette(image_path, cache=None):
+    """
+    Returns (palette, cached, error) for an image: palette is [{"hex", "hsl": [h, s, l], "share"}] with the largest
+    share first, [] when the image cannot be decoded (error says why). Results are cached by the image's sha256, so
+    every image is decoded once; cache is an optional build cache dict to remember file hashes by (size, mtime).
+    """
+    if not PIL_AVAILABLE:
+        return [], False, "Pillow is not installed"
+    source_digest = build_cache.hash_file(image_path, cache)
+    if source_digest is None:
+        return [], False, f"Image not found: {image_path}"
+
+    entry_path = _cache_entry_path(build_cache.combine_keys(source_digest, palette_signature()))
+    try:
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        return entry["palette"], True, entry.get("error")
+    except (OSError, ValueError, KeyError):
+        pass # Miss
+
+    error = None
+    try:
+        thumbnail = _thumbnail_rgba(image_path)
+        palette = _kmeans_palette(thumbnail) if NUMPY_AVAILABLE else _histogram_palette(thumbnail)
+    except Exception as e: # pylint: disable=broad-except
+        # Unreadable or empty image: remembered too, so it is not retried until its bytes change
+        palette, error = [], f"Could not decode image: {e}"
+
+    try:
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        atomic_files.write_json(entry_path, {"palette": palette, "error": error})
+    except OSError:
+        pass # Not fatal; the next run decodes again
+    return palette, False, error
+
+
+if __name__ == "__main__":
+    # `python image_palette.py <image_path> [...]` prints each image's palette and the colorShift it suggests
+    if len(sys.argv) < 2:
+        print(json.dumps({"errors": ["Usage: python image_palette.py <image_path> [<image_path> ...]"]}))
+        sys.exit(1)
+    report = {}
+    for path_arg in sys.argv[1:]:
+        image_colors, from_cache, palette_error = extract_palette(path_arg)
+        report[path_arg] = {"palette": image_colors, "color_shift": palette_color_shift(image_colors), "cached": from_cache, "error": palette_error}
+    print(json.dumps(report))
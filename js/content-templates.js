@@ -383,3 +383,50 @@ function renderArticlePost(article) {
 '</article>'
 );
 }
+
+/**
+ * Renders the listing card for an article, video, audio or interactive post.
+ * @param {object} card - The card record written by article_index.py. Expected properties:
+ *   id, title, contentType, bundle, excerpt (optional), thumbnail (optional), category (optional),
+ *   date (optional), tags (optional)
+ * @returns {string} HTML string for the card; the full post is loaded from the bundle when the card is opened.
+ */
+function renderContentCard(card) {
+    if (!card || !card.id || !card.title) {
+        console.error('Invalid card object provided to renderContentCard', card);
+        return '<article class="content-item content-card error"><p>Error: Card data is incomplete.</p></article>';
+    }
+
+    var s = function(str) {
+        return String(str || '').replace(/[&<>"']/g, function(match) {
+            return { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[match];
+        });
+    };
+
+    var contentType = card.contentType || 'article';
+    var link = '#!/' + encodeURIComponent(card.id);
+    var thumbnailHtml = '';
+    if (card.thumbnail) {
+        var imagePath = card.thumbnail;
+        if (window.MagazineRouter && typeof window.MagazineRouter.resolveAssetPath === 'function') {
+            imagePath = window.MagazineRouter.resolveAssetPath(card.thumbnail);
+        }
+        thumbnailHtml = '<a href="' + s(link) + '"><img src="' + s(imagePath) + '" alt="' + s(card.title) + '" class="content-card-thumbnail" loading="lazy"></a>';
+    }
+
+    return (
+'<article class="content-item content-card ' + s(contentType) + '-card glass-element" id="card-' + s(card.id) + '" data-content-id="' + s(card.id) + '" data-content-type="' + s(contentType) + '">' +
+    thumbnailHtml +
+    '<header class="content-card-header content-header">' +
+        '<h2><a href="' + s(link) + '">' + s(card.title) + '</a></h2>' +
+        '<p class="content-meta">' +
+            (card.date ? '<span>' + s(card.date) + '</span>' : '') +
+            (card.date && card.category ? ' | ' : '') +
+            (card.category ? '<span class="category-meta">' + s(card.category) + '</span>' : '') +
+        '</p>' +
+    '</header>' +
+    (card.excerpt ? '<p class="excerpt">' + s(card.excerpt) + '</p>' : '') +
+    (card.tags && card.tags.length ? '<p class="tags-meta">Tags: ' + card.tags.map(function(tag) { return s(tag); }).join(', ') + '</p>' : '') +
+'</article>'
+);
+}
@@ -2,6 +2,14 @@ var MagazineRouter = { // Converted const
     contentContainer: null,
     articlesData: [], // Will be assigned allArticles
     navLinks: [],
+    // With an empty allArticles array the router reads the sharded article index written by article_index.py
+    // (assets/index/): one page per section on first load, older articles and deep links fetched on demand.
+    indexMode: false,
+    indexBasePath: 'assets/index/',
+    indexRequests: {},
+    // Listings hold article cards; the full record (the "bundle", assets/index/articles/<id>.json) is fetched when
+    // an article is opened and kept here by id.
+    bundles: {},
     currentRoute: { section: null, itemId: null },
     
     // Base path resolver for GitHub Pages
@@ -85,9 +93,234 @@ var MagazineRouter = { // Converted const
         document.body.appendChild(script);
     },
 
+    articleFilename: function(id) {
+        // Mirrors article_filename() in article_index.py
+        return String(id).replace(/[^A-Za-z0-9_.-]/g, '_') + '.json';
+    },
+
+    fetchIndexFile: function(relativePath) {
+        var self = this;
+        if (!this.indexRequests[relativePath]) {
+            this.indexRequests[relativePath] = fetch(this.resolveAssetPath(this.indexBasePath + relativePath))
+                .then(function(response) {
+                    if (response.status === 404) return null; // e.g. a tag with no articles yet
+                    if (!response.ok) {
+                        throw new Error('HTTP error ' + response.status + ' fetching ' + relativePath);
+                    }
+                    return response.json();
+                })
+                .catch(function(error) {
+                    delete self.indexRequests[relativePath]; // Let the next navigation retry
+                    throw error;
+                });
+        }
+        return this.indexRequests[relativePath];
+    },
+
+    // Prefers the precompressed <bundle>.gz where the browser can inflate it, falling back to the plain JSON
+    fetchBundle: function(bundlePath) {
+        var url = this.resolveAssetPath(this.indexBasePath + bundlePath);
+        var fetchPlain = function() {
+            return fetch(url).then(function(response) {
+                if (response.status === 404) return null;
+                if (!response.ok) {
+                    throw new Error('HTTP error ' + response.status + ' fetching ' + bundlePath);
+                }
+                return response.json();
+            });
+        };
+        if (typeof DecompressionStream === 'undefined') return fetchPlain();
+        return fetch(url + '.gz').then(function(response) {
+            if (!response.ok) return fetchPlain();
+            return response.arrayBuffer().then(function(buffer) {
+                var bytes = new Uint8Array(buffer);
+                if (bytes[0] !== 0x1f || bytes[1] !== 0x8b) {
+                    // Served with Content-Encoding: gzip, so the browser already inflated it
+                    return JSON.parse(new TextDecoder().decode(bytes));
+                }
+                return new Response(new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'))).json();
+            });
+        }).catch(fetchPlain);
+    },
+
+    // Resolves to the full record of an article, or null if it does not exist
+    loadArticle: function(id) {
+        var self = this;
+        var known = this.findArticleById(id);
+        if (known && !known.bundle) return Promise.resolve(known); // A full record published inline before bundles
+        if (this.bundles[id]) return Promise.resolve(this.bundles[id]);
+        return this.fetchBundle(known ? known.bundle : 'articles/' + this.articleFilename(id)).then(function(article) {
+            if (article) {
+                self.bundles[id] = article;
+                if (!known) self.rememberArticles([article]);
+            }
+            return article;
+        });
+    },
+
+    rememberArticles: function(articles) {
+        var self = this;
+        articles.forEach(function(article) {
+            if (article && !self.findArticleById(article.id)) {
+                self.articlesData.push(article);
+            }
+        });
+        return articles;
+    },
+
+    sectionIndexShards: function(section) {
+        switch (section) {
+            case 'home': return ['pages'];
+            case 'articles': return ['types/article'];
+            case 'videos': return ['types/video'];
+            case 'audios':
+            case 'podcasts': return ['types/audio'];
+            case 'interactives': return ['types/interactive'];
+            case 'ema': return ['tags/ema', 'tags/philosophy', 'tags/digital-sovereignty'];
+            default: return [];
+        }
+    },
+
+    // Resolves to { items: [...], more: paging state for loadOlderIndexItems, or null }
+    loadIndexItems: function(section) {
+        var self = this;
+        var shards = this.sectionIndexShards(section);
+        return Promise.all(shards.map(function(shard) { return self.fetchIndexFile(shard + '/page-1.json'); })).then(function(pages) {
+            var seen = {};
+            var items = [];
+            pages.forEach(function(page) {
+                (page ? page.articles : []).forEach(function(article) {
+                    if (!seen[article.id]) { seen[article.id] = true; items.push(article); }
+                });
+            });
+            items.sort(function(a,b) { return (b.date && a.date) ? new Date(b.date) - new Date(a.date) : 0; });
+            if (section === 'home') {
+                items = items.slice(0, 5);
+            }
+            if (section === 'ema' && items.length === 0) {
+                // If no EMA-tagged content, show recent articles
+                return self.fetchIndexFile('pages/page-1.json').then(function(page) {
+                    return { items: self.rememberArticles(page ? page.articles.slice(0, 3) : []), more: null };
+                });
+            }
+            var more = null;
+            if (shards.length === 1 && section !== 'home' && pages[0] && pages[0].total > pages[0].articles.length) {
+                more = { shard: shards[0], chunks: pages[0].chunks.slice(), seen: seen };
+            }
+            return { items: self.rememberArticles(items), more: more };
+        });
+    },
+
+    // Older articles of a section: walks the shard's chunks (numbers listed newest first in page-1.json), skipping
+    // articles already shown
+    loadOlderIndexItems: function(more) {
+        var self = this;
+        if (more.chunks.length === 0) return Promise.resolve([]);
+        return this.fetchIndexFile(more.shard + '/chunk-' + more.chunks[0] + '.json').then(function(chunk) {
+            more.chunks.shift();
+            var items = (chunk ? chunk.articles : []).filter(function(article) { return !more.seen[article.id]; });
+            items.forEach(function(article) { more.seen[article.id] = true; });
+            if (items.length === 0 && more.chunks.length > 0) {
+                return self.loadOlderIndexItems(more);
+            }
+            return self.rememberArticles(items);
+        });
+    },
+
+    appendLoadMore: function(more) {
+        var self = this;
+        var button = document.createElement('button');
+        button.className = 'load-more-cyber';
+        button.textContent = 'Load more';
+        button.addEventListener('click', function() {
+            button.disabled = true;
+            self.loadOlderIndexItems(more).then(function(items) {
+                button.remove();
+                if (items.length > 0) self.renderItems(items);
+                if (more.chunks.length > 0) self.appendLoadMore(more);
+            }).catch(function(error) {
+                console.error('MagazineRouter: Error loading older articles:', error);
+                button.disabled = false;
+            });
+        });
+        this.contentContainer.appendChild(button);
+    },
+
+    renderFromIndex: function(section) {
+        var self = this;
+        var route = this.currentRoute;
+        this.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;"><p><em>Loading...</em></p></div>';
+        this.loadIndexItems(section).then(function(result) {
+            if (self.currentRoute !== route) return; // Navigated elsewhere while this page was loading
+            self.contentContainer.innerHTML = '';
+            self.renderItems(result.items);
+            if (result.more) self.appendLoadMore(result.more);
+        }).catch(function(error) {
+            console.error('MagazineRouter: Error loading the article index:', error);
+            self.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;"><h2 class="section-title">Content Unavailable</h2><p>Sorry, this section could not be loaded. Please try again later.</p></div>';
+        });
+    },
+
+    renderArticle: function(id, isArticleIdRoute) {
+        var self = this;
+        var route = this.currentRoute;
+        var wasKnown = !!this.findArticleById(id);
+        this.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;"><p><em>Loading...</em></p></div>';
+        this.loadArticle(id).then(function(article) {
+            if (self.currentRoute !== route) return;
+            if (!article) console.warn('MagazineRouter: Item with ID \'' + id + '\' not found.');
+            self.contentContainer.innerHTML = '';
+            self.renderItems(article ? [article] : []);
+            if (isArticleIdRoute && article && !wasKnown) {
+                // The article was not known when the route changed; highlight and theme it now
+                self.updateNavActiveState(id);
+                self.applyTheme(article.theme_modifier_key || article.contentType || 'article');
+            }
+        }).catch(function(error) {
+            console.error('MagazineRouter: Error loading article ' + id + ':', error);
+            self.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;"><h2 class="section-title">Content Unavailable</h2><p>Sorry, this article could not be loaded. Please try again later.</p></div>';
+        });
+    },
+
+    escapeHtml: function(text) {
+        return String(text == null ? '' : text).replace(/[&<>"']/g, function(c) {
+            return { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c];
+        });
+    },
+
+    // #!/search/<query>: results from the static search index (js/magazine-search.js)
+    renderSearch: function(query) {
+        var self = this;
+        var route = this.currentRoute;
+        var heading = '<h2 class="section-title">Search: ' + this.escapeHtml(query) + '</h2>';
+        if (typeof MagazineSearch === 'undefined' || !query.trim()) {
+            this.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;">' + heading + '<p>Type a few words to search the magazine.</p></div>';
+            return;
+        }
+        this.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;">' + heading + '<p><em>Searching...</em></p></div>';
+        MagazineSearch.search(query, 20).then(function(results) {
+            if (self.currentRoute !== route) return;
+            if (results.length === 0) {
+                self.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;">' + heading + '<p>No articles match your search.</p></div>';
+                return;
+            }
+            var items = results.map(function(result) {
+                return '<li class="search-result glass-element" style="padding: 16px 20px; margin: 10px 0; list-style: none;">' +
+                    '<a href="#!/' + encodeURIComponent(result.id) + '"><strong>' + self.escapeHtml(result.title) + '</strong></a>' +
+                    (result.date ? ' <small>' + self.escapeHtml(result.date) + '</small>' : '') +
+                    (result.excerpt ? '<p>' + self.escapeHtml(result.excerpt) + '</p>' : '') + '</li>';
+            });
+            self.contentContainer.innerHTML = '<div class="container-cyber search-results" style="padding: 40px 20px;">' + heading + '<ul style="padding: 0;">' + items.join('') + '</ul></div>';
+        }).catch(function(error) {
+            console.error('MagazineRouter: Error searching:', error);
+            self.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;">' + heading + '<p>Search is unavailable right now. Please try again later.</p></div>';
+        });
+    },
+
     // EXISTING METHODS + FULL RENDERCONTENT
     init: function(articles) {
-        this.articlesData = articles;
+        this.articlesData = articles || [];
+        this.indexMode = this.articlesData.length === 0;
         this.contentContainer = document.querySelector('.magazine-content');
 
         if (!this.contentContainer) {
@@ -112,8 +345,8 @@ var MagazineRouter = { // Converted const
         this.setupNavLinks();
         window.addEventListener('hashchange', this.handleRouteChange.bind(this));
         console.log("MagazineRouter initialized with " + (this.articlesData ? this.articlesData.length : 0) + " articles.");
-        if (!this.articlesData || this.articlesData.length === 0) {
-            console.warn("MagazineRouter: No articles loaded.");
+        if (this.indexMode) {
+            console.log("MagazineRouter: No inline articles, loading pages from the article index.");
         }
     },
 
@@ -137,14 +370,14 @@ var MagazineRouter = { // Converted const
         var parts = hash.split('/'); // Converted const
         var section = parts[0] || 'home'; // Converted let
         var itemId = parts[1] || null; // Converted const
-        var knownSections = ['home', 'articles', 'videos', 'audios', 'podcasts', 'interactives', 'spotlights', 'ema', 'about']; // Converted const
+        var knownSections = ['home', 'articles', 'videos', 'audios', 'podcasts', 'interactives', 'spotlights', 'ema', 'about', 'search']; // Converted const
         var isKnownSection = knownSections.includes(section); // Converted let
         var isArticleIdRoute = false; // Converted let
 
         if (!isKnownSection) {
             var article = this.findArticleById(section); // Converted const
-            if (article) {
-                isArticleIdRoute = true;
+            if (article || this.indexMode) {
+                isArticleIdRoute = true; // In index mode the record is fetched (or found missing) when rendering
             }
         }
         if (!isKnownSection && !isArticleIdRoute) {
@@ -170,6 +403,14 @@ var MagazineRouter = { // Converted const
             var article = this.findArticleById(section); // Converted const
             themeKey = article ? (article.theme_modifier_key || article.contentType || 'article') : 'home';
         }
+        this.applyTheme(themeKey);
+    },
+
+    applyTheme: function(themeKey) {
+        // An article's theme key (article_<id>_custom) is an alias of a shared modifier (see apply_theme_suggestions.py)
+        if (window.modifierAliases && window.modifierAliases[themeKey]) {
+            themeKey = window.modifierAliases[themeKey];
+        }
         if (window.visualizerManager && typeof window.visualizerManager.applyMasterStyle === 'function') {
             window.visualizerManager.applyMasterStyle(themeKey);
         } else {
@@ -217,6 +458,20 @@ var MagazineRouter = { // Converted const
             console.error("MagazineRouter: No content container to render into.");
             return;
         }
+        if (section === 'search') {
+            this.renderSearch(itemId ? decodeURIComponent(itemId) : '');
+            return;
+        }
+        var articleId = isArticleIdRoute ? section : itemId;
+        var knownArticle = articleId ? this.findArticleById(articleId) : null;
+        if (articleId && (this.indexMode || (knownArticle && knownArticle.bundle))) {
+            this.renderArticle(articleId, isArticleIdRoute);
+            return;
+        }
+        if (this.indexMode) {
+            this.renderFromIndex(section);
+            return;
+        }
         this.contentContainer.innerHTML = '';
         var itemsToRender = []; // Converted let
 
@@ -272,7 +527,10 @@ var MagazineRouter = { // Converted const
             }
             itemsToRender = filteredData;
         }
+        this.renderItems(itemsToRender);
+    },
 
+    renderItems: function(itemsToRender) {
         if (itemsToRender.length === 0) {
              this.contentContainer.innerHTML = '<div class="container-cyber" style="padding: 40px 20px; text-align: center;"><h2 class="section-title">No Content Found</h2><p>Sorry, there is no content available for this section or item.</p></div>';
              return;
@@ -287,7 +545,14 @@ var MagazineRouter = { // Converted const
                 console.warn('MagazineRouter: Item \'' + item.id + '\' missing contentType, defaulting to \'article\'.', item);
                 effectiveContentType = 'article';
             }
+            if (item.bundle) {
+                effectiveContentType = 'card'; // A listing entry; the full post is rendered from its bundle when opened
+            }
             switch (effectiveContentType) {
+                case 'card':
+                    if (typeof renderContentCard === 'function') { itemHtml = renderContentCard(item); }
+                    else { console.error('renderContentCard not defined.'); itemHtml = '<p>Error: Card renderer missing.</p>'; }
+                    break;
                 case 'article':
                     if (typeof renderArticlePost === 'function') { itemHtml = renderArticlePost(item); }
                     else { console.error('renderArticlePost not defined.'); itemHtml = '<p>Error: Article renderer missing.</p>'; }
@@ -337,70 +602,7 @@ var MagazineRouter = { // Converted const
     }
 };
 
-var allArticles = [
-    {
-        "title": "My New Test Article",
-        "author": "Jules AI Editor",
-        "date": "2025-06-15",
-        "id": "new-test-article",
-        "contentType": "article",
-        "html_content_path": "assets/articles/new-test-article/content.html",
-        "tags": ["intended mood", "pipeline", "visual", "guidelines for new s & s", "asset", "test", "new"],
-        "description": "A new test article to demonstrate full pipeline capabilities.",
-        "header_image_path": "assets/images/new_test_article/new_header.svg",
-        "linked_document_pdf": "assets/documents/new_test_article/new_document.txt",
-        "visual_mood": "calm minimalist blue_focus",
-        "theme_modifier_key": "article_new_test_article_custom",
-        "ai_suggestions": {
-            "suggested_excerpt": "my new test article this is a new article created to test the full content pipeline, including asset creation and visual mood processing.",
-            "suggested_categories": ["guidelines for new s & s", "intended mood"],
-            "suggested_tags": ["intended mood", "pipeline", "visual", "guidelines for new s & s", "asset", "test", "new"]
-        },
-        "excerpt": "my new test article this is a new article created to test the full content pipeline, including asset creation and visual mood processing.",
-        "category": "guidelines for new s & s"
-    },
-    {
-        "id": "video1",
-        "contentType": "video",
-        "title": "My First Video",
-        "video_url": "https://example.com/video.mp4",
-        "transcript_path": "assets/videos/video1/transcript.txt",
-        "excerpt": "A cool video."
-    },
-    {
-        "id": "my_cool_podcast_ep1",
-        "contentType": "audio",
-        "title": "My Cool Podcast - Episode 1",
-        "author": "Podcast Host",
-        "date": "2023-11-20",
-        "audio_url": "https://example.com/podcast_ep1.mp3",
-        "duration": "00:30:45",
-        "excerpt": "Talking about cool audio things.",
-        "episode_artwork_path": "assets/audio/my_cool_podcast_ep1/podcast_ep1_art.jpg",
-        "shownotes_path": "assets/audio/my_cool_podcast_ep1/ep1_notes.txt",
-        "series_title": "My Cool Podcast",
-        "tags": ["podcast", "audio", "episode1"]
-    },
-    {
-        "id": "my_game_01",
-        "contentType": "interactive",
-        "title": "My Awesome Interactive Game",
-        "author": "Game Developer",
-        "date": "2023-11-25",
-        "live_url": "https://example.com/mygame/index.html",
-        "bootstrap_script_path": "assets/interactive/my_game_01/load_my_game.js",
-        "embed_target_div_id": "game-container-div",
-        "excerpt": "A fun block-stacking game.",
-        "thumbnail_image_path": "assets/interactive/my_game_01/game_thumb.png",
-        "instructions_path": "assets/interactive/my_game_01/game_instructions.txt",
-        "required_assets_paths": [
-            "assets/interactive/my_game_01/required/game_styles.css",
-            {"path": "assets/interactive/my_game_01/required/levels.json", "type": "json"},
-            "https://cdn.example.com/somelib.js"
-        ],
-        "tags": ["game", "interactive", "fun"]
-    }
-];
+var allArticles = [];
 
 document.addEventListener('DOMContentLoaded', function() {
     if (typeof MagazineRouter !== 'undefined' && typeof MagazineRouter.init === 'function') {
@@ -0,0 +1,139 @@
+// Client for the static search index built at publish time by search_index.py (assets/search/).
+// A query only fetches meta.json once, the shards its terms fall in (shards/<first 2 characters>.json) and the
+// doc blocks holding its top results, so the cost of a search does not grow with the size of the archive.
+var MagazineSearch = {
+    basePath: 'assets/search/',
+    meta: null,
+    stopwords: null,
+    requests: {},
+
+    resolvePath: function(relativePath) {
+        if (typeof MagazineRouter !== 'undefined' && typeof MagazineRouter.resolveAssetPath === 'function') {
+            return MagazineRouter.resolveAssetPath(this.basePath + relativePath);
+        }
+        return this.basePath + relativePath;
+    },
+
+    fetchJson: function(relativePath) {
+        var self = this;
+        if (!this.requests[relativePath]) {
+            this.requests[relativePath] = fetch(this.resolvePath(relativePath))
+                .then(function(response) {
+                    if (response.status === 404) return null; // No indexed term has this prefix
+                    if (!response.ok) {
+                        throw new Error('HTTP error ' + response.status + ' fetching ' + relativePath);
+                    }
+                    return response.json();
+                })
+                .catch(function(error) {
+                    delete self.requests[relativePath];
+                    throw error;
+                });
+        }
+        return this.requests[relativePath];
+    },
+
+    loadMeta: function() {
+        var self = this;
+        return this.fetchJson('meta.json').then(function(meta) {
+            if (meta && !self.stopwords) {
+                self.meta = meta;
+                self.stopwords = {};
+                meta.stopwords.forEach(function(word) { self.stopwords[word] = true; });
+            }
+            return meta;
+        });
+    },
+
+    // Mirrors suggest_metadata.preprocess_text: lowercase, drop punctuation, split on whitespace and . ? !
+    tokenize: function(text) {
+        var self = this;
+        return String(text).toLowerCase()
+            .replace(/[^\p{L}\p{N}_\s.?!]/gu, '')
+            .split(/[\s.?!]+/)
+            .filter(function(word) { return word && !self.stopwords[word]; });
+    },
+
+    // Mirrors shard_name() in search_index.py
+    shardName: function(term) {
+        return Array.from(term).slice(0, this.meta.prefix_length).map(function(c) {
+            return /^[a-z0-9]$/i.test(c) ? c : '-' + c.codePointAt(0).toString(16) + '-';
+        }).join('');
+    },
+
+    decodePostings: function(encoded) {
+        var postings = {};
+        var doc = 0;
+        for (var i = 0; i < encoded.length; i += 2) {
+            doc += encoded[i];
+            postings[doc] = encoded[i + 1];
+        }
+        return postings;
+    },
+
+    // Resolves to up to `limit` results ({id, title, excerpt, date, contentType, score}), best first.
+    // Every query word must match; the last one also matches as a prefix, so results update while typing.
+    search: function(query, limit) {
+        var self = this;
+        limit = limit || 10;
+        return this.loadMeta().then(function(meta) {
+            if (!meta) return [];
+            var tokens = self.tokenize(query);
+            if (tokens.length === 0) return [];
+            return Promise.all(tokens.map(function(token) { return self.fetchJson('shards/' + self.shardName(token) + '.json'); }))
+                .then(function(shards) {
+                    var scores = null;
+                    tokens.forEach(function(token, position) {
+                        var terms = shards[position] ? shards[position].terms : {};
+                        var prefixMatch = position === tokens.length - 1 && Array.from(token).length >= meta.prefix_length;
+                        var tokenScores = {};
+                        Object.keys(terms).forEach(function(term) {
+                            if (term !== token && !(prefixMatch && term.indexOf(token) === 0)) return;
+                            var postings = self.decodePostings(terms[term]);
+                            var docs = Object.keys(postings);
+                            var idf = Math.log(1 + meta.doc_count / docs.length);
+                            docs.forEach(function(doc) {
+                                tokenScores[doc] = Math.max(tokenScores[doc] || 0, postings[doc] * idf);
+                            });
+                        });
+                        if (scores === null) {
+                            scores = tokenScores;
+                        } else {
+                            var combined = {};
+                            Object.keys(scores).forEach(function(doc) {
+                                if (doc in tokenScores) combined[doc] = scores[doc] + tokenScores[doc];
+                            });
+                            scores = combined;
+                        }
+                    });
+                    var ranked = Object.keys(scores || {}).map(Number).sort(function(a, b) {
+                        return (scores[b] - scores[a]) || (a - b);
+                    }).slice(0, limit);
+                    return self.loadSummaries(ranked, meta).then(function(summaries) {
+                        return ranked.filter(function(doc) { return summaries[doc]; }).map(function(doc) {
+                            var result = Object.assign({}, summaries[doc]);
+                            result.score = scores[doc];
+                            return result;
+                        });
+                    });
+                });
+        });
+    },
+
+    loadSummaries: function(docs, meta) {
+        var self = this;
+        var blocks = [];
+        docs.forEach(function(doc) {
+            var block = Math.floor(doc / meta.docs_per_block);
+            if (blocks.indexOf(block) === -1) blocks.push(block);
+        });
+        return Promise.all(blocks.map(function(block) { return self.fetchJson('docs/' + block + '.json'); })).then(function(loaded) {
+            var summaries = {};
+            loaded.forEach(function(block) {
+                if (!block) return;
+                Object.keys(block.docs).forEach(function(doc) { summaries[doc] = block.docs[doc]; });
+            });
+            return summaries;
+        });
+    }
+};
@@ -46,6 +46,10 @@ this.sectionModifiers = {home: {
                 animationStyle: 'revolutionary',
                 visualComplexity: 'maximum'
             },
-            "article_sample_article_custom": { "intensity": 0.8, "particleCount": 100, "animationStyle": "structural", "visualComplexity": "medium", "colorShift": { "h": 210, "s": 0, "l": -15 } },
-            "article_new_test_article_custom": { "intensity": 0.7, "particleCount": 21.0, "animationStyle": "smooth", "visualComplexity": "low", "colorShift": { "h": 210, "s": 0, "l": 0 } }
+            "theme_b1d7f0aed4c5": { "animationStyle": "structural", "intensity": 0.8, "particleCount": 100, "visualComplexity": "medium", "colorShift": { "h": 210, "l": -15, "s": 0 } },
+            "theme_92a841768578": { "animationStyle": "smooth", "intensity": 0.7, "particleCount": 21, "visualComplexity": "low", "colorShift": { "h": 210, "l": 0, "s": 0 } }
+        };
+        window.modifierAliases = {
+            "article_sample_article_custom": "theme_b1d7f0aed4c5",
+            "article_new_test_article_custom": "theme_92a841768578"
         };
\ No newline at end of file
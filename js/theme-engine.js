@@ -195,7 +195,9 @@
     
     // Calculate section-specific colors maintaining relationships
     ThemeEngine.prototype.getSectionColors = function(sectionId) {
-        var modifier = this.sectionModifiers[sectionId] || this.sectionModifiers.hero;
+        // An article's key (article_<id>_custom) is an alias of a shared theme_<hash> modifier from theme-engine-clean.js
+        var modifierKey = (window.modifierAliases && window.modifierAliases[sectionId]) || sectionId;
+        var modifier = this.sectionModifiers[modifierKey] || (window.sectionModifiers && window.sectionModifiers[modifierKey]) || this.sectionModifiers.hero;
         var base = this.baseTheme;
         
         // Apply mathematical transformations while maintaining relationships
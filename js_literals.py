@@ -0,0 +1,243 @@
+import json
+import re
+import sys
+
+# Locates array/object literals in JavaScript source (e.g. `var allArticles = [...]` in magazine-router.js or
+# `this.sectionModifiers = {...}` in theme-engine-clean.js) so they can be spliced without touching the rest of the file.
+# One forward pass over the file: a single regex jumps from one bracket, comment or template to the next, so plain
+# code and strings are skipped in C, and strings, template literals (with nested ${...}), comments and regex literals are consumed
+# whole, so a `];` or `};` inside any of them is never mistaken for the end of a literal.
+# Plain code and complete strings are consumed inside the regex engine; the match stops at the next token
+_TOKEN_PATTERN = r'''
+    (?:[^"'`/\[\]{}()%s]+|"[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"|'[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*')*
+    (?:
+        (?P<comment>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+      | (?P<unterminated>["'])
+      | (?P<template>`)
+      | (?P<slash>/)
+      | (?P<bracket>[\[\]{}()])
+      %s
+      | (?P<end>\Z)
+    )
+'''
+_TOKEN = re.compile(_TOKEN_PATTERN % ('', ''), re.VERBOSE)
+_TOKEN_WITH_COMMAS = re.compile(_TOKEN_PATTERN % (',', '| (?P<comma>,)'), re.VERBOSE)
+_REGEX_LITERAL = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+_TEMPLATE_TEXT = re.compile(r'(?:[^`\\$]|\\[\s\S]|\$(?!\{))*')
+# A `/` whose previous code token ends in one of these (or that starts the file) begins a regex literal rather than a
+# division. Brackets and comments are tokens of their own and handled in iter_brackets
+_REGEX_PRECEDERS = set(',=:!&|?;+-*%<>~^')
+_REGEX_KEYWORDS = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|void|yield|await|delete|instanceof|new)$')
+_CLOSERS = {']': '[', '}': '{', ')': '('}
+_SPACE = ' \t\r\n'
+
+
+class JsSyntaxError(ValueError):
+    pass
+
+
+def _regex_allowed_after(source, start, end):
+    """Whether a `/` may begin a regex after the plain code in source[start:end]; None if it is only whitespace."""
+    j = end - 1
+    while j >= start and source[j] in _SPACE:
+        j -= 1
+    if j < start:
+        return None
+    char = source[j]
+    if char in '+-' and j > 0 and source[j - 1] == char:
+        return False # Postfix ++/-- ends an operand
+    if char in _REGEX_PRECEDERS:
+        return True
+    # Identifiers, numbers and strings are operands, unless the identifier is a keyword like return
+    return bool(_REGEX_KEYWORDS.search(source, max(0, j - 11), j + 1))
+
+
+def iter_brackets(source, start=0, end=None, commas=False):
+    """
+    Yields (position, character) for every bracket (and, with commas=True, every comma) that is code, in order:
+    anything inside strings, template text, comments and regex literals is skipped, and the braces of a
+    template's ${...} are not reported. Raises JsSyntaxError for an unterminated string or template.
+    """
+    token = _TOKEN_WITH_COMMAS if commas else _TOKEN
+    end = len(source) if end is None else end
+    position = start
+    stack = [] # "{" for code braces, "${" for template substitutions
+    regex_allowed = True # Whether a `/` here would begin a regex, decided by the previous code token (comments skipped)
+    while position < end:
+        match = token.match(source, position, end)
+        kind = match.lastgroup
+        if kind == "end":
+            return
+        after_code = _regex_allowed_after(source, position, match.start(kind))
+        if after_code is not None:
+            regex_allowed = after_code
+        position = match.end()
+        if kind == "bracket":
+            char = source[position - 1]
+            if char == '{':
+                stack.append('{')
+            elif char == '}':
+                if stack and stack[-1] == '${':
+                    stack.pop()
+                    position = _skip_template(source, position, stack)
+                    regex_allowed = source[position - 1] == '{' # Back in a substitution, or after the template
+                    continue
+                if stack:
+                    stack.pop()
+            regex_allowed = char not in ')]' # `)` and `]` end an operand; a block's `}` ends a statement
+            yield position - 1, char
+        elif kind == "comma":
+            regex_allowed = True
+            yield position - 1, ','
+        elif kind == "template":
+            position = _skip_template(source, position, stack)
+            regex_allowed = source[position - 1] == '{'
+        elif kind == "slash":
+            regex_match = _REGEX_LITERAL.match(source, position - 1) if regex_allowed else None
+            if regex_match:
+                position = regex_match.end()
+            regex_allowed = regex_match is None # A division operator is followed by an operand
+        elif kind == "unterminated":
+            raise JsSyntaxError(f"Unterminated string at offset {position - 1}")
+
+
+def _skip_template(source, position, stack):
+    """Consumes template text from position; returns the offset after the closing backtick or after a `${`."""
+    text_end = _TEMPLATE_TEXT.match(source, position).end()
+    if source.startswith('`', text_end):
+        return text_end + 1
+    if source.startswith('${', text_end):
+        stack.append('${')
+        return text_end + 2
+    raise JsSyntaxError(f"Unterminated template literal before offset {position}")
+
+
+def find_literal(source, head_pattern):
+    """
+    (open, close) offsets of the opening and closing bracket of the literal that the first code (not string or
+    comment) match of head_pattern ends with, e.g. r'var\\s+allArticles\\s*=\\s*\\['; None if there is no such match.
+    Raises JsSyntaxError if the literal is unterminated or its brackets do not pair up.
+    """
+    candidates = (match.end() - 1 for match in re.finditer(head_pattern, source)) # Bracket offsets, searched lazily
+    candidate = next(candidates, None)
+    stack = []
+    literal_open = None
+    for position, char in iter_brackets(source):
+        if literal_open is None:
+            while candidate is not None and candidate < position:
+                candidate = next(candidates, None) # That match's bracket sat inside a string or comment
+            if candidate is None:
+                return None
+            if candidate != position:
+                continue
+            literal_open = position
+        if char in '[{(':
+            stack.append((char, position))
+        else:
+            if not stack or stack[-1][0] != _CLOSERS[char]:
+                raise JsSyntaxError(f"Unbalanced '{char}' at offset {position}")
+            stack.pop()
+            if not stack:
+                return literal_open, position
+    if literal_open is not None:
+        raise JsSyntaxError(f"Literal opened at offset {literal_open} is never closed")
+    return None
+
+
+def literal_items(source, literal_open, literal_close):
+    """
+    (start, end) spans of the top-level items of the literal between literal_open and literal_close (as returned
+    by find_literal), split at its top-level commas; each starts at the item's first code token (comments before it
+    are left in place) and ends at its last non-whitespace character.
+    """
+    spans = []
+    depth = 0
+    item_start = literal_open + 1
+    for position, char in iter_brackets(source, literal_open + 1, literal_close, commas=True):
+        if char == ',':
+            if depth == 0:
+                spans.append(_trim(source, item_start, position))
+                item_start = position + 1
+        elif char in '[{(':
+            depth += 1
+        else:
+            depth -= 1
+    spans.append(_trim(source, item_start, literal_close))
+    return [span for span in spans if span[0] < span[1]] # A trailing comma leaves an empty last item
+
+
+def item_splices(item_spans, replace=None, remove=(), append=(), separator=",\n"):
+    """
+    Splices (for splice()) that edit a literal's items in place: replace maps item index -> new text, remove lists
+    item indexes to drop (with the comma before them) and append texts go after the last kept item, each preceded by
+    separator. Returns None when no item would be kept and something has to be appended, so the caller can lay out
+    the literal itself.
+    """
+    replace = replace or {}
+    remove = set(remove)
+    kept = [i for i in range(len(item_spans)) if i not in remove]
+    if not kept and append:
+        return None
+    splices = [(item_spans[i][0], item_spans[i][1], text) for i, text in replace.items() if i not in remove]
+    if kept and kept[0] > 0:
+        splices.append((item_spans[0][0], item_spans[kept[0]][0], "")) # Leading items go up to the first kept one
+    elif not kept and item_spans:
+        splices.append((item_spans[0][0], item_spans[-1][1], ""))
+    for i in sorted(remove):
+        if kept and kept[0] < i < len(item_spans):
+            splices.append((item_spans[i - 1][1], item_spans[i][1], ""))
+    if append:
+        last_kept_end = item_spans[kept[-1]][1]
+        splices.append((last_kept_end, last_kept_end, "".join(separator + text for text in append)))
+    return splices
+
+
+def _trim(source, start, end):
+    """Narrows start:end to the item itself: leading whitespace and comments and trailing whitespace are dropped."""
+    while start < end:
+        if source[start] in _SPACE:
+            start += 1
+        elif source.startswith('//', start):
+            line_end = source.find('\n', start, end)
+            start = end if line_end < 0 else line_end + 1
+        elif source.startswith('/*', start):
+            comment_end = source.find('*/', start + 2, end)
+            start = end if comment_end < 0 else comment_end + 2
+        else:
+            break
+    while end > start and source[end - 1] in _SPACE:
+        end -= 1
+    return start, end
+
+
+def splice(source, replacements):
+    """source with each (start, end, text) replacement applied; spans must not overlap. Untouched bytes are kept as is."""
+    pieces = []
+    cursor = 0
+    for start, end, text in sorted(replacements, key=lambda r: (r[0], r[1])):
+        if start < cursor:
+            raise ValueError(f"Overlapping splice at offset {start}")
+        pieces.append(source[cursor:start])
+        pieces.append(text)
+        cursor = end
+    pieces.append(source[cursor:])
+    return "".join(pieces)
+
+
+if __name__ == "__main__":
+    # `python js_literals.py <file.js> <head_pattern>` prints where the literal is and how many top-level items it has,
+    # e.g. python js_literals.py js/magazine-router.js 'var\s+allArticles\s*=\s*\['
+    if len(sys.argv) != 3:
+        print(json.dumps({"errors": ["Usage: python js_literals.py <file.js> <head_pattern>"]}))
+        sys.exit(1)
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        js_source = f.read()
+    try:
+        span = find_literal(js_source, sys.argv[2])
+    except JsSyntaxError as e:
+        print(json.dumps({"errors": [str(e)]}))
+        sys.exit(1)
+    if span is None:
+        print(json.dumps({"found": False}))
+    else:
+        print(json.dumps({"found": True, "open": span[0], "close": span[1], "items": len(literal_items(js_source, *span))}))
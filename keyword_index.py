@@ -0,0 +1,310 @@
+import glob
+import hashlib
+import heapq
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+
+import atomic_files
+
+# Corpus-wide document frequencies for suggest_metadata.py, so article keywords are ranked by TF-IDF instead of raw
+# in-article frequency and words that appear all over the site (the magazine's own vocabulary) stop topping every
+# article's tags. Layout under KEYWORD_INDEX_ROOT:
+#   meta.json                {"format_version", "generation", "doc_count"}
+#   df/<prefix>.json         {"generation", "df": {term: number of articles containing it}} for every term starting
+#                            with <prefix> (its first DF_PREFIX_LENGTH characters, escaped like search_index.py's shards)
+#   docs/<xx>/<key>.json     one article's distinct terms ({"id", "generation", "terms": [...]}, sorted), key being a
+#                            hash of its id; only read when that article is re-indexed, to take its old terms back out
+# Ranking an article reads meta.json and only the df shards its own terms fall in (each once per process), and
+# indexing it only diffs its term set against its doc file, so both stay O(article length) however large the archive.
+# Changes are kept in memory until save_index(), which pipeline.py calls once per run. The save holds
+# .keyword_index.lock and re-applies each changed article against its doc file and the df shards as they are on disk
+# right then, so concurrent runs (or a `remove` from the CLI) never overwrite each other's counts.
+# A doc file or shard from another generation (meta.json was deleted or rebuilt since) is ignored.
+KEYWORD_INDEX_ROOT = "/app/content_pipeline/keyword_index"
+KEYWORD_INDEX_FORMAT_VERSION = 2
+DF_PREFIX_LENGTH = 2
+LOCK_FILENAME = ".keyword_index.lock"
+DEFAULT_STAGING_ROOT = "/app/content_pipeline/staging"
+
+_keyword_lock = threading.Lock()
+# Index root -> {"generation", "doc_count", "shards": {name: df as read}, "pending": {key: doc entry or None},
+# "df_delta": {term: change}, "doc_delta"}; the deltas are this process's unsaved changes, added on lookup
+_indexes = {}
+
+
+def _doc_key(doc_id):
+    return hashlib.blake2b(str(doc_id).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _doc_path(root, key):
+    return os.path.join(root, "docs", key[:2], key + ".json")
+
+
+def df_shard_name(term):
+    """File name (without .json) of the df shard holding term."""
+    prefix = term[:DF_PREFIX_LENGTH]
+    return "".join(c if c.isascii() and c.isalnum() else f"-{ord(c):x}-" for c in prefix)
+
+
+def _shard_path(root, name):
+    return os.path.join(root, "df", name + ".json")
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_meta(root):
+    """The stored (generation, doc_count), or None if meta.json is missing, unreadable or in an old format."""
+    stored = _read_json(os.path.join(root, "meta.json"))
+    if not isinstance(stored, dict) or stored.get("format_version") != KEYWORD_INDEX_FORMAT_VERSION:
+        return None
+    return stored["generation"], stored["doc_count"]
+
+
+def _read_shard(root, name, generation):
+    stored = _read_json(_shard_path(root, name))
+    if not isinstance(stored, dict) or stored.get("generation") != generation:
+        return {}
+    return stored["df"]
+
+
+def _read_terms(root, key, generation):
+    """The terms an article's doc file records for this generation, or None if it is not in the index."""
+    entry = _read_json(_doc_path(root, key))
+    if not entry or entry.get("generation") != generation:
+        return None
+    return entry["terms"]
+
+
+def _load(root):
+    index = _indexes.get(root)
+    if index is None:
+        # Missing or unreadable: a new generation, so doc files and shards left from an earlier one are not used
+        generation, doc_count = _read_meta(root) or (os.urandom(8).hex(), 0)
+        index = {"generation": generation, "doc_count": doc_count, "shards": {}, "pending": {}, "df_delta": {}, "doc_delta": 0}
+        _indexes[root] = index
+    return index
+
+
+def _document_frequency(index, root, term):
+    name = df_shard_name(term)
+    shard = index["shards"].get(name)
+    if shard is None:
+        shard = index["shards"][name] = _read_shard(root, name, index["generation"])
+    return shard.get(term, 0) + index["df_delta"].get(term, 0)
+
+
+def _stored_terms(index, root, key):
+    """The terms an article was last indexed with (saved or not), or None if it is not in the index."""
+    if key in index["pending"]:
+        entry = index["pending"][key]
+        return entry["terms"] if entry else None
+    return _read_terms(root, key, index["generation"])
+
+
+def _diff(df_changes, old_terms, new_terms):
+    """Adds the df changes of replacing old_terms by new_terms (None: not indexed) to df_changes; returns the doc count change."""
+    old_set, new_set = set(old_terms or ()), set(new_terms or ())
+    for term in old_set.difference(new_set):
+        df_changes[term] = df_changes.get(term, 0) - 1
+    for term in new_set.difference(old_set):
+        df_changes[term] = df_changes.get(term, 0) + 1
+    return (new_terms is not None) - (old_terms is not None)
+
+
+def _set_document(doc_id, terms, root):
+    # terms=None removes the document; returns False if that changes nothing
+    key = _doc_key(doc_id)
+    with _keyword_lock:
+        index = _load(root)
+        old_terms = _stored_terms(index, root, key)
+        if old_terms == terms:
+            return False
+        index["doc_delta"] += _diff(index["df_delta"], old_terms, terms)
+        index["pending"][key] = None if terms is None else {"id": str(doc_id), "terms": terms}
+        return True
+
+
+def index_document(doc_id, terms, root=None):
+    """
+    Records that doc_id contains exactly the given terms (e.g. suggest_metadata.analyze_text's "terms"), replacing
+    what it was indexed with before. Returns True if the document frequencies changed.
+    """
+    return _set_document(doc_id, sorted(set(terms)), root or KEYWORD_INDEX_ROOT)
+
+
+def remove_document(doc_id, root=None):
+    """Takes doc_id's terms back out of the document frequencies; returns False if it was not indexed."""
+    return _set_document(doc_id, None, root or KEYWORD_INDEX_ROOT)
+
+
+def _write_changes(root, generation, doc_count, pending):
+    """Under the index lock: applies the pending doc entries to what is on disk for generation and writes it all."""
+    df_changes = {}
+    for key, entry in pending.items():
+        path = _doc_path(root, key)
+        doc_count += _diff(df_changes, _read_terms(root, key, generation), entry and entry["terms"])
+        if entry is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_files.write_json(path, {"id": entry["id"], "generation": generation, "terms": entry["terms"]}, separators=(',', ':'))
+
+    by_shard = {}
+    for term, change in df_changes.items():
+        if change:
+            by_shard.setdefault(df_shard_name(term), {})[term] = change
+    os.makedirs(os.path.join(root, "df"), exist_ok=True)
+    for name, changes in by_shard.items():
+        df = _read_shard(root, name, generation)
+        for term, change in changes.items():
+            count = df.get(term, 0) + change
+            if count > 0:
+                df[term] = count
+            else:
+                df.pop(term, None)
+        path = _shard_path(root, name)
+        if df:
+            atomic_files.write_json(path, {"generation": generation, "df": dict(sorted(df.items()))}, separators=(',', ':'))
+        elif os.path.exists(path):
+            os.remove(path)
+    # An interrupted save can leave the counts slightly off; rebuild_index recomputes them
+    atomic_files.write_json(os.path.join(root, "meta.json"), {
+        "format_version": KEYWORD_INDEX_FORMAT_VERSION, "generation": generation, "doc_count": doc_count
+    }, separators=(',', ':'))
+
+
+def save_index(root=None):
+    """Writes this process's pending changes, if there are any, merged into the index on disk. Errors are not fatal."""
+    root = root or KEYWORD_INDEX_ROOT
+    with _keyword_lock:
+        index = _indexes.get(root)
+        if not index or not index["pending"]:
+            return False
+        try:
+            with atomic_files.file_lock(os.path.join(root, LOCK_FILENAME)):
+                # Another process may have saved (or created the index) since this one loaded it
+                stored = _read_meta(root)
+                if stored is None:
+                    shutil.rmtree(os.path.join(root, "df"), ignore_errors=True) # Shards of an earlier generation
+                generation, doc_count = stored or (index["generation"], 0)
+                _write_changes(root, generation, doc_count, index["pending"])
+        except OSError:
+            return False # Kept pending; the next save retries
+        del _indexes[root] # Re-read on next use, picking up other processes' changes too
+        return True
+
+
+def idf(document_frequency, doc_count):
+    """Smoothed inverse document frequency: always positive, and equal for every term of a one-article corpus."""
+    return math.log((1 + doc_count) / (1 + document_frequency)) + 1
+
+
+def rank_terms(terms, counts, n, root=None):
+    """
+    The n highest (term, tf-idf) pairs of an article given as parallel terms/counts (its sparse term vector, e.g.
+    analyze_text's "terms" and "counts"); ties keep the order of terms. Index the article first so it counts itself.
+    """
+    root = root or KEYWORD_INDEX_ROOT
+    with _keyword_lock:
+        index = _load(root)
+        doc_count = index["doc_count"] + index["doc_delta"]
+        scores = [count * idf(_document_frequency(index, root, term), doc_count) for term, count in zip(terms, counts)]
+    return [(terms[i], scores[i]) for i in heapq.nlargest(n, range(len(scores)), key=scores.__getitem__)]
+
+
+def index_stats(root=None):
+    root = root or KEYWORD_INDEX_ROOT
+    with _keyword_lock:
+        index = _load(root)
+        df = dict(index["df_delta"])
+        for shard_path in glob.glob(os.path.join(root, "df", "*.json")):
+            for term, count in _read_shard(root, os.path.basename(shard_path)[:-len(".json")], index["generation"]).items():
+                df[term] = df.get(term, 0) + count
+        df = {term: count for term, count in df.items() if count > 0}
+        common = heapq.nlargest(20, df.items(), key=lambda item: item[1])
+        return {"doc_count": index["doc_count"] + index["doc_delta"], "term_count": len(df), "most_common_terms": common}
+
+
+def staged_documents(staging_root=DEFAULT_STAGING_ROOT):
+    """(article id, body HTML path) for every staged article that has both metadata and a rendered body."""
+    documents = []
+    for metadata_path in sorted(glob.glob(os.path.join(staging_root, "*", "*_metadata.json"))):
+        batch_path = os.path.dirname(metadata_path)
+        base_filename = os.path.basename(metadata_path)[:-len("_metadata.json")]
+        html_path = os.path.join(batch_path, f"{base_filename}.html")
+        if not os.path.exists(html_path): # Moved by assembly
+            html_path = os.path.join(batch_path, "01_processed_content", f"{base_filename}.html")
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(metadata, dict) and os.path.exists(html_path):
+            documents.append((metadata.get("id") or base_filename, html_path))
+    return documents
+
+
+def rebuild_index(router_file_path, staging_root=DEFAULT_STAGING_ROOT, root=None):
+    """
+    Recomputes the index from every published article and every staged one (a staged copy wins over the published
+    record with the same id), in a new generation; doc files of articles found in neither are deleted.
+    """
+    import search_index
+    import suggest_metadata
+
+    root = root or KEYWORD_INDEX_ROOT
+    bodies = {}
+    site_root = search_index.site_root_for_router(router_file_path)
+    for record in search_index.published_articles(router_file_path):
+        text = search_index.article_body_text(record, site_root)
+        if record.get("id") and text.strip():
+            bodies[str(record["id"])] = text
+    for doc_id, html_path in staged_documents(staging_root):
+        with open(html_path, 'r', encoding='utf-8') as f:
+            text = suggest_metadata.extract_text_from_html(f.read())
+        if text.strip():
+            bodies[str(doc_id)] = text
+    pending = {_doc_key(doc_id): {"id": doc_id, "terms": sorted(set(suggest_metadata.analyze_text(text)["terms"]))}
+               for doc_id, text in bodies.items()}
+
+    removed = 0
+    with _keyword_lock:
+        with atomic_files.file_lock(os.path.join(root, LOCK_FILENAME)):
+            for doc_path in glob.glob(os.path.join(root, "docs", "*", "*.json")):
+                if os.path.basename(doc_path)[:-len(".json")] not in pending:
+                    os.remove(doc_path)
+                    removed += 1
+            shutil.rmtree(os.path.join(root, "df"), ignore_errors=True)
+            _write_changes(root, os.urandom(8).hex(), 0, pending) # Written even for an empty archive
+        _indexes.pop(root, None)
+    report = {"indexed": len(bodies), "doc_files_removed": removed}
+    report.update(index_stats(root))
+    return report
+
+
+if __name__ == "__main__":
+    # `python keyword_index.py rebuild [router_file_path]` indexes every published and staged article;
+    # `remove <article_id>` drops one; `stats` prints the totals and the terms found in the most articles.
+    args = sys.argv[1:]
+    if args[:1] == ["rebuild"] and len(args) <= 2:
+        print(json.dumps(rebuild_index(args[1] if len(args) == 2 else "/app/js/magazine-router.js")))
+    elif args[:1] == ["remove"] and len(args) == 2:
+        removed = remove_document(args[1])
+        save_index()
+        print(json.dumps({"removed": removed}))
+    elif args == ["stats"]:
+        print(json.dumps(index_stats()))
+    else:
+        print(json.dumps({"errors": ["Usage: python keyword_index.py rebuild [router_file_path] | remove <article_id> | stats"]}))
+        sys.exit(1)
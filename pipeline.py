@@ -0,0 +1,375 @@
+import copy
+import json
+import os
+import sys
+import threading
+
+# All stages are imported once, so yaml/markdown/bs4/nltk are loaded a single time per run
+# instead of once per spawned CLI invocation.
+import atomic_files
+import build_cache
+import pipeline_journal
+import process_markdown
+import stage_graph
+import suggest_metadata
+import suggest_visuals
+import image_palette
+import keyword_index
+import process_image_assets
+import generate_image_derivatives
+import process_audio_assets
+import process_document_assets
+import probe_media
+import assemble_review_package
+import finalize_data_and_assets
+import update_router_article
+
+BASE_APP_PATH = "/app"
+STAGING_DIR_ROOT = "content_pipeline/staging"
+STYLE_GUIDANCE_PATH = os.path.join(BASE_APP_PATH, "STYLE_GUIDANCE.md")
+LIVE_ASSETS_ROOT_DIR_ON_DISK = os.path.join(BASE_APP_PATH, "assets")
+LIVE_ASSETS_PATH_PREFIX_FOR_ROUTER = "/assets"
+ROUTER_FILE_PATH = os.path.join(BASE_APP_PATH, "js/magazine-router.js")
+
+
+def collect_asset_fields(metadata):
+    """
+    Groups the metadata fields that reference assets by the stage that handles them,
+    using the same field patterns as assemble_review_package.py.
+    """
+    asset_fields = {"image": [], "audio": [], "pdf": [], "txt_embedded": []}
+    for field_name, value in metadata.items():
+        if not value or field_name.endswith("_status") or field_name.endswith("_content"):
+            continue
+        asset_type = assemble_review_package.get_asset_type(field_name)
+        if asset_type in asset_fields:
+            asset_fields[asset_type].append(field_name)
+    return asset_fields
+
+
+def _asset_input_hashes(batch_dir_name, metadata, field_names, cache):
+    """Hashes of the incoming asset files referenced by the given fields, in field order."""
+    return build_cache.asset_input_hashes(os.path.join(BASE_APP_PATH, "content_pipeline/incoming", batch_dir_name), metadata, field_names, cache)
+
+
+def _stage_outputs(result):
+    """Files a stage result says it wrote, so a cache hit can check they still exist."""
+    return build_cache.stage_outputs(result, BASE_APP_PATH)
+
+
+def _stage_plan(batch_dir_name, base_filename, metadata, publish, cache):
+    """
+    The per-article stages as an ordered dict of stage_name -> (module, extra_cache_inputs, run_stage, lock_key).
+    run_stage(metadata) returns (result, metadata_after, outputs). Stages never write <base>_metadata.json themselves
+    here; run_batches merges their updates and persists the result. lock_key serializes stages that write a
+    batch-level file (theme_suggestions.json, the manifest/summary).
+    """
+    staging_batch_path = os.path.join(BASE_APP_PATH, STAGING_DIR_ROOT, batch_dir_name)
+    metadata_file_path = os.path.join(staging_batch_path, f"{base_filename}_metadata.json")
+    html_path = os.path.join(staging_batch_path, f"{base_filename}.html")
+    if not os.path.exists(html_path): # Already moved by a previous assembly
+        html_path = os.path.join(staging_batch_path, "01_processed_content", f"{base_filename}.html")
+    theme_suggestions_path = os.path.join(staging_batch_path, "theme_suggestions.json")
+    style_guidance_hash = build_cache.hash_file(STYLE_GUIDANCE_PATH, cache)
+    batch_lock = ("batch", batch_dir_name)
+
+    def run_suggest_metadata(current_metadata):
+        result = suggest_metadata.stage_result(metadata_file_path, html_path, STYLE_GUIDANCE_PATH, metadata=current_metadata, save_metadata=False)
+        return result, current_metadata, _stage_outputs(result)
+
+    def run_suggest_visuals(current_metadata):
+        result = suggest_visuals.stage_result(metadata_file_path, STYLE_GUIDANCE_PATH, theme_suggestions_path, metadata=current_metadata)
+        return result, current_metadata, _stage_outputs(result)
+
+    def asset_stage(run_assets):
+        def run(current_metadata):
+            result = run_assets(current_metadata)
+            # Outputs are checked before the staged metadata file is written, so leave it out
+            outputs = [path for path in _stage_outputs(result) if path != metadata_file_path]
+            return result, result.get("metadata_after_processing", current_metadata), outputs
+        return run
+
+    def run_assemble(current_metadata):
+        result = assemble_review_package.stage_result(batch_dir_name, base_filename, batch_dir_name, metadata=current_metadata)
+        return result, current_metadata, _stage_outputs(result)
+
+    def run_finalize(current_metadata):
+        # finalize_data merges suggestions into the dict it is given, so hand it a copy
+        final_metadata = copy.deepcopy(current_metadata)
+        result = finalize_data_and_assets.stage_result(batch_dir_name, base_filename, LIVE_ASSETS_ROOT_DIR_ON_DISK, LIVE_ASSETS_PATH_PREFIX_FOR_ROUTER, metadata=final_metadata)
+        result["_final_metadata"] = final_metadata
+        return result, current_metadata, _stage_outputs(result)
+
+    plan = {
+        # Keywords are ranked against the corpus document frequencies; a cached result keeps the ranking it was made
+        # with (only keyword_index.py changing invalidates it), so new articles do not re-run every older one
+        "suggest_metadata": (suggest_metadata, [style_guidance_hash, build_cache.code_version(keyword_index)], run_suggest_metadata, None),
+        # The header image's bytes decide its palette, and so the colorShift suggestion
+        "suggest_visuals": (suggest_visuals,
+                            [style_guidance_hash, _asset_input_hashes(batch_dir_name, metadata, ["header_image_path"], cache),
+                             image_palette.palette_signature()],
+                            run_suggest_visuals, batch_lock),
+    }
+
+    # Asset stages only run when the metadata actually references assets of their type
+    asset_fields = collect_asset_fields(metadata)
+    if asset_fields["image"]:
+        fields = asset_fields["image"]
+        plan["process_image_assets"] = (process_image_assets,
+                                        [fields, _asset_input_hashes(batch_dir_name, metadata, fields, cache)],
+                                        asset_stage(lambda m: process_image_assets.process_assets(batch_dir_name, base_filename, json.dumps(fields), metadata=m, save_metadata=False)),
+                                        None)
+        plan["generate_image_derivatives"] = (generate_image_derivatives,
+                                              [fields, generate_image_derivatives.encoder_signature()],
+                                              asset_stage(lambda m: generate_image_derivatives.generate_derivatives(batch_dir_name, base_filename, json.dumps(fields), metadata=m, save_metadata=False)),
+                                              None)
+    if asset_fields["audio"]:
+        audio_fields = asset_fields["audio"]
+        plan["process_audio_assets"] = (process_audio_assets,
+                                        [audio_fields, _asset_input_hashes(batch_dir_name, metadata, audio_fields, cache)],
+                                        asset_stage(lambda m: process_audio_assets.process_assets(batch_dir_name, base_filename, json.dumps(audio_fields), metadata=m, save_metadata=False)),
+                                        None)
+    if asset_fields["txt_embedded"] or asset_fields["pdf"]:
+        txt_fields, pdf_fields = asset_fields["txt_embedded"], asset_fields["pdf"]
+        plan["process_document_assets"] = (process_document_assets,
+                                           [txt_fields, pdf_fields, process_document_assets.TXT_INLINE_MAX_BYTES, _asset_input_hashes(batch_dir_name, metadata, txt_fields + pdf_fields, cache)],
+                                           asset_stage(lambda m: process_document_assets.process_document_assets(batch_dir_name, base_filename, json.dumps(txt_fields), json.dumps(pdf_fields), metadata=m, save_metadata=False)),
+                                           None)
+
+    if asset_fields["image"] or asset_fields["audio"] or asset_fields["pdf"]:
+        plan["probe_media"] = (probe_media, [], asset_stage(lambda m: probe_media.probe_assets(batch_dir_name, base_filename, metadata=m, save_metadata=False)), None)
+
+    plan["assemble_review_package"] = (assemble_review_package, [], run_assemble, batch_lock)
+    if publish:
+        plan["finalize_data_and_assets"] = (finalize_data_and_assets, [LIVE_ASSETS_ROOT_DIR_ON_DISK, LIVE_ASSETS_PATH_PREFIX_FOR_ROUTER, finalize_data_and_assets.FINGERPRINT_ASSETS], run_finalize, None)
+    return plan, metadata_file_path
+
+
+def _article_tasks(batch_dir_name, base_filename, metadata, publish, cache, upstream_key, journal=None):
+    """
+    Builds the graph tasks for one article plus the shared state they report into.
+
+    Every stage starts from the staged frontmatter plus the metadata updates (deltas) of its ancestors, so stages
+    running side by side never see or overwrite each other's changes. Each finished stage's delta is merged in
+    declared stage order and the merged metadata is written to <base>_metadata.json under a per-article lock.
+
+    cache is the build cache dict (an empty, unsaved one without --cache). A stage's input key combines the Markdown
+    key, its ancestors' keys, its own code version and its own inputs (STYLE_GUIDANCE.md, referenced asset bytes, ...);
+    a hit reuses the cached result and delta. Without a Markdown key (upstream_key None) every stage runs.
+    Each stage that re-ran is also appended to the batch journal (see pipeline_journal.py) as soon as it finishes.
+    """
+    plan, metadata_file_path = _stage_plan(batch_dir_name, base_filename, metadata, publish, cache)
+    use_cache = upstream_key is not None
+    state = {
+        "base_metadata": metadata,
+        "deltas": {},
+        "results": {},
+        "cached_stages": [],
+        "input_keys": {},
+        "errors": [],
+        "dirty": not use_cache, # Whether the metadata file needs rewriting once stages re-run
+        "final_metadata": None,
+        "lock": threading.Lock()
+    }
+
+    def merge_and_persist(stage_name, delta, reran):
+        with state["lock"]:
+            state["deltas"][stage_name] = delta
+            state["dirty"] = state["dirty"] or reran
+            if not state["dirty"] or not (delta["set"] or delta["removed"] or reran):
+                return
+            merged, conflicts = stage_graph.apply_deltas(state["base_metadata"], [(name, state["deltas"][name]) for name in plan if name in state["deltas"]])
+            state["errors"] = conflicts
+            with atomic_files.atomic_open(metadata_file_path) as f:
+                json.dump(merged, f, indent=4)
+
+    def make_task(stage_name):
+        module, extra_inputs, run_stage, _ = plan[stage_name]
+
+        def task():
+            ancestors = stage_graph.stage_ancestors(stage_name, plan)
+            # Ancestors have finished before this task was submitted, so their deltas and keys are in place
+            stage_input, _ = stage_graph.apply_deltas(state["base_metadata"], [(name, state["deltas"][name]) for name in ancestors])
+
+            entry = None
+            if use_cache:
+                input_key = build_cache.combine_keys(upstream_key, [state["input_keys"][name] for name in ancestors], stage_name, build_cache.code_version(module), extra_inputs)
+                state["input_keys"][stage_name] = input_key
+                name = build_cache.entry_name(batch_dir_name, base_filename, stage_name)
+                entry = build_cache.lookup(cache, name, input_key)
+
+            if entry:
+                result, delta = entry["result"], entry["metadata_delta"]
+                state["cached_stages"].append(stage_name)
+            else:
+                before = copy.deepcopy(stage_input)
+                result, metadata_after, outputs = run_stage(stage_input)
+                if "_final_metadata" in result:
+                    state["final_metadata"] = result.pop("_final_metadata")
+                delta = stage_graph.compute_delta(before, metadata_after)
+                if use_cache:
+                    build_cache.store(cache, name, input_key, outputs, result, metadata_delta=delta)
+                    if journal is not None:
+                        pipeline_journal.record(journal, name, cache["entries"][name])
+            state["results"][stage_name] = result
+            merge_and_persist(stage_name, delta, reran=entry is None)
+            return result
+        return task
+
+    tasks = {}
+    for stage_name in plan:
+        lock_key = plan[stage_name][3]
+        dependencies = [(batch_dir_name, base_filename, d) for d in stage_graph.STAGE_DEPENDENCIES[stage_name] if d in plan]
+        tasks[(batch_dir_name, base_filename, stage_name)] = (dependencies, make_task(stage_name), lock_key)
+
+    return tasks, state
+
+
+def _publish_to_router(article_states):
+    """
+    Applies every article finalized in this run to the router with one update_router_article batch call (one read,
+    parse and write of the router or article index), instead of rewriting it once per article.
+    """
+    pending = []
+    for state in article_states.values():
+        finalize_result = state["results"].get("finalize_data_and_assets")
+        if not (finalize_result and finalize_result.get("final_metadata_file") and os.path.exists(finalize_result["final_metadata_file"])):
+            continue
+        final_metadata = state["final_metadata"]
+        if final_metadata is None: # Finalize was a cache hit; its output file is current
+            with open(finalize_result["final_metadata_file"], 'r', encoding='utf-8') as f:
+                final_metadata = json.load(f)
+        pending.append((state, final_metadata))
+    if not pending:
+        return
+    router_results = update_router_article.batch_stage_results(ROUTER_FILE_PATH, [final_metadata for _, final_metadata in pending])
+    for (state, _), (_, result) in zip(pending, router_results):
+        state["results"]["update_router_article"] = result
+
+
+def run_batches(batch_dir_names, publish=False, workers=1, cache=None, threads=1, resume=True):
+    """
+    Stages (and optionally publishes) whole incoming batches in one interpreter.
+    Markdown staging for all batches is fanned out over `workers` processes by process_markdown. The remaining
+    stages of every article are then scheduled together on a `threads`-sized pool following
+    stage_graph.STAGE_DEPENDENCIES, so independent stages overlap and articles flow through the graph concurrently.
+    With a build cache (see build_cache.py), stages whose inputs are unchanged since the last run are skipped.
+    Completed stages are journaled per batch; with resume, a batch whose previous run was interrupted picks up
+    the stages that run finished (when their inputs are unchanged), with or without a persistent build cache.
+    """
+    persistent_cache = cache is not None
+    if cache is None:
+        # Stage keys are still computed without --cache, so journaled stages can be matched when resuming
+        cache = build_cache.empty_cache()
+    journal_paths = {batch_dir_name: pipeline_journal.journal_path(os.path.join(BASE_APP_PATH, STAGING_DIR_ROOT, batch_dir_name)) for batch_dir_name in batch_dir_names}
+    resumed_entries = {}
+    for batch_dir_name in batch_dir_names:
+        resumed_entries[batch_dir_name] = pipeline_journal.load_pending(journal_paths[batch_dir_name]) if resume else {}
+        cache["entries"].update(resumed_entries[batch_dir_name])
+
+    staged_metadata = {}
+    markdown_results = process_markdown.process_batches(batch_dir_names, STAGING_DIR_ROOT, workers=workers, staged_metadata=staged_metadata, cache=cache)
+
+    journals = {}
+    for batch_dir_name in batch_dir_names:
+        journals[batch_dir_name] = pipeline_journal.start_run(journal_paths[batch_dir_name], resumed_entries[batch_dir_name], publish)
+        # Markdown staging ran in worker processes, so its entries are journaled here
+        for base_filename in staged_metadata.get(batch_dir_name, {}):
+            name = build_cache.entry_name(batch_dir_name, base_filename, "process_markdown")
+            if name in cache["entries"] and cache["entries"][name] != resumed_entries[batch_dir_name].get(name):
+                pipeline_journal.record(journals[batch_dir_name], name, cache["entries"][name])
+
+    tasks = {}
+    article_states = {}
+    for batch_dir_name in batch_dir_names:
+        for base_filename, metadata in staged_metadata.get(batch_dir_name, {}).items():
+            if not isinstance(metadata, dict): # Empty frontmatter, nothing downstream can use
+                continue
+            markdown_entry = cache["entries"].get(build_cache.entry_name(batch_dir_name, base_filename, "process_markdown"))
+            upstream_key = markdown_entry["input_key"] if markdown_entry else None
+            article_tasks, article_states[(batch_dir_name, base_filename)] = _article_tasks(batch_dir_name, base_filename, metadata, publish, cache, upstream_key, journals[batch_dir_name])
+            tasks.update(article_tasks)
+
+    try:
+        outcomes = stage_graph.run_graph(tasks, threads=threads)
+        if publish:
+            _publish_to_router(article_states)
+    except BaseException:
+        for journal in journals.values():
+            pipeline_journal.finish_run(journal, completed=False)
+        raise
+    finally:
+        keyword_index.save_index() # Every article suggest_metadata indexed this run, written once
+
+    batch_results = []
+    for batch_dir_name, markdown_result in zip(batch_dir_names, markdown_results):
+        articles = {}
+        cached_stages = {}
+        batch_completed = not markdown_result.get("error_log")
+        for (state_batch, base_filename), state in article_states.items():
+            if state_batch != batch_dir_name:
+                continue
+            stage_results = {name: state["results"][name] for name in stage_graph.STAGE_ORDER if name in state["results"]}
+            errors = list(state["errors"])
+            for (task_batch, task_base, stage_name), (status, value) in outcomes.items():
+                if (task_batch, task_base) == (batch_dir_name, base_filename) and status != "ok":
+                    errors.append(f"Stage '{stage_name}' {'failed: ' + str(value) if status == 'error' else 'skipped because a dependency failed'}.")
+            if errors:
+                stage_results["pipeline_errors"] = errors
+                batch_completed = False
+            articles[base_filename] = stage_results
+            cached_stages[base_filename] = [name for name in stage_graph.STAGE_ORDER if name in state["cached_stages"]]
+
+        batch_result = {
+            "batch": batch_dir_name,
+            "process_markdown": markdown_result,
+            "articles": articles
+        }
+        if persistent_cache or resumed_entries[batch_dir_name]:
+            batch_result["cached_stages"] = cached_stages
+        if resumed_entries[batch_dir_name]:
+            batch_result["resumed_from_journal"] = True
+        batch_results.append(batch_result)
+        # A batch with failures stays resumable: the next run picks up from its journal
+        pipeline_journal.finish_run(journals[batch_dir_name], completed=batch_completed)
+    return batch_results
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    publish_arg = "--publish" in args
+    use_cache_arg = "--cache" in args
+    resume_arg = "--no-resume" not in args
+    finalize_data_and_assets.FINGERPRINT_ASSETS = "--fingerprint" in args
+    args = [a for a in args if a not in ("--publish", "--cache", "--fingerprint", "--no-resume")]
+    int_flags = {"--workers": 1, "--threads": 1, "--txt-inline-max-bytes": process_document_assets.TXT_INLINE_MAX_BYTES}
+    for flag in int_flags:
+        if flag in args:
+            flag_index = args.index(flag)
+            try:
+                int_flags[flag] = max(1, int(args[flag_index + 1]))
+                del args[flag_index:flag_index + 2]
+            except (IndexError, ValueError):
+                args = [] # Falls through to the usage error below
+                break
+    batch_args = args
+    process_document_assets.TXT_INLINE_MAX_BYTES = int_flags["--txt-inline-max-bytes"]
+
+    if not batch_args:
+        print(json.dumps({
+            "batches": [],
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python pipeline.py <incoming_batch_dir> [<incoming_batch_dir> ...] [--publish] [--workers N] [--threads N] [--cache] [--no-resume] [--fingerprint] [--txt-inline-max-bytes N]",
+            "errors": ["No incoming batch directory provided."]
+        }))
+        sys.exit(1)
+
+    cache_arg = build_cache.load_cache() if use_cache_arg else None
+    batch_results = run_batches(batch_args, publish=publish_arg, workers=int_flags["--workers"], cache=cache_arg, threads=int_flags["--threads"], resume=resume_arg)
+    if cache_arg is not None:
+        build_cache.save_cache(cache_arg)
+    article_count = sum(len(b["articles"]) for b in batch_results)
+
+    print(json.dumps({
+        "batches": batch_results,
+        "editorial_ai_message": f"Pipeline processed {article_count} article(s) across {len(batch_results)} batch(es)" + (" and published them." if publish_arg else ".")
+    }))
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import atomic_files
+
+# Per-batch run journal: staging/<batch>/.pipeline_journal.jsonl.
+# Every stage that completes (process_markdown and the graph stages in pipeline.py) appends its build cache entry
+# (input key, outputs, result, metadata delta) as one fsync'ed JSON line. A run that finishes cleanly appends
+# "run_completed". If the next run finds no such line, the previous run was interrupted (crash, kill, failed stage):
+# its journaled entries seed the build cache, so stages whose inputs are unchanged are resumed instead of re-run.
+JOURNAL_FILENAME = ".pipeline_journal.jsonl"
+
+
+def journal_path(staging_batch_path):
+    return os.path.join(staging_batch_path, JOURNAL_FILENAME)
+
+
+def read_journal(path):
+    """Returns the parsed journal lines; a torn last line (crash mid-append) is ignored."""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+    except OSError:
+        pass # No journal yet
+    return records
+
+
+def load_pending(path):
+    """Build cache entries ({entry_name: entry}) recorded by an interrupted run; empty if the last run completed."""
+    records = read_journal(path)
+    if any(record.get("event") == "run_completed" for record in records):
+        return {}
+    return {record["name"]: record["entry"] for record in records if record.get("event") == "stage_completed"}
+
+
+def start_run(path, carried_entries=None, publish=False):
+    """
+    Starts a fresh journal for this run, carrying over the entries being resumed (so a second interruption still
+    has them), and returns the journal handle used by record() and finish_run().
+    """
+    lines = [{"event": "run_started", "pid": os.getpid(), "publish": publish, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}]
+    lines += [{"event": "stage_completed", "name": name, "entry": entry} for name, entry in (carried_entries or {}).items()]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_files.write_text(path, "".join(json.dumps(line) + "\n" for line in lines))
+    return {"path": path, "file": open(path, 'a', encoding='utf-8'), "lock": threading.Lock(), "recorded": set(carried_entries or {})}
+
+
+def record(journal, name, entry):
+    """Durably appends one completed stage's build cache entry."""
+    line = json.dumps({"event": "stage_completed", "name": name, "entry": entry}) + "\n"
+    with journal["lock"]:
+        journal["file"].write(line)
+        journal["file"].flush()
+        os.fsync(journal["file"].fileno())
+        journal["recorded"].add(name)
+
+
+def finish_run(journal, completed):
+    """Closes the journal; completed=False (a stage failed) leaves it open for the next run to resume."""
+    with journal["lock"]:
+        if completed:
+            journal["file"].write(json.dumps({"event": "run_completed", "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}) + "\n")
+            journal["file"].flush()
+            os.fsync(journal["file"].fileno())
+        journal["file"].close()
+
+
+if __name__ == "__main__":
+    # `python pipeline_journal.py <staging_batch_dir_name>`: whether the last run completed and which stages it finished
+    if len(sys.argv) != 2:
+        print(json.dumps({"errors": ["Usage: python pipeline_journal.py <staging_batch_dir_name>"]}))
+        sys.exit(1)
+
+    path = journal_path(os.path.join("/app/content_pipeline/staging", sys.argv[1]))
+    records = read_journal(path)
+    started = next((record for record in records if record.get("event") == "run_started"), None)
+    print(json.dumps({
+        "journal": path,
+        "run_started": started.get("started_at") if started else None,
+        "run_completed": any(record.get("event") == "run_completed" for record in records),
+        "completed_stages": [record["name"] for record in records if record.get("event") == "stage_completed"]
+    }))
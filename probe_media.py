@@ -0,0 +1,429 @@
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+import atomic_files
+import assemble_review_package
+
+# Header-only media prober: files are memory-mapped and only the few bytes each format needs are touched
+# (a PNG's IHDR, a JPEG's SOF marker, an MP3's first frame and Xing header, an Ogg file's first and last page...),
+# so probing a 500 MB podcast costs the same as probing a thumbnail. Nothing is decoded.
+
+# Which detected formats each extension is allowed to contain
+EXTENSION_FORMATS = {
+    ".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".gif": "gif", ".webp": "webp", ".avif": "avif", ".svg": "svg",
+    ".wav": "wav", ".mp3": "mp3", ".ogg": "ogg", ".oga": "ogg", ".opus": "ogg", ".pdf": "pdf",
+}
+FORMAT_MIME_TYPES = {
+    "png": "image/png", "jpeg": "image/jpeg", "gif": "image/gif", "webp": "image/webp", "avif": "image/avif",
+    "svg": "image/svg+xml", "wav": "audio/wav", "mp3": "audio/mpeg", "ogg": "audio/ogg", "pdf": "application/pdf",
+}
+PROBED_ASSET_TYPES = ("image", "audio", "pdf")
+TAIL_WINDOW = 64 * 1024 # Ogg duration lives in the last page
+
+# MPEG audio header tables: bitrates (kbps) by [version_is_mpeg1][layer] and sample rates by version bits
+MP3_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def detect_format(data):
+    """Content-sniffed format name from the first bytes, or None."""
+    head = bytes(data[:512])
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "png"
+    if head.startswith(b'\xff\xd8\xff'):
+        return "jpeg"
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return "gif"
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return "webp"
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return "wav"
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return "avif"
+    if head.startswith(b'%PDF-'):
+        return "pdf"
+    if head.startswith(b'OggS'):
+        return "ogg"
+    if head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    text_head = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text_head.startswith(b'<svg') or (text_head.startswith(b'<?xml') and b'<svg' in bytes(data[:4096]).lower()):
+        return "svg"
+    return None
+
+
+def _png_info(data):
+    width, height = struct.unpack('>II', data[16:24])
+    return {"width": width, "height": height}
+
+
+def _gif_info(data):
+    width, height = struct.unpack('<HH', data[6:10])
+    return {"width": width, "height": height}
+
+
+def _jpeg_info(data):
+    # Walk marker segments by their length fields until a start-of-frame marker; segment bodies are never read
+    offset = 2
+    size = len(data)
+    while offset + 9 < size:
+        if data[offset] != 0xFF:
+            offset += 1
+            continue
+        marker = data[offset + 1]
+        if marker == 0xFF: # Fill byte
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7: # Markers without a length
+            offset += 2
+            continue
+        segment_length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+            return {"width": width, "height": height}
+        offset += 2 + segment_length
+    return {}
+
+
+def _webp_info(data):
+    chunk = bytes(data[12:16])
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return {"width": width & 0x3FFF, "height": height & 0x3FFF}
+    if chunk == b'VP8L':
+        bits = struct.unpack('<I', data[21:25])[0]
+        return {"width": (bits & 0x3FFF) + 1, "height": ((bits >> 14) & 0x3FFF) + 1}
+    if chunk == b'VP8X':
+        return {"width": int.from_bytes(data[24:27], 'little') + 1, "height": int.from_bytes(data[27:30], 'little') + 1}
+    return {}
+
+
+def _avif_info(data):
+    # The image spatial extents ('ispe') property sits in the meta box near the start of the file
+    window = bytes(data[:TAIL_WINDOW])
+    position = window.find(b'ispe')
+    if position < 0:
+        return {}
+    width, height = struct.unpack('>II', window[position + 8:position + 16])
+    return {"width": width, "height": height}
+
+
+def _svg_dimension(value):
+    match = re.match(r'\s*([\d.]+)\s*(px)?\s*$', value or '')
+    return round(float(match.group(1))) if match else None
+
+
+def _svg_info(data):
+    head = bytes(data[:8192]).decode('utf-8', 'replace')
+    tag_match = re.search(r'<svg\b[^>]*>', head, re.IGNORECASE | re.DOTALL)
+    if not tag_match:
+        return {}
+    attributes = dict((name.lower(), value) for name, value in re.findall(r'([\w:-]+)\s*=\s*["\']([^"\']*)["\']', tag_match.group(0)))
+    width, height = _svg_dimension(attributes.get("width")), _svg_dimension(attributes.get("height"))
+    if (width is None or height is None) and attributes.get("viewbox"):
+        view_box = re.split(r'[\s,]+', attributes["viewbox"].strip())
+        if len(view_box) == 4:
+            width, height = round(float(view_box[2])), round(float(view_box[3]))
+    info = {}
+    if width is not None and height is not None:
+        info.update(width=width, height=height)
+    return info
+
+
+def _wav_info(data):
+    # Walk RIFF chunks: 'fmt ' gives channels/rate/byte rate, the 'data' chunk size gives the duration
+    offset = 12
+    info = {}
+    byte_rate = 0
+    size = len(data)
+    while offset + 8 <= size:
+        chunk_id = bytes(data[offset:offset + 4])
+        chunk_size = struct.unpack('<I', data[offset + 4:offset + 8])[0]
+        if chunk_id == b'fmt ':
+            channels, sample_rate, byte_rate = struct.unpack('<HII', data[offset + 10:offset + 20])
+            info = {"channels": channels, "sample_rate_hz": sample_rate, "bitrate_kbps": round(byte_rate * 8 / 1000)}
+        elif chunk_id == b'data' and byte_rate:
+            data_size = min(chunk_size, size - offset - 8) # Streamed WAVs may carry a placeholder size
+            info["duration_seconds"] = round(data_size / byte_rate, 3)
+            break
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return info
+
+
+def _mp3_info(data):
+    size = len(data)
+    offset = 0
+    if bytes(data[:3]) == b'ID3': # Skip the ID3v2 tag (synchsafe size)
+        tag_size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        offset = 10 + tag_size + (10 if data[5] & 0x10 else 0)
+
+    # Find the first valid frame header within a bounded window
+    limit = min(size - 4, offset + TAIL_WINDOW)
+    while offset < limit:
+        if data[offset] == 0xFF and data[offset + 1] & 0xE0 == 0xE0:
+            header = struct.unpack('>I', data[offset:offset + 4])[0]
+            version_bits = (header >> 19) & 3
+            layer = 4 - ((header >> 17) & 3)
+            bitrate_index = (header >> 12) & 0xF
+            sample_rate_index = (header >> 10) & 3
+            if version_bits != 1 and layer != 4 and 0 < bitrate_index < 15 and sample_rate_index < 3:
+                break
+        offset += 1
+    else:
+        return {}
+
+    is_mpeg1 = version_bits == 3
+    sample_rate = MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    bitrate = MP3_BITRATES[(is_mpeg1, layer)][bitrate_index]
+    channel_mode = (header >> 6) & 3
+    samples_per_frame = 384 if layer == 1 else 1152 if (layer == 2 or is_mpeg1) else 576
+    info = {"channels": 1 if channel_mode == 3 else 2, "sample_rate_hz": sample_rate, "bitrate_kbps": bitrate}
+
+    # VBR files carry a Xing/Info (or VBRI) header with the frame count right after the side information
+    side_info = (17 if channel_mode == 3 else 32) if is_mpeg1 else (9 if channel_mode == 3 else 17)
+    xing_offset = offset + 4 + side_info
+    frames = None
+    if bytes(data[xing_offset:xing_offset + 4]) in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 1:
+            frames = struct.unpack('>I', data[xing_offset + 8:xing_offset + 12])[0]
+    elif bytes(data[offset + 36:offset + 40]) == b'VBRI':
+        frames = struct.unpack('>I', data[offset + 50:offset + 54])[0]
+
+    audio_bytes = size - offset - (128 if bytes(data[-128:-125]) == b'TAG' else 0)
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+        info["duration_seconds"] = round(duration, 3)
+        if duration > 0:
+            info["bitrate_kbps"] = round(audio_bytes * 8 / duration / 1000)
+    else: # Constant bitrate: duration follows from the stream size
+        info["duration_seconds"] = round(audio_bytes * 8 / (bitrate * 1000), 3)
+    return info
+
+
+def _ogg_info(data):
+    size = len(data)
+    head = bytes(data[:4096])
+    info = {}
+    rate_for_granule = None
+    pre_skip = 0
+    vorbis = head.find(b'\x01vorbis')
+    opus = head.find(b'OpusHead')
+    if vorbis >= 0:
+        channels = head[vorbis + 11]
+        sample_rate, _, nominal_bitrate = struct.unpack('<Iii', head[vorbis + 12:vorbis + 24])
+        info.update(codec="vorbis", channels=channels, sample_rate_hz=sample_rate)
+        if nominal_bitrate > 0:
+            info["bitrate_kbps"] = round(nominal_bitrate / 1000)
+        rate_for_granule = sample_rate
+    elif opus >= 0:
+        channels = head[opus + 9]
+        pre_skip, input_rate = struct.unpack('<HI', head[opus + 10:opus + 16])
+        info.update(codec="opus", channels=channels, sample_rate_hz=input_rate or 48000)
+        rate_for_granule = 48000 # Opus granule positions always count 48 kHz samples
+
+    # Duration: granule position of the last page, found in the final window of the file
+    tail_start = max(0, size - TAIL_WINDOW)
+    tail = bytes(data[tail_start:])
+    last_page = tail.rfind(b'OggS')
+    if rate_for_granule and last_page >= 0 and last_page + 14 <= len(tail):
+        granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+        if granule > 0:
+            duration = (granule - pre_skip) / rate_for_granule
+            info["duration_seconds"] = round(duration, 3)
+            if "bitrate_kbps" not in info and duration > 0:
+                info["bitrate_kbps"] = round(size * 8 / duration / 1000)
+    return info
+
+
+def _pdf_info(data):
+    # Unlike the other formats the page tree can sit anywhere in a PDF, so this scans the mapped file for /Pages nodes.
+    # The root node carries the total in /Count and nested nodes smaller counts, so the largest wins.
+    # Page trees stored inside compressed object streams are not visible this way and yield no count.
+    counts = []
+    for match in re.finditer(rb'/Type\s*/Pages\b', data):
+        window = bytes(data[max(0, match.start() - 512):match.end() + 512])
+        counts.extend(int(count) for count in re.findall(rb'/Count\s+(\d+)', window))
+    if counts:
+        return {"page_count": max(counts)}
+    pages = len(re.findall(rb'/Type\s*/Page\b', data))
+    return {"page_count": pages} if pages else {}
+
+
+FORMAT_PROBES = {
+    "png": _png_info, "gif": _gif_info, "jpeg": _jpeg_info, "webp": _webp_info, "avif": _avif_info, "svg": _svg_info,
+    "wav": _wav_info, "mp3": _mp3_info, "ogg": _ogg_info, "pdf": _pdf_info,
+}
+
+
+def probe_file(path):
+    """
+    Probes one file from its headers only. Returns a dict with bytes, detected_format, mime_type, extension_mismatch,
+    format-specific fields (width/height, duration_seconds/bitrate_kbps/sample_rate_hz/channels, page_count)
+    and a warnings list. Raises OSError if the file cannot be opened.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    expected_format = EXTENSION_FORMATS.get(extension)
+    result = {"bytes": os.path.getsize(path), "extension": extension, "detected_format": None, "mime_type": None, "extension_mismatch": False, "warnings": []}
+
+    if result["bytes"] == 0:
+        result["warnings"].append("File is empty.")
+        detected_format = None
+    else:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = memoryview(mapped)
+            try:
+                detected_format = detect_format(data)
+                result["detected_format"] = detected_format
+                result["mime_type"] = FORMAT_MIME_TYPES.get(detected_format)
+                if detected_format in FORMAT_PROBES:
+                    try:
+                        result.update(FORMAT_PROBES[detected_format](data))
+                    except (struct.error, IndexError, ValueError) as e:
+                        result["warnings"].append(f"Truncated or malformed {detected_format} header: {e}")
+            finally:
+                data.release()
+
+    if detected_format is None and result["bytes"]:
+        result["warnings"].append("Unrecognized file content.")
+    if expected_format and detected_format != expected_format:
+        result["extension_mismatch"] = True
+        if detected_format:
+            result["warnings"].append(f"Extension '{extension}' but content is {detected_format}.")
+    if result["warnings"]:
+        # e.g. an empty new_header.png next to the real new_header.svg
+        stem = os.path.splitext(os.path.basename(path))[0]
+        directory = os.path.dirname(path) or "."
+        siblings = sorted(name for name in os.listdir(directory) if os.path.splitext(name)[0] == stem and name != os.path.basename(path))
+        if siblings:
+            result["warnings"].append(f"Same-named file(s) with another extension: {', '.join(siblings)}.")
+    return result
+
+
+def resolve_disk_path(metadata_path, incoming_batch_base_path):
+    """Disk location of a metadata asset path: staged (/content_pipeline/...), live (/assets/...) or still incoming-relative."""
+    if metadata_path.startswith("/content_pipeline/") or metadata_path.startswith("/assets/"):
+        return "/app" + metadata_path
+    return os.path.normpath(os.path.join(incoming_batch_base_path, metadata_path.lstrip('/')))
+
+
+def probe_assets(staging_batch_dir_name, base_filename, metadata=None, save_metadata=True):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading the staged file
+    # save_metadata=False leaves writing <base>_metadata.json to the caller (pipeline.py merges concurrent stage updates)
+    # Records metadata["asset_probes"] = {metadata asset path: probe}; runs after the asset stages so paths are staged ones.
+    metadata_file_path = f"/app/content_pipeline/staging/{staging_batch_dir_name}/{base_filename}_metadata.json"
+    incoming_batch_base_path = f"/app/content_pipeline/incoming/{staging_batch_dir_name}"
+    probe_log = []
+    error_log = []
+    updated_metadata_file_path = None
+
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            return {
+                "probe_log": probe_log,
+                "error_log": [f"Error loading metadata from {metadata_file_path}: {e}"],
+                "editorial_ai_message": f"Error probing assets for '{base_filename}': Could not load metadata.",
+                "updated_metadata_file_path": None
+            }
+
+    probes = {}
+    for field_name, field_value in list(metadata.items()):
+        if field_name.endswith("_status") or field_name.endswith("_content"):
+            continue
+        if assemble_review_package.get_asset_type(field_name) not in PROBED_ASSET_TYPES:
+            continue
+        for asset_path in ([field_value] if isinstance(field_value, str) else field_value if isinstance(field_value, list) else []):
+            if not isinstance(asset_path, str) or not asset_path.strip() or asset_path in probes:
+                continue
+            disk_path = resolve_disk_path(asset_path, incoming_batch_base_path)
+            try:
+                probe = probe_file(disk_path)
+            except OSError as e:
+                error_log.append(f"Could not probe '{asset_path}' ({field_name}): {e}")
+                continue
+            probes[asset_path] = probe
+            probe_log.append({"metadata_field": field_name, "path": asset_path, "detected_format": probe["detected_format"], "warnings": probe["warnings"]})
+
+    metadata_updated = metadata.get("asset_probes", {}) != probes
+    if probes:
+        metadata["asset_probes"] = probes
+    else:
+        metadata.pop("asset_probes", None)
+
+    if metadata_updated and not save_metadata:
+        updated_metadata_file_path = metadata_file_path # Persisted by the caller
+    elif metadata_updated:
+        try:
+            with atomic_files.atomic_open(metadata_file_path) as f:
+                json.dump(metadata, f, indent=4)
+            updated_metadata_file_path = metadata_file_path
+        except Exception as e: # pylint: disable=broad-except
+            error_log.append(f"Error writing updated metadata to {metadata_file_path}: {e}")
+
+    flagged = [entry for entry in probe_log if entry["warnings"]]
+    article_title = metadata.get('title', base_filename)
+    if not probes:
+        ai_message = f"No image, audio or PDF assets to probe for article '{article_title}'."
+    elif flagged:
+        ai_message = f"Probed {len(probes)} asset(s) for '{article_title}'; {len(flagged)} flagged (empty, unrecognized or extension mismatch). Check logs."
+    else:
+        ai_message = f"Probed {len(probes)} asset(s) for '{article_title}'; formats match their extensions."
+
+    return {
+        "probe_log": probe_log,
+        "error_log": error_log,
+        "editorial_ai_message": ai_message,
+        "updated_metadata_file_path": updated_metadata_file_path,
+        "metadata_after_processing": metadata
+    }
+
+
+if __name__ == "__main__":
+    # python probe_media.py <staging_batch_dir_name> <base_filename> [--cache]   (pipeline stage)
+    # python probe_media.py --file <path> [<path>...]                            (ad-hoc probing)
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    sys.argv = [a for a in sys.argv if a != "--cache"]
+    if len(sys.argv) >= 3 and sys.argv[1] == "--file":
+        probe_results = {}
+        for file_path in sys.argv[2:]:
+            try:
+                probe_results[file_path] = probe_file(file_path)
+            except OSError as e:
+                probe_results[file_path] = {"error": str(e)}
+        print(json.dumps(probe_results))
+        sys.exit(0)
+
+    if len(sys.argv) != 3:
+        print(json.dumps({
+            "probe_log": [],
+            "error_log": ["Usage: python probe_media.py <staging_batch_dir_name> <base_filename> [--cache] | --file <path> [<path>...]"],
+            "editorial_ai_message": "Error: Incorrect arguments for probe_media.py.",
+            "updated_metadata_file_path": None
+        }))
+        sys.exit(1)
+
+    if use_cache_arg:
+        import build_cache
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "probe_media", f"/app/content_pipeline/staging/{sys.argv[1]}/{sys.argv[2]}_metadata.json",
+            lambda metadata: build_cache.asset_input_hashes(f"/app/content_pipeline/incoming/{sys.argv[1]}", metadata, [
+                field_name for field_name in metadata if not field_name.endswith(("_status", "_content"))
+                and assemble_review_package.get_asset_type(field_name) in PROBED_ASSET_TYPES]),
+            lambda: probe_assets(sys.argv[1], sys.argv[2]))
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(probe_assets(sys.argv[1], sys.argv[2])))
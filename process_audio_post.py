@@ -5,6 +5,8 @@ import sys
 from pathlib import Path
 import re
 
+import atomic_files
+
 def extract_frontmatter_and_content(file_content):
     frontmatter_str = []
     content_lines = []
@@ -131,7 +133,7 @@ def process_audio_file(input_file_path_str, output_dir_path_str):
         if processed_metadata.get('contentType') == 'audio' and current_status != "failure":
             output_dir_path.mkdir(parents=True, exist_ok=True)
             output_file_path = output_dir_path / f"{article_id}_metadata.json"
-            with open(output_file_path, 'w', encoding='utf-8') as f:
+            with atomic_files.atomic_open(output_file_path) as f:
                 json.dump(processed_metadata, f, indent=4)
             output_file_path_str = str(output_file_path)
             if errors and current_status == "success": # Should have been caught by success_with_warnings
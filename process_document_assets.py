@@ -1,13 +1,105 @@
+import codecs
+import gzip
+import hashlib
 import json
 import os
 import sys
-import shutil
+import tempfile
 
-def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fields_json_str, pdf_asset_fields_json_str):
+import atomic_files
+import asset_store
+
+# TXT files up to this many bytes are embedded in the metadata as <field>_content. Larger ones are stored as a
+# gzip sidecar next to the staged PDFs and the metadata keeps only <field>_sidecar (path, sizes, hash) and
+# <field>_preview, so one long transcript does not bloat every metadata load and the router payload.
+TXT_INLINE_MAX_BYTES = 8 * 1024
+TXT_PREVIEW_CHARS = 280
+TXT_READ_CHUNK_SIZE = 64 * 1024
+
+
+def make_preview(text, max_chars=TXT_PREVIEW_CHARS):
+    """First max_chars of text with whitespace collapsed, cut back to a word boundary."""
+    collapsed = " ".join(text.split())
+    if len(collapsed) <= max_chars:
+        return collapsed
+    cut = collapsed[:max_chars]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,;:.") + "\u2026"
+
+
+def stream_text_asset(source_txt_path, sidecar_disk_path, inline_max_bytes=TXT_INLINE_MAX_BYTES):
+    """
+    Reads a UTF-8 TXT file in chunks, never holding more than inline_max_bytes (plus one chunk) in memory.
+    Returns {"bytes", "sha256", "preview", "content", "sidecar_transfer"}: content is the text (with universal newlines,
+    like a text-mode read) when the file fits inline, otherwise None and the exact bytes were gzip-compressed into
+    sidecar_disk_path through the asset store as they were read. Raises on missing files and invalid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    digest = hashlib.sha256()
+    total_bytes = 0
+    inline_chunks = [] # Raw bytes while the file still fits inline
+    preview_parts = []
+    preview_chars = 0
+    compressed_file = None
+    gzip_writer = None
+    tmp_path = None
+
+    try:
+        with open(source_txt_path, 'rb') as txt_file:
+            for chunk in iter(lambda: txt_file.read(TXT_READ_CHUNK_SIZE), b''):
+                total_bytes += len(chunk)
+                digest.update(chunk)
+                text = decoder.decode(chunk) # Validates UTF-8 across chunk boundaries
+                if preview_chars < TXT_PREVIEW_CHARS * 2:
+                    preview_parts.append(text)
+                    preview_chars += len(text)
+
+                if gzip_writer is None and total_bytes > inline_max_bytes:
+                    # Too big to embed: switch to the sidecar and flush what was buffered so far
+                    os.makedirs(os.path.dirname(sidecar_disk_path), exist_ok=True)
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(sidecar_disk_path), prefix=".tmp-")
+                    compressed_file = os.fdopen(fd, 'wb')
+                    # mtime=0 and no name keep the sidecar bytes (and so its asset store blob) a pure function of the text
+                    gzip_writer = gzip.GzipFile(filename="", mode='wb', fileobj=compressed_file, mtime=0)
+                    gzip_writer.write(b"".join(inline_chunks))
+                    inline_chunks = None
+                if gzip_writer is not None:
+                    gzip_writer.write(chunk)
+                else:
+                    inline_chunks.append(chunk)
+        decoder.decode(b'', final=True) # A truncated multi-byte sequence at EOF is invalid too
+        preview = make_preview("".join(preview_parts))
+
+        if gzip_writer is None:
+            content = b"".join(inline_chunks).decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            return {"bytes": total_bytes, "sha256": digest.hexdigest(), "preview": preview, "content": content, "sidecar_transfer": None}
+
+        gzip_writer.close()
+        gzip_writer = None
+        compressed_file.close()
+        compressed_file = None
+        sidecar_transfer = asset_store.transfer(tmp_path, sidecar_disk_path)
+        return {"bytes": total_bytes, "sha256": digest.hexdigest(), "preview": preview, "content": None, "sidecar_transfer": sidecar_transfer}
+    finally:
+        if gzip_writer is not None:
+            gzip_writer.close()
+        if compressed_file is not None:
+            compressed_file.close()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fields_json_str, pdf_asset_fields_json_str, metadata=None, save_metadata=True, inline_max_bytes=None):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading the staged file
+    # save_metadata=False leaves writing <base>_metadata.json to the caller (pipeline.py merges concurrent stage updates)
+    # inline_max_bytes: TXT embedding threshold (defaults to TXT_INLINE_MAX_BYTES); larger files become sidecars
+    if inline_max_bytes is None:
+        inline_max_bytes = TXT_INLINE_MAX_BYTES
     # 1. Construct Paths
     metadata_file_path = f"/app/content_pipeline/staging/{staging_batch_dir_name}/{base_filename}_metadata.json"
     incoming_batch_base_path = f"/app/content_pipeline/incoming/{staging_batch_dir_name}"
-    processed_assets_article_documents_path = f"/app/content_pipeline/processed_assets/documents/{base_filename}" # For PDFs
+    processed_assets_article_documents_path = f"/app/content_pipeline/processed_assets/documents/{base_filename}" # For PDFs and TXT sidecars
 
     # 2. Initialization
     processed_files_log = [] # Generic log for both TXT and PDF
@@ -24,13 +116,12 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
         pdf_asset_fields = json.loads(pdf_asset_fields_json_str)
     except json.JSONDecodeError as e:
         error_log.append(f"Error parsing asset_fields_json: {e}")
-        print(json.dumps({
+        return {
             "processed_files_log": processed_files_log,
             "error_log": error_log,
             "editorial_ai_message": "Error: Could not parse TXT or PDF asset fields JSON.",
             "updated_metadata_file_path": None
-        }))
-        return
+        }
 
     os.makedirs(processed_assets_article_documents_path, exist_ok=True) # For PDFs
 
@@ -41,22 +132,22 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
         error_log.append(f"DEBUG: PDF documents directory {processed_assets_article_documents_path} successfully created or already exists.")
 
     # 3. Read Article Metadata
-    try:
-        with open(metadata_file_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except FileNotFoundError:
-        error_log.append(f"Metadata file not found: {metadata_file_path}")
-        ai_message = f"Error processing document assets for '{base_filename}': Metadata file not found."
-        print(json.dumps({"processed_files_log": processed_files_log, "error_log": error_log, "editorial_ai_message": ai_message, "updated_metadata_file_path": None}))
-        return
-    except json.JSONDecodeError as e:
-        error_log.append(f"Error decoding metadata JSON from {metadata_file_path}: {e}")
-        ai_message = f"Error processing document assets for '{base_filename}': Could not decode metadata."
-        print(json.dumps({"processed_files_log": processed_files_log, "error_log": error_log, "editorial_ai_message": ai_message, "updated_metadata_file_path": None}))
-        return
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            error_log.append(f"Metadata file not found: {metadata_file_path}")
+            ai_message = f"Error processing document assets for '{base_filename}': Metadata file not found."
+            return {"processed_files_log": processed_files_log, "error_log": error_log, "editorial_ai_message": ai_message, "updated_metadata_file_path": None}
+        except json.JSONDecodeError as e:
+            error_log.append(f"Error decoding metadata JSON from {metadata_file_path}: {e}")
+            ai_message = f"Error processing document assets for '{base_filename}': Could not decode metadata."
+            return {"processed_files_log": processed_files_log, "error_log": error_log, "editorial_ai_message": ai_message, "updated_metadata_file_path": None}
 
     # 4. Process Asset Fields
     successful_txt_reads = 0
+    successful_txt_sidecars = 0
     failed_txt_reads = 0
     successful_pdf_copies = 0
     failed_pdf_copies = 0
@@ -70,18 +161,39 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
 
             content_field_name = field_name + "_content"
             status_field_name = field_name + "_status"
+            sidecar_field_name = field_name + "_sidecar"
+            preview_field_name = field_name + "_preview"
+            sidecar_filename = os.path.basename(clean_relative_path) + ".gz"
 
             try:
                 if not os.path.exists(source_txt_path):
                     raise FileNotFoundError(f"Source TXT file not found: {source_txt_path}")
 
-                with open(source_txt_path, 'r', encoding='utf-8') as txt_file:
-                    file_content = txt_file.read()
+                text_asset = stream_text_asset(source_txt_path, os.path.join(processed_assets_article_documents_path, sidecar_filename), inline_max_bytes)
 
-                metadata[content_field_name] = file_content
+                if text_asset["content"] is not None:
+                    metadata[content_field_name] = text_asset["content"]
+                    metadata.pop(sidecar_field_name, None) # From an earlier run when the file was larger
+                    metadata.pop(preview_field_name, None)
+                    processed_files_log.append({"source": source_txt_path, "field_updated": content_field_name, "status": "success_read_embedded", "bytes": text_asset["bytes"]})
+                    successful_txt_reads += 1
+                else:
+                    sidecar_metadata_path = f"/content_pipeline/processed_assets/documents/{base_filename}/{sidecar_filename}"
+                    sidecar_transfer = text_asset["sidecar_transfer"]
+                    metadata.pop(content_field_name, None)
+                    metadata[sidecar_field_name] = {
+                        "path": sidecar_metadata_path,
+                        "encoding": "gzip",
+                        "bytes": text_asset["bytes"],
+                        "compressed_bytes": sidecar_transfer["bytes"],
+                        "sha256": text_asset["sha256"]
+                    }
+                    metadata[preview_field_name] = text_asset["preview"]
+                    processed_files_log.append({"source": source_txt_path, "field_updated": sidecar_field_name, "staged_at": sidecar_metadata_path,
+                                                "status": "success_stored_sidecar", "bytes": text_asset["bytes"], "compressed_bytes": sidecar_transfer["bytes"],
+                                                "transfer": sidecar_transfer})
+                    successful_txt_sidecars += 1
                 metadata[status_field_name] = "processed"
-                processed_files_log.append({"source": source_txt_path, "field_updated": content_field_name, "status": "success_read_embedded"})
-                successful_txt_reads += 1
                 metadata_updated = True
             except Exception as e:
                 metadata[status_field_name] = "error_reading"
@@ -95,6 +207,9 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
 
 
     # Process PDF fields (similar to image/audio asset processing)
+    # PDFs are transferred up front on the shared bounded pool; the loop below records outcomes in order
+    pdf_string_fields = [field_name for field_name in pdf_asset_fields if isinstance(metadata.get(field_name), str)]
+    transfers = asset_store.place_many(asset_store.incoming_transfer_pairs(metadata, pdf_string_fields, incoming_batch_base_path, processed_assets_article_documents_path))
     for field_name in pdf_asset_fields:
         if field_name in metadata and isinstance(metadata[field_name], str) and metadata[field_name].strip():
             relative_path = metadata[field_name]
@@ -114,9 +229,11 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
                 if not os.path.exists(source_pdf_path):
                     raise FileNotFoundError(f"Source PDF file not found: {source_pdf_path}")
 
-                shutil.copy2(source_pdf_path, destination_pdf_path)
+                transfer = transfers.get((source_pdf_path, destination_pdf_path)) or asset_store.transfer(source_pdf_path, destination_pdf_path)
+                if isinstance(transfer, Exception):
+                    raise transfer
                 metadata[field_name] = new_metadata_path # Update path in metadata
-                processed_files_log.append({"source": source_pdf_path, "staged_at": new_metadata_path, "status": "success_copied"})
+                processed_files_log.append({"source": source_pdf_path, "staged_at": new_metadata_path, "status": "success_copied", "transfer": transfer})
                 successful_pdf_copies += 1
                 metadata_updated = True
             except Exception as e:
@@ -127,13 +244,15 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
 
 
     # 5. Save Updated Metadata
-    if metadata_updated:
+    if metadata_updated and not save_metadata:
+        updated_metadata_file_path = metadata_file_path # Persisted by the caller
+    elif metadata_updated:
         try:
             def json_serial(obj): # Copied from previous script
                 from datetime import date, datetime
                 if isinstance(obj, (datetime, date)): return obj.isoformat()
                 raise TypeError(f"Type {type(obj)} not serializable")
-            with open(metadata_file_path, 'w', encoding='utf-8') as f:
+            with atomic_files.atomic_open(metadata_file_path) as f:
                 json.dump(metadata, f, indent=4, default=json_serial)
             updated_metadata_file_path = metadata_file_path
         except Exception as e:
@@ -143,6 +262,7 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
     article_title = metadata.get('title', base_filename)
     messages = []
     if successful_txt_reads > 0 : messages.append(f"{successful_txt_reads} TXT file(s) embedded")
+    if successful_txt_sidecars > 0 : messages.append(f"{successful_txt_sidecars} large TXT file(s) stored as compressed sidecars")
     if failed_txt_reads > 0 : messages.append(f"{failed_txt_reads} TXT file(s) failed to read")
     if successful_pdf_copies > 0 : messages.append(f"{successful_pdf_copies} PDF file(s) copied")
     if failed_pdf_copies > 0 : messages.append(f"{failed_pdf_copies} PDF file(s) failed to copy")
@@ -153,27 +273,53 @@ def process_document_assets(staging_batch_dir_name, base_filename, txt_asset_fie
         ai_message = f"Document asset processing for '{article_title}': {', '.join(messages)}. Check logs."
 
     # 7. Return Results
-    print(json.dumps({
+    return {
         "processed_files_log": processed_files_log,
         "error_log": error_log,
         "editorial_ai_message": ai_message,
         "updated_metadata_file_path": updated_metadata_file_path,
         "metadata_after_processing": metadata
-    }))
+    }
 
 if __name__ == "__main__":
-    if len(sys.argv) != 5: # Expect 4 arguments now + script name
+    args = sys.argv[1:]
+    use_cache_arg = "--cache" in args # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    args = [a for a in args if a != "--cache"]
+    inline_max_bytes_arg = None
+    if "--inline-max-bytes" in args:
+        flag_index = args.index("--inline-max-bytes")
+        try:
+            inline_max_bytes_arg = max(0, int(args[flag_index + 1]))
+            del args[flag_index:flag_index + 2]
+        except (IndexError, ValueError):
+            args = [] # Falls through to the usage error below
+    if len(args) != 4: # Expect 4 arguments now + script name
         print(json.dumps({
             "processed_files_log": [],
-            "error_log": ["Usage: python process_document_assets.py <staging_batch_dir_name> <base_filename> <txt_asset_fields_json> <pdf_asset_fields_json>"],
+            "error_log": ["Usage: python process_document_assets.py <staging_batch_dir_name> <base_filename> <txt_asset_fields_json> <pdf_asset_fields_json> [--inline-max-bytes N] [--cache]"],
             "editorial_ai_message": "Error: Incorrect arguments for process_document_assets.py.",
             "updated_metadata_file_path": None
         }))
         sys.exit(1)
 
-    staging_batch_dir_name_arg = sys.argv[1]
-    base_filename_arg = sys.argv[2]
-    txt_asset_fields_json_str_arg = sys.argv[3]
-    pdf_asset_fields_json_str_arg = sys.argv[4]
+    staging_batch_dir_name_arg = args[0]
+    base_filename_arg = args[1]
+    txt_asset_fields_json_str_arg = args[2]
+    pdf_asset_fields_json_str_arg = args[3]
 
-    process_document_assets(staging_batch_dir_name_arg, base_filename_arg, txt_asset_fields_json_str_arg, pdf_asset_fields_json_str_arg)
+    def run_documents():
+        return process_document_assets(staging_batch_dir_name_arg, base_filename_arg, txt_asset_fields_json_str_arg, pdf_asset_fields_json_str_arg,
+                                       inline_max_bytes=inline_max_bytes_arg)
+
+    if use_cache_arg:
+        import build_cache
+        incoming_batch_path = f"/app/content_pipeline/incoming/{staging_batch_dir_name_arg}"
+        document_fields = build_cache.json_fields(txt_asset_fields_json_str_arg) + build_cache.json_fields(pdf_asset_fields_json_str_arg)
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "process_document_assets", f"/app/content_pipeline/staging/{staging_batch_dir_name_arg}/{base_filename_arg}_metadata.json",
+            lambda metadata: [txt_asset_fields_json_str_arg, pdf_asset_fields_json_str_arg, inline_max_bytes_arg if inline_max_bytes_arg is not None else TXT_INLINE_MAX_BYTES,
+                              build_cache.asset_input_hashes(incoming_batch_path, metadata, document_fields)],
+            run_documents)
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(run_documents()))
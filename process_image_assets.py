@@ -1,9 +1,13 @@
 import json
 import os
 import sys
-import shutil
 
-def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str):
+import atomic_files
+import asset_store
+
+def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str, metadata=None, save_metadata=True):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading the staged file
+    # save_metadata=False leaves writing <base>_metadata.json to the caller (pipeline.py merges concurrent stage updates)
     # 1. Construct Paths
     metadata_file_path = f"/app/content_pipeline/staging/{staging_batch_dir_name}/{base_filename}_metadata.json"
     incoming_batch_base_path = f"/app/content_pipeline/incoming/{staging_batch_dir_name}"
@@ -20,42 +24,42 @@ def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str)
     except json.JSONDecodeError as e:
         error_log.append(f"Error parsing asset_fields_json: {e}")
         # Output results and exit if essential parameters are bad
-        print(json.dumps({
+        return {
             "processed_images_log": processed_images_log,
             "error_log": error_log,
             "editorial_ai_message": "Error: Could not parse asset fields JSON.",
             "updated_metadata_file_path": None
-        }))
-        return
+        }
 
     os.makedirs(processed_assets_article_images_path, exist_ok=True)
 
     # 3. Read Article Metadata
-    try:
-        with open(metadata_file_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except FileNotFoundError:
-        error_log.append(f"Metadata file not found: {metadata_file_path}")
-        ai_message = f"Error processing assets for '{base_filename}': Metadata file not found."
-        print(json.dumps({
-            "processed_images_log": processed_images_log,
-            "error_log": error_log,
-            "editorial_ai_message": ai_message,
-            "updated_metadata_file_path": updated_metadata_file_path
-        }))
-        return
-    except json.JSONDecodeError as e:
-        error_log.append(f"Error decoding metadata JSON from {metadata_file_path}: {e}")
-        ai_message = f"Error processing assets for '{base_filename}': Could not decode metadata."
-        print(json.dumps({
-            "processed_images_log": processed_images_log,
-            "error_log": error_log,
-            "editorial_ai_message": ai_message,
-            "updated_metadata_file_path": updated_metadata_file_path
-        }))
-        return
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            error_log.append(f"Metadata file not found: {metadata_file_path}")
+            ai_message = f"Error processing assets for '{base_filename}': Metadata file not found."
+            return {
+                "processed_images_log": processed_images_log,
+                "error_log": error_log,
+                "editorial_ai_message": ai_message,
+                "updated_metadata_file_path": updated_metadata_file_path
+            }
+        except json.JSONDecodeError as e:
+            error_log.append(f"Error decoding metadata JSON from {metadata_file_path}: {e}")
+            ai_message = f"Error processing assets for '{base_filename}': Could not decode metadata."
+            return {
+                "processed_images_log": processed_images_log,
+                "error_log": error_log,
+                "editorial_ai_message": ai_message,
+                "updated_metadata_file_path": updated_metadata_file_path
+            }
 
     # 4. Process Asset Fields
+    # Every referenced file is transferred up front on the shared bounded pool; the loop below records outcomes in order
+    transfers = asset_store.place_many(asset_store.incoming_transfer_pairs(metadata, asset_fields, incoming_batch_base_path, processed_assets_article_images_path))
     metadata_updated = False
     successful_copies = 0
     failed_copies = 0
@@ -95,8 +99,10 @@ def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str)
                     if not os.path.exists(source_image_path):
                         raise FileNotFoundError(f"Source image not found: {source_image_path}")
 
-                    shutil.copy2(source_image_path, destination_image_path)
-                    processed_images_log.append({"source": source_image_path, "staged_at": new_metadata_path, "status": "success"})
+                    transfer = transfers.get((source_image_path, destination_image_path)) or asset_store.transfer(source_image_path, destination_image_path)
+                    if isinstance(transfer, Exception):
+                        raise transfer
+                    processed_images_log.append({"source": source_image_path, "staged_at": new_metadata_path, "status": "success", "transfer": transfer})
                     successful_copies += 1
                     if is_list_field:
                         new_paths_for_list_field.append(new_metadata_path)
@@ -122,7 +128,9 @@ def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str)
 
 
     # 5. Save Updated Metadata (if changed)
-    if metadata_updated:
+    if metadata_updated and not save_metadata:
+        updated_metadata_file_path = metadata_file_path # Persisted by the caller
+    elif metadata_updated:
         try:
             # Custom handler for JSON serialization of date/datetime objects, if any (copied from previous script)
             def json_serial(obj):
@@ -130,7 +138,7 @@ def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str)
                 if isinstance(obj, (datetime, date)):
                     return obj.isoformat()
                 raise TypeError(f"Type {type(obj)} not serializable")
-            with open(metadata_file_path, 'w', encoding='utf-8') as f:
+            with atomic_files.atomic_open(metadata_file_path) as f:
                 json.dump(metadata, f, indent=4, default=json_serial)
             updated_metadata_file_path = metadata_file_path
         except Exception as e:
@@ -150,20 +158,22 @@ def process_assets(staging_batch_dir_name, base_filename, asset_fields_json_str)
         ai_message = f"Image asset processing for article '{article_title}' completed. Processed: {len(processed_images_log)}. Check logs for details."
 
 
-    # 7. Return Results (printed as JSON to stdout)
-    print(json.dumps({
+    # 7. Return Results (printed as JSON to stdout by the CLI entry point)
+    return {
         "processed_images_log": processed_images_log,
         "error_log": error_log,
         "editorial_ai_message": ai_message,
         "updated_metadata_file_path": updated_metadata_file_path,
         "metadata_after_processing": metadata # For debugging/verification
-    }))
+    }
 
 if __name__ == "__main__":
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    sys.argv = [a for a in sys.argv if a != "--cache"]
     if len(sys.argv) != 4:
         print(json.dumps({
             "processed_images_log": [],
-            "error_log": ["Usage: python process_image_assets.py <staging_batch_dir_name> <base_filename> <asset_fields_json_string>"],
+            "error_log": ["Usage: python process_image_assets.py <staging_batch_dir_name> <base_filename> <asset_fields_json_string> [--cache]"],
             "editorial_ai_message": "Error: Incorrect arguments for process_image_assets.py.",
             "updated_metadata_file_path": None
         }))
@@ -173,4 +183,13 @@ if __name__ == "__main__":
     base_filename_arg = sys.argv[2]
     asset_fields_json_str_arg = sys.argv[3]
 
-    process_assets(staging_batch_dir_name_arg, base_filename_arg, asset_fields_json_str_arg)
+    if use_cache_arg:
+        import build_cache
+        incoming_batch_path = f"/app/content_pipeline/incoming/{staging_batch_dir_name_arg}"
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "process_image_assets", f"/app/content_pipeline/staging/{staging_batch_dir_name_arg}/{base_filename_arg}_metadata.json",
+            lambda metadata: [asset_fields_json_str_arg, build_cache.asset_input_hashes(incoming_batch_path, metadata, build_cache.json_fields(asset_fields_json_str_arg))],
+            lambda: process_assets(staging_batch_dir_name_arg, base_filename_arg, asset_fields_json_str_arg))
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(process_assets(staging_batch_dir_name_arg, base_filename_arg, asset_fields_json_str_arg)))
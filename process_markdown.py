@@ -2,6 +2,10 @@ import json
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import atomic_files
+import build_cache
 
 # Attempt to import dependencies
 try:
@@ -16,6 +20,9 @@ try:
 except ImportError:
     MARKDOWN_AVAILABLE = False
 
+# Paths are constructed starting from /app, which is the repo root in the sandbox
+BASE_APP_PATH = "/app"
+
 def parse_frontmatter_and_body(content):
     """
     Parses YAML frontmatter and extracts the Markdown body.
@@ -131,128 +138,216 @@ def markdown_to_html_regex_fallback(md_body, reason_for_fallback):
         error = reason_for_fallback
     return html_output, error
 
-def main(incoming_batch_dir_arg, staging_dir_arg):
-    # Ensure paths are constructed starting from /app, which is the repo root in the sandbox
-    base_app_path = "/app"
-    full_incoming_path = os.path.join(base_app_path, "content_pipeline/incoming", incoming_batch_dir_arg)
-    # staging_dir_arg is also relative to /app as per subtask description (e.g. /content_pipeline/staging/)
-    # So, full_staging_path_for_batch should also be relative to /app
-    full_staging_path_for_batch = os.path.join(base_app_path, staging_dir_arg.strip('/'), incoming_batch_dir_arg)
+def json_serial(obj):
+    # Custom handler for JSON serialization of date/datetime objects
+    from datetime import date, datetime
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+def process_markdown_file(filename, full_incoming_path, full_staging_path_for_batch):
+    """
+    Parses, renders and stages a single Markdown file.
+    Returns (log_entry, errors, editorial_message, frontmatter). frontmatter is None on critical failure.
+    """
+    md_filepath = os.path.join(full_incoming_path, filename)
+    base_filename = filename[:-3]
+    status = "success"
+    current_file_errors = []
+
+    try:
+        with open(md_filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
 
+        fm_parse_result = parse_frontmatter_and_body(content)
+        frontmatter = {}
+        body = ""
+        parse_error_detail = None
 
-    if not os.path.exists(full_staging_path_for_batch):
-        os.makedirs(full_staging_path_for_batch, exist_ok=True) # Added exist_ok=True
+        if len(fm_parse_result) == 3:
+            frontmatter, body, parse_error_detail = fm_parse_result
+        else:
+            frontmatter, body = fm_parse_result
 
-    processed_files_log = []
-    error_log = []
-    editorial_ai_messages = []
+        if parse_error_detail:
+            current_file_errors.append(f"Frontmatter parsing issue for {filename}: {parse_error_detail}")
 
-    if not os.path.isdir(full_incoming_path):
-        error_msg = f"Error: Incoming batch directory not found: {full_incoming_path}"
-        error_log.append(error_msg)
-        print(json.dumps({
-            "processed_files_log": processed_files_log,
-            "error_log": error_log,
-            "editorial_ai_messages": editorial_ai_messages
-        }))
-        return
-
-    for filename in os.listdir(full_incoming_path):
-        if filename.endswith(".md"):
-            md_filepath = os.path.join(full_incoming_path, filename)
-            base_filename = filename[:-3]
-            status = "success"
-            current_file_errors = []
-
-            try:
-                with open(md_filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                fm_parse_result = parse_frontmatter_and_body(content)
-                frontmatter = {}
-                body = ""
-                parse_error_detail = None
-
-                if len(fm_parse_result) == 3:
-                    frontmatter, body, parse_error_detail = fm_parse_result
-                else:
-                    frontmatter, body = fm_parse_result
-
-                if parse_error_detail:
-                    current_file_errors.append(f"Frontmatter parsing issue for {filename}: {parse_error_detail}")
-
-                html_body, md_conversion_error = markdown_to_html(body)
-                if md_conversion_error:
-                    current_file_errors.append(f"Markdown to HTML conversion issue for {filename}: {md_conversion_error}")
-
-                metadata_filename = base_filename + "_metadata.json"
-                html_filename = base_filename + ".html"
-
-                metadata_out_path = os.path.join(full_staging_path_for_batch, metadata_filename)
-                html_out_path = os.path.join(full_staging_path_for_batch, html_filename)
-
-                try:
-                    # Custom handler for JSON serialization of date/datetime objects
-                    def json_serial(obj):
-                        from datetime import date, datetime
-                        if isinstance(obj, (datetime, date)):
-                            return obj.isoformat()
-                        raise TypeError(f"Type {type(obj)} not serializable")
-
-                    with open(metadata_out_path, 'w', encoding='utf-8') as mf:
-                        json.dump(frontmatter, mf, indent=4, default=json_serial)
-                except Exception as e:
-                    current_file_errors.append(f"Error writing metadata for {filename}: {e}")
-                    status = "error"
-
-                try:
-                    with open(html_out_path, 'w', encoding='utf-8') as hf:
-                        hf.write(html_body)
-                except Exception as e:
-                    current_file_errors.append(f"Error writing HTML for {filename}: {e}")
-                    status = "error"
-
-                if current_file_errors:
-                    error_log.extend(current_file_errors)
-                    status = "error"
-                    editorial_ai_messages.append(f"Error processing {filename}. Check logs. Details: {'; '.join(current_file_errors)}")
-                else:
-                    editorial_ai_messages.append(f"Processed {filename}. Staged metadata and HTML.")
-
-                processed_files_log.append({
-                    "source": filename,
-                    "metadata_out": metadata_filename,
-                    "html_out": html_filename,
-                    "status": status
-                })
-
-            except Exception as e:
-                error_log.append(f"Failed to process file {filename}: {e}")
-                processed_files_log.append({
-                    "source": filename,
-                    "metadata_out": None,
-                    "html_out": None,
-                    "status": "error"
-                })
-                editorial_ai_messages.append(f"Critical error processing {filename}. See error log.")
-
-    print(json.dumps({
-        "processed_files_log": processed_files_log,
-        "error_log": error_log,
-        "editorial_ai_messages": editorial_ai_messages,
-        "pyyaml_available": PYYAML_AVAILABLE,
-        "markdown_available": MARKDOWN_AVAILABLE
-    }))
+        html_body, md_conversion_error = markdown_to_html(body)
+        if md_conversion_error:
+            current_file_errors.append(f"Markdown to HTML conversion issue for {filename}: {md_conversion_error}")
+
+        metadata_filename = base_filename + "_metadata.json"
+        html_filename = base_filename + ".html"
+
+        metadata_out_path = os.path.join(full_staging_path_for_batch, metadata_filename)
+        html_out_path = os.path.join(full_staging_path_for_batch, html_filename)
+
+        try:
+            with atomic_files.atomic_open(metadata_out_path) as mf:
+                json.dump(frontmatter, mf, indent=4, default=json_serial)
+        except Exception as e:
+            current_file_errors.append(f"Error writing metadata for {filename}: {e}")
+            status = "error"
+
+        try:
+            with atomic_files.atomic_open(html_out_path) as hf:
+                hf.write(html_body)
+        except Exception as e:
+            current_file_errors.append(f"Error writing HTML for {filename}: {e}")
+            status = "error"
+
+        if current_file_errors:
+            status = "error"
+            message = f"Error processing {filename}. Check logs. Details: {'; '.join(current_file_errors)}"
+        else:
+            message = f"Processed {filename}. Staged metadata and HTML."
+
+        log_entry = {
+            "source": filename,
+            "metadata_out": metadata_filename,
+            "html_out": html_filename,
+            "status": status
+        }
+        return log_entry, current_file_errors, message, frontmatter
+
+    except Exception as e:
+        log_entry = {
+            "source": filename,
+            "metadata_out": None,
+            "html_out": None,
+            "status": "error"
+        }
+        return log_entry, [f"Failed to process file {filename}: {e}"], f"Critical error processing {filename}. See error log.", None
+
+def process_batches(incoming_batch_dirs, staging_dir_arg, workers=1, staged_metadata=None, cache=None):
+    """
+    Stages every .md file of several incoming batches, fanning the files out over a process pool when workers > 1.
+    Returns one result dict per batch, in the order the batches were given. Files are processed and logged in
+    sorted filename order, so the merged logs are identical whatever the worker count.
+    If staged_metadata (a dict) is given, it is filled with batch -> {base_filename -> frontmatter}.
+    If cache (a build_cache dict) is given, files whose Markdown bytes and stage code are unchanged since the
+    last run are not re-parsed; their staged outputs and cached results are reused.
+    """
+    batch_results = []
+    jobs = [] # (batch index, filename, full_incoming_path, full_staging_path_for_batch)
+
+    for incoming_batch_dir_arg in incoming_batch_dirs:
+        full_incoming_path = os.path.join(BASE_APP_PATH, "content_pipeline/incoming", incoming_batch_dir_arg)
+        # staging_dir_arg is also relative to /app as per subtask description (e.g. /content_pipeline/staging/)
+        # So, full_staging_path_for_batch should also be relative to /app
+        full_staging_path_for_batch = os.path.join(BASE_APP_PATH, staging_dir_arg.strip('/'), incoming_batch_dir_arg)
+
+        if not os.path.exists(full_staging_path_for_batch):
+            os.makedirs(full_staging_path_for_batch, exist_ok=True) # Added exist_ok=True
+
+        result = {
+            "processed_files_log": [],
+            "error_log": [],
+            "editorial_ai_messages": []
+        }
+
+        if not os.path.isdir(full_incoming_path):
+            result["error_log"].append(f"Error: Incoming batch directory not found: {full_incoming_path}")
+            batch_results.append(result)
+            continue
+
+        result["pyyaml_available"] = PYYAML_AVAILABLE
+        result["markdown_available"] = MARKDOWN_AVAILABLE
+
+        for filename in sorted(os.listdir(full_incoming_path)):
+            if filename.endswith(".md"):
+                jobs.append((len(batch_results), filename, full_incoming_path, full_staging_path_for_batch))
+        batch_results.append(result)
+
+    outcomes = [None] * len(jobs)
+    input_keys = [None] * len(jobs)
+    if cache is not None:
+        stage_code_version = build_cache.code_version(sys.modules[__name__])
+        for job_index, (batch_index, filename, full_incoming_path, _) in enumerate(jobs):
+            md_hash = build_cache.hash_file(os.path.join(full_incoming_path, filename), cache)
+            input_keys[job_index] = build_cache.combine_keys("process_markdown", stage_code_version, md_hash)
+            entry = build_cache.lookup(cache, build_cache.entry_name(incoming_batch_dirs[batch_index], filename[:-3], "process_markdown"), input_keys[job_index])
+            if entry:
+                cached = entry["result"]
+                outcomes[job_index] = (cached["log_entry"], cached["errors"], cached["message"], entry["metadata_after"])
+
+    pending = [job_index for job_index, outcome in enumerate(outcomes) if outcome is None]
+    if workers > 1 and len(pending) > 1:
+        # Parsing and rendering are CPU-bound pure Python, so use processes rather than threads
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            fresh_outcomes = list(executor.map(process_markdown_file,
+                                               [jobs[job_index][1] for job_index in pending],
+                                               [jobs[job_index][2] for job_index in pending],
+                                               [jobs[job_index][3] for job_index in pending]))
+    else:
+        fresh_outcomes = [process_markdown_file(jobs[job_index][1], jobs[job_index][2], jobs[job_index][3]) for job_index in pending]
+
+    for job_index, outcome in zip(pending, fresh_outcomes):
+        outcomes[job_index] = outcome
+        log_entry, file_errors, message, frontmatter = outcome
+        if cache is not None and frontmatter is not None and log_entry["metadata_out"]:
+            batch_index, filename, _, full_staging_path_for_batch = jobs[job_index]
+            build_cache.store(cache, build_cache.entry_name(incoming_batch_dirs[batch_index], filename[:-3], "process_markdown"), input_keys[job_index],
+                              [os.path.join(full_staging_path_for_batch, name) for name in (log_entry["metadata_out"], log_entry["html_out"]) if name],
+                              {"log_entry": log_entry, "errors": file_errors, "message": message},
+                              json.loads(json.dumps(frontmatter, default=json_serial)))
+
+    # Merge back in job order (batch order, then sorted filenames) so the logs are deterministic
+    for (batch_index, filename, _, _), (log_entry, file_errors, message, frontmatter) in zip(jobs, outcomes):
+        result = batch_results[batch_index]
+        result["processed_files_log"].append(log_entry)
+        result["error_log"].extend(file_errors)
+        result["editorial_ai_messages"].append(message)
+        if staged_metadata is not None and frontmatter is not None and log_entry["metadata_out"]:
+            # Same normalization as the JSON file on disk (dates -> ISO strings)
+            batch_name = incoming_batch_dirs[batch_index]
+            staged_metadata.setdefault(batch_name, {})[filename[:-3]] = json.loads(json.dumps(frontmatter, default=json_serial))
+
+    return batch_results
+
+def main(incoming_batch_dir_arg, staging_dir_arg, staged_metadata=None, workers=1, cache=None):
+    """
+    Stages every .md file in an incoming batch and returns the JSON-serializable result dict.
+    If staged_metadata (a dict) is given, it is filled with base_filename -> frontmatter, normalized
+    exactly as written to <base>_metadata.json, so callers don't need to re-read the staged files.
+    """
+    batch_metadata = {}
+    result = process_batches([incoming_batch_dir_arg], staging_dir_arg, workers=workers, staged_metadata=batch_metadata, cache=cache)[0]
+    if staged_metadata is not None:
+        staged_metadata.update(batch_metadata.get(incoming_batch_dir_arg, {}))
+    return result
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
+    # Optional: --workers N fans articles (across all given batches) out over N processes,
+    # --cache skips files unchanged since the last run (see build_cache.py)
+    args = sys.argv[1:]
+    use_cache_arg = "--cache" in args
+    args = [a for a in args if a != "--cache"]
+    workers_arg = 1
+    if "--workers" in args:
+        flag_index = args.index("--workers")
+        try:
+            workers_arg = max(1, int(args[flag_index + 1]))
+            del args[flag_index:flag_index + 2]
+        except (IndexError, ValueError):
+            args = [] # Falls through to the usage error below
+
+    if len(args) < 2:
         print(json.dumps({
             "processed_files_log": [],
-            "error_log": ["Usage: python process_markdown.py <incoming_batch_dir> <staging_dir_root>"],
+            "error_log": ["Usage: python process_markdown.py <incoming_batch_dir> [<incoming_batch_dir> ...] <staging_dir_root> [--workers N] [--cache]"],
             "editorial_ai_messages": []
         }))
         sys.exit(1)
 
-    incoming_batch_dir_arg = sys.argv[1]
-    staging_dir_arg = sys.argv[2]
-    main(incoming_batch_dir_arg, staging_dir_arg)
+    incoming_batch_dir_args = args[:-1]
+    staging_dir_arg = args[-1]
+    cache_arg = build_cache.load_cache() if use_cache_arg else None
+    if len(incoming_batch_dir_args) == 1:
+        output = main(incoming_batch_dir_args[0], staging_dir_arg, workers=workers_arg, cache=cache_arg)
+    else:
+        batch_results = process_batches(incoming_batch_dir_args, staging_dir_arg, workers=workers_arg, cache=cache_arg)
+        output = [dict(batch=batch, **result) for batch, result in zip(incoming_batch_dir_args, batch_results)]
+    if cache_arg is not None:
+        build_cache.save_cache(cache_arg)
+    print(json.dumps(output))
@@ -5,6 +5,8 @@ import sys
 from pathlib import Path
 import re
 
+import atomic_files
+
 def extract_frontmatter_and_content(file_content):
     frontmatter_str = []
     content_lines = []
@@ -118,7 +120,7 @@ def process_video_file(input_file_path_str, output_dir_path_str):
         if status in ["success", "success_with_warnings"] or (status == "failure" and "YAML parsing failed." in '; '.join(errors) and processed_metadata.get('title')):
             output_dir_path.mkdir(parents=True, exist_ok=True)
             output_file_path = output_dir_path / f"{article_id}_metadata.json"
-            with open(output_file_path, 'w', encoding='utf-8') as f:
+            with atomic_files.atomic_open(output_file_path) as f:
                 json.dump(processed_metadata, f, indent=4)
             output_file = str(output_file_path)
 
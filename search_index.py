@@ -0,0 +1,315 @@
+import functools
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+
+import article_index
+import atomic_files
+import build_cache
+import suggest_metadata
+
+# Static full-text search index for the site, read by js/magazine-search.js. Layout under assets/search/:
+#   meta.json               doc count, shard/block parameters and the stopword list the browser drops from queries
+#   shards/<prefix>.json    inverted index for every term starting with <prefix> (its first PREFIX_LENGTH characters):
+#                           {"terms": {term: postings}}, postings being a flat list of (doc number gap, weight) pairs
+#                           sorted by doc number, i.e. delta-encoded doc numbers, so a query fetches only its terms' shards
+#   docs/<block>.json       result summaries (id, title, excerpt, date, contentType) for doc numbers in one block
+#   catalog.json            build-side state: each article's doc number and content hash
+#   docstate/<doc>.json     build-side state per doc: a hash of its postings in each shard it appears in, so an
+#                           update only opens the shards where that doc's postings actually changed
+# Articles are tokenized with suggest_metadata.preprocess_text (same tokenizer and stopwords as the metadata
+# suggestions) over the title, tags, excerpt/description and the rendered body HTML. Updating an article only
+# rewrites the shards its old and new terms fall in and the doc block holding it; the rest of the archive is untouched.
+PREFIX_LENGTH = 2
+DOCS_PER_BLOCK = 256
+# Per-occurrence weight of a term in each field; occurrences in one field count at most MAX_TERM_OCCURRENCES times
+FIELD_WEIGHTS = {"title": 8, "tags": 5, "excerpt": 3, "body": 1}
+MAX_TERM_OCCURRENCES = 5
+SUMMARY_EXCERPT_CHARS = 160
+INDEX_FORMAT_VERSION = 1
+
+_search_lock = threading.Lock()
+
+
+def site_root_for_router(router_file_path):
+    return os.path.dirname(os.path.dirname(os.path.abspath(router_file_path)))
+
+
+def search_dir_for_router(router_file_path):
+    return os.path.join(site_root_for_router(router_file_path), "assets", "search")
+
+
+@functools.lru_cache(maxsize=65536)
+def shard_name(term):
+    """File name of the shard holding term; mirrors shardName() in magazine-search.js."""
+    prefix = term[:PREFIX_LENGTH]
+    return "".join(c if c.isascii() and c.isalnum() else f"-{ord(c):x}-" for c in prefix)
+
+
+def encode_postings(postings):
+    """{doc: weight} -> [first doc, weight, gap to next doc, weight, ...]"""
+    encoded = []
+    previous = 0
+    for doc in sorted(postings):
+        encoded.extend((doc - previous, postings[doc]))
+        previous = doc
+    return encoded
+
+
+def decode_postings(encoded):
+    postings = {}
+    doc = 0
+    for i in range(0, len(encoded), 2):
+        doc += encoded[i]
+        postings[doc] = encoded[i + 1]
+    return postings
+
+
+def postings_digest(term_weights_in_shard):
+    """Short digest of one doc's {term: weight} within a shard (computed per doc and shard, so kept cheap)."""
+    return hashlib.blake2b(repr(sorted(term_weights_in_shard.items())).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def article_body_text(record, site_root):
+    """Plain text of the article's rendered HTML (html_content_path under the site root); "" if it has none."""
+    html_path = record.get("html_content_path")
+    if not (isinstance(html_path, str) and html_path.startswith('/') and site_root):
+        return ""
+    try:
+        with open(os.path.join(site_root, html_path.lstrip('/')), 'r', encoding='utf-8') as f:
+            return suggest_metadata.extract_text_from_html(f.read())
+    except OSError:
+        return ""
+
+
+def field_texts(record, body_text):
+    tags = record.get("tags")
+    return {
+        "title": str(record.get("title") or ""),
+        "tags": " ".join(map(str, tags)) if isinstance(tags, list) else str(tags or ""),
+        "excerpt": str(record.get("excerpt") or record.get("description") or ""),
+        "body": body_text
+    }
+
+
+def term_weights(texts):
+    weights = {}
+    for field_name, text in texts.items():
+        if not text:
+            continue
+        counts = {}
+        for term in suggest_metadata.preprocess_text(text)[1]:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            weights[term] = weights.get(term, 0) + FIELD_WEIGHTS[field_name] * min(count, MAX_TERM_OCCURRENCES)
+    return weights
+
+
+def doc_summary(record):
+    excerpt = str(record.get("excerpt") or record.get("description") or "")
+    if len(excerpt) > SUMMARY_EXCERPT_CHARS:
+        excerpt = excerpt[:SUMMARY_EXCERPT_CHARS].rstrip() + "..."
+    return {"id": record.get("id"), "title": record.get("title") or record.get("id"), "excerpt": excerpt,
+            "date": record.get("date"), "contentType": record.get("contentType") or "article"}
+
+
+def load_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def update_search_index(records, search_dir, removed_ids=(), site_root=None):
+    """
+    Indexes (or re-indexes) the given article records and drops removed_ids, touching only the affected shards
+    and doc blocks. site_root is where html_content_path resolves to on disk. Returns a report of what changed.
+    """
+    report = {"indexed": [], "unchanged": [], "removed": [], "shards_written": 0, "shards_deleted": 0, "blocks_written": 0}
+    with _search_lock:
+        catalog = load_json(os.path.join(search_dir, "catalog.json"), None)
+        if not catalog or catalog.get("version") != INDEX_FORMAT_VERSION:
+            catalog = {"version": INDEX_FORMAT_VERSION, "next_doc": 0, "docs": {}}
+        docs = catalog["docs"]
+        purges = {} # shard -> docs whose old postings in it are dropped
+        additions = {} # shard -> term -> {doc: weight}
+        summaries = {} # doc -> summary, or None to remove it from its block
+        docstates = {} # doc -> new per-shard postings hashes, or None to delete its state file
+
+        def docstate_path(doc):
+            return os.path.join(search_dir, "docstate", f"{doc}.json")
+
+        for record in records:
+            article_id = record.get("id")
+            if not article_id:
+                continue
+            texts = field_texts(record, article_body_text(record, site_root))
+            content_hash = build_cache.combine_keys(doc_summary(record), texts)
+            entry = docs.get(article_id)
+            if entry and entry["hash"] == content_hash:
+                report["unchanged"].append(article_id)
+                continue
+            if entry:
+                doc = entry["doc"]
+                old_groups = load_json(docstate_path(doc), {"shards": {}})["shards"]
+            else:
+                doc = catalog["next_doc"]
+                catalog["next_doc"] += 1
+                old_groups = {}
+            shard_postings = {}
+            for term, weight in term_weights(texts).items():
+                shard_postings.setdefault(shard_name(term), {})[term] = weight
+            new_groups = {name: postings_digest(postings) for name, postings in shard_postings.items()}
+            for name in set(old_groups) | set(new_groups):
+                if old_groups.get(name) == new_groups.get(name):
+                    continue # Same postings for this doc in this shard, e.g. the body of an edited article
+                if name in old_groups:
+                    purges.setdefault(name, set()).add(doc)
+                for term, weight in shard_postings.get(name, {}).items():
+                    additions.setdefault(name, {}).setdefault(term, {})[doc] = weight
+                purges.setdefault(name, set())
+            docs[article_id] = {"doc": doc, "hash": content_hash}
+            docstates[doc] = new_groups
+            summaries[doc] = doc_summary(record)
+            report["indexed"].append(article_id)
+
+        for article_id in removed_ids:
+            entry = docs.pop(article_id, None)
+            if entry:
+                for name in load_json(docstate_path(entry["doc"]), {"shards": {}})["shards"]:
+                    purges.setdefault(name, set()).add(entry["doc"])
+                docstates[entry["doc"]] = None
+                summaries[entry["doc"]] = None
+                report["removed"].append(article_id)
+
+        if not summaries and os.path.exists(os.path.join(search_dir, "meta.json")):
+            return report
+
+        for name in sorted(purges):
+            path = os.path.join(search_dir, "shards", name + ".json")
+            stored_terms = load_json(path, {"terms": {}})["terms"]
+            purged_docs = purges[name]
+            shard_additions = additions.get(name, {})
+            encoded_terms = {}
+            for term in sorted(set(stored_terms) | set(shard_additions)):
+                encoded = stored_terms.get(term, [])
+                # Only terms listing a purged doc (running sum of the gaps, in C) or gaining one are decoded
+                if term not in shard_additions and purged_docs.isdisjoint(itertools.accumulate(encoded[0::2])):
+                    encoded_terms[term] = encoded
+                    continue
+                postings = decode_postings(encoded)
+                for doc in purged_docs.intersection(postings):
+                    del postings[doc]
+                postings.update(shard_additions.get(term, {}))
+                if postings:
+                    encoded_terms[term] = encode_postings(postings)
+            if encoded_terms == stored_terms:
+                continue
+            if encoded_terms:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                atomic_files.write_json(path, {"terms": encoded_terms}, separators=(',', ':'))
+                report["shards_written"] += 1
+            elif os.path.exists(path):
+                os.remove(path)
+                report["shards_deleted"] += 1
+
+        for doc, groups in docstates.items():
+            path = docstate_path(doc)
+            if groups is not None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                atomic_files.write_json(path, {"shards": groups}, separators=(',', ':'))
+            elif os.path.exists(path):
+                os.remove(path)
+
+        for block in sorted({doc // DOCS_PER_BLOCK for doc in summaries}):
+            path = os.path.join(search_dir, "docs", f"{block}.json")
+            block_docs = load_json(path, {"docs": {}})["docs"]
+            for doc, summary in summaries.items():
+                if doc // DOCS_PER_BLOCK != block:
+                    continue
+                if summary is None:
+                    block_docs.pop(str(doc), None)
+                else:
+                    block_docs[str(doc)] = summary
+            if block_docs:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                atomic_files.write_json(path, {"block": block, "docs": block_docs}, separators=(',', ':'))
+                report["blocks_written"] += 1
+            elif os.path.exists(path):
+                os.remove(path)
+
+        os.makedirs(search_dir, exist_ok=True)
+        stopwords = suggest_metadata.NLTK_STOPWORDS if suggest_metadata.NLTK_AVAILABLE else suggest_metadata.FALLBACK_STOPWORDS
+        atomic_files.write_json(os.path.join(search_dir, "meta.json"), {
+            "version": INDEX_FORMAT_VERSION,
+            "doc_count": len(docs),
+            "prefix_length": PREFIX_LENGTH,
+            "docs_per_block": DOCS_PER_BLOCK,
+            "stopwords": sorted(stopwords)
+        }, separators=(',', ':'))
+        atomic_files.write_json(os.path.join(search_dir, "catalog.json"), catalog, separators=(',', ':'))
+    return report
+
+
+def search(search_dir, query, limit=10):
+    """Python counterpart of MagazineSearch.search, for checking the index from the command line."""
+    meta = load_json(os.path.join(search_dir, "meta.json"), None)
+    if not meta:
+        return []
+    stopwords = set(meta["stopwords"])
+    tokens = [token for token in suggest_metadata.preprocess_text(query)[0] if token not in stopwords and token not in ('.', '?', '!')]
+    scores = None
+    for position, token in enumerate(tokens):
+        shard = load_json(os.path.join(search_dir, "shards", shard_name(token) + ".json"), {"terms": {}})["terms"]
+        prefix_match = position == len(tokens) - 1 and len(token) >= PREFIX_LENGTH
+        token_scores = {}
+        for term, encoded in shard.items():
+            if term == token or (prefix_match and term.startswith(token)):
+                postings = decode_postings(encoded)
+                idf = math.log(1 + meta["doc_count"] / len(postings))
+                for doc, weight in postings.items():
+                    token_scores[doc] = max(token_scores.get(doc, 0), weight * idf)
+        scores = token_scores if scores is None else {doc: score + token_scores[doc] for doc, score in scores.items() if doc in token_scores}
+    results = []
+    for doc, score in sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))[:limit]:
+        summary = load_json(os.path.join(search_dir, "docs", f"{doc // meta['docs_per_block']}.json"), {"docs": {}})["docs"].get(str(doc))
+        if summary:
+            results.append(dict(summary, score=round(score, 3)))
+    return results
+
+
+def published_articles(router_file_path):
+    """Every published article: the router's inline array (cards expanded to their bundles), or assets/index/articles/ for a migrated router."""
+    with open(router_file_path, 'r', encoding='utf-8') as f:
+        _, articles = article_index.parse_router_articles(f.read())
+    index_dir = article_index.index_dir_for_router(router_file_path)
+    if articles:
+        return article_index.expand_articles(articles, index_dir)
+    return article_index.stored_records(index_dir)
+
+
+if __name__ == "__main__":
+    # `python search_index.py rebuild [router_file_path]` indexes every published article (unchanged ones are skipped);
+    # `remove <article_id> [router_file_path]` drops one; `query "<text>" [router_file_path]` runs a search.
+    args = sys.argv[1:]
+    default_router = "/app/js/magazine-router.js"
+    if args[:1] == ["rebuild"] and len(args) <= 2:
+        router_path = args[1] if len(args) == 2 else default_router
+        articles = published_articles(router_path)
+        search_dir = search_dir_for_router(router_path)
+        stale = set(load_json(os.path.join(search_dir, "catalog.json"), {}).get("docs", {})) - {a.get("id") for a in articles}
+        print(json.dumps(update_search_index(articles, search_dir, removed_ids=sorted(stale), site_root=site_root_for_router(router_path))))
+    elif args[:1] == ["remove"] and len(args) in (2, 3):
+        router_path = args[2] if len(args) == 3 else default_router
+        print(json.dumps(update_search_index([], search_dir_for_router(router_path), removed_ids=[args[1]])))
+    elif args[:1] == ["query"] and len(args) in (2, 3):
+        router_path = args[2] if len(args) == 3 else default_router
+        print(json.dumps({"results": search(search_dir_for_router(router_path), args[1])}))
+    else:
+        print(json.dumps({"errors": ["Usage: python search_index.py rebuild [router_file_path] | remove <article_id> [router_file_path] | query \"<text>\" [router_file_path]"]}))
+        sys.exit(1)
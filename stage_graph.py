@@ -0,0 +1,122 @@
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Declared per-article stage dependencies (process_markdown has already run for every article).
+# The suggestion stages only read the staged metadata/HTML and each asset stage touches a different asset type,
+# so they can run side by side; image derivatives and media probing need the staged assets, assembly needs
+# everything, and finalize needs the assembled package. update_router_article is not scheduled per article:
+# pipeline.py applies every finalized article to the router in one batch update once the graph has run.
+STAGE_DEPENDENCIES = {
+    "suggest_metadata": [],
+    "suggest_visuals": [],
+    "process_image_assets": [],
+    "generate_image_derivatives": ["process_image_assets"],
+    "process_audio_assets": [],
+    "process_document_assets": [],
+    "probe_media": ["process_image_assets", "process_audio_assets", "process_document_assets"],
+    "assemble_review_package": ["suggest_metadata", "suggest_visuals", "process_image_assets", "generate_image_derivatives", "process_audio_assets", "process_document_assets", "probe_media"],
+    "finalize_data_and_assets": ["assemble_review_package"],
+    "update_router_article": ["finalize_data_and_assets"],
+}
+
+# Declared stage order; used wherever a deterministic order is needed (merging, reporting)
+STAGE_ORDER = list(STAGE_DEPENDENCIES)
+
+
+def stage_ancestors(stage_name, present_stages):
+    """All transitive dependencies of stage_name that are part of this article's plan, in declared stage order."""
+    ancestors = set()
+    pending = list(STAGE_DEPENDENCIES.get(stage_name, []))
+    while pending:
+        dependency = pending.pop()
+        if dependency not in ancestors:
+            ancestors.add(dependency)
+            pending.extend(STAGE_DEPENDENCIES.get(dependency, []))
+    return [name for name in STAGE_ORDER if name in ancestors and name in present_stages]
+
+
+def compute_delta(before, after):
+    """The top-level metadata keys a stage set or removed, as {"set": {...}, "removed": [...]}."""
+    return {
+        "set": {key: copy.deepcopy(value) for key, value in after.items() if key not in before or before[key] != value},
+        "removed": sorted(key for key in before if key not in after)
+    }
+
+
+def apply_deltas(base_metadata, deltas):
+    """
+    Applies (stage_name, delta) pairs in the order given to a copy of base_metadata.
+    Returns (merged_metadata, conflicts); a conflict is two stages setting the same key to different values,
+    in which case the stage listed first keeps the key, so the outcome never depends on which finished last.
+    """
+    merged = copy.deepcopy(base_metadata)
+    owners = {}
+    conflicts = []
+    for stage_name, delta in deltas:
+        for key, value in delta["set"].items():
+            if key in owners and merged.get(key) != value:
+                conflicts.append(f"Stages '{owners[key]}' and '{stage_name}' both set metadata field '{key}'; kept the value from '{owners[key]}'.")
+                continue
+            owners.setdefault(key, stage_name)
+            merged[key] = copy.deepcopy(value)
+        for key in delta["removed"]:
+            if key not in owners:
+                merged.pop(key, None)
+    return merged, conflicts
+
+
+def run_graph(tasks, threads=1):
+    """
+    Runs a dependency graph of tasks on a bounded thread pool.
+    tasks: ordered dict of task_id -> (dependency_task_ids, fn, lock_key). A task is submitted as soon as all of
+    its dependencies have finished; tasks sharing a non-None lock_key (e.g. a batch-level output file)
+    never run at the same time. Tasks whose dependency raised are not run.
+    Returns task_id -> ("ok", value) | ("error", exception) | ("skipped", None).
+    """
+    locks = {}
+    for _, _, lock_key in tasks.values():
+        if lock_key is not None:
+            locks.setdefault(lock_key, threading.Lock())
+
+    def guarded(fn, lock_key):
+        if lock_key is None:
+            return fn()
+        with locks[lock_key]:
+            return fn()
+
+    outcomes = {}
+    waiting = {task_id: [d for d in deps if d in tasks] for task_id, (deps, _, _) in tasks.items()}
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        running = {}
+
+        def submit_ready():
+            for task_id in list(waiting):
+                deps = waiting[task_id]
+                if any(outcomes.get(d, ("pending",))[0] in ("error", "skipped") for d in deps):
+                    outcomes[task_id] = ("skipped", None)
+                    del waiting[task_id]
+                elif all(d in outcomes for d in deps):
+                    _, fn, lock_key = tasks[task_id]
+                    running[executor.submit(guarded, fn, lock_key)] = task_id
+                    del waiting[task_id]
+
+        submit_ready()
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                task_id = running.pop(future)
+                try:
+                    outcomes[task_id] = ("ok", future.result())
+                except Exception as e: # pylint: disable=broad-except
+                    outcomes[task_id] = ("error", e)
+            submit_ready()
+            # Skipping can cascade without anything left running
+            while waiting and not running:
+                before = len(waiting)
+                submit_ready()
+                if len(waiting) == before:
+                    break
+
+    return outcomes
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import re
+import sys
+
+import atomic_files
+
+# STYLE_GUIDANCE.md compiled once into the rule tables suggest_visuals.py and suggest_metadata.py use, instead of
+# each of them re-parsing the Markdown for every article. The tables are memoized per process by the file's
+# (size, mtime) and persisted in an artifact keyed by the sha256 of the guide, so a fresh process (or a touched but
+# unchanged guide) loads them without parsing. Bump STYLE_RULES_FORMAT_VERSION whenever the parsing below changes.
+STYLE_RULES_CACHE_PATH = "/app/content_pipeline/style_rules.json"
+STYLE_RULES_FORMAT_VERSION = 1
+
+DEFAULT_STYLE_GUIDANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "STYLE_GUIDANCE.md")
+
+_MOOD_SECTION = re.compile(r'###\s*Visual Mood Keyword Mapping for AI Suggestions([\s\S]*?)(?=###|\Z)', re.IGNORECASE)
+# Lines like: *   **keyword**: param(value), param2(+value)
+_MOOD_RULE = re.compile(r'^\s*\*\s*\*\*(.+?)\*\*\s*:\s*(.+?)\s*$', re.MULTILINE)
+_MOOD_PARAM = re.compile(r'([a-zA-Z0-9._]+)\s*\(([-+*/]?\s*".*?"|[-+*/]?\s*[\d.]+)\)') # Quoted strings or numbers with ops
+_SECTION = re.compile(r'###\s*([A-Za-z0-9\s&_()-]+?)\s*\n([\s\S]*?)(?=###|\Z)', re.IGNORECASE)
+_LIST_ITEM = re.compile(r'^\s*[\*\-]\s*(.+)', re.MULTILINE)
+_EMA_SECTION = re.compile(r'##\s*1\.\s*Core Aesthetic Philosophy[\s\S]*?###\s*EMA Principles in Visual Design([\s\S]*?)(?=##|\Z)', re.IGNORECASE | re.MULTILINE)
+_EMA_PRINCIPLE = re.compile(r'^\s*-\s*\*\*(.*?)\*\*:', re.MULTILINE)
+GENERIC_STYLE_TERMS = {"name", "primary", "secondary", "accent", "background", "mood", "color shift", "intensity", "particle count", "animation style", "visual complexity"}
+
+_compiled = {} # Absolute guide path -> {"stamp": [size, mtime_ns], "rules": ...} for this process
+
+
+def parse_visual_mood_rules(content):
+    """keyword -> {param: {"value": v, "op": None|'+'|'-'|'*'|'/'}} from the "Visual Mood Keyword Mapping" section."""
+    rules = {}
+    mapping_section_match = _MOOD_SECTION.search(content)
+    if not mapping_section_match:
+        return rules
+
+    for match in _MOOD_RULE.finditer(mapping_section_match.group(1)):
+        keyword = match.group(1).strip().lower()
+        keyword_rules = {}
+        for p_match in _MOOD_PARAM.finditer(match.group(2)):
+            param_name = p_match.group(1)
+            value_str = p_match.group(2).strip()
+
+            op = None
+            actual_value_str = value_str
+            if value_str.startswith(('+', '-', '*', '/')):
+                op = value_str[0]
+                actual_value_str = value_str[1:].strip()
+
+            # Try to convert to number, else it's a string (remove quotes if any)
+            try:
+                if '.' in actual_value_str:
+                    val = float(actual_value_str)
+                else:
+                    val = int(actual_value_str)
+            except ValueError:
+                val = actual_value_str.strip('"')
+
+            keyword_rules[param_name] = {"value": val, "op": op}
+        rules[keyword] = keyword_rules
+    return rules
+
+
+def parse_ema_principles(content):
+    """Lowercased principle names listed under "EMA Principles in Visual Design"."""
+    ema_principles_match = _EMA_SECTION.search(content.lower())
+    if not ema_principles_match:
+        return []
+    return [principle.strip() for principle in _EMA_PRINCIPLE.findall(ema_principles_match.group(1))]
+
+
+def parse_style_guide_keywords(content):
+    """Sorted keywords (theme/modifier names, list item labels, EMA principles) suggest_metadata matches articles against."""
+    content = content.lower()
+    keywords = set()
+    for section_name, section_body in _SECTION.findall(content):
+        section_name = section_name.strip()
+        if "theme" in section_name or "modifier" in section_name: # The heading itself names a theme/modifier
+            keywords.add(section_name.replace("theme", "").replace("modifier", "").strip())
+
+        # e.g. "*   Primary: Deep Blue (H:210, S:85, L:25)" -> "primary"
+        for item in _LIST_ITEM.findall(section_body):
+            match = re.match(r'([A-Za-z\s]+):', item)
+            if match:
+                keywords.add(match.group(1).strip())
+            else: # If no colon, maybe it's a direct keyword list
+                for sub_item in (si.strip() for si in item.split(',')):
+                    if sub_item and len(sub_item.split()) <= 3 and re.match(r'[A-Z][a-z]+', sub_item):
+                        keywords.add(sub_item)
+
+    keywords.update(parse_ema_principles(content))
+    return sorted(kw for kw in keywords if kw and kw not in GENERIC_STYLE_TERMS and len(kw) > 3)
+
+
+def compile_style_guidance(content):
+    return {
+        "visual_mood_rules": parse_visual_mood_rules(content),
+        "style_guide_keywords": parse_style_guide_keywords(content),
+        "ema_principles": parse_ema_principles(content)
+    }
+
+
+def _read_artifact(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+        if artifact.get("format_version") == STYLE_RULES_FORMAT_VERSION:
+            return artifact
+    except (OSError, ValueError):
+        pass # Missing or unreadable artifact just means compiling once
+    return {"format_version": STYLE_RULES_FORMAT_VERSION, "guides": {}}
+
+
+def _write_artifact(artifact, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        atomic_files.write_json(cache_path, artifact)
+    except OSError:
+        pass # Not fatal; the next process simply compiles again
+
+
+def load_style_rules(style_guidance_path=DEFAULT_STYLE_GUIDANCE_PATH, cache_path=STYLE_RULES_CACHE_PATH):
+    """
+    The compiled rule tables of a STYLE_GUIDANCE.md (see compile_style_guidance). Callers must not mutate them.
+    Raises OSError if the guide cannot be read.
+    """
+    path = os.path.abspath(style_guidance_path)
+    stat_result = os.stat(path)
+    stamp = [stat_result.st_size, stat_result.st_mtime_ns]
+    known = _compiled.get(path)
+    if known and known["stamp"] == stamp:
+        return known["rules"]
+
+    artifact = _read_artifact(cache_path) if cache_path else None
+    entry = artifact["guides"].get(path) if artifact else None
+    if not entry or entry["stamp"] != stamp:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        source_hash = hashlib.sha256(raw).hexdigest()
+        # Same content (touched, restored or copied elsewhere) reuses its compiled tables
+        entry = next((guide for guide in (artifact["guides"].values() if artifact else ()) if guide["sha256"] == source_hash), None)
+        rules = entry["rules"] if entry else compile_style_guidance(raw.decode('utf-8'))
+        entry = {"stamp": stamp, "sha256": source_hash, "rules": rules}
+        if artifact is not None:
+            artifact["guides"][path] = entry
+            _write_artifact(artifact, cache_path)
+
+    _compiled[path] = entry
+    return entry["rules"]
+
+
+if __name__ == "__main__":
+    # `python style_rules.py [STYLE_GUIDANCE.md]` (re)compiles the artifact and prints a summary of the tables
+    if len(sys.argv) > 2:
+        print(json.dumps({"errors": ["Usage: python style_rules.py [style_guidance_path]"]}))
+        sys.exit(1)
+    guide_path = sys.argv[1] if len(sys.argv) == 2 else DEFAULT_STYLE_GUIDANCE_PATH
+    try:
+        compiled = load_style_rules(guide_path)
+    except OSError as e:
+        print(json.dumps({"errors": [f"Could not read style guidance: {e}"]}))
+        sys.exit(1)
+    print(json.dumps({
+        "style_guidance_path": os.path.abspath(guide_path),
+        "artifact_path": STYLE_RULES_CACHE_PATH,
+        "visual_mood_keywords": sorted(compiled["visual_mood_rules"]),
+        "style_guide_keyword_count": len(compiled["style_guide_keywords"]),
+        "ema_principles": compiled["ema_principles"]
+    }))
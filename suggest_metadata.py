@@ -1,58 +1,144 @@
+import heapq
+import importlib.util
 import json
 import re
 import os
+import subprocess
 import sys
-from collections import Counter
-
-# Attempt to import advanced libraries
-BS4_AVAILABLE = False
-try:
-    from bs4 import BeautifulSoup
-    BS4_AVAILABLE = True
-except ImportError:
-    pass
-
-NLTK_AVAILABLE = False
-NLTK_STOPWORDS = []
+import time
+from array import array
+
+import atomic_files
+import keyword_index
+import style_rules
+
+# BeautifulSoup and NLTK are optional and loaded lazily on first use, so importing this module (or running it on an
+# article with jules_override_ai_suggestions) costs nothing. None means "not resolved yet in this process".
+BS4_AVAILABLE = None
+BeautifulSoup = None
+
+NLTK_AVAILABLE = None
+NLTK_STOPWORDS = frozenset()
 NLTK_SENT_TOKENIZE = None
 NLTK_WORD_TOKENIZE = None
-NLTK_FREQ_DIST = None
-try:
-    import nltk
-    from nltk.tokenize import sent_tokenize, word_tokenize
-    from nltk.tokenize import sent_tokenize, word_tokenize
-    from nltk.corpus import stopwords # Moved import here
-    from nltk.probability import FreqDist # Moved import here
-
-    # Attempt to load NLTK resources and set NLTK_AVAILABLE flag
+
+# Prebuilt artifact holding the resolved NLTK availability and English stopword list, so later starts skip probing
+# the stopwords corpus and punkt. It is rebuilt whenever the NLTK install or its data directories change.
+NLP_RESOURCE_CACHE_PATH = "/app/content_pipeline/nlp_resources.json"
+NLP_RESOURCE_CACHE_FORMAT_VERSION = 1
+
+
+def load_bs4():
+    global BS4_AVAILABLE, BeautifulSoup
+    if BS4_AVAILABLE is None:
+        try:
+            from bs4 import BeautifulSoup as bs4_beautiful_soup
+            BeautifulSoup = bs4_beautiful_soup
+            BS4_AVAILABLE = True
+        except ImportError:
+            BS4_AVAILABLE = False
+    return BS4_AVAILABLE
+
+
+def _mtime_ns(path):
     try:
-        # These assignments will try to use the respective tokenizers/data.
-        # If 'punkt' or 'stopwords' data is missing, a LookupError will be raised here.
-        NLTK_STOPWORDS = stopwords.words('english')
-        _ = sent_tokenize("test sentence.") # Test punkt
-        _ = word_tokenize("test sentence") # Test word tokenizer (which might also use punkt resources)
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _nltk_install_stamp(data_paths):
+    """Cheap fingerprint of the NLTK install and its data directories; never imports nltk."""
+    spec = importlib.util.find_spec("nltk")
+    origin = spec.origin if spec else None
+    return {
+        "nltk_origin": [origin, _mtime_ns(origin)] if origin else None,
+        "nltk_data_env": os.environ.get("NLTK_DATA"),
+        # Downloading a corpus or tokenizer adds an entry under corpora/ or tokenizers/, which bumps their mtime
+        "data_dirs": [[path, _mtime_ns(os.path.join(path, "corpora")), _mtime_ns(os.path.join(path, "tokenizers"))] for path in data_paths]
+    }
+
+
+def _read_nlp_resource_cache():
+    try:
+        with open(NLP_RESOURCE_CACHE_PATH, 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+        if artifact.get("format_version") != NLP_RESOURCE_CACHE_FORMAT_VERSION:
+            return None
+        if artifact.get("stamp") != _nltk_install_stamp(artifact.get("nltk_data_paths", [])):
+            return None
+        return artifact
+    except (OSError, ValueError):
+        return None # Missing or unreadable artifact just means probing once
+
+
+def _write_nlp_resource_cache(nltk_available, stopword_list, data_paths):
+    artifact = {
+        "format_version": NLP_RESOURCE_CACHE_FORMAT_VERSION,
+        "nltk_available": nltk_available,
+        "stopwords": stopword_list,
+        "nltk_data_paths": data_paths,
+        "stamp": _nltk_install_stamp(data_paths)
+    }
+    try:
+        os.makedirs(os.path.dirname(NLP_RESOURCE_CACHE_PATH), exist_ok=True)
+        atomic_files.write_json(NLP_RESOURCE_CACHE_PATH, artifact)
+    except OSError:
+        pass # Not fatal; the next start simply probes again
+
 
-        # If all above succeeded, assign them for use
-        NLTK_SENT_TOKENIZE = sent_tokenize
-        NLTK_WORD_TOKENIZE = word_tokenize
-        NLTK_FREQ_DIST = FreqDist
-        NLTK_AVAILABLE = True
-
-    except LookupError:
-        NLTK_AVAILABLE = False # Explicitly set to False on LookupError
-        # Fallback mechanisms will be used by the script's functions.
-        # No need to attempt nltk.download() here as it's unreliable in sandboxes
-        # and the script is designed with fallbacks.
+def _probe_nltk():
+    """The original start-up probe: load the stopwords corpus and run punkt once. Returns (available, stopwords, data_paths)."""
+    try:
+        import nltk
+        from nltk.tokenize import sent_tokenize, word_tokenize
+        from nltk.corpus import stopwords
     except ImportError: # If NLTK itself is not installed
-        NLTK_AVAILABLE = False
-    except Exception: # Catch any other NLTK-related exception during setup
-        NLTK_AVAILABLE = False
+        return False, [], []
 
-except ImportError: # If the initial `import nltk` fails
-    NLTK_AVAILABLE = False
+    data_paths = [str(path) for path in nltk.data.path]
+    try:
+        # If 'punkt' or 'stopwords' data is missing, a LookupError will be raised here.
+        # No nltk.download() here as it's unreliable in sandboxes and the script is designed with fallbacks.
+        stopword_list = stopwords.words('english')
+        _ = sent_tokenize("test sentence.") # Test punkt
+        _ = word_tokenize("test sentence") # Test word tokenizer (which might also use punkt resources)
+        return True, stopword_list, data_paths
+    except Exception: # pylint: disable=broad-except
+        # LookupError for missing data, or any other NLTK-related exception during setup
+        return False, [], data_paths
+
+
+def load_nlp_resources():
+    """
+    Resolves NLTK availability, stopwords and tokenizers once per process.
+    A valid prebuilt artifact replaces the probe; the tokenizers themselves are only imported when NLTK is usable.
+    """
+    global NLTK_AVAILABLE, NLTK_STOPWORDS, NLTK_SENT_TOKENIZE, NLTK_WORD_TOKENIZE
+    if NLTK_AVAILABLE is not None:
+        return NLTK_AVAILABLE
+
+    artifact = _read_nlp_resource_cache()
+    if artifact is not None:
+        nltk_available, stopword_list = artifact["nltk_available"], artifact["stopwords"]
+    else:
+        nltk_available, stopword_list, data_paths = _probe_nltk()
+        _write_nlp_resource_cache(nltk_available, stopword_list, data_paths)
 
-# Fallback stopwords list if NLTK is not available or fails
-FALLBACK_STOPWORDS = [
+    if nltk_available:
+        try:
+            from nltk.tokenize import sent_tokenize, word_tokenize
+            NLTK_SENT_TOKENIZE = sent_tokenize
+            NLTK_WORD_TOKENIZE = word_tokenize
+            NLTK_STOPWORDS = frozenset(stopword_list)
+        except ImportError: # Artifact outlived the install; fallbacks will be used
+            nltk_available = False
+
+    NLTK_AVAILABLE = nltk_available
+    return NLTK_AVAILABLE
+
+# Fallback stopwords if NLTK is not available or fails
+FALLBACK_STOPWORDS = frozenset([
     "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "as", "at",
     "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can", "did", "do",
     "does", "doing", "down", "during", "each", "few", "for", "from", "further", "had", "has", "have", "having",
@@ -67,11 +153,17 @@ FALLBACK_STOPWORDS = [
     "introduction", "conclusion", "summary", "abstract", "detail", "details", "information", "issue", "issues",
     "solution", "solutions", "problem", "problems", "context", "background", "overview", "analysis", "study",
     "approach", "method", "methods", "result", "results", "discussion", "reference", "references", "appendix"
-]
+])
+SENTENCE_ENDERS = frozenset(('.', '?', '!'))
+
+_NON_WORD = re.compile(r'[^\w\s\.\?!]') # Keep sentence enders for sentence tokenization
+_WORD_RUN = re.compile(r'[^\s\.\?!]+')
+_WHITESPACE = re.compile(r'\s+')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?]) ') # Whitespace is already collapsed to single spaces
 
 
 def extract_text_from_html(html_content):
-    if BS4_AVAILABLE:
+    if load_bs4():
         try:
             soup = BeautifulSoup(html_content, 'html.parser')
             return soup.get_text(separator=' ', strip=True)
@@ -81,141 +173,158 @@ def extract_text_from_html(html_content):
     else:
         return re.sub(r'<[^<]+?>', ' ', html_content)
 
-def preprocess_text(text, use_nltk_stopwords=True):
-    text = text.lower()
-    text = re.sub(r'[^\w\s\.\?!]', '', text) # Keep sentence enders for sentence tokenization
-
+def _words(text):
+    """Words of lowercased text: punctuation other than sentence enders removed, then NLTK's or the basic tokenizer."""
+    text = _NON_WORD.sub('', text)
     if NLTK_AVAILABLE and NLTK_WORD_TOKENIZE:
-        words = NLTK_WORD_TOKENIZE(text)
-    else:
-        # Basic word tokenization: split by space, then filter out empty strings from punctuation removal
-        words = [word for word in re.split(r'[\s\.\?!]+', text) if word]
+        return NLTK_WORD_TOKENIZE(text)
+    # Basic word tokenization: split by space and sentence enders, dropping the empty strings between them
+    return _WORD_RUN.findall(text)
 
-    current_stopwords = NLTK_STOPWORDS if NLTK_AVAILABLE and use_nltk_stopwords else FALLBACK_STOPWORDS
 
-    # Remove stopwords for frequency analysis, but keep them for excerpt generation (handled later)
-    # For general keywords, remove stopwords
-    # For sentence scoring, we might want to keep stopwords initially or use a different list.
-    # This version removes stopwords for keyword extraction.
+def preprocess_text(text, use_nltk_stopwords=True):
+    load_nlp_resources()
+    words = _words(text.lower())
 
-    # For keyword extraction, further remove sentence enders that became part of words
-    words_for_keywords = [word for word in words if word not in current_stopwords and word not in ['.','?','!']]
+    current_stopwords = NLTK_STOPWORDS if NLTK_AVAILABLE and use_nltk_stopwords else FALLBACK_STOPWORDS
+
+    # Stopwords and stray sentence enders removed for keyword extraction; the raw words are returned as well
+    words_for_keywords = [word for word in words if word not in current_stopwords and word not in SENTENCE_ENDERS]
 
     return words, words_for_keywords # Return both for different uses
 
-def generate_excerpt(full_text, title_text, top_n_keywords, max_chars=250):
-    # Use full_text with punctuation for sentence tokenization
-    text_for_sentences = full_text.lower()
-    text_for_sentences = re.sub(r'\s+', ' ', text_for_sentences).strip() # Normalize whitespace
 
+def _sentence_spans(text):
     if NLTK_AVAILABLE and NLTK_SENT_TOKENIZE:
-        sentences = NLTK_SENT_TOKENIZE(text_for_sentences)
-    else:
-        sentences = re.split(r'(?<=[.!?])\s+', text_for_sentences) # Basic split
-        sentences = [s.strip() for s in sentences if s.strip()]
-
+        spans = []
+        cursor = 0
+        for sentence in NLTK_SENT_TOKENIZE(text):
+            # punkt returns slices of the text, so each sentence is found right after the previous one
+            start = text.find(sentence, cursor)
+            if start < 0:
+                start = cursor
+            cursor = max(cursor, start + len(sentence))
+            spans.append((start, cursor))
+        return [(start, end) for start, end in spans if start < end]
+    spans = []
+    start = 0
+    for match in _SENTENCE_BREAK.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+def analyze_text(full_text):
+    """
+    Tokenizes an article's plain text once for both keyword counting and excerpt scoring. Returns a dict with the
+    lowercased, whitespace-collapsed "text"; its "sentences" as (start, end) spans; "tokens", the term id of every
+    non-stopword in order; "sentence_tokens", where each sentence's tokens start in "tokens" (one more entry than
+    sentences); and "terms", "term_ids" and "counts", the distinct terms by id and how often each occurs.
+    """
+    load_nlp_resources()
+    text = _WHITESPACE.sub(' ', full_text.lower()).strip()
+    stopwords = NLTK_STOPWORDS if NLTK_AVAILABLE else FALLBACK_STOPWORDS
+    sentences = _sentence_spans(text)
+
+    term_ids = {} # Term -> id, or -1 for a stopword, so each distinct word is checked against the stopwords once
+    terms = []
+    counts = array('l')
+    tokens = array('l')
+    sentence_tokens = array('l', [0])
+    for start, end in sentences:
+        for word in _words(text[start:end]):
+            term_id = term_ids.get(word)
+            if term_id is None:
+                term_id = -1 if word in stopwords or word in SENTENCE_ENDERS else len(terms)
+                term_ids[word] = term_id
+                if term_id >= 0:
+                    terms.append(word)
+                    counts.append(0)
+            if term_id >= 0:
+                tokens.append(term_id)
+                counts[term_id] += 1
+        sentence_tokens.append(len(tokens))
+
+    return {"text": text, "sentences": sentences, "tokens": tokens, "sentence_tokens": sentence_tokens,
+            "terms": terms, "term_ids": term_ids, "counts": counts}
+
+
+def generate_excerpt(full_text, title_text, top_n_keywords, max_chars=250, analysis=None):
+    # analysis: optional analyze_text(full_text) result, so the text is tokenized only once
+    if analysis is None:
+        analysis = analyze_text(full_text)
+    text, sentences = analysis["text"], analysis["sentences"]
     if not sentences:
         return ""
 
     title_keywords = set(preprocess_text(title_text, use_nltk_stopwords=False)[1]) # Get keywords from title
 
+    # What each term adds to a sentence containing it: 3 for a title keyword (higher bonus), 1 for a top keyword
+    term_ids = analysis["term_ids"]
+    weights = array('l', [0]) * len(analysis["terms"])
+    for keyword in title_keywords:
+        if term_ids.get(keyword, -1) >= 0:
+            weights[term_ids[keyword]] += 3
+    for keyword in top_n_keywords:
+        if term_ids.get(keyword, -1) >= 0:
+            weights[term_ids[keyword]] += 1
+
+    tokens, sentence_tokens = analysis["tokens"], analysis["sentence_tokens"]
+    last_seen = array('l', [-1]) * len(weights) # Sentence a term was last counted in, so it counts once per sentence
     sentence_scores = []
-    for i, sentence in enumerate(sentences):
+    for i, (start, end) in enumerate(sentences):
         score = 0
-        # Tokenize sentence here for scoring
-        sentence_words = set(preprocess_text(sentence, use_nltk_stopwords=True)[1])
-
-        for keyword in title_keywords:
-            if keyword in sentence_words:
-                score += 3 # Higher bonus for title keywords
-        for keyword in top_n_keywords:
-            if keyword in sentence_words:
-                score += 1
+        for term_id in tokens[sentence_tokens[i]:sentence_tokens[i + 1]]:
+            if last_seen[term_id] != i:
+                last_seen[term_id] = i
+                score += weights[term_id]
 
         score -= i * 0.1 # Slight penalty for later sentences
 
         # Bonus for length (up to a point)
-        if 50 < len(sentence) < 200 : score += 0.5
+        if 50 < end - start < 200 : score += 0.5
 
-        sentence_scores.append((score, sentence))
+        sentence_scores.append(score)
 
-    sentence_scores.sort(key=lambda x: x[0], reverse=True)
-
-    # Take top 1-3 sentences, ensure it's not too long
-    excerpt = ""
-    if sentence_scores:
-        if len(sentence_scores[0][1]) > max_chars * 0.66: # If the best sentence is already long
-             excerpt = sentence_scores[0][1]
-        else: # Try to combine first 2-3 sentences
-            excerpt = sentence_scores[0][1]
-            if len(sentence_scores) > 1 and len(excerpt) + len(sentence_scores[1][1]) + 1 < max_chars:
-                excerpt += " " + sentence_scores[1][1]
-            if len(sentence_scores) > 2 and len(excerpt) + len(sentence_scores[2][1]) + 1 < max_chars:
-                 excerpt += " " + sentence_scores[2][1]
+    # Take top 1-3 sentences (highest score first, earlier sentence on ties), ensure it's not too long
+    best = [text[sentences[i][0]:sentences[i][1]] for i in heapq.nlargest(3, range(len(sentence_scores)), key=sentence_scores.__getitem__)]
+    if len(best[0]) > max_chars * 0.66: # If the best sentence is already long
+        excerpt = best[0]
+    else: # Try to combine first 2-3 sentences
+        excerpt = best[0]
+        if len(best) > 1 and len(excerpt) + len(best[1]) + 1 < max_chars:
+            excerpt += " " + best[1]
+        if len(best) > 2 and len(excerpt) + len(best[2]) + 1 < max_chars:
+            excerpt += " " + best[2]
 
     return excerpt[:max_chars].strip() + "..." if len(excerpt) > max_chars else excerpt.strip()
 
 
 def extract_keywords_from_style_guide(style_guidance_path):
-    keywords = set()
+    # Theme/modifier names, list item labels and EMA principles, compiled once per guide content by style_rules.py
     try:
-        with open(style_guidance_path, 'r', encoding='utf-8') as f:
-            content = f.read().lower()
-
-        # Look for terms under specific headings, e.g., theme names, EMA principles
-        # This regex is basic; could be more sophisticated
-        found_sections = re.findall(r'###\s*([A-Za-z0-9\s&_()-]+?)\s*\n([\s\S]*?)(?=###|\Z)', content, re.IGNORECASE)
-        # Found sections from theme palletes: [('Digital Sovereignty', '* Primary: Deep Blue...'), ... ]
-        for section_tuple in found_sections:
-            section_name = section_tuple[0].strip()
-            if "theme" in section_name.lower() or "modifier" in section_name.lower(): # If it's a theme/modifier heading
-                # The section_name itself is a keyword (e.g. "Digital Sovereignty" theme name)
-                keywords.add(section_name.replace("theme","").replace("modifier","").strip())
-
-            # Extract keywords from list items or bolded text within sections
-            # This is a simplified heuristic
-            list_items = re.findall(r'^\s*[\*\-]\s*(.+)', section_tuple[1], re.MULTILINE)
-            for item in list_items:
-                # Take first few words of list item if it's descriptive
-                # e.g. "*   Primary: Deep Blue (H:210, S:85, L:25)" -> "Primary"
-                # or "*   Digital Sovereignty: Design should be clear..." -> "Digital Sovereignty"
-                match = re.match(r'([A-Za-z\s]+):', item)
-                if match:
-                    keywords.add(match.group(1).strip())
-                else: # If no colon, maybe it's a direct keyword list
-                    # Try to split and take capitalized words or short phrases
-                    sub_items = [si.strip() for si in item.split(',') if si.strip()]
-                    for si in sub_items:
-                        if len(si.split()) <=3 and re.match(r'[A-Z][a-z]+', si): # Simple filter
-                             keywords.add(si)
-
-        # Add EMA principles
-        ema_principles_match = re.search(r'##\s*1\.\s*Core Aesthetic Philosophy[\s\S]*?###\s*EMA Principles in Visual Design([\s\S]*?)(?=##|\Z)', content, re.IGNORECASE | re.MULTILINE)
-        if ema_principles_match:
-            ema_content = ema_principles_match.group(1)
-            principle_items = re.findall(r'^\s*-\s*\*\*(.*?)\*\*:', ema_content, re.MULTILINE)
-            for principle in principle_items:
-                keywords.add(principle.strip())
-
+        return set(style_rules.load_style_rules(style_guidance_path)["style_guide_keywords"])
     except Exception: # pylint: disable=broad-except
-        # If file not found or regex error, return empty set
-        pass
-    # Filter out generic terms
-    generic_terms = {"name", "primary", "secondary", "accent", "background", "mood", "color shift", "intensity", "particle count", "animation style", "visual complexity"}
-    return {kw for kw in keywords if kw and kw not in generic_terms and len(kw) > 3}
+        # If file not found or unreadable, return empty set
+        return set()
 
 
-def generate_suggestions(metadata_file_path, content_file_path, style_guidance_path):
+def generate_suggestions(metadata_file_path, content_file_path, style_guidance_path, metadata=None):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading metadata_file_path
+    # The article's terms are recorded in keyword_index; callers persist them with keyword_index.save_index()
     suggestions_made = {}
     errors = []
     status_message = ""
 
-    try:
-        with open(metadata_file_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except Exception as e: # pylint: disable=broad-except
-        errors.append(f"Error loading metadata: {e}")
-        return None, {}, "Error loading metadata.", errors
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as e: # pylint: disable=broad-except
+            errors.append(f"Error loading metadata: {e}")
+            return None, {}, "Error loading metadata.", errors
 
     if metadata.get("jules_override_ai_suggestions") is True:
         status_message = "AI suggestions overridden by 'jules_override_ai_suggestions'."
@@ -233,17 +342,15 @@ def generate_suggestions(metadata_file_path, content_file_path, style_guidance_p
         errors.append("Extracted text content is empty.")
         return metadata, {}, "Extracted text content is empty.", errors
 
-    # Preprocess for keywords (stopwords removed)
-    _, processed_text_keywords = preprocess_text(plain_text_content)
-
-    # Calculate word frequencies
-    if NLTK_AVAILABLE and NLTK_FREQ_DIST:
-        freq_dist = NLTK_FREQ_DIST(processed_text_keywords)
-    else:
-        freq_dist = Counter(processed_text_keywords)
+    # One tokenization pass (stopwords removed) shared by keyword ranking and excerpt scoring
+    analysis = analyze_text(plain_text_content)
 
-    top_keywords_with_freq = freq_dist.most_common(20)
-    top_keywords = [kw[0] for kw in top_keywords_with_freq]
+    # Keywords ranked by TF-IDF against every indexed article, this one included, so words used all over the site
+    # sink below the ones particular to this article (with an empty index this is plain frequency order)
+    doc_id = metadata.get("id") or os.path.splitext(os.path.basename(content_file_path))[0]
+    keyword_index.index_document(doc_id, analysis["terms"])
+    top_keywords_with_scores = keyword_index.rank_terms(analysis["terms"], analysis["counts"], 20)
+    article_keywords = [kw[0] for kw in top_keywords_with_scores]
 
 
     # Excerpt Suggestion
@@ -251,7 +358,7 @@ def generate_suggestions(metadata_file_path, content_file_path, style_guidance_p
     if not current_excerpt or len(current_excerpt) < 50: # Threshold to trigger suggestion
         title_text = metadata.get("title", "")
         # Use plain_text_content (not preprocessed) for excerpt generation
-        suggested_excerpt = generate_excerpt(plain_text_content, title_text, top_keywords[:10])
+        suggested_excerpt = generate_excerpt(plain_text_content, title_text, article_keywords[:10], analysis=analysis)
         if suggested_excerpt:
             suggestions_made["suggested_excerpt"] = suggested_excerpt
 
@@ -259,12 +366,12 @@ def generate_suggestions(metadata_file_path, content_file_path, style_guidance_p
     current_category = metadata.get("category", "")
     current_tags = metadata.get("tags", [])
     if not current_category or not current_tags or len(current_tags) < 3:
-        style_guide_keywords = extract_keywords_from_style_guide(style_guidance_path)
+        style_guide_keywords = sorted(extract_keywords_from_style_guide(style_guidance_path)) # Stable order, so the suggestions are too
 
         suggested_categories = []
         matched_core_concepts = []
 
-        for kw, _ in top_keywords_with_freq[:10]: # Check top 10 article keywords
+        for kw in article_keywords[:10]: # Check top 10 article keywords
             for core_kw in style_guide_keywords:
                 if kw == core_kw.lower() or kw in core_kw.lower().split(): # Simple match
                     matched_core_concepts.append(core_kw)
@@ -277,15 +384,15 @@ def generate_suggestions(metadata_file_path, content_file_path, style_guidance_p
         if not suggested_categories and style_guide_keywords:
              # Fallback: use a couple of general style guide keywords as categories
             broad_categories = [kw for kw in style_guide_keywords if " " in kw or kw.istitle()] # Prefer multi-word or titled
-            suggested_categories = list(broad_categories)[:2]
+            suggested_categories = broad_categories[:2]
 
 
-        suggested_tags = list(set(top_keywords[:5] + matched_core_concepts[:3]))[:7] # Mix of content keywords and matched concepts
+        suggested_tags = list(dict.fromkeys(article_keywords[:5] + matched_core_concepts[:3]))[:7] # Mix of content keywords and matched concepts, best first
 
         if suggested_categories:
-            suggestions_made["suggested_categories"] = list(set(suggested_categories)) # Ensure unique
+            suggestions_made["suggested_categories"] = list(dict.fromkeys(suggested_categories)) # Ensure unique
         if suggested_tags:
-            suggestions_made["suggested_tags"] = list(set(suggested_tags)) # Ensure unique
+            suggestions_made["suggested_tags"] = suggested_tags
 
     if suggestions_made:
         if "ai_suggestions" not in metadata:
@@ -298,25 +405,20 @@ def generate_suggestions(metadata_file_path, content_file_path, style_guidance_p
     return metadata, suggestions_made, status_message, errors
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print(json.dumps({
-            "updated_metadata_file_path": None,
-            "suggestions_made": {},
-            "editorial_ai_message": "Error: Incorrect arguments. Usage: python suggest_metadata.py <metadata_file_path> <content_file_path> <style_guidance_path>",
-            "errors": ["Incorrect number of arguments provided."]
-        }))
-        sys.exit(1)
-
-    meta_path = sys.argv[1]
-    content_path = sys.argv[2]
-    style_path = sys.argv[3]
-
-    final_metadata, suggestions, message, errors_list = generate_suggestions(meta_path, content_path, style_path)
+def stage_result(meta_path, content_path, style_path, metadata=None, save_metadata=True):
+    """
+    Runs generate_suggestions, writes the metadata back if suggestions were made,
+    and returns the same result dict the CLI prints.
+    With save_metadata=False the caller persists the updated metadata (pipeline.py merges concurrent stage updates).
+    """
+    final_metadata, suggestions, message, errors_list = generate_suggestions(meta_path, content_path, style_path, metadata=metadata)
 
-    if final_metadata and suggestions: # Only write if suggestions were made and added
+    if final_metadata and suggestions and not save_metadata:
+        updated_path = meta_path # Persisted by the caller
+        final_message = f"Metadata updated with AI suggestions. {message}"
+    elif final_metadata and suggestions: # Only write if suggestions were made and added
         try:
-            with open(meta_path, 'w', encoding='utf-8') as f:
+            with atomic_files.atomic_open(meta_path) as f:
                 json.dump(final_metadata, f, indent=4)
             updated_path = meta_path
             final_message = f"Metadata updated with AI suggestions. {message}"
@@ -334,11 +436,105 @@ if __name__ == "__main__":
         updated_path = None
         final_message = message
 
-    print(json.dumps({
+    return {
         "updated_metadata_file_path": updated_path,
         "suggestions_made": suggestions,
         "editorial_ai_message": final_message,
         "errors": errors_list,
-        "nltk_available_in_script": NLTK_AVAILABLE, # For debugging sandbox
+        "nltk_available_in_script": NLTK_AVAILABLE, # For debugging sandbox; None if no NLP was needed this run
         "bs4_available_in_script": BS4_AVAILABLE
-    }))
+    }
+
+
+# Runs in a fresh interpreter per sample so every measurement is a true cold start
+STARTUP_BENCHMARK_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import suggest_metadata
+imported = time.perf_counter()
+suggest_metadata.NLP_RESOURCE_CACHE_PATH = sys.argv[1]
+suggest_metadata.load_nlp_resources()
+suggest_metadata.load_bs4()
+resolved = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "resources_ms": (resolved - imported) * 1000,
+                  "nltk_available": suggest_metadata.NLTK_AVAILABLE, "bs4_available": suggest_metadata.BS4_AVAILABLE}))
+"""
+
+
+def benchmark_startup(runs=5):
+    """
+    Measures start-up cost in fresh interpreters: module import, then resolving the NLP resources either by probing
+    (no artifact, the old behaviour on every start) or from a warm prebuilt artifact. Reports medians in milliseconds.
+    The real artifact is left alone; each sample uses a scratch artifact path.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    scratch_dir = os.path.join(os.path.dirname(NLP_RESOURCE_CACHE_PATH), ".nlp_benchmark")
+    os.makedirs(scratch_dir, exist_ok=True)
+    warm_artifact = os.path.join(scratch_dir, "warm.json")
+    cold_artifact = os.path.join(scratch_dir, "cold.json")
+
+    def sample(artifact_path):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_BENCHMARK_SNIPPET, artifact_path],
+                                cwd=script_dir, capture_output=True, text=True, check=True).stdout
+        timings = json.loads(output)
+        timings["process_ms"] = (time.perf_counter() - started) * 1000
+        return timings
+
+    def median(values):
+        ordered = sorted(values)
+        middle = len(ordered) // 2
+        return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+    samples = {"cold_probe": [], "warm_artifact": []}
+    sample(warm_artifact) # Build the warm artifact
+    for _ in range(runs):
+        if os.path.exists(cold_artifact):
+            os.remove(cold_artifact)
+        samples["cold_probe"].append(sample(cold_artifact))
+        samples["warm_artifact"].append(sample(warm_artifact))
+
+    for path in (warm_artifact, cold_artifact):
+        if os.path.exists(path):
+            os.remove(path)
+    os.rmdir(scratch_dir)
+
+    report = {"runs": runs}
+    for name, timings in samples.items():
+        report[name] = {key: round(median([t[key] for t in timings]), 2) for key in ("import_ms", "resources_ms", "process_ms")}
+    report["nltk_available"] = samples["warm_artifact"][0]["nltk_available"]
+    report["bs4_available"] = samples["warm_artifact"][0]["bs4_available"]
+    return report
+
+
+if __name__ == "__main__":
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    sys.argv = [a for a in sys.argv if a != "--cache"]
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "--benchmark-startup":
+        # python suggest_metadata.py --benchmark-startup [runs]
+        print(json.dumps(benchmark_startup(int(sys.argv[2]) if len(sys.argv) == 3 else 5)))
+        sys.exit(0)
+
+    if len(sys.argv) != 4:
+        print(json.dumps({
+            "updated_metadata_file_path": None,
+            "suggestions_made": {},
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python suggest_metadata.py <metadata_file_path> <content_file_path> <style_guidance_path> [--cache] (or --benchmark-startup [runs])",
+            "errors": ["Incorrect number of arguments provided."]
+        }))
+        sys.exit(1)
+
+    meta_path = sys.argv[1]
+    content_path = sys.argv[2]
+    style_path = sys.argv[3]
+
+    if use_cache_arg:
+        import build_cache
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "suggest_metadata", meta_path,
+            [build_cache.hash_file(content_path), build_cache.hash_file(style_path), build_cache.code_version(keyword_index)],
+            lambda: stage_result(meta_path, content_path, style_path))
+    else:
+        cli_result = stage_result(meta_path, content_path, style_path)
+    keyword_index.save_index()
+    print(json.dumps(cli_result))
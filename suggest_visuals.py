@@ -2,6 +2,20 @@ import json
 import re
 import os
 import sys
+import time
+from collections import deque
+
+import atomic_files
+import image_palette
+import style_rules
+
+# NumPy is optional: without it theme_params_batch folds each article through apply_rules instead
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
 
 # Default parameters, conceptually from a generic or 'home' section modifier
 # These would be the starting point before applying keyword-based adjustments.
@@ -31,64 +45,39 @@ COLOR_NAME_TO_HSL_HUE = {
 }
 
 def parse_style_guidance_rules(style_guidance_path):
-    rules = {}
+    # Compiled once per guide content by style_rules.py rather than re-parsed for every article
     try:
-        with open(style_guidance_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Find the "Visual Mood Keyword Mapping" section
-        mapping_section_match = re.search(r'###\s*Visual Mood Keyword Mapping for AI Suggestions([\s\S]*?)(?=###|\Z)', content, re.IGNORECASE)
-        if not mapping_section_match:
-            return {}
-
-        section_content = mapping_section_match.group(1)
-
-        # Regex to find lines like: *   **keyword**: param(value), param2(+value)
-        rule_pattern = re.compile(r'^\s*\*\s*\*\*(.+?)\*\*\s*:\s*(.+?)\s*$', re.MULTILINE)
-        param_pattern = re.compile(r'([a-zA-Z0-9._]+)\s*\(([-+*/]?\s*".*?"|[-+*/]?\s*[\d.]+)\)') # Handles quoted strings or numbers with ops
-
-        for match in rule_pattern.finditer(section_content):
-            keyword = match.group(1).strip().lower()
-            params_str = match.group(2)
-
-            keyword_rules = {}
-            for p_match in param_pattern.finditer(params_str):
-                param_name = p_match.group(1)
-                value_str = p_match.group(2).strip()
-
-                op = None
-                actual_value_str = value_str
-
-                if value_str.startswith(('+', '-', '*', '/')):
-                    op = value_str[0]
-                    actual_value_str = value_str[1:].strip()
-
-                # Try to convert to number, else it's a string (remove quotes if any)
-                try:
-                    if '.' in actual_value_str:
-                        val = float(actual_value_str)
-                    else:
-                        val = int(actual_value_str)
-                except ValueError:
-                    val = actual_value_str.strip('"') # String value
-
-                keyword_rules[param_name] = {"value": val, "op": op}
-            rules[keyword] = keyword_rules
+        return style_rules.load_style_rules(style_guidance_path)["visual_mood_rules"]
     except Exception as e:
-        # Log error if needed, for now, just return empty rules on failure
         print(f"Error parsing style guidance: {e}", file=sys.stderr) # Optional debug
-        pass
-    return rules
+        return {}
+
+# Header images are read from the incoming batch (the stage runs before process_image_assets stages them)
+APP_ROOT = "/app"
+INCOMING_ROOT = "/app/content_pipeline/incoming"
+
+# visual_mood strings and rule keywords are split into words the same way, so "blue_focus", "blue focus" and
+# "blue-focus" are the same phrase
+MOOD_TOKEN_SPLIT = re.compile(r'[\s,_-]+')
+HEX_COLOR = re.compile(r'^#([0-9a-fA-F]{3}){1,2}$')
+
+# The compiled matcher for the last rule table seen, as one (rules, matcher) tuple so threads swap it atomically
+_mood_matcher = (None, None)
+
+
+def mood_tokens(text):
+    return [kw for kw in MOOD_TOKEN_SPLIT.split(text.lower()) if kw]
+
 
 def parse_visual_mood(visual_mood_str):
-    mood_str = visual_mood_str.lower()
-    # Basic tokenization: split by space, comma, underscore. Remove empty.
-    keywords = [kw.strip() for kw in re.split(r'[\s,_-]+', mood_str) if kw.strip()]
+    return split_color_hints(mood_tokens(visual_mood_str))
+
 
+def split_color_hints(keywords):
     color_hints = {"hex": [], "name": []}
     # Very basic hex color detection
     for kw in keywords:
-        if re.match(r'^#([0-9a-fA-F]{3}){1,2}$', kw):
+        if HEX_COLOR.match(kw):
             color_hints["hex"].append(kw)
         elif kw in COLOR_NAME_TO_HSL_HUE:
              color_hints["name"].append(kw)
@@ -97,6 +86,112 @@ def parse_visual_mood(visual_mood_str):
     general_keywords = [kw for kw in keywords if kw not in color_hints["hex"] and kw not in color_hints["name"]]
     return general_keywords, color_hints
 
+
+def build_mood_matcher(mood_rules):
+    """
+    Word-level Aho-Corasick automaton over the rule keywords: goto transitions per state, failure links, and the
+    (keyword, word count) outputs ending at each state (including those reached through failure links).
+    """
+    goto = [{}]
+    outputs = [[]]
+    for keyword in mood_rules:
+        words = mood_tokens(keyword)
+        if not words:
+            continue
+        state = 0
+        for word in words:
+            if word not in goto[state]:
+                goto[state][word] = len(goto)
+                goto.append({})
+                outputs.append([])
+            state = goto[state][word]
+        outputs[state].append((keyword, len(words)))
+
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for word, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and word not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(word, 0)
+            outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+    return {"goto": goto, "fail": fail, "outputs": outputs}
+
+
+def mood_matcher(mood_rules):
+    global _mood_matcher
+    rules, matcher = _mood_matcher
+    if rules is not mood_rules:
+        matcher = build_mood_matcher(mood_rules)
+        _mood_matcher = (mood_rules, matcher)
+    return matcher
+
+
+def match_mood_keywords(matcher, words):
+    """Rule keywords found in one pass over words; overlapping matches resolve leftmost-longest, in mood order."""
+    goto, fail, outputs = matcher["goto"], matcher["fail"], matcher["outputs"]
+    found = [] # (start word, -word count, keyword)
+    state = 0
+    for position, word in enumerate(words):
+        while state and word not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(word, 0)
+        found.extend((position - length + 1, -length, keyword) for keyword, length in outputs[state])
+
+    matched = []
+    covered_until = 0
+    for start, negative_length, keyword in sorted(found):
+        if start >= covered_until:
+            matched.append(keyword)
+            covered_until = start - negative_length
+    return matched
+
+
+def interpret_mood(visual_mood, mood_rules, image_shift=None):
+    """
+    What a visual_mood string asks for: its general words and color hints (as parse_visual_mood), the rule keywords
+    it matches and the operations to fold over DEFAULT_THEME_PARAMS, in order: [(op_key, rules)]. The header image's
+    colorShift (image_shift, see image_palette.palette_color_shift) goes first as "palette:<params>", then the rule
+    keywords, then the hue of the first color name ("color:<name>") and the HSL of the first hex color ("hex:<hex>"),
+    so explicit colors in the mood win over the image.
+    """
+    words = mood_tokens(visual_mood)
+    mood_keywords, color_hints = split_color_hints(words)
+    matched_keywords = match_mood_keywords(mood_matcher(mood_rules), words)
+    operations = []
+    if image_shift:
+        operations.append((f"palette:{json.dumps(image_shift, sort_keys=True)}", _assignments(image_shift)))
+    operations.extend((keyword, mood_rules[keyword]) for keyword in matched_keywords)
+    if color_hints["name"]:
+        first_color_name = color_hints["name"][0]
+        operations.append((f"color:{first_color_name}", _assignments({"colorShift.h": COLOR_NAME_TO_HSL_HUE[first_color_name]})))
+    if color_hints["hex"]:
+        first_hex = color_hints["hex"][0]
+        hex_hsl = image_palette.rgb_to_hsl(image_palette.hex_to_rgb(first_hex))
+        operations.append((f"hex:{first_hex}", _assignments(image_palette.color_shift_for_hsl(hex_hsl))))
+    return {"mood_keywords": mood_keywords, "color_hints": color_hints, "matched_keywords": matched_keywords, "operations": operations}
+
+
+def _assignments(params):
+    return {param: {"value": value, "op": None} for param, value in params.items()}
+
+
+def header_image_disk_path(header_image_path, base_dir):
+    """
+    Where a header_image_path points on disk: staged or live paths ("/content_pipeline/...", "/assets/...") are under
+    /app, anything else is relative to base_dir (the incoming batch, or the site root for published articles).
+    None for remote URLs and empty values.
+    """
+    if not isinstance(header_image_path, str) or not header_image_path.strip() or "://" in header_image_path:
+        return None
+    if header_image_path.startswith(("/content_pipeline/", "/assets/")):
+        return APP_ROOT + header_image_path
+    return os.path.normpath(os.path.join(base_dir, header_image_path.lstrip('/')))
+
+
 def apply_rules(current_params, rules_to_apply):
     # rules_to_apply is like {'colorShift.l': {'value': -15, 'op': None}, 'intensity': {'value': 0.8, 'op': '*'}}}
     for param_key, rule in rules_to_apply.items():
@@ -119,65 +214,254 @@ def apply_rules(current_params, rules_to_apply):
                 pass
     return current_params
 
-def generate_visual_suggestions(metadata_file_path, style_guidance_path, output_suggestions_path):
+
+# Operation kinds per (operation, param) cell of the NumPy op tables; division by zero is left as OP_KEEP like apply_rules
+OP_KEEP, OP_SET, OP_ADD, OP_MUL, OP_DIV = 0, 1, 2, 3, 4
+_OP_KINDS = {None: OP_SET, '+': OP_ADD, '-': OP_ADD, '*': OP_MUL, '/': OP_DIV}
+
+
+def fold_operations(operations):
+    params = DEFAULT_THEME_PARAMS.copy()
+    for _, rules_for_op in operations:
+        params = apply_rules(params, rules_for_op)
+    return params
+
+
+def theme_params_batch(visual_moods, mood_rules, image_shifts=None):
+    """
+    The params generate_visual_suggestions would suggest for each visual_mood string (None where nothing matched),
+    plus each interpret_mood result: [(params or None, interpretation)]. image_shifts optionally gives each mood's
+    header image colorShift (or None). Equal (mood, image shift) pairs share one params dict.
+    """
+    image_shifts = image_shifts or [None] * len(visual_moods)
+    # Archives repeat the same few moods, so each distinct pair is interpreted and computed once
+    distinct_moods = {}
+    mood_positions = [distinct_moods.setdefault((visual_mood or "", json.dumps(image_shift, sort_keys=True) if image_shift else ""), len(distinct_moods))
+                      for visual_mood, image_shift in zip(visual_moods, image_shifts)]
+    interpretations = [interpret_mood(visual_mood, mood_rules, json.loads(shift_key) if shift_key else None) for visual_mood, shift_key in distinct_moods]
+    params_list = _theme_params_for(interpretations)
+    return [(params_list[position], interpretations[position]) for position in mood_positions]
+
+
+def _theme_params_for(interpretations):
+    """
+    With NumPy the operations run over a moods x params matrix, one operation position at a time for every mood at
+    once; without it (or for a mood that does arithmetic on a string param) each one is folded through apply_rules.
+    """
+    params_list = [None] * len(interpretations)
+    vectorized = [i for i, interpretation in enumerate(interpretations) if interpretation["operations"]]
+    if not NUMPY_AVAILABLE or not vectorized:
+        for i in vectorized:
+            params_list[i] = fold_operations(interpretations[i]["operations"])
+        return params_list
+
+    # Columns: default params first, then any other param a rule touches. A column holding any string is
+    # categorical: its values are stored as codes into `values`, and only direct assignment is vectorized for it.
+    columns = list(DEFAULT_THEME_PARAMS)
+    op_keys = {} # op_key -> row in the op tables; row 0 keeps every param
+    op_rows = [{}]
+    for i in vectorized:
+        for op_key, rules_for_op in interpretations[i]["operations"]:
+            if op_key not in op_keys:
+                op_keys[op_key] = len(op_rows)
+                op_rows.append(rules_for_op)
+                columns.extend(param for param in rules_for_op if param not in columns)
+    column_index = {param: j for j, param in enumerate(columns)}
+    categorical = [isinstance(DEFAULT_THEME_PARAMS.get(param), str) for param in columns]
+    for rules_for_op in op_rows:
+        for param, rule in rules_for_op.items():
+            if isinstance(rule["value"], str):
+                categorical[column_index[param]] = True
+    values = []
+    value_codes = {}
+
+    def encode(value):
+        code_key = (type(value).__name__, value)
+        if code_key not in value_codes:
+            value_codes[code_key] = len(values)
+            values.append(value)
+        return value_codes[code_key]
+
+    kinds = np.zeros((len(op_rows), len(columns)), dtype=np.int8)
+    operands = np.zeros((len(op_rows), len(columns)))
+    float_operands = np.zeros((len(op_rows), len(columns)), dtype=bool)
+    string_arithmetic = set() # Rows doing +/-/*// on a categorical column
+    for row, rules_for_op in enumerate(op_rows):
+        for param, rule in rules_for_op.items():
+            j = column_index[param]
+            kind = _OP_KINDS.get(rule["op"], OP_KEEP)
+            value = rule["value"]
+            if categorical[j]:
+                if kind != OP_SET:
+                    string_arithmetic.add(row)
+                    continue
+                value = encode(value)
+            elif kind == OP_DIV and value == 0:
+                continue
+            kinds[row, j] = kind
+            operands[row, j] = -value if rule["op"] == '-' else value
+            float_operands[row, j] = isinstance(rule["value"], float) or kind == OP_DIV
+
+    row_lists = []
+    kept = []
+    for i in vectorized:
+        rows = [op_keys[op_key] for op_key, _ in interpretations[i]["operations"]]
+        if string_arithmetic.intersection(rows):
+            params_list[i] = fold_operations(interpretations[i]["operations"])
+        else:
+            kept.append(i)
+            row_lists.append(rows)
+    vectorized = kept
+    if not vectorized:
+        return params_list
+
+    # Operation position k of every article at once; shorter op lists are padded with the keep-everything row 0
+    steps = max(len(rows) for rows in row_lists)
+    op_matrix = np.zeros((len(row_lists), steps), dtype=np.int32)
+    for n, rows in enumerate(row_lists):
+        op_matrix[n, :len(rows)] = rows
+
+    defaults = [DEFAULT_THEME_PARAMS.get(param, 0) for param in columns]
+    current = np.tile(np.array([encode(d) if categorical[j] else d for j, d in enumerate(defaults)], dtype=float), (len(row_lists), 1))
+    present = np.tile(np.array([param in DEFAULT_THEME_PARAMS for param in columns]), (len(row_lists), 1))
+    is_float = np.tile(np.array([isinstance(d, float) for d in defaults]), (len(row_lists), 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in range(steps):
+            step_kinds = kinds[op_matrix[:, k]]
+            step_operands = operands[op_matrix[:, k]]
+            step_float = float_operands[op_matrix[:, k]]
+            # A param no rule has set yet starts from 0 for +/- and 1 for * and /, like apply_rules' .get defaults
+            base = np.where(present, current, np.where(step_kinds >= OP_MUL, 1.0, 0.0))
+            current = np.select(
+                [step_kinds == OP_SET, step_kinds == OP_ADD, step_kinds == OP_MUL, step_kinds == OP_DIV],
+                [step_operands, base + step_operands, base * step_operands, base / step_operands],
+                current)
+            is_float = np.where(step_kinds == OP_KEEP, is_float,
+                                np.where(step_kinds == OP_SET, step_float, (is_float & present) | step_float))
+            present = present | (step_kinds != OP_KEEP)
+
+    # Back to Python values: codes to strings, and ints stay ints unless a float or a division touched them
+    columns_out = []
+    for j in range(len(columns)):
+        if categorical[j]:
+            columns_out.append([values[code] for code in current[:, j].astype(np.int64).tolist()])
+        else:
+            as_int = current[:, j].astype(np.int64).tolist()
+            columns_out.append([value if is_float_value else as_int[n] for n, (value, is_float_value) in enumerate(zip(current[:, j].tolist(), is_float[:, j].tolist()))])
+    # Params every row has (all the defaults) are zipped in whole rows; any other column only where it was set
+    dense = [j for j in range(len(columns)) if present[:, j].all()]
+    sparse = [j for j in range(len(columns)) if j not in dense]
+    dense_names = [columns[j] for j in dense]
+    for n, row in enumerate(zip(*(columns_out[j] for j in dense))):
+        params_list[vectorized[n]] = dict(zip(dense_names, row))
+    for j in sparse:
+        for n in np.flatnonzero(present[:, j]).tolist():
+            params_list[vectorized[n]][columns[j]] = columns_out[j][n]
+    return params_list
+
+
+def retheme_archive(router_file_path, theme_engine_file_path, style_guidance_path):
+    """
+    Recomputes every published article's theme from its visual_mood and header image palette with the current
+    STYLE_GUIDANCE.md rules and applies them all to the theme engine in one write
+    (apply_theme_suggestions.apply_suggestions_batch).
+    """
+    # Only re-theming needs these; the per-article stage keeps its import light
+    import apply_theme_suggestions
+    import build_cache
+    import search_index
+
+    mood_rules = style_rules.load_style_rules(style_guidance_path)["visual_mood_rules"]
+    site_root = search_index.site_root_for_router(router_file_path)
+    # File hashes are remembered by (size, mtime) in the build cache, so unchanged header images are not re-read
+    cache = build_cache.load_cache()
+    articles = []
+    image_shifts = []
+    for article in search_index.published_articles(router_file_path):
+        header_image_path = header_image_disk_path(article.get("header_image_path"), site_root)
+        image_shift = image_palette.palette_color_shift(image_palette.extract_palette(header_image_path, cache)[0]) if header_image_path else {}
+        if article.get("visual_mood") or image_shift:
+            articles.append(article)
+            image_shifts.append(image_shift)
+    build_cache.save_cache(cache)
+
+    started = time.perf_counter()
+    results = theme_params_batch([article.get("visual_mood") for article in articles], mood_rules, image_shifts)
+    compute_ms = (time.perf_counter() - started) * 1000
+    suggestions = [(article["id"], apply_theme_suggestions.normalize_params(params))
+                   for article, (params, _) in zip(articles, results) if params and article.get("id")]
+    report = apply_theme_suggestions.apply_suggestions_batch(theme_engine_file_path, suggestions)
+    report["articles_themed"] = len(articles)
+    report["articles_with_image_palette"] = sum(1 for image_shift in image_shifts if image_shift)
+    report["compute_ms"] = round(compute_ms, 2)
+    report["numpy_available"] = NUMPY_AVAILABLE
+    report.pop("applied", None) # One entry per article; the counts above are what a re-theme run needs
+    return report
+
+
+def generate_visual_suggestions(metadata_file_path, style_guidance_path, output_suggestions_path, metadata=None):
+    # metadata: optional already-loaded metadata dict (e.g. from pipeline.py); skips re-reading metadata_file_path
     errors = []
     suggestions_generated = False
     ai_interpretation_parts = []
 
-    try:
-        with open(metadata_file_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    except Exception as e:
-        errors.append(f"Error loading metadata: {e}")
-        return False, "Error loading metadata.", errors, None
+    if metadata is None:
+        try:
+            with open(metadata_file_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except Exception as e:
+            errors.append(f"Error loading metadata: {e}")
+            return False, "Error loading metadata.", errors, None
 
     article_id = metadata.get("id", os.path.basename(metadata_file_path).replace("_metadata.json", ""))
     visual_mood = metadata.get("visual_mood")
 
-    if not visual_mood:
+    # The header image's dominant colours, decoded once per image (see image_palette.py)
+    incoming_batch_dir = os.path.join(INCOMING_ROOT, os.path.basename(os.path.dirname(os.path.abspath(metadata_file_path))))
+    header_image_path = header_image_disk_path(metadata.get("header_image_path"), incoming_batch_dir)
+    palette, palette_error = [], None
+    if header_image_path:
+        palette, _, palette_error = image_palette.extract_palette(header_image_path)
+    image_shift = image_palette.palette_color_shift(palette)
+
+    if not visual_mood and not image_shift:
         return False, "No 'visual_mood' found in metadata.", errors, None
+    visual_mood = visual_mood or ""
 
-    style_rules = parse_style_guidance_rules(style_guidance_path)
-    if not style_rules:
+    mood_rules = parse_style_guidance_rules(style_guidance_path)
+    if not mood_rules:
         errors.append("No rules parsed from style guidance or error during parsing.")
         # Continue with default params if mood is present but no rules? Or just exit?
         # For now, let's say if rules are essential and missing, we can't do much.
         # However, color name/hex parsing could still work.
 
-    mood_keywords, color_hints = parse_visual_mood(visual_mood)
+    interpretation = interpret_mood(visual_mood, mood_rules, image_shift)
+    mood_keywords, color_hints = interpretation["mood_keywords"], interpretation["color_hints"]
 
     # Start with default ThemeEngine parameters (or a copy of 'home' section's params)
     suggested_params = DEFAULT_THEME_PARAMS.copy()
     ai_interpretation_parts.append(f"Interpreting visual mood: '{visual_mood}'.")
 
-
-    # Apply rules based on general keywords
-    for kw in mood_keywords:
-        if kw in style_rules:
-            rules_for_kw = style_rules[kw]
-            suggested_params = apply_rules(suggested_params, rules_for_kw)
-            ai_interpretation_parts.append(f"Keyword '{kw}' suggests: {json.dumps(rules_for_kw)}.")
-            suggestions_generated = True
-
-    # Handle color hints (simplified: take the first detected color name/hex for HSL hue)
-    # A more complex system would average hues or derive a palette.
-    if color_hints["name"]:
-        first_color_name = color_hints["name"][0]
-        if first_color_name in COLOR_NAME_TO_HSL_HUE:
-            suggested_params["colorShift.h"] = COLOR_NAME_TO_HSL_HUE[first_color_name]
-            ai_interpretation_parts.append(f"Color name '{first_color_name}' suggests Hue: {suggested_params['colorShift.h']}.")
-            suggestions_generated = True
-    # Basic HEX to HSL conversion is too complex for this script without more robust color libraries.
-    # For now, we'll just note if a hex was found.
-    if color_hints["hex"]:
-         ai_interpretation_parts.append(f"Hex color(s) {color_hints['hex']} found. Advanced conversion to HSL not yet implemented; consider manual HSL values for these.")
-         # If we had a robust hex->HSL:
-         # h,s,l = convert_hex_to_hsl(color_hints["hex"][0])
-         # suggested_params["colorShift.h"] = h ... etc.
+    # The header image's colours first, then every keyword phrase found in the mood (e.g. "blue_focus"), then the
+    # first color name's hue and the first hex color's HSL
+    for op_key, rules_for_op in interpretation["operations"]:
+        suggested_params = apply_rules(suggested_params, rules_for_op)
+        shift = {param: rule["value"] for param, rule in rules_for_op.items()}
+        if op_key.startswith("palette:"):
+            ai_interpretation_parts.append(f"Header image palette {[color['hex'] for color in palette]} suggests colorShift: {json.dumps(shift)}.")
+        elif op_key.startswith("color:"):
+            ai_interpretation_parts.append(f"Color name '{op_key[len('color:'):]}' suggests Hue: {suggested_params['colorShift.h']}.")
+        elif op_key.startswith("hex:"):
+            ai_interpretation_parts.append(f"Hex color '{op_key[len('hex:'):]}' suggests colorShift: {json.dumps(shift)}.")
+        else:
+            ai_interpretation_parts.append(f"Keyword '{op_key}' suggests: {json.dumps(rules_for_op)}.")
+        suggestions_generated = True
+    if palette_error:
+        ai_interpretation_parts.append(f"Header image colours not used: {palette_error}.")
 
     # Assemble Rationale and AI Interpretation
     ai_interpretation = " ".join(ai_interpretation_parts)
-    rationale = "Suggestions are based on matching keywords from 'visual_mood' to rules in STYLE_GUIDANCE.md and interpreting explicit color mentions."
+    rationale = "Suggestions are based on the header image's dominant colours, matching keywords from 'visual_mood' to rules in STYLE_GUIDANCE.md and interpreting explicit color mentions."
     if not suggestions_generated and not errors:
         ai_interpretation = f"Visual mood '{visual_mood}' did not strongly map to any defined keyword rules or simple color hints for parameter changes."
         rationale = "No specific parameter changes suggested based on current rules and mood string."
@@ -190,14 +474,16 @@ def generate_visual_suggestions(metadata_file_path, style_guidance_path, output_
         "ai_interpretation": ai_interpretation,
         "suggested_sectionModifier_params": suggested_params if suggestions_generated else {}, # Only include if suggestions were made
         "rationale": rationale,
-        "style_guidance_rules_found": bool(style_rules),
+        "style_guidance_rules_found": bool(mood_rules),
         "parsed_mood_keywords": mood_keywords,
-        "parsed_color_hints": color_hints
+        "matched_mood_keywords": interpretation["matched_keywords"],
+        "parsed_color_hints": color_hints,
+        "header_image_palette": palette
     }
 
     try:
         os.makedirs(os.path.dirname(output_suggestions_path), exist_ok=True)
-        with open(output_suggestions_path, 'w', encoding='utf-8') as f:
+        with atomic_files.atomic_open(output_suggestions_path) as f:
             json.dump(output_data, f, indent=4)
     except Exception as e:
         errors.append(f"Error writing suggestions to JSON file: {e}")
@@ -210,12 +496,36 @@ def generate_visual_suggestions(metadata_file_path, style_guidance_path, output_
     return suggestions_generated, final_message, errors, output_suggestions_path
 
 
+def stage_result(meta_path, style_path, output_path, metadata=None):
+    """Runs generate_visual_suggestions and returns the same result dict the CLI prints."""
+    sg, msg, err_list, out_file_path = generate_visual_suggestions(meta_path, style_path, output_path, metadata=metadata)
+    return {
+        "output_suggestions_file_path": out_file_path,
+        "suggestions_generated": sg,
+        "editorial_ai_message": msg,
+        "errors": err_list
+    }
+
+
 if __name__ == "__main__":
+    use_cache_arg = "--cache" in sys.argv # Skip the stage if nothing it reads changed since it last ran (see build_cache.py)
+    sys.argv = [a for a in sys.argv if a != "--cache"]
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "--retheme":
+        # python suggest_visuals.py --retheme <router_file_path> <theme_engine_file_path> [style_guidance_path]
+        guidance_path = sys.argv[4] if len(sys.argv) == 5 else style_rules.DEFAULT_STYLE_GUIDANCE_PATH
+        try:
+            retheme_report = retheme_archive(sys.argv[2], sys.argv[3], guidance_path)
+        except (OSError, ValueError) as e:
+            print(json.dumps({"status": "failure", "errors": [f"Could not re-theme the archive: {e}"]}))
+            sys.exit(1)
+        print(json.dumps(retheme_report))
+        sys.exit(0 if retheme_report["status"] == "success" else 1)
+
     if len(sys.argv) != 4:
         print(json.dumps({
             "output_suggestions_file_path": None,
             "suggestions_generated": False,
-            "editorial_ai_message": "Error: Incorrect arguments. Usage: python suggest_visuals.py <metadata_file_path> <style_guidance_path> <output_suggestions_path>",
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python suggest_visuals.py <metadata_file_path> <style_guidance_path> <output_suggestions_path> [--cache] (or --retheme <router_file_path> <theme_engine_file_path> [style_guidance_path])",
             "errors": ["Incorrect number of arguments provided."]
         }))
         sys.exit(1)
@@ -224,11 +534,14 @@ if __name__ == "__main__":
     style_path_arg = sys.argv[2]
     output_path_arg = sys.argv[3]
 
-    sg, msg, err_list, out_file_path = generate_visual_suggestions(meta_path_arg, style_path_arg, output_path_arg)
-
-    print(json.dumps({
-        "output_suggestions_file_path": out_file_path,
-        "suggestions_generated": sg,
-        "editorial_ai_message": msg,
-        "errors": err_list
-    }))
+    if use_cache_arg:
+        import build_cache
+        header_batch_dir = os.path.join(INCOMING_ROOT, os.path.basename(os.path.dirname(os.path.abspath(meta_path_arg))))
+        cli_result, _ = build_cache.run_stage_cached(
+            sys.modules[__name__], "suggest_visuals", meta_path_arg,
+            lambda metadata: [build_cache.hash_file(style_path_arg), os.path.abspath(output_path_arg), image_palette.palette_signature(),
+                              build_cache.hash_file(header_image_disk_path(metadata.get("header_image_path"), header_batch_dir) or "")],
+            lambda: stage_result(meta_path_arg, style_path_arg, output_path_arg))
+        print(json.dumps(cli_result))
+    else:
+        print(json.dumps(stage_result(meta_path_arg, style_path_arg, output_path_arg)))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The pipeline scripts are flat top-level modules; make them importable from the tests
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import apply_theme_suggestions
+
+THEME_ENGINE = """this.sectionModifiers = {home: {
+                name: 'Hero Foundation',
+                colorShift: { h: 0, s: 0, l: 0 },
+                intensity: 1.0
+            },
+            "article_legacy_custom": { "intensity": 0.7, "colorShift": { "h": 210, "s": 0, "l": 0 } }
+        };
+"""
+CALM = {"colorShift.h": 210.0, "colorShift.s": 0, "colorShift.l": 0, "intensity": 0.70}
+
+
+def _engine(tmp_path):
+    path = tmp_path / "theme-engine-clean.js"
+    path.write_text(THEME_ENGINE, encoding="utf-8")
+    return path
+
+
+def _evaluate(path):
+    """sectionModifiers and modifierAliases as a browser sees them after loading the file as a classic script."""
+    script = ("const vm = require('vm'); const ctx = {}; ctx.window = ctx;"
+              "vm.runInNewContext(require('fs').readFileSync(process.argv[1], 'utf8'), ctx);"
+              "console.log(JSON.stringify({modifiers: ctx.sectionModifiers, aliases: ctx.window.modifierAliases}));")
+    return json.loads(subprocess.run(["node", "-e", script, str(path)], capture_output=True, text=True, check=True).stdout)
+
+
+def test_equal_themes_share_one_modifier_and_legacy_entries_are_folded(tmp_path):
+    path = _engine(tmp_path)
+    normalized = apply_theme_suggestions.normalize_params(CALM)
+    assert normalized == apply_theme_suggestions.normalize_params({"intensity": 0.7, "colorShift": {"l": 0, "h": 210, "s": 0.0}})
+    shared_key = apply_theme_suggestions.modifier_key_for(normalized)
+
+    report = apply_theme_suggestions.apply_suggestions_batch(str(path), [("a-1", normalized), ("b", normalized)])
+
+    assert report["status"] == "success" and report["added_modifiers"] == [shared_key]
+    assert report["removed_modifiers"] == ["article_legacy_custom"] and report["aliases_set"] == 3
+    content = path.read_text(encoding="utf-8")
+    assert "window.modifierAliases = {" in content and content.count(shared_key) == 4 # One modifier, three aliases
+    assert '"article_a_1_custom": "%s"' % shared_key in content
+
+
+def test_moving_the_last_alias_collects_the_unused_modifier(tmp_path):
+    path = _engine(tmp_path)
+    calm = apply_theme_suggestions.normalize_params(CALM)
+    loud = apply_theme_suggestions.normalize_params({"intensity": 1.4, "colorShift.h": -30})
+    apply_theme_suggestions.apply_suggestions_batch(str(path), [("a", calm)])
+    apply_theme_suggestions.apply_suggestions_batch(str(path), [("legacy", loud)])
+
+    report = apply_theme_suggestions.apply_suggestions_batch(str(path), [("a", loud)])
+    assert report["removed_modifiers"] == [apply_theme_suggestions.modifier_key_for(calm)] and report["bytes_shed"] > 0
+    assert apply_theme_suggestions.modifier_key_for(calm) not in path.read_text(encoding="utf-8")
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_the_browser_sees_the_alias_table_on_window(tmp_path):
+    path = _engine(tmp_path)
+    calm = apply_theme_suggestions.normalize_params(CALM)
+    apply_theme_suggestions.apply_suggestions_batch(str(path), [("a", calm)])
+    loaded = _evaluate(path)
+    modifier = loaded["modifiers"][loaded["aliases"]["article_a_custom"]]
+    assert modifier == {"intensity": 0.7, "colorShift": {"h": 210, "l": 0, "s": 0}}
+    assert loaded["aliases"]["article_legacy_custom"] == loaded["aliases"]["article_a_custom"]
+
+    # The repo's own theme engine: every alias points at a modifier that exists
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    repo_loaded = _evaluate(os.path.join(repo_root, "js", "theme-engine-clean.js"))
+    assert repo_loaded["aliases"] and all(target in repo_loaded["modifiers"] for target in repo_loaded["aliases"].values())
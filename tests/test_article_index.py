@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+import random
+
+import article_index
+
+
+def _record(number, date, tags=("t",)):
+    return {"id": f"a{number}", "title": f"A{number}", "date": date, "contentType": "article", "category": "News", "tags": list(tags)}
+
+
+def _listing_ids(index_dir, shard="pages"):
+    """The shard's ids as the router walks it: page-1.json's chunk numbers, newest first."""
+    page = json.loads(open(os.path.join(index_dir, shard, "page-1.json"), encoding="utf-8").read())
+    if not page["chunks"]:
+        return page, [card["id"] for card in page["articles"]]
+    ids = []
+    for number in page["chunks"]:
+        ids += [card["id"] for card in json.loads(open(os.path.join(index_dir, shard, f"chunk-{number}.json"), encoding="utf-8").read())["articles"]]
+    return page, ids
+
+
+def test_back_dated_article_rewrites_only_the_chunk_it_falls_in(tmp_path):
+    index_dir = str(tmp_path / "index")
+    article_index.update_index([_record(i, f"2024-{i // 28 + 1:02d}-{i % 28 + 1:02d}") for i in range(40)], index_dir)
+    _, chunks_before = _listing_ids(index_dir)
+
+    report = article_index.update_index([_record(100, "2024-01-03T12")], index_dir)
+    listing_files = {path for path in report["files_written"] if path.startswith("pages/")}
+    assert listing_files == {"pages/chunk-1.json", "pages/page-1.json"}
+    page, ids = _listing_ids(index_dir)
+    assert page["total"] == 41 and page["chunks"] == [4, 3, 2, 1]
+    assert ids == chunks_before[:-3] + ["a100"] + chunks_before[-3:]
+
+    body_edit = dict(_record(5, "2024-01-06"), body="new text")
+    assert article_index.update_index([body_edit], index_dir)["files_written"] == ["articles/a5.json", "articles/a5.json.gz"]
+
+
+def test_listings_stay_complete_and_ordered_through_inserts_and_removals(tmp_path):
+    index_dir = str(tmp_path / "index")
+    rng = random.Random(7)
+    live = {}
+    for round_number in range(6):
+        records = [_record(round_number * 100 + i, f"20{rng.randint(10, 30)}-0{rng.randint(1, 9)}") for i in range(30)]
+        removed = rng.sample(sorted(live), min(len(live), 12))
+        article_index.update_index(records, index_dir, removed_ids=removed)
+        live.update((record["id"], record["date"]) for record in records)
+        for article_id in removed:
+            del live[article_id]
+
+        page, ids = _listing_ids(index_dir)
+        assert page["total"] == len(live) == len(ids) and set(ids) == set(live)
+        assert ids == sorted(ids, key=lambda article_id: article_index.sort_key(article_id, live[article_id]), reverse=True)
+        assert all(len(json.loads(open(os.path.join(index_dir, "pages", f"chunk-{n}.json"), encoding="utf-8").read())["articles"]) <= 2 * article_index.PAGE_SIZE
+                   for n in page["chunks"])
+
+    article_index.update_index([], index_dir, removed_ids=sorted(live)[:-3])
+    page, ids = _listing_ids(index_dir)
+    assert page["chunks"] == [] and len(ids) == 3
+    assert [name for name in os.listdir(os.path.join(index_dir, "pages")) if name.startswith("chunk-")] == []
+
+
+def test_catalog_and_meta_are_sharded(tmp_path):
+    index_dir = str(tmp_path / "index")
+    article_index.update_index([_record(1, "2024-01-01", tags=("alpha",)), _record(2, "2024-01-02", tags=("beta",))], index_dir)
+    assert not os.path.exists(os.path.join(index_dir, "catalog.json"))
+    assert set(article_index.load_catalog(index_dir)) == {"a1", "a2"}
+    assert os.path.exists(article_index.catalog_bucket_path(index_dir, "a1"))
+
+    report = article_index.update_index([_record(3, "2024-01-03", tags=("beta",))], index_dir)
+    assert "meta/tags.json" in report["files_written"] and "meta/categories.json" in report["files_written"]
+    assert "meta/types.json" in report["files_written"]
+    tags = json.loads(open(os.path.join(index_dir, "meta", "tags.json"), encoding="utf-8").read())
+    assert tags == {"alpha": {"name": "alpha", "count": 1}, "beta": {"name": "beta", "count": 2}}
+
+    article_index.update_index([], index_dir, removed_ids=["a1"])
+    meta = article_index.load_meta(index_dir)
+    assert meta["total"] == 2 and meta["shard_counts"] == {"types": 1, "categories": 1, "tags": 1}
+    assert not os.path.exists(os.path.join(index_dir, "tags", "alpha"))
+
+
+def test_tags_that_slugify_alike_keep_separate_listings(tmp_path):
+    index_dir = str(tmp_path / "index")
+    article_index.update_index([_record(1, "2024-01-01", tags=("C++",)), _record(2, "2024-01-02", tags=("C#",)),
+                                _record(3, "2024-01-03", tags=("c",))], index_dir)
+    plus, sharp = article_index.listing_slug("C++"), article_index.listing_slug("C#")
+    assert article_index.listing_slug("c") == "c" and plus.startswith("c-") and sharp.startswith("c-") and plus != sharp
+
+    tags = json.loads(open(os.path.join(index_dir, "meta", "tags.json"), encoding="utf-8").read())
+    assert tags == {"c": {"name": "c", "count": 1}, plus: {"name": "C++", "count": 1}, sharp: {"name": "C#", "count": 1}}
+    assert _listing_ids(index_dir, "tags/c")[1] == ["a3"]
+    assert _listing_ids(index_dir, f"tags/{plus}")[1] == ["a1"]
+
+
+def test_an_index_in_the_old_single_catalog_format_is_republished(tmp_path):
+    index_dir = tmp_path / "index"
+    (index_dir / "pages").mkdir(parents=True)
+    article_index.write_bundle(str(index_dir), _record(1, "2024-01-01"))
+    (index_dir / "meta.json").write_text(json.dumps({"version": 2, "page_size": 12, "total": 1}), encoding="utf-8")
+    (index_dir / "catalog.json").write_text(json.dumps({"version": 2, "page_size": 12, "articles": {}}), encoding="utf-8")
+
+    report = article_index.update_index([_record(2, "2024-01-02")], str(index_dir))
+    assert sorted(report["added"]) == ["a1", "a2"]
+    assert not (index_dir / "catalog.json").exists()
+    assert _listing_ids(str(index_dir))[1] == ["a2", "a1"]
+
+
+def test_cards_keep_only_what_a_listing_shows():
+    record = {
+        "id": "a/1", "title": "T", "excerpt": "word " * 100, "category": ["Essays", "Other"], "tags": "[one, 'two']",
+        "date": "2024-01-01", "body": "<p>long</p>", "description": "", "header_image_path": "/assets/h.jpg",
+        "image_derivatives": [{"metadata_field": "header_image_path", "fallback_type": "image/jpeg", "variants": [
+            {"path": "/assets/h-960w.jpg", "width": 960, "type": "image/jpeg"},
+            {"path": "/assets/h-480w.webp", "width": 480, "type": "image/webp"},
+            {"path": "/assets/h-480w.jpg", "width": 480, "type": "image/jpeg"}]}]
+    }
+    card = article_index.card_record(record)
+    assert set(card) == {"id", "title", "excerpt", "thumbnail", "category", "date", "contentType", "tags", "bundle"}
+    assert card["thumbnail"] == "/assets/h-480w.jpg" # Smallest variant in the fallback format
+    assert (card["category"], card["tags"], card["bundle"]) == ("Essays", ["one", "two"], "articles/a_1.json")
+    assert len(card["excerpt"]) <= article_index.CARD_EXCERPT_CHARS + 3 and card["excerpt"].endswith("word...")
+    assert article_index.is_card(card) and not article_index.is_card(record)
+
+
+def test_bundles_are_deterministic_gzip_and_expand_cards(tmp_path):
+    index_dir = str(tmp_path / "index")
+    record = {"id": "b1", "title": "Bundle", "body": "<p>" + "text " * 200 + "</p>"}
+    json_path, gz_path = article_index.write_bundle(index_dir, record)
+    first_gz = open(gz_path, "rb").read()
+    article_index.write_bundle(index_dir, record)
+    assert open(gz_path, "rb").read() == first_gz
+    assert json.loads(gzip.decompress(first_gz)) == record == json.loads(open(json_path, encoding="utf-8").read())
+
+    inline = {"id": "old", "title": "Published inline before bundles"}
+    assert article_index.expand_articles([article_index.card_record(record), inline, None], index_dir) == [record, inline]
+    assert article_index.delete_bundle(index_dir, "b1") == [json_path, gz_path]
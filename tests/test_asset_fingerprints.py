@@ -0,0 +1,63 @@
+import json
+import multiprocessing
+import re
+
+import asset_fingerprints
+
+GRACE = asset_fingerprints.STALE_FINGERPRINT_GRACE_SECONDS
+
+
+def _publish(live_root, start):
+    for i in range(start, start + 20):
+        asset_fingerprints.update_manifest(live_root, {f"/assets/images/a{i}/h.png": f"/assets/images/a{i}/h.{i:012x}.png"})
+
+
+def test_fingerprinted_names_keep_compound_extensions():
+    digest = "0123456789abcdef" * 4
+    assert asset_fingerprints.fingerprinted_name("header.png", digest) == "header.0123456789ab.png"
+    assert asset_fingerprints.fingerprinted_name("transcript.txt.gz", digest) == "transcript.0123456789ab.txt.gz"
+    rule = asset_fingerprints.firebase_cache_headers()[0]["regex"]
+    assert re.match(rule, "/assets/documents/a/transcript.0123456789ab.txt.gz")
+    assert not re.match(rule, "/assets/images/a/header.png")
+
+
+def test_concurrent_processes_never_lose_manifest_entries(tmp_path):
+    live_root = str(tmp_path / "assets")
+    processes = [multiprocessing.get_context("fork").Process(target=_publish, args=(live_root, start)) for start in (0, 20, 40, 60)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert len(asset_fingerprints.load_manifest(asset_fingerprints.manifest_path(live_root))["assets"]) == 80
+
+
+def test_replaced_fingerprints_are_deleted_after_the_grace_period(tmp_path):
+    live_root = tmp_path / "assets"
+    old_file = live_root / "images" / "a" / "h.aaaaaaaaaaaa.png"
+    old_file.parent.mkdir(parents=True)
+    old_file.write_bytes(b"v1")
+    (live_root / "images" / "a" / "h.bbbbbbbbbbbb.png").write_bytes(b"v2")
+
+    asset_fingerprints.update_manifest(str(live_root), {"/assets/images/a/h.png": "/assets/images/a/h.aaaaaaaaaaaa.png"}, now=1000)
+    asset_fingerprints.update_manifest(str(live_root), {"/assets/images/a/h.png": "/assets/images/a/h.bbbbbbbbbbbb.png"}, now=2000)
+    manifest = json.loads((live_root / "asset-manifest.json").read_text(encoding="utf-8"))
+    assert manifest["superseded"] == {"/assets/images/a/h.aaaaaaaaaaaa.png": 2000}
+
+    asset_fingerprints.update_manifest(str(live_root), {}, now=2000 + GRACE - 1)
+    assert old_file.exists()
+    asset_fingerprints.update_manifest(str(live_root), {}, now=2000 + GRACE)
+    assert not old_file.exists() and (live_root / "images" / "a" / "h.bbbbbbbbbbbb.png").exists()
+    assert asset_fingerprints.load_manifest(str(live_root / "asset-manifest.json"))["superseded"] == {}
+
+
+def test_gc_sweeps_fingerprinted_files_the_manifest_never_listed(tmp_path):
+    live_root = tmp_path / "assets"
+    (live_root / "audio" / "a").mkdir(parents=True)
+    orphan = live_root / "audio" / "a" / "clip.cccccccccccc.mp3"
+    orphan.write_bytes(b"x")
+    plain = live_root / "audio" / "a" / "clip.mp3"
+    plain.write_bytes(b"x")
+
+    assert asset_fingerprints.collect_garbage(str(live_root), now=0) == {"removed": [], "awaiting_removal": 1}
+    assert asset_fingerprints.collect_garbage(str(live_root), now=GRACE) == {"removed": ["/assets/audio/a/clip.cccccccccccc.mp3"], "awaiting_removal": 0}
+    assert not orphan.exists() and plain.exists()
@@ -0,0 +1,89 @@
+import os
+
+import asset_store
+
+
+def _source(tmp_path, name="h.png", data=b"image bytes"):
+    path = tmp_path / "incoming" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def _no_hardlinks(*args, **kwargs):
+    raise OSError("cross-device link")
+
+
+def test_outputs_are_writable_hardlinks_to_one_blob(tmp_path):
+    store = str(tmp_path / "store")
+    source = _source(tmp_path)
+    first, second = tmp_path / "processed" / "h.png", tmp_path / "live" / "h.png"
+
+    assert asset_store.transfer(str(source), str(first), store)["method"] == "hardlink"
+    assert asset_store.transfer(str(first), str(second), store)["method"] == "hardlink"
+    blob = asset_store.blob_path(asset_store.file_digest(str(source)), store)
+    assert os.path.samefile(first, blob) and os.path.samefile(second, blob)
+    assert not os.path.samefile(source, blob) # Incoming files are never linked
+    assert os.access(first, os.W_OK) and os.access(second, os.W_OK)
+    assert first.read_bytes() == b"image bytes"
+    assert asset_store.transfer(str(first), str(second), store)["method"] == "existing" # Already the same inode
+
+
+def test_falls_back_to_reflink_then_copy(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    source = _source(tmp_path)
+    monkeypatch.setattr(asset_store.os, "link", _no_hardlinks)
+
+    monkeypatch.setattr(asset_store, "_reflink", lambda src, dst: asset_store._copy_file(src, dst) and True)
+    assert asset_store.transfer(str(source), str(tmp_path / "a" / "h.png"), store)["method"] == "reflink"
+
+    monkeypatch.setattr(asset_store, "_reflink", lambda src, dst: False)
+    report = asset_store.transfer(str(source), str(tmp_path / "b" / "h.png"), store)
+    assert report["method"] in ("copy_file_range", "sendfile", "read_write")
+    assert report["bytes_copied"] == len(b"image bytes") # The blob already existed; only the output was written
+    assert (tmp_path / "b" / "h.png").read_bytes() == b"image bytes"
+    assert os.access(tmp_path / "b" / "h.png", os.W_OK)
+
+
+def test_unchanged_copies_are_skipped_without_writing(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    source = _source(tmp_path)
+    monkeypatch.setattr(asset_store.os, "link", _no_hardlinks)
+    monkeypatch.setattr(asset_store, "_reflink", lambda src, dst: False)
+    destination = tmp_path / "out" / "h.png"
+    asset_store.transfer(str(source), str(destination), store)
+
+    report = asset_store.transfer(str(source), str(destination), store)
+    assert report["method"] == "unchanged" and asset_store.transfer_action(report) == "skipped"
+
+
+def test_an_in_place_edit_is_detected_and_the_blob_restored(tmp_path):
+    store = str(tmp_path / "store")
+    source = _source(tmp_path)
+    edited = tmp_path / "processed" / "h.png"
+    asset_store.transfer(str(source), str(edited), store)
+    blob = asset_store.blob_path(asset_store.file_digest(str(source)), store)
+
+    with open(edited, "r+b") as f: # An editor saving in place
+        f.write(b"IMAGE")
+    assert asset_store.verify_store(store) == {"corrupted_blobs": [blob]}
+
+    other = tmp_path / "other" / "h.png"
+    assert asset_store.transfer(str(source), str(other), store)["store_method"] != "existing"
+    assert other.read_bytes() == b"image bytes" and edited.read_bytes() == b"IMAGE bytes"
+    assert asset_store.verify_store(store) == {"corrupted_blobs": []}
+
+
+def test_place_many_and_garbage_collection(tmp_path):
+    store = str(tmp_path / "store")
+    a, b = _source(tmp_path, "a.png", b"same"), _source(tmp_path, "b.png", b"same")
+    c = _source(tmp_path, "c.png", b"different")
+    out = tmp_path / "out"
+    reports = asset_store.place_many([(str(a), str(out / "a.png")), (str(b), str(out / "b.png")), (str(c), str(out / "c.png"))], store_root=store)
+    assert all(not isinstance(report, Exception) for report in reports.values())
+    assert asset_store.store_stats(store)["blobs"] == 2 # a and b share one blob
+
+    (out / "c.png").unlink()
+    assert asset_store.collect_garbage(store) == {"removed_blobs": 1, "bytes_freed": len(b"different")}
+    assert not os.path.exists(asset_store.blob_path(asset_store.file_digest(str(c)), store) + asset_store.STAMP_SUFFIX)
+    assert asset_store.store_stats(store)["blobs"] == 1
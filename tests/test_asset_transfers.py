@@ -0,0 +1,73 @@
+import errno
+import os
+
+import asset_store
+
+
+def _copy(tmp_path, data):
+    source, destination = tmp_path / "source.bin", tmp_path / "destination.bin"
+    source.write_bytes(data)
+    strategy = asset_store._copy_file(str(source), str(destination))
+    return strategy, destination.read_bytes()
+
+
+def _unsupported(*args):
+    raise OSError(errno.EXDEV, "cross-device")
+
+
+def test_copy_falls_back_when_kernel_copies_are_unsupported(tmp_path, monkeypatch):
+    data = os.urandom(300 * 1024)
+    monkeypatch.setattr(asset_store.os, "copy_file_range", _unsupported, raising=False)
+    strategy, copied = _copy(tmp_path, data)
+    assert strategy in ("sendfile", "read_write") and copied == data
+
+    monkeypatch.setattr(asset_store.os, "sendfile", _unsupported, raising=False)
+    strategy, copied = _copy(tmp_path, data)
+    assert strategy == "read_write" and copied == data
+
+
+def test_copy_continues_where_a_partial_kernel_copy_stopped(tmp_path, monkeypatch):
+    data = os.urandom(200 * 1024)
+    real_copy_file_range = os.copy_file_range if hasattr(os, "copy_file_range") else None
+    calls = []
+
+    def first_chunk_then_fail(src_fd, dst_fd, count, offset_src, offset_dst):
+        calls.append(offset_src)
+        if len(calls) > 1 or real_copy_file_range is None:
+            _unsupported()
+        return real_copy_file_range(src_fd, dst_fd, 64 * 1024, offset_src, offset_dst)
+
+    monkeypatch.setattr(asset_store.os, "copy_file_range", first_chunk_then_fail, raising=False)
+    monkeypatch.setattr(asset_store.os, "sendfile", _unsupported, raising=False)
+    strategy, copied = _copy(tmp_path, data)
+    assert strategy == "read_write" and copied == data
+
+
+def test_incoming_transfer_pairs_resolve_like_the_asset_stages(tmp_path):
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "h.png").write_bytes(b"h")
+    (tmp_path / "images" / "g.png").write_bytes(b"g")
+    metadata = {
+        "header_image_path": "/images/h.png",
+        "gallery_images": ["images/g.png", "images/missing.png", "", "/content_pipeline/processed_assets/images/a/x.png"],
+    }
+    pairs = asset_store.incoming_transfer_pairs(metadata, ["header_image_path", "gallery_images"], str(tmp_path), "/out")
+    assert pairs == [(str(tmp_path / "images" / "h.png"), "/out/h.png"), (str(tmp_path / "images" / "g.png"), "/out/g.png")]
+
+
+def test_place_many_keeps_the_last_source_for_a_shared_destination(tmp_path):
+    store = str(tmp_path / "store")
+    sources = []
+    for name, data in (("one.png", b"one"), ("two.png", b"two")):
+        (tmp_path / name).write_bytes(data)
+        sources.append(str(tmp_path / name))
+    destination = str(tmp_path / "out" / "h.png")
+
+    reports = asset_store.place_many([(sources[0], destination), (sources[1], destination), (str(tmp_path / "gone.png"), str(tmp_path / "out" / "x.png"))],
+                                     threads=4, store_root=store)
+    assert open(destination, "rb").read() == b"two"
+    assert isinstance(reports[(str(tmp_path / "gone.png"), str(tmp_path / "out" / "x.png"))], FileNotFoundError)
+
+    summary = asset_store.summarize_transfers([r for r in reports.values() if not isinstance(r, Exception)])
+    assert summary["files"] == 2 and summary["bytes"] == 6
+    assert summary["bytes_saved"] == summary["bytes"] - summary["bytes_copied"]
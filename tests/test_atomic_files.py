@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+import stat
+
+import pytest
+
+import atomic_files
+
+
+def _locked_increment(path):
+    for _ in range(50):
+        with atomic_files.file_lock(path + ".lock"):
+            value = int(open(path, encoding="utf-8").read())
+            atomic_files.write_text(path, str(value + 1))
+
+
+def test_failed_write_leaves_the_target_untouched(tmp_path):
+    target = tmp_path / "article_metadata.json"
+    target.write_text('{"title": "old"}', encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        with atomic_files.atomic_open(str(target)) as f:
+            f.write('{"title": "ne')
+            raise RuntimeError("stage crashed mid-write")
+    assert target.read_text(encoding="utf-8") == '{"title": "old"}'
+    assert os.listdir(tmp_path) == ["article_metadata.json"] # No .tmp- file left behind
+
+
+def test_replacing_keeps_permissions_and_new_files_follow_the_umask(tmp_path):
+    existing = tmp_path / "router.js"
+    existing.write_text("old", encoding="utf-8")
+    os.chmod(existing, 0o640)
+    atomic_files.write_text(str(existing), "new")
+    assert existing.read_text(encoding="utf-8") == "new"
+    assert stat.S_IMODE(os.stat(existing).st_mode) == 0o640
+
+    atomic_files.write_json(str(tmp_path / "fresh.json"), {"a": 1})
+    assert stat.S_IMODE(os.stat(tmp_path / "fresh.json").st_mode) == 0o666 & ~atomic_files._UMASK
+
+
+def test_file_lock_serializes_read_merge_write_across_processes(tmp_path):
+    counter = str(tmp_path / "counter.txt")
+    atomic_files.write_text(counter, "0")
+    processes = [multiprocessing.get_context("fork").Process(target=_locked_increment, args=(counter,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert open(counter, encoding="utf-8").read() == "200"
@@ -0,0 +1,109 @@
+import json
+import sys
+
+import build_cache
+import process_markdown
+
+
+def test_lookup_hits_only_for_the_same_key_with_outputs_present(tmp_path):
+    output = tmp_path / "out.html"
+    output.write_text("<p>x</p>", encoding="utf-8")
+    cache = build_cache.empty_cache()
+    build_cache.store(cache, "b/a:stage", "key-1", [str(output)], {"ok": True})
+
+    assert build_cache.lookup(cache, "b/a:stage", "key-1")["result"] == {"ok": True}
+    assert build_cache.lookup(cache, "b/a:stage", "key-2") is None
+    assert build_cache.lookup(cache, "b/other:stage", "key-1") is None
+    output.unlink()
+    assert build_cache.lookup(cache, "b/a:stage", "key-1") is None
+
+
+def test_stage_outputs_lists_every_file_a_stage_wrote():
+    result = {
+        "updated_metadata_file_path": "/s/a_metadata.json",
+        "processed_images_log": [{"staged_at": "/content_pipeline/processed_assets/images/a/h.png"}, {"error": "missing"}],
+        "moved_assets_log": [{"live_disk_path": "/site/assets/images/a/h.png"}],
+        "staging_package_path": "/s",
+        "files_created_or_verified": ["01_processed_content/a.html (moved)", "04_asset_manifest.json (created)",
+                                      "theme_suggestions.json (verified)", "05_source_files_copy/a.md (copied)"]
+    }
+    assert build_cache.stage_outputs(result, "/root") == [
+        "/s/a_metadata.json", "/root/content_pipeline/processed_assets/images/a/h.png", "/site/assets/images/a/h.png",
+        "/s/01_processed_content/a.html", "/s/04_asset_manifest.json", "/s/05_source_files_copy/a.md"
+    ]
+
+
+def test_asset_input_hashes_follow_the_asset_bytes(tmp_path):
+    incoming = tmp_path / "incoming"
+    (incoming / "images").mkdir(parents=True)
+    (incoming / "images" / "h.png").write_bytes(b"one")
+    metadata = {"header_image_path": "images/h.png", "gallery_images": ["images/missing.png"]}
+
+    before = build_cache.asset_input_hashes(str(incoming), metadata, ["header_image_path", "gallery_images"])
+    assert before[1] == ["gallery_images", "images/missing.png", None]
+    (incoming / "images" / "h.png").write_bytes(b"two")
+    assert build_cache.asset_input_hashes(str(incoming), metadata, ["header_image_path", "gallery_images"]) != before
+
+
+def test_run_stage_cached_skips_an_unchanged_stage(tmp_path):
+    metadata_path = tmp_path / "a_metadata.json"
+    metadata_path.write_text(json.dumps({"title": "T"}), encoding="utf-8")
+    suggestions_path = tmp_path / "theme_suggestions.json"
+    cache_path = str(tmp_path / "build_cache.json")
+    runs = []
+
+    def run_stage():
+        runs.append(1)
+        metadata = json.loads(metadata_path.read_text(encoding="utf-8"))
+        metadata["ai_suggestions"] = {"suggested_tags": ["x"]}
+        metadata_path.write_text(json.dumps(metadata), encoding="utf-8")
+        suggestions_path.write_text("{}", encoding="utf-8")
+        return {"output_suggestions_file_path": str(suggestions_path), "errors": []}
+
+    def run(inputs):
+        return build_cache.run_stage_cached(sys.modules[__name__], "suggest_metadata", str(metadata_path), inputs, run_stage, cache_path=cache_path)
+
+    assert run(["style-1"])[1] is False
+    # The stage rewrote the metadata file, but that is the state it left it in: still a hit
+    assert run(["style-1"]) == ({"output_suggestions_file_path": str(suggestions_path), "errors": []}, True)
+    assert len(runs) == 1
+
+    # Re-staged metadata gets the cached suggestions back without running the stage
+    metadata_path.write_text(json.dumps({"title": "T"}), encoding="utf-8")
+    assert run(["style-1"])[1] is True
+    assert json.loads(metadata_path.read_text(encoding="utf-8")) == {"title": "T", "ai_suggestions": {"suggested_tags": ["x"]}}
+    assert len(runs) == 1
+
+    # Changed inputs, or a deleted output, re-run it
+    assert run(["style-2"])[1] is False
+    suggestions_path.unlink()
+    assert run(["style-2"])[1] is False
+    assert len(runs) == 3
+
+
+def test_failed_stages_are_not_cached(tmp_path):
+    metadata_path = tmp_path / "a_metadata.json"
+    metadata_path.write_text("{}", encoding="utf-8")
+    cache_path = str(tmp_path / "build_cache.json")
+    for _ in range(2):
+        result, hit = build_cache.run_stage_cached(sys.modules[__name__], "probe_media", str(metadata_path),
+                                                   lambda metadata: [], lambda: {"error_log": ["boom"]}, cache_path=cache_path)
+        assert not hit
+    assert build_cache.load_cache(cache_path)["entries"] == {}
+
+
+def test_process_markdown_regenerates_a_deleted_html_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(process_markdown, "BASE_APP_PATH", str(tmp_path))
+    incoming = tmp_path / "content_pipeline" / "incoming" / "b1"
+    incoming.mkdir(parents=True)
+    (incoming / "a.md").write_text("---\ntitle: A\nid: a\n---\nBody.\n", encoding="utf-8")
+    html_path = tmp_path / "content_pipeline" / "staging" / "b1" / "a.html"
+    cache = build_cache.empty_cache()
+
+    process_markdown.process_batches(["b1"], "content_pipeline/staging", cache=cache)
+    (entry,) = cache["entries"].values()
+    assert str(html_path) in entry["outputs"]
+
+    html_path.unlink()
+    process_markdown.process_batches(["b1"], "content_pipeline/staging", cache=cache)
+    assert html_path.exists()
@@ -0,0 +1,50 @@
+import gzip
+import hashlib
+
+import pytest
+
+import asset_store
+import process_document_assets
+
+
+def test_small_text_is_embedded_with_universal_newlines(tmp_path):
+    source = tmp_path / "notes.txt"
+    source.write_bytes(b"line one\r\nline two\rline three\n")
+    result = process_document_assets.stream_text_asset(str(source), str(tmp_path / "out" / "notes.txt.gz"))
+
+    assert result["content"] == "line one\nline two\nline three\n"
+    assert result["sidecar_transfer"] is None and not (tmp_path / "out").exists()
+    assert result["sha256"] == hashlib.sha256(source.read_bytes()).hexdigest()
+
+
+def test_large_text_goes_to_a_deterministic_gzip_sidecar(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_store, "ASSET_STORE_ROOT", str(tmp_path / "store"))
+    monkeypatch.setattr(process_document_assets, "TXT_READ_CHUNK_SIZE", 1000) # Several chunks, multi-byte characters split across them
+    text = ("Café naïve résumé " * 400).encode("utf-8")
+    source = tmp_path / "essay.txt"
+    source.write_bytes(text)
+
+    first = process_document_assets.stream_text_asset(str(source), str(tmp_path / "a" / "essay.txt.gz"), inline_max_bytes=2048)
+    second = process_document_assets.stream_text_asset(str(source), str(tmp_path / "b" / "essay.txt.gz"), inline_max_bytes=2048)
+
+    assert first["content"] is None and first["bytes"] == len(text)
+    assert second["sha256"] == first["sha256"] and second["bytes"] == first["bytes"]
+    assert gzip.decompress((tmp_path / "a" / "essay.txt.gz").read_bytes()) == text
+    assert (tmp_path / "a" / "essay.txt.gz").read_bytes() == (tmp_path / "b" / "essay.txt.gz").read_bytes()
+    assert first["preview"].startswith("Café naïve") and first["preview"].endswith("…")
+    assert len(first["preview"]) <= process_document_assets.TXT_PREVIEW_CHARS + 1
+    assert not [name for name in (tmp_path / "a").iterdir() if name.name.startswith(".tmp-")]
+
+
+def test_invalid_utf8_raises_and_leaves_no_partial_sidecar(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_store, "ASSET_STORE_ROOT", str(tmp_path / "store"))
+    source = tmp_path / "bad.txt"
+    source.write_bytes(b"a" * 5000 + b"\xe2\x82") # Truncated multi-byte sequence at EOF
+    with pytest.raises(UnicodeDecodeError):
+        process_document_assets.stream_text_asset(str(source), str(tmp_path / "out" / "bad.txt.gz"), inline_max_bytes=1024)
+    assert list((tmp_path / "out").iterdir()) == []
+
+
+def test_make_preview_cuts_at_a_word_boundary():
+    assert process_document_assets.make_preview("  short   text ") == "short text"
+    assert process_document_assets.make_preview("alpha beta gamma, delta", max_chars=19) == "alpha beta gamma…"
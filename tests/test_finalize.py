@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import asset_store
+import finalize_data_and_assets
+
+
+@pytest.fixture
+def staged(tmp_path, monkeypatch):
+    monkeypatch.setattr(finalize_data_and_assets, "BASE_APP_PATH", str(tmp_path))
+    monkeypatch.setattr(asset_store, "ASSET_STORE_ROOT", str(tmp_path / "asset_store"))
+    (tmp_path / "content_pipeline" / "staging" / "b1").mkdir(parents=True)
+    images = tmp_path / "content_pipeline" / "processed_assets" / "images" / "a"
+    images.mkdir(parents=True)
+    (images / "h.png").write_bytes(b"header v1")
+    (images / "g.png").write_bytes(b"gallery")
+    return tmp_path
+
+
+def _metadata():
+    return {
+        "title": "A",
+        "header_image_path": "/content_pipeline/processed_assets/images/a/h.png",
+        "gallery_images": ["/content_pipeline/processed_assets/images/a/g.png"],
+        "ai_suggestions": {"suggested_tags": ["x"]},
+    }
+
+
+def _finalize(root, fingerprint=False):
+    return finalize_data_and_assets.finalize_data("b1", "a", str(root / "assets"), "/assets", metadata=_metadata(), fingerprint=fingerprint)
+
+
+def test_republishing_unchanged_assets_writes_nothing(staged):
+    final_path, moved, errors, _ = _finalize(staged)
+    assert errors == []
+    assert {entry["publish_action"] for entry in moved} == {"copied"} # Into the asset store, then linked live
+    final = json.loads(open(final_path, encoding="utf-8").read())
+    assert final["header_image_path"] == "/assets/images/a/h.png" and final["tags"] == ["x"]
+
+    _, moved_again, _, _ = _finalize(staged)
+    assert {entry["publish_action"] for entry in moved_again} == {"skipped"}
+
+    # Replacing the staged file (new inode, new bytes) re-publishes just that asset
+    header = staged / "content_pipeline" / "processed_assets" / "images" / "a" / "h.png"
+    header.unlink()
+    header.write_bytes(b"header v2")
+    _, moved_after_edit, _, _ = _finalize(staged)
+    actions = {entry["live_router_path"]: entry["publish_action"] for entry in moved_after_edit}
+    assert actions == {"/assets/images/a/h.png": "copied", "/assets/images/a/g.png": "skipped"}
+    assert (staged / "assets" / "images" / "a" / "h.png").read_bytes() == b"header v2"
+
+
+def test_fingerprinted_publishing_records_the_manifest(staged):
+    final_path, moved, errors, _ = _finalize(staged, fingerprint=True)
+    assert errors == []
+    final = json.loads(open(final_path, encoding="utf-8").read())
+    assert final["header_image_path"].startswith("/assets/images/a/h.") and final["header_image_path"] != "/assets/images/a/h.png"
+    manifest = json.loads((staged / "assets" / "asset-manifest.json").read_text(encoding="utf-8"))
+    assert manifest["assets"]["/assets/images/a/h.png"] == final["header_image_path"]
+    assert (staged / "assets" / final["header_image_path"][len("/assets/"):]).read_bytes() == b"header v1"
+
+
+def test_missing_staged_asset_keeps_its_path_and_is_reported(staged):
+    (staged / "content_pipeline" / "processed_assets" / "images" / "a" / "g.png").unlink()
+    final_path, _, errors, _ = _finalize(staged)
+    assert [error["field"] for error in errors] == ["gallery_images"]
+    final = json.loads(open(final_path, encoding="utf-8").read())
+    assert final["gallery_images"] == ["/content_pipeline/processed_assets/images/a/g.png"]
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import asset_store
+import generate_image_derivatives
+
+
+def test_srcsets_list_variants_by_width_and_end_with_the_original():
+    entry = {
+        "source": "/p/h.jpg", "width": 1200, "fallback_type": "image/jpeg",
+        "variants": [
+            {"path": "/p/h-960w.webp", "width": 960, "type": "image/webp"},
+            {"path": "/p/h-480w.webp", "width": 480, "type": "image/webp"},
+            {"path": "/p/h-480w.jpg", "width": 480, "type": "image/jpeg"},
+        ]
+    }
+    assert generate_image_derivatives.build_srcsets(entry) == {
+        "image/webp": "/p/h-480w.webp 480w, /p/h-960w.webp 960w",
+        "image/jpeg": "/p/h-480w.jpg 480w, /p/h.jpg 1200w",
+    }
+
+
+@pytest.fixture
+def staged_article(tmp_path, monkeypatch):
+    Image = pytest.importorskip("PIL.Image")
+    monkeypatch.setattr(generate_image_derivatives, "BASE_APP_PATH", str(tmp_path))
+    monkeypatch.setattr(generate_image_derivatives, "DERIVATIVE_CACHE_ROOT", str(tmp_path / "derivative_cache"))
+    monkeypatch.setattr(asset_store, "ASSET_STORE_ROOT", str(tmp_path / "asset_store"))
+
+    images_dir = tmp_path / "content_pipeline" / "processed_assets" / "images" / "a"
+    images_dir.mkdir(parents=True)
+    Image.new("RGB", (1000, 500), (200, 40, 40)).save(images_dir / "h.jpg")
+    Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(images_dir / "small.png")
+    return {"title": "A", "header_image_path": "/content_pipeline/processed_assets/images/a/h.jpg",
+            "gallery_images": ["/content_pipeline/processed_assets/images/a/small.png", "images/not-staged-yet.png"]}
+
+
+def test_variants_are_never_upscaled_and_keep_alpha(staged_article, tmp_path):
+    fields = json.dumps(["header_image_path", "gallery_images"])
+    result = generate_image_derivatives.generate_derivatives("b1", "a", fields, metadata=staged_article, save_metadata=False)
+
+    assert result["error_log"] == []
+    header, small = result["metadata_after_processing"]["image_derivatives"]
+    assert {v["width"] for v in header["variants"] if v["type"] == "image/jpeg"} == {480, 960}
+    assert header["fallback_type"] == "image/jpeg" and header["srcset"]["image/jpeg"].endswith("h.jpg 1000w")
+    assert small["fallback_type"] == "image/png" # Transparent images fall back to PNG
+    assert all(v["width"] == 300 for v in small["variants"]) # Only modern-format re-encodes at the original width
+    for variant in header["variants"]:
+        assert (tmp_path / variant["path"].lstrip("/")).exists()
+
+
+def test_second_run_is_served_from_the_derivative_cache(staged_article):
+    fields = json.dumps(["header_image_path"])
+    first = generate_image_derivatives.generate_derivatives("b1", "a", fields, metadata=dict(staged_article), save_metadata=False)
+    second = generate_image_derivatives.generate_derivatives("b1", "a", fields, metadata=dict(staged_article), save_metadata=False)
+
+    assert {entry["status"] for entry in first["derivatives_log"]} == {"encoded"}
+    assert {entry["status"] for entry in second["derivatives_log"]} == {"cached"}
+    assert first["metadata_after_processing"]["image_derivatives"] == second["metadata_after_processing"]["image_derivatives"]
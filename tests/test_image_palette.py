@@ -0,0 +1,60 @@
+import pytest
+
+import image_palette
+import suggest_visuals
+
+
+def test_color_conversions_and_shifts():
+    assert image_palette.hex_to_rgb("#36f") == (0x33, 0x66, 0xff)
+    assert image_palette.rgb_to_hsl((0x33, 0x66, 0xff)) == [225, 100, 60]
+    assert image_palette.color_shift_for_hsl([225, 100, 60]) == {"colorShift.h": 225, "colorShift.s": 20, "colorShift.l": 4}
+    with pytest.raises(ValueError):
+        image_palette.hex_to_rgb("#12345")
+
+
+def test_palette_shift_takes_the_hue_of_the_main_chromatic_colour():
+    palette = [{"hex": "#202020", "hsl": [0, 0, 13], "share": 0.6}, {"hex": "#cc3333", "hsl": [0, 60, 50], "share": 0.3},
+               {"hex": "#3333cc", "hsl": [240, 60, 50], "share": 0.1}]
+    shift = image_palette.palette_color_shift(palette)
+    assert (shift["colorShift.h"], shift["colorShift.s"]) == (0, 4)
+    assert shift["colorShift.l"] == round((0.6 * 13 + 0.4 * 50 - 50) * image_palette.COLOR_SHIFT_RANGE / 50)
+    greys = image_palette.palette_color_shift([{"hex": "#eeeeee", "hsl": [0, 0, 93], "share": 1.0}])
+    assert greys == {"colorShift.s": -image_palette.COLOR_SHIFT_RANGE, "colorShift.l": 17}
+    assert image_palette.palette_color_shift([]) == {}
+
+
+def test_mood_colours_override_the_image_shift():
+    interpretation = suggest_visuals.interpret_mood("calm #ff0000", {}, image_shift={"colorShift.h": 120, "colorShift.l": -10})
+    params = suggest_visuals.fold_operations(interpretation["operations"])
+    assert [op_key.split(":")[0] for op_key, _ in interpretation["operations"]] == ["palette", "hex"]
+    assert (params["colorShift.h"], params["colorShift.s"], params["colorShift.l"]) == (0, 20, 0)
+
+
+@pytest.fixture
+def palette_cache(tmp_path, monkeypatch):
+    pytest.importorskip("PIL.Image")
+    monkeypatch.setattr(image_palette, "PALETTE_CACHE_ROOT", str(tmp_path / "palette_cache"))
+    return tmp_path
+
+
+def test_palette_shares_ignore_transparent_pixels_and_are_cached(palette_cache):
+    from PIL import Image
+    image = Image.new("RGBA", (40, 40), (0, 0, 0, 0))
+    image.paste((200, 30, 30, 255), (0, 0, 40, 30))
+    image.paste((30, 30, 200, 255), (0, 30, 20, 40))
+    path = palette_cache / "header.png"
+    image.save(path)
+
+    palette, cached, error = image_palette.extract_palette(str(path))
+    assert (cached, error) == (False, None)
+    assert [(color["hex"], color["share"]) for color in palette] == [("#c81e1e", 0.8571), ("#1e1ec8", 0.1429)]
+    assert image_palette.extract_palette(str(path)) == (palette, True, None)
+
+
+def test_undecodable_images_are_remembered(palette_cache):
+    path = palette_cache / "broken.jpg"
+    path.write_bytes(b"not an image")
+    palette, cached, error = image_palette.extract_palette(str(path))
+    assert palette == [] and not cached and error.startswith("Could not decode image")
+    assert image_palette.extract_palette(str(path))[1:] == (True, error)
+    assert image_palette.extract_palette(str(palette_cache / "missing.png"))[2].startswith("Image not found")
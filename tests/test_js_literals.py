@@ -0,0 +1,59 @@
+import pytest
+
+import js_literals
+
+HEAD = r'var\s+items\s*=\s*\['
+
+
+def _items(source):
+    literal = js_literals.find_literal(source, HEAD)
+    return [source[start:end] for start, end in js_literals.literal_items(source, *literal)]
+
+
+def test_strings_and_template_literals_never_end_a_literal():
+    source = ('var note = "var items = [";\n'
+              'var items = ["];", \'a, b\', `x ${ {k: "]"}.k + `inner ${1}` } ]`, "\\"],"];\n'
+              'var after = 1;')
+    assert _items(source) == ['"];"', "'a, b'", '`x ${ {k: "]"}.k + `inner ${1}` } ]`', '"\\"],"']
+    with pytest.raises(js_literals.JsSyntaxError):
+        js_literals.find_literal('var items = ["open, ];', HEAD)
+    with pytest.raises(js_literals.JsSyntaxError):
+        js_literals.find_literal('var items = [`open ${1}, ];', HEAD)
+
+
+def test_comments_are_skipped_and_items_start_after_them():
+    source = ('// var items = [ in a comment\n'
+              'var items = [ /* first ] */ {a: 1},\n'
+              '    // second ], {\n'
+              '    {b: [2, 3]} /* tail, */\n'
+              '];')
+    assert _items(source) == ["{a: 1}", "{b: [2, 3]} /* tail, */"]
+
+
+@pytest.mark.parametrize("expression", [
+    "a / 2 / 1", "f(x) / 2 / 1", "arr[0] / 2 / 1", "i++ / 2 / 1", "i-- / 2 / 1",
+    "1.5e3 / 2 / 1", "'s'.length / 2 / 1", "`t` / 2 / 1", "a /* c */ / 2 / 1",
+])
+def test_a_slash_after_an_operand_is_a_division(expression):
+    # Read as a regex, "/ 2 /" would swallow code; as divisions the ']' that follows closes the literal
+    source = f"var items = [{expression}], rest = [1];"
+    assert _items(source) == [expression]
+
+
+@pytest.mark.parametrize("prefix, suffix", [
+    ("", ""), ("x = ", ""), ("f(", ")"), ("[1, ", "]"), ("a && ", ""), ("!", ""), ("return ", ""), ("typeof ", ""),
+    ("{} ", ""), ("x = /* c */ ", ""), ("return // c\n", ""), ("`${", "}`"),
+])
+def test_a_slash_in_operator_position_starts_a_regex(prefix, suffix):
+    source = "var items = [function () { " + prefix + "/[\\]}]/" + suffix + " }];"
+    literal = js_literals.find_literal(source, HEAD)
+    assert literal == (source.index("["), len(source) - 2)
+
+
+def test_item_splices_edit_in_place_and_keep_untouched_bytes():
+    source = "var items = [\n    1,\n    /* two */ 2,\n    3\n];"
+    literal = js_literals.find_literal(source, HEAD)
+    spans = js_literals.literal_items(source, *literal)
+    edited = js_literals.splice(source, js_literals.item_splices(spans, replace={0: "10"}, remove=[1], append=["4"]))
+    assert edited == "var items = [\n    10,\n    3,\n4\n];"
+    assert js_literals.item_splices(spans, remove=[0, 1, 2], append=["5"]) is None
@@ -0,0 +1,110 @@
+import json
+import multiprocessing
+
+import pytest
+
+import keyword_index
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_index, "KEYWORD_INDEX_ROOT", str(tmp_path / "keyword_index"))
+    monkeypatch.setattr(keyword_index, "_indexes", {})
+    return tmp_path / "keyword_index"
+
+
+def _df(root):
+    df = {}
+    for shard in (root / "df").glob("*.json"):
+        df.update(json.loads(shard.read_text(encoding="utf-8"))["df"])
+    return df
+
+
+def _index_batch(start):
+    keyword_index._indexes.clear() # A process of its own, starting from what is on disk
+    for i in range(start, start + 10):
+        keyword_index.index_document(f"doc-{i}", ["shared", f"word{i}"])
+    keyword_index.save_index()
+
+
+def test_document_frequencies_are_sharded_by_term_prefix(root):
+    keyword_index.index_document("a", ["coral", "reef", "coral"])
+    keyword_index.index_document("b", ["reef", "kelp"])
+    assert keyword_index.rank_terms(["coral", "reef"], [1, 1], 2)[0][0] == "coral" # Unsaved changes already count
+    assert keyword_index.save_index() and not keyword_index.save_index()
+
+    assert sorted(path.name for path in (root / "df").iterdir()) == ["co.json", "ke.json", "re.json"]
+    assert _df(root) == {"coral": 1, "reef": 2, "kelp": 1}
+    assert json.loads((root / "meta.json").read_text(encoding="utf-8"))["doc_count"] == 2
+    assert keyword_index.df_shard_name("é-x") == "-e9--2d-"
+
+
+def test_ranking_reads_only_the_shards_of_the_articles_terms(root, monkeypatch):
+    for doc_id, terms in (("a", ["coral", "reef"]), ("b", ["reef", "kelp"]), ("c", ["tide"])):
+        keyword_index.index_document(doc_id, terms)
+    keyword_index.save_index()
+
+    reads = []
+    read_shard = keyword_index._read_shard
+    monkeypatch.setattr(keyword_index, "_read_shard", lambda root, name, generation: reads.append(name) or read_shard(root, name, generation))
+    ranked = keyword_index.rank_terms(["coral", "reef"], [1, 1], 2)
+    assert sorted(reads) == ["co", "re"]
+    assert [term for term, _ in ranked] == ["coral", "reef"] # reef is in two of three articles
+    keyword_index.rank_terms(["reef"], [3], 1)
+    assert sorted(reads) == ["co", "re"] # Each shard is read once per process
+
+
+def test_reindexing_and_removal_adjust_the_counts(root):
+    keyword_index.index_document("a", ["coral", "reef"])
+    keyword_index.index_document("b", ["reef"])
+    keyword_index.save_index()
+
+    assert not keyword_index.index_document("a", ["reef", "coral"]) # Same term set: nothing to write
+    assert keyword_index.index_document("a", ["reef", "tide"])
+    assert keyword_index.remove_document("b") and not keyword_index.remove_document("missing")
+    keyword_index.save_index()
+
+    assert _df(root) == {"reef": 1, "tide": 1}
+    assert not (root / "df" / "co.json").exists() # Emptied shards are deleted
+    assert keyword_index.index_stats()["doc_count"] == 1
+
+
+def test_concurrent_saves_never_lose_counts(root):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_index_batch, args=(start,)) for start in (0, 10, 20, 30)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    stats = keyword_index.index_stats()
+    assert stats["doc_count"] == 40 and stats["term_count"] == 41
+    assert stats["most_common_terms"][0] == ("shared", 40)
+
+
+def test_a_save_merges_into_changes_made_since_loading(root):
+    keyword_index.index_document("a", ["reef"])
+    keyword_index.save_index()
+
+    keyword_index.rank_terms(["reef"], [1], 1) # Loaded here...
+    other = dict(keyword_index._indexes)
+    keyword_index._indexes.clear()
+    keyword_index.index_document("b", ["reef"]) # ...while another run indexes and saves b
+    keyword_index.save_index()
+    keyword_index._indexes.update(other)
+
+    keyword_index.index_document("a", ["reef", "kelp"])
+    keyword_index.save_index()
+    assert _df(root) == {"reef": 2, "kelp": 1}
+    assert json.loads((root / "meta.json").read_text(encoding="utf-8"))["doc_count"] == 2
+
+
+def test_files_from_another_generation_are_ignored(root):
+    keyword_index.index_document("a", ["reef"])
+    keyword_index.save_index()
+    (root / "meta.json").unlink() # e.g. deleted to start over
+
+    assert keyword_index.index_stats() == {"doc_count": 0, "term_count": 0, "most_common_terms": []}
+    keyword_index.index_document("a", ["kelp"]) # Its old doc file is not subtracted
+    keyword_index.save_index()
+    assert _df(root) == {"kelp": 1}
@@ -0,0 +1,65 @@
+import json
+
+import pipeline
+import process_markdown
+import suggest_metadata
+
+
+def test_collect_asset_fields_groups_fields_by_stage():
+    metadata = {
+        "title": "T",
+        "header_image_path": "images/h.png",
+        "gallery_images": ["images/a.png"],
+        "audio_clip_path": "audio/a.mp3",
+        "linked_document_pdf": "docs/d.pdf",
+        "supplementary_text_path": "text/notes.txt",
+        "thumbnail_image_path": "", # Empty fields are not assets
+        "header_image_path_status": "done"
+    }
+    assert pipeline.collect_asset_fields(metadata) == {
+        "image": ["header_image_path", "gallery_images"],
+        "audio": ["audio_clip_path"],
+        "pdf": ["linked_document_pdf"],
+        "txt_embedded": ["supplementary_text_path"]
+    }
+
+
+def test_stage_plan_only_schedules_the_stages_an_article_needs(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "BASE_APP_PATH", str(tmp_path))
+    cache = pipeline.build_cache.empty_cache()
+
+    plain, _ = pipeline._stage_plan("batch", "plain", {"title": "T"}, False, cache)
+    assert list(plain) == ["suggest_metadata", "suggest_visuals", "assemble_review_package"]
+
+    with_assets, metadata_path = pipeline._stage_plan("batch", "rich", {"header_image_path": "images/h.png", "audio_clip_path": "a.mp3"}, True, cache)
+    assert {"process_image_assets", "generate_image_derivatives", "process_audio_assets", "probe_media", "finalize_data_and_assets"} <= set(with_assets)
+    assert "process_document_assets" not in with_assets
+    assert metadata_path.endswith("batch/rich_metadata.json")
+
+
+def test_process_markdown_file_stages_metadata_and_html(tmp_path):
+    incoming = tmp_path / "incoming"
+    staging = tmp_path / "staging"
+    incoming.mkdir()
+    staging.mkdir()
+    (incoming / "post.md").write_text("---\ntitle: Hello\ndate: 2025-01-02\n---\n# Heading\n\nBody text.\n", encoding="utf-8")
+
+    log_entry, errors, _, frontmatter = process_markdown.process_markdown_file("post.md", str(incoming), str(staging))
+
+    assert log_entry == {"source": "post.md", "metadata_out": "post_metadata.json", "html_out": "post.html", "status": log_entry["status"]}
+    assert frontmatter["title"] == "Hello"
+    assert json.loads((staging / "post_metadata.json").read_text(encoding="utf-8"))["title"] == "Hello"
+    assert "Heading" in (staging / "post.html").read_text(encoding="utf-8")
+    if process_markdown.PYYAML_AVAILABLE and process_markdown.MARKDOWN_AVAILABLE:
+        assert errors == []
+
+
+def test_stage_result_uses_the_given_metadata_instead_of_rereading_it(tmp_path):
+    # The metadata file does not exist: the in-memory metadata handed over by the pipeline is all the stage needs
+    metadata = {"title": "T", "jules_override_ai_suggestions": True}
+    result = suggest_metadata.stage_result(str(tmp_path / "missing_metadata.json"), str(tmp_path / "missing.html"), str(tmp_path / "STYLE.md"),
+                                           metadata=metadata, save_metadata=False)
+
+    assert result["suggestions_made"] == {}
+    assert "overridden" in result["editorial_ai_message"]
+    assert not (tmp_path / "missing_metadata.json").exists()
@@ -0,0 +1,29 @@
+import pipeline_journal
+
+
+def test_interrupted_run_is_resumed_and_a_completed_one_is_not(tmp_path):
+    path = pipeline_journal.journal_path(str(tmp_path / "staging" / "b1"))
+    assert pipeline_journal.load_pending(path) == {} # No journal yet
+
+    journal = pipeline_journal.start_run(path)
+    pipeline_journal.record(journal, "b1/a/process_markdown", {"input_key": "k1"})
+    pipeline_journal.record(journal, "b1/a/suggest_metadata", {"input_key": "k2"})
+    pipeline_journal.finish_run(journal, completed=False) # A stage failed
+    pending = pipeline_journal.load_pending(path)
+    assert pending == {"b1/a/process_markdown": {"input_key": "k1"}, "b1/a/suggest_metadata": {"input_key": "k2"}}
+
+    # The resumed run carries the entries over, so a second interruption still has them
+    journal = pipeline_journal.start_run(path, carried_entries=pending)
+    assert pipeline_journal.load_pending(path) == pending
+    pipeline_journal.record(journal, "b1/a/suggest_visuals", {"input_key": "k3"})
+    pipeline_journal.finish_run(journal, completed=True)
+    assert pipeline_journal.load_pending(path) == {}
+
+
+def test_a_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / pipeline_journal.JOURNAL_FILENAME)
+    journal = pipeline_journal.start_run(path)
+    pipeline_journal.record(journal, "b1/a/process_markdown", {"input_key": "k1"})
+    journal["file"].write('{"event": "stage_completed", "name": "b1/a/sugg') # Crash mid-append
+    journal["file"].close()
+    assert pipeline_journal.load_pending(path) == {"b1/a/process_markdown": {"input_key": "k1"}}
@@ -0,0 +1,66 @@
+import struct
+import wave
+import zlib
+
+import probe_media
+
+
+def _png_bytes(width, height):
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr))
+    return b'\x89PNG\r\n\x1a\n' + chunk
+
+
+def test_image_dimensions_come_from_the_header(tmp_path):
+    path = tmp_path / "h.png"
+    path.write_bytes(_png_bytes(640, 360))
+    result = probe_media.probe_file(str(path))
+    assert (result["detected_format"], result["width"], result["height"]) == ("png", 640, 360)
+    assert result["mime_type"] == "image/png" and result["warnings"] == []
+
+
+def test_wav_duration_and_format(tmp_path):
+    path = tmp_path / "clip.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(b"\0\0" * 4000)
+    result = probe_media.probe_file(str(path))
+    assert result["detected_format"] == "wav"
+    assert (result["channels"], result["sample_rate_hz"], result["duration_seconds"]) == (1, 8000, 0.5)
+
+
+def test_pdf_page_count_uses_the_page_tree_root(tmp_path):
+    path = tmp_path / "d.pdf"
+    path.write_bytes(b"%PDF-1.4\n1 0 obj << /Type /Pages /Kids [2 0 R 3 0 R] /Count 12 >>\n"
+                     b"2 0 obj << /Type /Pages /Count 5 >>\n4 0 obj << /Type /Page >>\n%%EOF\n")
+    assert probe_media.probe_file(str(path))["page_count"] == 12
+
+
+def test_mislabelled_and_empty_files_are_flagged(tmp_path):
+    (tmp_path / "header.svg").write_text('<svg width="10" height="20"></svg>', encoding="utf-8")
+    (tmp_path / "header.png").write_bytes(b"")
+    (tmp_path / "logo.png").write_text('<svg width="100px" height="50"></svg>', encoding="utf-8")
+
+    empty = probe_media.probe_file(str(tmp_path / "header.png"))
+    assert empty["extension_mismatch"] and "File is empty." in empty["warnings"]
+    assert any("header.svg" in warning for warning in empty["warnings"])
+
+    mislabelled = probe_media.probe_file(str(tmp_path / "logo.png"))
+    assert mislabelled["detected_format"] == "svg" and mislabelled["extension_mismatch"]
+    assert (mislabelled["width"], mislabelled["height"]) == (100, 50)
+
+
+def test_truncated_headers_are_reported_not_raised(tmp_path):
+    path = tmp_path / "cut.png"
+    path.write_bytes(_png_bytes(1, 1)[:20])
+    result = probe_media.probe_file(str(path))
+    assert result["detected_format"] == "png"
+    assert any("Truncated" in warning for warning in result["warnings"])
+
+
+def test_resolve_disk_path_handles_staged_live_and_incoming_paths():
+    assert probe_media.resolve_disk_path("/content_pipeline/processed_assets/images/a/h.png", "/in/b1") == "/app/content_pipeline/processed_assets/images/a/h.png"
+    assert probe_media.resolve_disk_path("/assets/images/a/h.png", "/in/b1") == "/app/assets/images/a/h.png"
+    assert probe_media.resolve_disk_path("images/h.png", "/in/b1") == "/in/b1/images/h.png"
@@ -0,0 +1,36 @@
+import process_markdown
+
+
+def _make_batch(root, batch, names):
+    incoming = root / "content_pipeline" / "incoming" / batch
+    incoming.mkdir(parents=True)
+    for name in names:
+        (incoming / f"{name}.md").write_text(f"---\ntitle: {name}\nid: {name}\n---\nBody of {name}.\n", encoding="utf-8")
+    (incoming / "notes.txt").write_text("not markdown", encoding="utf-8")
+
+
+def test_workers_produce_the_same_results_as_a_single_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(process_markdown, "BASE_APP_PATH", str(tmp_path))
+    _make_batch(tmp_path, "b1", ["c", "a", "b"])
+    _make_batch(tmp_path, "b2", ["z"])
+
+    serial_metadata, parallel_metadata = {}, {}
+    serial = process_markdown.process_batches(["b1", "b2"], "content_pipeline/staging", workers=1, staged_metadata=serial_metadata)
+    parallel = process_markdown.process_batches(["b1", "b2"], "content_pipeline/staging", workers=3, staged_metadata=parallel_metadata)
+
+    assert serial == parallel
+    assert serial_metadata == parallel_metadata
+    # Logs follow sorted filenames within each batch, whatever order the workers finished in
+    assert [entry["source"] for entry in parallel[0]["processed_files_log"]] == ["a.md", "b.md", "c.md"]
+    assert set(parallel_metadata["b1"]) == {"a", "b", "c"} and parallel_metadata["b2"]["z"]["title"] == "z"
+    assert (tmp_path / "content_pipeline" / "staging" / "b2" / "z_metadata.json").exists()
+
+
+def test_missing_batch_is_reported_without_failing_the_others(tmp_path, monkeypatch):
+    monkeypatch.setattr(process_markdown, "BASE_APP_PATH", str(tmp_path))
+    _make_batch(tmp_path, "present", ["a"])
+
+    missing, present = process_markdown.process_batches(["missing", "present"], "content_pipeline/staging", workers=2)
+
+    assert "not found" in missing["error_log"][0]
+    assert [entry["source"] for entry in present["processed_files_log"]] == ["a.md"]
@@ -0,0 +1,53 @@
+import search_index
+
+
+def _record(article_id, title, tags=(), excerpt="", html_path=None):
+    record = {"id": article_id, "title": title, "tags": list(tags), "excerpt": excerpt, "date": "2024-01-01"}
+    if html_path:
+        record["html_content_path"] = html_path
+    return record
+
+
+def test_postings_are_delta_encoded_and_shard_names_are_file_safe():
+    encoded = search_index.encode_postings({7: 3, 2: 5, 40: 1})
+    assert encoded == [2, 5, 5, 3, 33, 1]
+    assert search_index.decode_postings(encoded) == {2: 5, 7: 3, 40: 1}
+    assert search_index.shard_name("garden") == "ga"
+    assert search_index.shard_name("ölkanne") == "-f6-l"
+
+
+def test_search_ranks_title_matches_first_and_prefix_matches_the_last_word(tmp_path):
+    search_dir = str(tmp_path / "search")
+    search_index.update_search_index([
+        _record("a", "Gardening in winter", excerpt="Notes on cold frames."),
+        _record("b", "Kitchen notes", tags=["recipes"], excerpt="Gardening leftovers become soup."),
+        _record("c", "Travel diary", excerpt="Trains and harbours."),
+    ], search_dir)
+
+    assert [result["id"] for result in search_index.search(search_dir, "gardening")] == ["a", "b"]
+    assert [result["id"] for result in search_index.search(search_dir, "notes garden")] == ["a", "b"]
+    assert [result["id"] for result in search_index.search(search_dir, "harb")] == ["c"]
+    assert search_index.search(search_dir, "gardening trains") == []
+
+
+def test_updates_touch_only_the_shards_whose_postings_changed(tmp_path):
+    site_root = tmp_path / "site"
+    (site_root / "articles").mkdir(parents=True)
+    body = site_root / "articles" / "a.html"
+    body.write_text("<p>Harbour lights at dusk.</p>", encoding="utf-8")
+    search_dir = str(tmp_path / "search")
+    record = _record("a", "Evening walk", html_path="/articles/a.html")
+    search_index.update_search_index([record, _record("b", "Morning walk")], search_dir, site_root=str(site_root))
+
+    unchanged = search_index.update_search_index([record], search_dir, site_root=str(site_root))
+    assert unchanged["unchanged"] == ["a"] and unchanged["shards_written"] == 0
+
+    body.write_text("<p>Harbour lights at dusk. Zebras.</p>", encoding="utf-8")
+    edited = search_index.update_search_index([record], search_dir, site_root=str(site_root))
+    assert edited["indexed"] == ["a"] and edited["shards_written"] == 1 # Only the new term's shard
+    assert [result["id"] for result in search_index.search(search_dir, "zebras")] == ["a"]
+
+    removed = search_index.update_search_index([], search_dir, removed_ids=["a"])
+    assert removed["removed"] == ["a"] and removed["shards_deleted"] >= 1
+    assert search_index.search(search_dir, "harbour") == []
+    assert [result["id"] for result in search_index.search(search_dir, "walk")] == ["b"]
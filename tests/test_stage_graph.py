@@ -0,0 +1,70 @@
+import threading
+import time
+
+import stage_graph
+
+
+def test_stage_ancestors_are_transitive_and_limited_to_the_plan():
+    plan = ["suggest_metadata", "process_image_assets", "generate_image_derivatives", "probe_media", "assemble_review_package"]
+    assert stage_graph.stage_ancestors("assemble_review_package", plan) == ["suggest_metadata", "process_image_assets", "generate_image_derivatives", "probe_media"]
+    assert stage_graph.stage_ancestors("finalize_data_and_assets", plan) == ["suggest_metadata", "process_image_assets", "generate_image_derivatives", "probe_media", "assemble_review_package"]
+    assert stage_graph.stage_ancestors("suggest_visuals", plan) == []
+
+
+def test_deltas_merge_in_the_order_given_and_report_conflicts():
+    base = {"title": "T", "old": 1}
+    first = stage_graph.compute_delta(base, {"title": "T", "old": 1, "tags": ["a"]})
+    second = stage_graph.compute_delta(base, {"title": "T", "tags": ["b"], "theme": "x"})
+    assert second == {"set": {"tags": ["b"], "theme": "x"}, "removed": ["old"]}
+
+    merged, conflicts = stage_graph.apply_deltas(base, [("suggest_metadata", first), ("suggest_visuals", second)])
+    assert merged == {"title": "T", "tags": ["a"], "theme": "x"}
+    assert len(conflicts) == 1 and "'suggest_metadata'" in conflicts[0]
+    assert base == {"title": "T", "old": 1}
+
+
+def test_run_graph_runs_independent_tasks_side_by_side_after_their_dependencies():
+    started = []
+    both_running = threading.Barrier(2, timeout=5)
+
+    def independent(name):
+        def run():
+            started.append(name)
+            both_running.wait() # Deadlocks (and times out) unless a and b run at the same time
+            return name
+        return run
+
+    tasks = {
+        "a": ([], independent("a"), None),
+        "b": ([], independent("b"), None),
+        "c": (["a", "b"], lambda: started.append("c") or "c", None),
+    }
+    outcomes = stage_graph.run_graph(tasks, threads=2)
+    assert outcomes == {"a": ("ok", "a"), "b": ("ok", "b"), "c": ("ok", "c")}
+    assert started[-1] == "c"
+
+
+def test_run_graph_skips_dependents_of_a_failed_task_and_serializes_locked_tasks():
+    active, overlaps = [], []
+
+    def locked():
+        active.append(1)
+        overlaps.append(len(active))
+        time.sleep(0.02)
+        active.pop()
+
+    def fail():
+        raise ValueError("boom")
+
+    tasks = {
+        "bad": ([], fail, None),
+        "after_bad": (["bad"], lambda: None, None),
+        "after_after": (["after_bad"], lambda: None, None),
+        "l1": ([], locked, "batch"),
+        "l2": ([], locked, "batch"),
+    }
+    outcomes = stage_graph.run_graph(tasks, threads=4)
+    assert outcomes["bad"][0] == "error"
+    assert outcomes["after_bad"] == ("skipped", None) and outcomes["after_after"] == ("skipped", None)
+    assert outcomes["l1"][0] == outcomes["l2"][0] == "ok"
+    assert overlaps == [1, 1]
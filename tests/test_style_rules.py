@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import style_rules
+
+GUIDE = """# Guide
+## 1. Core Aesthetic Philosophy
+### EMA Principles in Visual Design
+- **Transparency**: show the system.
+- **User Agency**: the reader decides.
+
+## 2. Themes
+### Night Theme
+*   Primary: Deep Blue (H:210, S:85, L:25)
+*   Calm, Quiet
+
+### Visual Mood Keyword Mapping for AI Suggestions
+*   **calm**: intensity(0.6), colorShift.h(-20), animationStyle("smooth")
+*   **energetic**: intensity(*1.5), particleCount(+50)
+"""
+
+
+def _guide(tmp_path, text=GUIDE):
+    path = tmp_path / "STYLE_GUIDANCE.md"
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_the_guide_compiles_into_rule_tables():
+    rules = style_rules.compile_style_guidance(GUIDE)
+    assert rules["visual_mood_rules"] == {
+        "calm": {"intensity": {"value": 0.6, "op": None}, "colorShift.h": {"value": 20, "op": "-"},
+                 "animationStyle": {"value": "smooth", "op": None}},
+        "energetic": {"intensity": {"value": 1.5, "op": "*"}, "particleCount": {"value": 50, "op": "+"}},
+    }
+    assert rules["ema_principles"] == ["transparency", "user agency"]
+    assert {"night", "transparency", "user agency"} <= set(rules["style_guide_keywords"])
+    assert "primary" not in rules["style_guide_keywords"] # Generic style terms are dropped
+
+
+def test_rules_are_reused_across_processes_and_touches(tmp_path, monkeypatch):
+    guide = _guide(tmp_path)
+    cache_path = str(tmp_path / "style_rules.json")
+    monkeypatch.setattr(style_rules, "_compiled", {})
+    first = style_rules.load_style_rules(str(guide), cache_path)
+    compile_style_guidance = style_rules.compile_style_guidance
+
+    def no_parsing(content):
+        raise AssertionError("compiled again")
+    monkeypatch.setattr(style_rules, "compile_style_guidance", no_parsing)
+    monkeypatch.setattr(style_rules, "_compiled", {}) # A fresh process
+    assert style_rules.load_style_rules(str(guide), cache_path) == first
+    stat_result = os.stat(guide)
+    os.utime(guide, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10**9)) # Touched, same bytes
+    assert style_rules.load_style_rules(str(guide), cache_path) == first
+
+    guide.write_text(GUIDE.replace("intensity(0.6)", "intensity(0.4)"), encoding="utf-8")
+    with pytest.raises(AssertionError):
+        style_rules.load_style_rules(str(guide), cache_path)
+    monkeypatch.setattr(style_rules, "compile_style_guidance", compile_style_guidance)
+    assert style_rules.load_style_rules(str(guide), cache_path)["visual_mood_rules"]["calm"]["intensity"]["value"] == 0.4
@@ -0,0 +1,53 @@
+from collections import Counter
+
+import pytest
+
+import suggest_metadata
+
+
+@pytest.fixture(autouse=True)
+def fallback_nlp(monkeypatch):
+    monkeypatch.setattr(suggest_metadata, "NLTK_AVAILABLE", False) # Resolved: basic tokenizer and fallback stopwords
+
+
+def test_one_pass_gives_sentence_spans_and_term_counts():
+    analysis = suggest_metadata.analyze_text("  Coral reefs  glow.\nThe reefs, at night, glow brighter!  Why? ")
+    text = analysis["text"]
+    assert text == "coral reefs glow. the reefs, at night, glow brighter! why?"
+    assert [text[start:end] for start, end in analysis["sentences"]] == ["coral reefs glow.", "the reefs, at night, glow brighter!", "why?"]
+
+    terms = analysis["terms"]
+    assert terms == ["coral", "reefs", "glow", "night", "brighter"] # Stopwords ("the", "at", "why") never get an id
+    assert dict(zip(terms, analysis["counts"])) == {"coral": 1, "reefs": 2, "glow": 2, "night": 1, "brighter": 1}
+    assert [terms[term_id] for term_id in analysis["tokens"]] == ["coral", "reefs", "glow", "reefs", "night", "glow", "brighter"]
+    assert list(analysis["sentence_tokens"]) == [0, 3, 7, 7]
+    assert analysis["term_ids"]["the"] == -1 and analysis["term_ids"]["reefs"] == 1
+
+
+def test_counts_match_the_stopword_filtered_words():
+    text = "Tide pools hold crabs. Crabs hide; the tide turns? Pools drain, crabs wait!"
+    analysis = suggest_metadata.analyze_text(text)
+    _, keywords = suggest_metadata.preprocess_text(text)
+    assert dict(zip(analysis["terms"], analysis["counts"])) == Counter(keywords)
+
+
+def test_excerpt_prefers_sentences_with_title_keywords():
+    text = ("Morning light falls across the quiet harbour. "
+            "Fishermen mend their nets beside the old lighthouse keeper's cottage. "
+            "Lighthouse beams once guided every lighthouse crew home through storms.")
+    excerpt = suggest_metadata.generate_excerpt(text, "The Lighthouse", [], max_chars=80)
+    # A title keyword counts once per sentence, so repeating it does not lift the later sentence past the earlier one
+    assert excerpt == "fishermen mend their nets beside the old lighthouse keeper's cottage."
+
+
+def test_excerpt_reuses_a_given_analysis_and_combines_short_sentences():
+    text = "Kelp grows fast. Otters eat urchins. Urchins eat kelp."
+    analysis = suggest_metadata.analyze_text(text)
+    excerpt = suggest_metadata.generate_excerpt("ignored", "Otters", ["kelp"], analysis=analysis)
+    assert excerpt == "otters eat urchins. kelp grows fast. urchins eat kelp."
+
+
+def test_long_excerpts_are_truncated_and_empty_text_gives_none():
+    text = "Word " * 100 + "end."
+    assert suggest_metadata.generate_excerpt(text, "", [], max_chars=40) == ("word " * 8).strip() + "..."
+    assert suggest_metadata.generate_excerpt("   ", "Title", []) == ""
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import suggest_metadata
+
+
+def _reset_nlp(monkeypatch, tmp_path):
+    monkeypatch.setattr(suggest_metadata, "NLP_RESOURCE_CACHE_PATH", str(tmp_path / "nlp_resources.json"))
+    monkeypatch.setattr(suggest_metadata, "NLTK_AVAILABLE", None)
+    monkeypatch.setattr(suggest_metadata, "NLTK_STOPWORDS", frozenset())
+
+
+def test_importing_the_module_loads_no_optional_nlp_libraries():
+    code = "import json, sys, suggest_metadata; print(json.dumps([m for m in ('nltk', 'bs4') if m in sys.modules]))"
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=repo_root, capture_output=True, text=True, check=True).stdout
+    assert json.loads(output) == []
+
+
+def test_probe_runs_once_and_later_starts_use_the_artifact(tmp_path, monkeypatch):
+    _reset_nlp(monkeypatch, tmp_path)
+    probes = []
+    monkeypatch.setattr(suggest_metadata, "_probe_nltk", lambda: probes.append(1) or (False, [], [str(tmp_path)]))
+
+    assert suggest_metadata.load_nlp_resources() is False
+    assert suggest_metadata.load_nlp_resources() is False # Resolved once per process
+    artifact = json.loads((tmp_path / "nlp_resources.json").read_text(encoding="utf-8"))
+    assert artifact["nltk_available"] is False and artifact["nltk_data_paths"] == [str(tmp_path)]
+
+    monkeypatch.setattr(suggest_metadata, "NLTK_AVAILABLE", None) # A new process
+    suggest_metadata.load_nlp_resources()
+    assert len(probes) == 1
+
+
+def test_artifact_is_rebuilt_when_the_nltk_data_changes(tmp_path, monkeypatch):
+    _reset_nlp(monkeypatch, tmp_path)
+    probes = []
+    monkeypatch.setattr(suggest_metadata, "_probe_nltk", lambda: probes.append(1) or (False, [], [str(tmp_path)]))
+    suggest_metadata.load_nlp_resources()
+
+    (tmp_path / "corpora").mkdir() # e.g. nltk.download("stopwords")
+    monkeypatch.setattr(suggest_metadata, "NLTK_AVAILABLE", None)
+    suggest_metadata.load_nlp_resources()
+    assert len(probes) == 2
+
+
+def test_overridden_articles_never_resolve_nlp_resources(tmp_path, monkeypatch):
+    _reset_nlp(monkeypatch, tmp_path)
+    metadata_path = tmp_path / "a_metadata.json"
+    metadata_path.write_text(json.dumps({"title": "T", "jules_override_ai_suggestions": True}), encoding="utf-8")
+    html_path = tmp_path / "a.html"
+    html_path.write_text("<p>Body text.</p>", encoding="utf-8")
+
+    suggest_metadata.stage_result(str(metadata_path), str(html_path), str(tmp_path / "STYLE_GUIDANCE.md"), save_metadata=False)
+    assert suggest_metadata.NLTK_AVAILABLE is None
+    assert not (tmp_path / "nlp_resources.json").exists()
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import suggest_visuals
+
+RULES = {
+    "calm": {"intensity": {"value": 0.6, "op": None}, "particleCount": {"value": 2, "op": "/"}},
+    "blue_focus": {"colorShift.h": {"value": 200, "op": None}, "visualComplexity": {"value": "low", "op": None}},
+    "blue focus deep": {"colorShift.l": {"value": 20, "op": "-"}},
+    "energetic": {"intensity": {"value": 1.5, "op": "*"}, "particleCount": {"value": 50, "op": "+"}},
+    "frozen": {"particleCount": {"value": 0, "op": "/"}, "glow": {"value": 3, "op": "+"}},
+    "wild": {"animationStyle": {"value": "chaotic", "op": None}},
+}
+
+
+def _per_mood(visual_mood):
+    operations = suggest_visuals.interpret_mood(visual_mood, RULES)["operations"]
+    return suggest_visuals.fold_operations(operations) if operations else None
+
+
+def test_phrases_match_in_any_spelling_and_overlaps_resolve_leftmost_longest():
+    matcher = suggest_visuals.build_mood_matcher(RULES)
+    for spelling in ("blue_focus", "Blue Focus", "blue-focus"):
+        assert suggest_visuals.match_mood_keywords(matcher, suggest_visuals.mood_tokens(spelling + ", calm")) == ["blue_focus", "calm"]
+    words = suggest_visuals.mood_tokens("calm blue focus deep energetic")
+    assert suggest_visuals.match_mood_keywords(matcher, words) == ["calm", "blue focus deep", "energetic"]
+
+
+def test_the_first_color_name_is_applied_after_the_rules():
+    interpretation = suggest_visuals.interpret_mood("red blue_focus green", RULES)
+    assert [op_key for op_key, _ in interpretation["operations"]] == ["blue_focus", "color:red"]
+    assert suggest_visuals.fold_operations(interpretation["operations"])["colorShift.h"] == 0
+    assert interpretation["color_hints"]["name"] == ["red", "blue", "green"]
+
+
+@pytest.fixture(params=["python", "numpy"])
+def batch_backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(suggest_visuals, "NUMPY_AVAILABLE", False)
+    return request.param
+
+
+def test_batch_params_match_the_per_article_fold(batch_backend):
+    rng = random.Random(3)
+    vocabulary = ["calm", "blue", "focus", "deep", "energetic", "frozen", "wild", "quiet", "red", "#3366ff"]
+    moods = [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 5))) for _ in range(300)]
+    batch = suggest_visuals.theme_params_batch(moods, RULES)
+    for visual_mood, (params, interpretation) in zip(moods, batch):
+        expected = _per_mood(visual_mood)
+        assert params == expected, visual_mood
+        if expected:
+            assert {key: type(value) for key, value in params.items()} == {key: type(value) for key, value in expected.items()}
+    repeated = suggest_visuals.theme_params_batch(["calm energetic", "wild", "calm energetic"], RULES)
+    assert repeated[0][0] is repeated[2][0] # Each distinct mood is computed once
@@ -0,0 +1,64 @@
+import json
+
+import article_index
+import update_router_article
+
+ROUTER_TAIL = "\n];\nvar note = 'an array ends with \"];\"';\n"
+
+
+def _record(article_id, title, date="2024-01-01"):
+    return {"id": article_id, "title": title, "date": date, "contentType": "article", "tags": ["t"], "body": "<p>Body</p>"}
+
+
+def _router(tmp_path, cards):
+    router = tmp_path / "js" / "magazine-router.js"
+    router.parent.mkdir()
+    router.write_text("var allArticles = [" + update_router_article.format_articles_array(cards)[:-1] + ROUTER_TAIL, encoding="utf-8")
+    return router
+
+
+def test_a_batch_is_applied_with_one_write_that_keeps_untouched_items(tmp_path, monkeypatch):
+    kept = article_index.card_record(_record("kept", "Kept"))
+    router = _router(tmp_path, [kept, article_index.card_record(_record("edited", "Old title"))])
+    writes = []
+    real_atomic_open = update_router_article.atomic_files.atomic_open
+    monkeypatch.setattr(update_router_article.atomic_files, "atomic_open", lambda path, *a, **k: writes.append(path) or real_atomic_open(path, *a, **k))
+    monkeypatch.setattr(update_router_article, "update_search", lambda *args: None)
+
+    batch = [_record("edited", "New title"), _record("fresh", "Fresh"), _record("fresh", "Fresh, second version")]
+    status, _, outcomes, errors = update_router_article.update_router_articles(str(router), batch)
+
+    assert (status, errors) == ("success", [])
+    assert [path for path in writes if path.endswith(".js")] == [str(router)] # Bundles aside, the router is written once
+    assert {article_id: outcome["action"] for article_id, outcome in outcomes.items()} == {"edited": "Updated", "fresh": "Added"}
+    content = router.read_text(encoding="utf-8")
+    assert content.startswith("var allArticles = [" + update_router_article.format_articles_array([kept])[:-1] + ",")
+    assert content.endswith(ROUTER_TAIL)
+    _, articles = article_index.parse_router_articles(content)
+    assert [(card["id"], card["title"]) for card in articles] == [("kept", "Kept"), ("edited", "New title"), ("fresh", "Fresh, second version")]
+    assert all(article_index.is_card(card) for card in articles)
+    assert article_index.load_bundle(str(tmp_path / "assets" / "index"), "fresh")["body"] == "<p>Body</p>"
+
+
+def test_articles_without_an_id_are_reported_and_the_rest_applied(tmp_path, monkeypatch):
+    router = _router(tmp_path, [])
+    monkeypatch.setattr(update_router_article, "update_search", lambda *args: None)
+    results = dict(update_router_article.batch_stage_results(str(router), [{"title": "No id"}, _record("ok", "Ok")]))
+    assert results["No id"]["status"] == "failure"
+    assert results["ok"]["status"] == "success" and "Added" in results["ok"]["changes_summary"]
+
+
+def test_a_migrated_router_updates_the_index_instead_of_the_file(tmp_path, monkeypatch):
+    router = _router(tmp_path, [])
+    index_dir = str(tmp_path / "assets" / "index")
+    article_index.update_index([_record("old", "Old")], index_dir)
+    before = router.read_bytes()
+    monkeypatch.setattr(update_router_article, "update_search", lambda *args: None)
+
+    status, modified, outcomes, _ = update_router_article.update_router_articles(str(router), [_record("old", "Old, edited"), _record("new", "New", "2024-02-01")])
+
+    assert (status, modified) == ("success", index_dir)
+    assert router.read_bytes() == before
+    assert {article_id: outcome["action"] for article_id, outcome in outcomes.items()} == {"old": "Updated", "new": "Added"}
+    page = json.loads((tmp_path / "assets" / "index" / "pages" / "page-1.json").read_text(encoding="utf-8"))
+    assert [card["title"] for card in page["articles"]] == ["New", "Old, edited"]
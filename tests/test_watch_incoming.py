@@ -0,0 +1,117 @@
+import os
+import signal
+
+import pytest
+
+import watch_incoming
+
+
+def test_refresh_snapshot_reports_added_edited_and_removed_files(tmp_path):
+    batch = tmp_path / "b1"
+    batch.mkdir()
+    (batch / "a.md").write_text("one", encoding="utf-8")
+    (batch / "old.md").write_text("old", encoding="utf-8")
+    snapshot = watch_incoming.scan_tree(str(tmp_path))
+    assert watch_incoming.refresh_snapshot(snapshot) == set()
+
+    (batch / "a.md").write_text("one, edited", encoding="utf-8")
+    (batch / "old.md").unlink()
+    (batch / "images").mkdir()
+    (batch / "images" / "h.png").write_bytes(b"png")
+    changed = watch_incoming.refresh_snapshot(snapshot)
+
+    assert {str(batch / "a.md"), str(batch / "old.md"), str(batch / "images"), str(batch / "images" / "h.png")} <= changed
+    assert str(batch / "images" / "h.png") in snapshot["files"] and str(batch / "old.md") not in snapshot["files"]
+    assert watch_incoming.refresh_snapshot(snapshot) == set()
+
+
+def test_affected_batches_ignores_temp_files_and_paths_outside_incoming(tmp_path):
+    (tmp_path / "b1").mkdir()
+    (tmp_path / "b2").mkdir()
+    changed = [
+        str(tmp_path / "b1" / "a.md"),
+        str(tmp_path / "b2" / "a.md.swp"),
+        str(tmp_path / "b2" / ".a.md"),
+        str(tmp_path / "gone" / "a.md"), # Batch directory already removed
+        str(tmp_path.parent / "elsewhere.md"),
+    ]
+    assert watch_incoming.affected_batches(changed, str(tmp_path)) == {"b1"}
+
+
+@pytest.mark.skipif(not watch_incoming.INOTIFY_AVAILABLE, reason="inotify is Linux-only")
+def test_inotify_reports_files_in_a_directory_copied_in(tmp_path):
+    fd, watches = watch_incoming.inotify_open(str(tmp_path))
+    try:
+        staged = tmp_path.parent / (tmp_path.name + "-new-batch")
+        staged.mkdir()
+        (staged / "a.md").write_text("x", encoding="utf-8")
+        os.rename(staged, tmp_path / "b1")
+        changed = watch_incoming.inotify_read(fd, watches, 1.0, str(tmp_path))
+        assert {str(tmp_path / "b1"), str(tmp_path / "b1" / "a.md")} <= changed
+
+        (tmp_path / "b1" / "b.md").write_text("y", encoding="utf-8")
+        assert str(tmp_path / "b1" / "b.md") in watch_incoming.inotify_read(fd, watches, 1.0, str(tmp_path))
+    finally:
+        os.close(fd)
+
+
+def test_queue_overflow_reports_every_file(tmp_path):
+    (tmp_path / "b1" / "images").mkdir(parents=True)
+    (tmp_path / "b1" / "a.md").write_text("x", encoding="utf-8")
+    (tmp_path / "b1" / "images" / "h.png").write_bytes(b"png")
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, watch_incoming.INOTIFY_EVENT_HEADER.pack(-1, watch_incoming.IN_Q_OVERFLOW, 0, 0))
+        changed = watch_incoming.inotify_read(read_fd, {}, 1.0, str(tmp_path))
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+    assert changed == {str(tmp_path / "b1" / "a.md"), str(tmp_path / "b1" / "images" / "h.png")}
+
+
+@pytest.mark.parametrize("use_inotify", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not watch_incoming.INOTIFY_AVAILABLE, reason="inotify is Linux-only")),
+])
+def test_writes_during_the_startup_round_trigger_another_round(tmp_path, monkeypatch, capsys, use_inotify):
+    (tmp_path / "b1").mkdir()
+    (tmp_path / "b1" / "a.md").write_text("x", encoding="utf-8")
+    calls = []
+
+    def process_changes(batches, cache, workers, threads):
+        calls.append(sorted(batches))
+        if len(calls) == 1:
+            (tmp_path / "b1" / "late.md").write_text("written mid-round", encoding="utf-8")
+        else:
+            raise KeyboardInterrupt # Stops the watcher
+        return {"batches": []}
+
+    def give_up(signum, frame):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch_incoming.build_cache, "load_cache", lambda *args: watch_incoming.build_cache.empty_cache())
+    monkeypatch.setattr(watch_incoming, "process_changes", process_changes)
+    previous_handler = signal.signal(signal.SIGALRM, give_up)
+    signal.alarm(5)
+    try:
+        watch_incoming.watch(str(tmp_path), debounce_seconds=0.1, poll_interval=0.05, use_inotify=use_inotify)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+    assert calls == [["b1"], ["b1"]]
+    assert '"trigger": "startup"' in capsys.readouterr().out
+
+
+def test_run_once_processes_every_batch_at_startup(tmp_path, monkeypatch, capsys):
+    for batch in ("b1", "b2"):
+        (tmp_path / batch).mkdir()
+        (tmp_path / batch / "a.md").write_text("x", encoding="utf-8")
+    calls = []
+    monkeypatch.setattr(watch_incoming.build_cache, "load_cache", lambda *args: watch_incoming.build_cache.empty_cache())
+    monkeypatch.setattr(watch_incoming, "process_changes", lambda batches, cache, workers, threads: calls.append(sorted(batches)) or {"batches": []})
+
+    watch_incoming.watch(str(tmp_path), run_once=True)
+
+    assert calls == [["b1", "b2"]]
+    assert '"trigger": "startup"' in capsys.readouterr().out
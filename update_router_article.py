@@ -1,176 +1,215 @@
 import json
-import re
 import os
 import sys
 
+import article_index
+import atomic_files
+import js_literals
+import search_index
+
 # robust_python_value_to_js_string, python_to_js_object_string, and parse_js_object_string
 # are removed as per new strategy using json.loads and json.dumps.
 
-def update_router_article_data(router_file_path, final_metadata_file_path, article_id_to_update):
-    errors = []
-    changes_summary = ""
-    final_article_title = article_id_to_update
+ARTICLE_INDENT = "    "
+
+
+def format_article_item(article_dict):
+    """One article pretty-printed for the allArticles array, every line indented one level."""
+    return '\n'.join(ARTICLE_INDENT + line for line in json.dumps(article_dict, indent=4).split('\n'))
+
+
+def format_articles_array(articles):
+    """
+    The content between `var allArticles = [` and `];`: each article pretty-printed and indented one level,
+    e.g. "\n    {\n        \"id\": \"1\"\n    },\n    {...}\n", or "" for an empty array.
+    """
+    if not articles:
+        return ""
+    return "\n" + ",\n".join(format_article_item(article_dict) for article_dict in articles) + "\n"
+
+
+def change_summary(action, article_id, title, modified_file, index_report=None):
+    if index_report is not None:
+        verb = "Updated article with ID" if action == "Updated" else "Added new article with ID"
+        return (f"{verb} '{article_id}' ('{title}') in the article index "
+                f"({len(index_report['files_written'])} index files written, {len(index_report['files_deleted'])} removed).")
+    if action == "Updated":
+        return f"Updated article with ID '{article_id}' ('{title}') in {os.path.basename(modified_file)}."
+    return f"Added new article with ID '{article_id}' ('{title}') to {os.path.basename(modified_file)}."
 
+
+def update_search(router_file_path, published_articles, outcomes):
+    """
+    Re-indexes the published articles in the site's search index (assets/search/, see search_index.py). The router
+    is already updated at this point, so a failure is reported on each article's outcome instead of failing it.
+    """
     try:
-        with open(final_metadata_file_path, 'r', encoding='utf-8') as f:
-            final_article_data = json.load(f)
-        final_article_title = final_article_data.get('title', article_id_to_update)
+        search_index.update_search_index(published_articles, search_index.search_dir_for_router(router_file_path),
+                                         site_root=search_index.site_root_for_router(router_file_path))
     except Exception as e:
-        errors.append(f"Error loading final metadata: {e}")
-        return "failure", router_file_path, "", errors, final_article_title
+        for outcome in outcomes.values():
+            outcome["errors"] = [f"Error updating search index: {e}"]
+
+
+def update_router_articles(router_file_path, final_articles):
+    """
+    Upserts many finalized articles (dicts from _final_for_router.json) with a single read, parse and write of the
+    router: an id->position map is built once, so each article is placed in O(1) rather than by rescanning the array,
+    and only the byte ranges of articles that changed are rewritten.
+    The router gets each article's card (article_index.card_record); the full record is written to its bundle.
+    A router migrated to the sharded index (article_index.py migrate) keeps an empty inline array; its articles live
+    in assets/index/, which gets one incremental update for the whole batch instead.
+    Later duplicates of an id win. Returns (status, modified_file, outcomes, errors) where outcomes maps each applied
+    article id to {"action": "Added"|"Updated", "title", "changes_summary"}; articles without an 'id' are reported
+    in errors and skipped.
+    """
+    errors = []
+    outcomes = {}
 
     try:
         with open(router_file_path, 'r', encoding='utf-8') as f:
             router_content = f.read()
     except Exception as e:
         errors.append(f"Error reading router file: {e}")
-        return "failure", router_file_path, "", errors, final_article_title
+        return "failure", router_file_path, outcomes, errors
 
-    all_articles_match = re.search(r'(var\s+allArticles\s*=\s*\[|this\.allArticles\s*=\s*\[)([\s\S]*?)(\];)', router_content)
-    if not all_articles_match:
+    # The array is located with a tokenizer rather than a regex, so a "];" inside a string cannot end it early, and
+    # each article's own byte range is known: only the articles that change are re-serialized below.
+    try:
+        literal = js_literals.find_literal(router_content, article_index.ROUTER_ARTICLES_HEAD)
+        item_spans = js_literals.literal_items(router_content, *literal) if literal else []
+    except js_literals.JsSyntaxError as e:
+        errors.append(f"Error parsing existing allArticles content: {e}")
+        return "failure", router_file_path, outcomes, errors
+    if literal is None:
         errors.append("Could not find 'allArticles' array in router file.")
-        return "failure", router_file_path, "", errors, final_article_title
-
-    array_prefix = all_articles_match.group(1)
-    array_content_str = all_articles_match.group(2).strip()
-    array_suffix = all_articles_match.group(3)
+        return "failure", router_file_path, outcomes, errors
 
     existing_articles_list = []
-    if array_content_str: # If not empty or just whitespace
+    if item_spans:
+        array_content_str = router_content[literal[0] + 1:literal[1]]
         try:
-            # The content is a list of JS objects, e.g. "{...}, {...}".
-            # To parse as JSON, it needs to be enclosed in '[]'
-            # unless it's already a valid JSON array string (which it might be).
-            # For robustness, we assume it's the content *inside* the array.
-            json_parsable_array_content = f"[{array_content_str}]"
-            existing_articles_list = json.loads(json_parsable_array_content)
+            # The captured content is the list of objects *inside* the array, e.g. "{...}, {...}"
+            existing_articles_list = json.loads(f"[{array_content_str}]")
         except json.JSONDecodeError as e:
-            errors.append(f"Error parsing existing allArticles content: {e}. Content preview: {array_content_str[:200]}")
-            # Decide if this is fatal. For now, let's try to continue by overwriting with new article if parsing fails.
-            # Or, return failure. Let's return failure.
-            return "failure", router_file_path, f"Failed to parse existing articles in {router_file_path}", errors, final_article_title
+            errors.append(f"Error parsing existing allArticles content: {e}. Content preview: {array_content_str.strip()[:200]}")
+            return "failure", router_file_path, outcomes, errors
+        if len(existing_articles_list) != len(item_spans):
+            errors.append(f"Error parsing existing allArticles content: found {len(item_spans)} items but parsed {len(existing_articles_list)} articles.")
+            return "failure", router_file_path, outcomes, errors
 
-    new_article_id = final_article_data.get('id')
-    if not new_article_id:
-        errors.append("New article data is missing 'id' field.")
-        return "failure", router_file_path, "New article data missing 'id'", errors, final_article_title
+    articles_to_apply = []
+    for final_article_data in final_articles:
+        if not final_article_data.get('id'):
+            errors.append(f"Article '{final_article_data.get('title', 'untitled')}' is missing 'id' field.")
+        else:
+            articles_to_apply.append(final_article_data)
+    if not articles_to_apply:
+        return "failure", router_file_path, outcomes, errors
+
+    index_dir = article_index.index_dir_for_router(router_file_path)
+    if not existing_articles_list and article_index.index_exists(index_dir):
+        try:
+            index_report = article_index.update_index(articles_to_apply, index_dir)
+        except Exception as e:
+            errors.append(f"Error updating article index: {e}")
+            return "failure", index_dir, outcomes, errors
+        for final_article_data in articles_to_apply:
+            article_id = final_article_data['id']
+            action = "Added" if article_id in index_report["added"] else "Updated"
+            title = final_article_data.get('title', article_id)
+            outcomes[article_id] = {"action": action, "title": title, "changes_summary": change_summary(action, article_id, title, index_dir, index_report)}
+        update_search(router_file_path, articles_to_apply, outcomes)
+        return "success", index_dir, outcomes, errors
+
+    # The inline array only holds cards; each full record goes to its bundle in assets/index/articles/, which the
+    # router fetches when the article is opened. Full records left inline by older versions are converted here.
+    replaced_items = {} # position -> new article; everything else keeps its bytes
+    try:
+        for i, existing_article in enumerate(existing_articles_list):
+            if isinstance(existing_article, dict) and existing_article.get('id') and not article_index.is_card(existing_article):
+                article_index.write_bundle(index_dir, existing_article)
+                replaced_items[i] = existing_articles_list[i] = article_index.card_record(existing_article)
+        for final_article_data in articles_to_apply:
+            article_index.write_bundle(index_dir, final_article_data)
+    except Exception as e:
+        errors.append(f"Error writing article bundles: {e}")
+        return "failure", index_dir, outcomes, errors
 
-    article_updated = False
+    position_by_id = {}
     for i, existing_article in enumerate(existing_articles_list):
-        if isinstance(existing_article, dict) and existing_article.get('id') == new_article_id:
-            existing_articles_list[i] = final_article_data
-            article_updated = True
-            break
+        if isinstance(existing_article, dict) and existing_article.get('id') is not None:
+            position_by_id.setdefault(existing_article['id'], i) # First match, like the old linear scan
+    for final_article_data in articles_to_apply:
+        article_id = final_article_data['id']
+        card = article_index.card_record(final_article_data)
+        if article_id in position_by_id:
+            position = position_by_id[article_id]
+            if existing_articles_list[position] != card:
+                replaced_items[position] = existing_articles_list[position] = card
+            action = outcomes[article_id]["action"] if article_id in outcomes else "Updated" # Added earlier in this batch stays Added
+        else:
+            position_by_id[article_id] = len(existing_articles_list)
+            existing_articles_list.append(card)
+            action = "Added"
+        title = final_article_data.get('title', article_id)
+        outcomes[article_id] = {"action": action, "title": title, "changes_summary": change_summary(action, article_id, title, router_file_path)}
 
-    if article_updated:
-        changes_summary = f"Updated article with ID '{new_article_id}' ('{final_article_title}') in {os.path.basename(router_file_path)}."
+    if not item_spans:
+        splices = [(literal[0] + 1, literal[1], format_articles_array(existing_articles_list))]
     else:
-        existing_articles_list.append(final_article_data)
-        changes_summary = f"Added new article with ID '{new_article_id}' ('{final_article_title}') to {os.path.basename(router_file_path)}."
-
-    # Convert the list of dictionaries back to a pretty-printed JSON string
-    # Ensure consistent newlines and indentation for array elements.
-    if existing_articles_list:
-        new_array_content_json_str = json.dumps(existing_articles_list, indent=4)
-        # Add a newline after array_prefix if it doesn't end with one (it usually does, e.g. "var allArticles = [")
-        # And a newline before array_suffix if it doesn't start with one (it usually does, e.g. "];")
-        # json.dumps output for a list will start with '[' and end with ']', but we want the content *inside* the main array.
-        # The regex captures `var allArticles = [` as prefix and `];` as suffix.
-        # So, the output of json.dumps (which is a full array string "[\n    {...}\n]") needs to be stripped of its outer brackets
-        # if the prefix and suffix provide them.
-        # Current regex: (var\s+allArticles\s*=\s*\[|this\.allArticles\s*=\s*\[)  <- group 1 (prefix)
-        # ([\s\S]*?)                                                              <- group 2 (content)
-        # (\];)                                                                  <- group 3 (suffix)
-        # So, new_array_content_json_str from json.dumps is already a complete array string.
-        # We need to replace group 2 with the content of this new string.
-        # Example: json.dumps([{"id":"1"}], indent=4) -> "[\n    {\n        \"id\": \"1\"\n    }\n]"
-        # We need to fit this between `array_prefix` (e.g. "var allArticles = [") and `array_suffix` (e.g. "];")
-        # This means `json.dumps` output should be used directly as the new content for the JS array.
-        # However, the current regex extracts the *content* of the array.
-        # Let's adjust: the new_array_content_str should be the content *between* the prefix's '[' and suffix's ']'.
-
-        # If existing_articles_list is not empty, json.dumps will produce "[\n    {...}\n]"
-        # If it's empty, it will produce "[]"
-        # We need to format it nicely.
-        if not existing_articles_list: # Handle empty list explicitly for cleaner output
-             new_array_internal_content_str = ""
-        else:
-            # json.dumps produces a full JSON array string.
-            # We want each object indented.
-            # A common style:
-            # var allArticles = [
-            #     {...},
-            #     {...}
-            # ];
-            # So, each item from json.dumps should be indented.
-            # Let's make each item string, then join with ',\n' and indent.
-            items_str_list = []
-            for article_dict in existing_articles_list:
-                # Convert each dict to a JSON string, compact (no newlines within object) for this style
-                # but then indent each line of the object if we use indent in dumps for the object itself.
-                # Easier: json.dumps the whole list with indent, then adjust.
-                items_str_list.append(json.dumps(article_dict, indent=4)) # Indent objects themselves
-
-            # Indent each item block for the array structure
-            # Example: if an item_str is "{\n    \"id\": \"1\"\n}", it becomes "    {\n        \"id\": \"1\"\n    }"
-            base_indent_for_array_items = "    " # Assuming array content starts after a newline and initial indent
-            formatted_items = []
-            for item_json_str in items_str_list:
-                indented_item_lines = [base_indent_for_array_items + line for line in item_json_str.split('\n')]
-                formatted_items.append('\n'.join(indented_item_lines))
-
-            if formatted_items:
-                new_array_internal_content_str = "\n" + ",\n".join(formatted_items) + "\n"
-            else: # Should not happen if existing_articles_list was not empty
-                new_array_internal_content_str = ""
-
-    else: # existing_articles_list is empty
-        new_array_internal_content_str = "" # Results in `[]`
-
-    # Reconstruct the entire file content
-    # router_content[:all_articles_match.start(0)] # Content before the 'allArticles' definition
-    # + array_prefix # The 'var allArticles = [' part
-    # + new_array_internal_content_str # The new content of the array, like '\n    {...}\n' or '' if empty
-    # + array_suffix.strip() # The '];' part, stripped of any extra whitespace from regex capture
-    # + router_content[all_articles_match.end(0):] # Content after the 'allArticles' definition
-
-    # all_articles_match.group(0) is the entire matched string for `allArticles`
-    # e.g. "var allArticles = [\n    {...}\n];"
-    # We want to replace this whole segment.
-
-    new_all_articles_definition = array_prefix + new_array_internal_content_str + array_suffix.strip()
-
-    updated_router_content = router_content[:all_articles_match.start(0)] + \
-                             new_all_articles_definition + \
-                             router_content[all_articles_match.end(0):]
+        splices = [(item_spans[i][0], item_spans[i][1], format_article_item(article)[len(ARTICLE_INDENT):])
+                   for i, article in replaced_items.items() if i < len(item_spans)]
+        appended = existing_articles_list[len(item_spans):]
+        if appended:
+            last_item_end = item_spans[-1][1]
+            splices.append((last_item_end, last_item_end, ",\n" + ",\n".join(format_article_item(article) for article in appended)))
+    updated_router_content = js_literals.splice(router_content, splices)
 
     try:
-        with open(router_file_path, 'w', encoding='utf-8') as f:
+        with atomic_files.atomic_open(router_file_path) as f:
             f.write(updated_router_content)
-        status = "success"
-        # changes_summary is set above based on add/update
     except Exception as e:
         errors.append(f"Error writing updated router file: {e}")
-        status = "failure"
-        changes_summary = f"Failed to write changes to {os.path.basename(router_file_path)} for article ID '{new_article_id}'."
+        for article_id, outcome in outcomes.items():
+            outcome["changes_summary"] = f"Failed to write changes to {os.path.basename(router_file_path)} for article ID '{article_id}'."
+        return "failure", router_file_path, outcomes, errors
+    update_search(router_file_path, articles_to_apply, outcomes)
+    return "success", router_file_path, outcomes, errors
 
-    return status, router_file_path, changes_summary, errors, final_article_title
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print(json.dumps({
-            "status": "failure", "modified_file": None, "changes_summary": "",
-            "editorial_ai_message": "Error: Incorrect arguments. Usage: python update_router_article.py <router_file_path> <final_metadata_file_path> <article_id_to_update>",
-            "errors": ["Incorrect number of arguments provided."]
-        }))
-        sys.exit(1)
+def update_router_article_data(router_file_path, final_metadata_file_path, article_id_to_update, final_article_data=None):
+    # final_article_data: optional already-loaded final metadata dict (e.g. from pipeline.py); skips re-reading the file
+    errors = []
+    final_article_title = article_id_to_update
 
-    r_file_path = sys.argv[1]
-    final_meta_path = sys.argv[2]
-    article_id = sys.argv[3]
+    if final_article_data is None:
+        try:
+            with open(final_metadata_file_path, 'r', encoding='utf-8') as f:
+                final_article_data = json.load(f)
+        except Exception as e:
+            errors.append(f"Error loading final metadata: {e}")
+            return "failure", router_file_path, "", errors, final_article_title
+    final_article_title = final_article_data.get('title', article_id_to_update)
+
+    if not final_article_data.get('id'):
+        errors.append("New article data is missing 'id' field.")
+        return "failure", router_file_path, "New article data missing 'id'", errors, final_article_title
+
+    status, modified_file, outcomes, errors = update_router_articles(router_file_path, [final_article_data])
+    outcome = outcomes.get(final_article_data['id'])
+    if outcome:
+        changes_summary = outcome["changes_summary"]
+        errors.extend(outcome.get("errors", []))
+    elif status != "success" and errors and errors[0].startswith("Error parsing existing allArticles"):
+        changes_summary = f"Failed to parse existing articles in {router_file_path}"
+    else:
+        changes_summary = ""
+    return status, modified_file, changes_summary, errors, final_article_title
 
-    status_res, mod_file, summary_res, err_list, title_res = update_router_article_data(r_file_path, final_meta_path, article_id)
 
+def article_result(status_res, mod_file, summary_res, err_list, title_res, article_id, r_file_path):
+    """The result dict the CLI prints for one article."""
     ai_msg = ""
     if status_res == "success":
         # summary_res already indicates if added or updated.
@@ -188,10 +227,74 @@ if __name__ == "__main__":
         if err_list:
              ai_msg += f" Errors: {'; '.join(map(str, err_list))}"
 
-    print(json.dumps({
+    return {
         "status": status_res,
         "modified_file": mod_file,
         "changes_summary": summary_res,
         "editorial_ai_message": ai_msg,
         "errors": [str(e) for e in err_list] # Ensure errors are strings
-    }))
+    }
+
+
+def stage_result(r_file_path, final_meta_path, article_id, final_article_data=None):
+    """Runs update_router_article_data and returns the same result dict the CLI prints."""
+    status_res, mod_file, summary_res, err_list, title_res = update_router_article_data(r_file_path, final_meta_path, article_id, final_article_data=final_article_data)
+    return article_result(status_res, mod_file, summary_res, err_list, title_res, article_id, r_file_path)
+
+
+def batch_stage_results(r_file_path, final_articles):
+    """
+    Applies all final_articles with one update_router_articles call and returns a stage_result-shaped dict per
+    article, in input order: (article id or title, result).
+    """
+    status_res, mod_file, outcomes, err_list = update_router_articles(r_file_path, final_articles)
+    results = []
+    for final_article_data in final_articles:
+        article_id = final_article_data.get('id')
+        title = final_article_data.get('title', article_id)
+        if article_id in outcomes:
+            outcome = outcomes[article_id]
+            results.append((article_id, article_result(status_res, mod_file, outcome["changes_summary"], outcome.get("errors", []) if status_res == "success" else err_list, outcome["title"], article_id, r_file_path)))
+        elif not article_id:
+            results.append((title, article_result("failure", r_file_path, "New article data missing 'id'", ["New article data is missing 'id' field."], title, title, r_file_path)))
+        else:
+            results.append((article_id, article_result("failure", mod_file, "", err_list, title, article_id, r_file_path)))
+    return results
+
+
+if __name__ == "__main__":
+    # `python update_router_article.py --batch <router_file_path> <final_metadata_file_path> [...]` applies many
+    # _final_for_router.json files with a single router read/write
+    if len(sys.argv) >= 4 and sys.argv[1] == "--batch":
+        r_file_path = sys.argv[2]
+        final_articles = []
+        load_errors = []
+        for final_meta_path in sys.argv[3:]:
+            try:
+                with open(final_meta_path, 'r', encoding='utf-8') as f:
+                    final_articles.append(json.load(f))
+            except Exception as e:
+                load_errors.append(f"Error loading final metadata {final_meta_path}: {e}")
+        results = batch_stage_results(r_file_path, final_articles) if final_articles else []
+        succeeded = sum(1 for _, result in results if result["status"] == "success")
+        print(json.dumps({
+            "status": "success" if results and succeeded == len(results) and not load_errors else "failure",
+            "articles": {article_key: result for article_key, result in results},
+            "editorial_ai_message": f"Applied {succeeded} of {len(results) + len(load_errors)} article(s) to the router in one update.",
+            "errors": load_errors
+        }))
+        sys.exit(0)
+
+    if len(sys.argv) != 4:
+        print(json.dumps({
+            "status": "failure", "modified_file": None, "changes_summary": "",
+            "editorial_ai_message": "Error: Incorrect arguments. Usage: python update_router_article.py <router_file_path> <final_metadata_file_path> <article_id_to_update> | --batch <router_file_path> <final_metadata_file_path> [...]",
+            "errors": ["Incorrect number of arguments provided."]
+        }))
+        sys.exit(1)
+
+    r_file_path = sys.argv[1]
+    final_meta_path = sys.argv[2]
+    article_id = sys.argv[3]
+
+    print(json.dumps(stage_result(r_file_path, final_meta_path, article_id)))
@@ -0,0 +1,290 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+
+import build_cache
+import pipeline
+
+INCOMING_ROOT = os.path.join(pipeline.BASE_APP_PATH, "content_pipeline/incoming")
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL_SECONDS = 1.0
+
+# Editors and copy tools leave these around mid-write; they never trigger a run on their own
+IGNORED_SUFFIXES = ('~', '.swp', '.swx', '.tmp', '.part', '.crdownload')
+
+# inotify is optional: on Linux it is used through libc directly, elsewhere (or if it fails) we poll snapshots.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+INOTIFY_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+INOTIFY_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+INOTIFY_AVAILABLE = False
+LIBC = None
+if sys.platform.startswith('linux'):
+    try:
+        LIBC = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        LIBC.inotify_init1.argtypes = [ctypes.c_int]
+        LIBC.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        INOTIFY_AVAILABLE = True
+    except (OSError, AttributeError):
+        INOTIFY_AVAILABLE = False
+
+
+def is_ignored(path):
+    name = os.path.basename(path)
+    return name.startswith('.') or name.endswith(IGNORED_SUFFIXES)
+
+
+# --- Polling backend: scandir + (size, mtime) snapshots ---
+
+def scan_tree(root):
+    """Full snapshot of root: {"dirs": {path: mtime_ns}, "files": {path: (size, mtime_ns)}}. Only used at startup."""
+    snapshot = {"dirs": {}, "files": {}}
+    _scan_dir(root, snapshot)
+    return snapshot
+
+
+def _scan_dir(dir_path, snapshot):
+    try:
+        snapshot["dirs"][dir_path] = os.stat(dir_path).st_mtime_ns
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    _scan_dir(entry.path, snapshot)
+                elif entry.is_file():
+                    stat_result = entry.stat()
+                    snapshot["files"][entry.path] = (stat_result.st_size, stat_result.st_mtime_ns)
+    except FileNotFoundError:
+        snapshot["dirs"].pop(dir_path, None)
+
+
+def refresh_snapshot(snapshot):
+    """
+    Updates snapshot in place and returns the set of changed paths.
+    Known files are stat()ed to catch in-place edits; a directory is only listed again when its own mtime changed
+    (entries added, removed or renamed), so a quiet tree costs one stat per entry and no directory listings.
+    """
+    changed = set()
+
+    for dir_path, known_mtime in list(snapshot["dirs"].items()):
+        try:
+            current_mtime = os.stat(dir_path).st_mtime_ns
+        except FileNotFoundError:
+            del snapshot["dirs"][dir_path]
+            changed.add(dir_path)
+            continue
+        if current_mtime == known_mtime:
+            continue
+        snapshot["dirs"][dir_path] = current_mtime
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and entry.path not in snapshot["dirs"]:
+                    before = set(snapshot["files"])
+                    _scan_dir(entry.path, snapshot)
+                    changed.add(entry.path)
+                    changed.update(set(snapshot["files"]) - before)
+                elif entry.is_file() and entry.path not in snapshot["files"]:
+                    stat_result = entry.stat()
+                    snapshot["files"][entry.path] = (stat_result.st_size, stat_result.st_mtime_ns)
+                    changed.add(entry.path)
+
+    for file_path, known_stamp in list(snapshot["files"].items()):
+        try:
+            stat_result = os.stat(file_path)
+        except FileNotFoundError:
+            del snapshot["files"][file_path]
+            changed.add(file_path)
+            continue
+        stamp = (stat_result.st_size, stat_result.st_mtime_ns)
+        if stamp != known_stamp:
+            snapshot["files"][file_path] = stamp
+            changed.add(file_path)
+
+    return changed
+
+
+# --- inotify backend ---
+
+def inotify_open(root):
+    """Returns (fd, {watch_descriptor: dir_path}) with a watch on root and every directory below it."""
+    fd = LIBC.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    watches = {}
+    for dir_path in scan_tree(root)["dirs"]:
+        _inotify_watch(fd, watches, dir_path)
+    return fd, watches
+
+
+def _inotify_watch(fd, watches, dir_path):
+    wd = LIBC.inotify_add_watch(fd, os.fsencode(dir_path), INOTIFY_WATCH_MASK)
+    if wd >= 0:
+        watches[wd] = dir_path
+
+
+def inotify_read(fd, watches, timeout, root):
+    """
+    Waits up to timeout seconds and returns the set of changed paths. New subdirectories are watched as they appear.
+    If the kernel's event queue overflowed, every file under root is reported, since which ones changed is unknown.
+    """
+    changed = set()
+    readable, _, _ = select.select([fd], [], [], timeout)
+    if not readable:
+        return changed
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return changed
+
+    offset = 0
+    while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+        wd, mask, _, name_len = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+        offset += INOTIFY_EVENT_HEADER.size
+        name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+        offset += name_len
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped (e.g. a large batch copied in), including any for new directories, so rescan
+            snapshot = scan_tree(root)
+            for dir_path in snapshot["dirs"]:
+                _inotify_watch(fd, watches, dir_path)
+            changed.update(snapshot["files"])
+            continue
+        dir_path = watches.get(wd)
+        if dir_path is None:
+            continue
+        path = os.path.join(dir_path, name) if name else dir_path
+        changed.add(path)
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            # A directory copied in may already hold files by the time the watch is added
+            for sub_dir in scan_tree(path)["dirs"]:
+                _inotify_watch(fd, watches, sub_dir)
+            changed.update(scan_tree(path)["files"])
+        if mask & IN_DELETE_SELF:
+            watches.pop(wd, None)
+    return changed
+
+
+# --- Processing ---
+
+def affected_batches(changed_paths, incoming_root=INCOMING_ROOT):
+    """Batch directory names touched by the changed paths (Markdown or assets), ignoring temp/hidden files."""
+    batches = set()
+    for path in changed_paths:
+        if is_ignored(path):
+            continue
+        relative = os.path.relpath(path, incoming_root)
+        if relative.startswith('..') or relative == '.':
+            continue
+        batch_dir_name = relative.split(os.sep, 1)[0]
+        if os.path.isdir(os.path.join(incoming_root, batch_dir_name)):
+            batches.add(batch_dir_name)
+    return batches
+
+
+def process_changes(batch_dir_names, cache, workers=1, threads=1):
+    """
+    Re-stages the given batches through the build cache, so only new or changed articles and assets do any work.
+    Watch mode never publishes; it only refreshes the staging previews.
+    """
+    started = time.monotonic()
+    batch_results = pipeline.run_batches(sorted(batch_dir_names), publish=False, workers=workers, cache=cache, threads=threads)
+    build_cache.save_cache(cache)
+    return {
+        "batches": batch_results,
+        "elapsed_seconds": round(time.monotonic() - started, 3)
+    }
+
+
+def watch(incoming_root=INCOMING_ROOT, debounce_seconds=DEFAULT_DEBOUNCE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL_SECONDS,
+          workers=1, threads=1, use_inotify=True, run_once=False):
+    """
+    Watches incoming_root and re-stages affected batches once a burst of writes has been quiet for debounce_seconds.
+    Emits one JSON line per processing round. A catch-up round over every batch runs at startup (cheap when the
+    build cache is warm) so changes made while the watcher was down are not missed.
+    """
+    cache = build_cache.load_cache()
+    inotify_fd = None
+    snapshot = None
+    if not run_once:
+        # Watch (or snapshot) before the catch-up round, so writes made while it runs trigger the next round
+        if use_inotify and INOTIFY_AVAILABLE:
+            try:
+                inotify_fd, watches = inotify_open(incoming_root)
+            except OSError:
+                inotify_fd = None
+        if inotify_fd is None:
+            snapshot = scan_tree(incoming_root)
+
+    pending = set()
+    last_change = None
+    try:
+        initial_batches = affected_batches((snapshot or scan_tree(incoming_root))["files"], incoming_root)
+        if initial_batches:
+            print(json.dumps(dict(trigger="startup", **process_changes(initial_batches, cache, workers, threads))), flush=True)
+        if run_once:
+            return
+
+        while True:
+            # While a burst is in progress, wake up in time to notice when it has gone quiet
+            timeout = poll_interval if last_change is None else min(poll_interval, max(0.05, debounce_seconds - (time.monotonic() - last_change)))
+            if inotify_fd is not None:
+                changed = inotify_read(inotify_fd, watches, timeout, incoming_root)
+            else:
+                time.sleep(timeout)
+                changed = refresh_snapshot(snapshot)
+
+            if changed:
+                pending.update(changed)
+                last_change = time.monotonic()
+            elif pending and time.monotonic() - last_change >= debounce_seconds:
+                batches = affected_batches(pending, incoming_root)
+                changed_paths = sorted(os.path.relpath(p, incoming_root) for p in pending if not is_ignored(p))
+                pending.clear()
+                last_change = None
+                if batches:
+                    print(json.dumps(dict(trigger="change", changed_paths=changed_paths, **process_changes(batches, cache, workers, threads))), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if inotify_fd is not None:
+            os.close(inotify_fd)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {"--debounce": DEFAULT_DEBOUNCE_SECONDS, "--poll-interval": DEFAULT_POLL_INTERVAL_SECONDS, "--workers": 1, "--threads": 1}
+    flags = {"--once": False, "--no-inotify": False}
+    usage_error = False
+    for flag in flags:
+        if flag in args:
+            flags[flag] = True
+            args.remove(flag)
+    for option, default in options.items():
+        if option in args:
+            option_index = args.index(option)
+            try:
+                options[option] = type(default)(args[option_index + 1])
+                del args[option_index:option_index + 2]
+            except (IndexError, ValueError):
+                usage_error = True
+    if args or usage_error:
+        print(json.dumps({
+            "errors": ["Usage: python watch_incoming.py [--debounce SECONDS] [--poll-interval SECONDS] [--workers N] [--threads N] [--no-inotify] [--once]"]
+        }))
+        sys.exit(1)
+
+    watch(debounce_seconds=options["--debounce"], poll_interval=options["--poll-interval"],
+          workers=max(1, options["--workers"]), threads=max(1, options["--threads"]),
+          use_inotify=not flags["--no-inotify"], run_once=flags["--once"])